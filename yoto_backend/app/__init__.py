@@ -54,6 +54,12 @@ from app.core.permission.advanced_optimization import advanced_optimization_ext
 from app.core.permission.hybrid_permission_cache import (
     hybrid_cache,
 )  # Import the instance
+from app.core.permission.permission_resolver import permission_resolver
+from app.core.permission.permission_generations import generation_store
+from app.core.permission.permission_registry import permission_manifest
+
+# 导入消息检索模块
+from app.core.search import message_search
 
 # 加载.env文件
 load_dotenv()
@@ -149,6 +155,18 @@ def create_app(config_name="development"):
     # 3. 高级优化模块，依赖Redis客户端和缓存
     advanced_optimization_ext.init_app(app)
 
+    # 4. 消息检索索引
+    message_search.init_app(app)
+
+    # 5. 权限解析器，快照在首次权限检查时构建
+    permission_resolver.init_app(app)
+
+    # 6. 权限缓存代数计数器，依赖Redis客户端
+    generation_store.init_app(app)
+
+    # 7. 权限清单，蓝图已导入，与permissions表一次性同步
+    permission_manifest.init_app(app)
+
     # 初始化权限平台（显式依赖注入）
     with app.app_context():
         if not initialize_permission_platform():
@@ -0,0 +1,201 @@
+"""
+消息批量加载工具
+
+为消息列表类接口提供固定查询次数的数据装配：
+- 一次批量查询被回复的父消息
+- 一次批量查询相关用户名
+- 一次 GROUP BY (message_id, reaction) 聚合表情反应
+- 基于 (created_at, id) 的游标分页，避免 COUNT(*)/OFFSET
+"""
+
+from sqlalchemy import and_, func, or_
+
+from app.core.extensions import db
+from .models import Message, MessageReaction
+
+REPLY_PREVIEW_LENGTH = 100
+
+
+def _truncate(content, length=REPLY_PREVIEW_LENGTH):
+    """截断被回复消息内容用于摘要展示"""
+    if len(content) > length:
+        return content[:length] + "..."
+    return content
+
+
+def load_usernames(user_ids):
+    """批量获取用户名，返回 {user_id: username}"""
+    from app.blueprints.auth.models import User
+
+    user_ids = {uid for uid in user_ids if uid is not None}
+    if not user_ids:
+        return {}
+    rows = (
+        db.session.query(User.id, User.username).filter(User.id.in_(user_ids)).all()
+    )
+    return {row.id: row.username for row in rows}
+
+
+def load_reply_parents(messages):
+    """批量获取被回复的父消息（已删除的不返回），返回 {message_id: Message}"""
+    reply_ids = {m.reply_to_id for m in messages if m.reply_to_id}
+    if not reply_ids:
+        return {}
+    parents = Message.query.filter(
+        Message.id.in_(reply_ids), Message.is_deleted == False
+    ).all()
+    return {parent.id: parent for parent in parents}
+
+
+def load_reaction_stats(message_ids):
+    """
+    聚合表情反应统计
+
+    一次 GROUP BY 查询返回 {message_id: [{"reaction": ..., "count": ...}]}
+    """
+    message_ids = list(message_ids)
+    if not message_ids:
+        return {}
+    rows = (
+        db.session.query(
+            MessageReaction.message_id,
+            MessageReaction.reaction,
+            func.count(MessageReaction.id),
+        )
+        .filter(MessageReaction.message_id.in_(message_ids))
+        .group_by(MessageReaction.message_id, MessageReaction.reaction)
+        .order_by(MessageReaction.message_id, func.min(MessageReaction.id))
+        .all()
+    )
+    stats = {}
+    for message_id, reaction, count in rows:
+        stats.setdefault(message_id, []).append({"reaction": reaction, "count": count})
+    return stats
+
+
+def build_reply_preview(parent, usernames):
+    """构造被回复消息的摘要"""
+    return {
+        "id": parent.id,
+        "user_id": parent.user_id,
+        "username": usernames.get(parent.user_id, "Unknown"),
+        "content": _truncate(parent.content),
+        "type": parent.type,
+    }
+
+
+def serialize_message_page(messages, include_author=False):
+    """
+    将一页消息序列化为接口返回格式
+
+    无论页面大小，固定执行最多三次查询（父消息、用户名、表情聚合）。
+
+    Args:
+        messages: Message 列表
+        include_author: 是否附带发送者用户名
+
+    Returns:
+        list[dict]: 与原 list_messages 返回结构一致的消息数据
+    """
+    if not messages:
+        return []
+
+    parents = load_reply_parents(messages)
+    user_ids = {parent.user_id for parent in parents.values()}
+    if include_author:
+        user_ids.update(m.user_id for m in messages)
+    usernames = load_usernames(user_ids)
+    reactions = load_reaction_stats(m.id for m in messages)
+
+    result = []
+    for m in messages:
+        message_data = {
+            "id": m.id,
+            "channel_id": m.channel_id,
+            "user_id": m.user_id,
+            "type": m.type,
+            "content": m.content,
+            "mentions": m.mentions or [],
+            "reply_to_id": m.reply_to_id,
+            "created_at": m.created_at.isoformat(),
+            "is_edited": m.is_edited,
+            "updated_at": m.updated_at.isoformat() if m.is_edited else None,
+            "is_forwarded": m.is_forwarded,
+            "original_message_id": m.original_message_id,
+            "original_channel_id": m.original_channel_id,
+            "original_user_id": m.original_user_id,
+            "forward_comment": m.forward_comment,
+            "is_pinned": m.is_pinned,
+            "pinned_at": m.pinned_at.isoformat() if m.pinned_at else None,
+            "pinned_by": m.pinned_by,
+        }
+        if include_author:
+            message_data["username"] = usernames.get(m.user_id, "Unknown")
+
+        parent = parents.get(m.reply_to_id) if m.reply_to_id else None
+        if parent is not None:
+            message_data["reply_to"] = build_reply_preview(parent, usernames)
+
+        message_data["reactions"] = reactions.get(m.id, [])
+        result.append(message_data)
+    return result
+
+
+def fetch_message_page(channel_id, limit, before_id=None, after_id=None):
+    """
+    基于 (created_at, id) 的游标分页
+
+    结果始终按时间倒序返回；before_id 向更早翻页，after_id 向更新翻页。
+    多取一条用于判断是否还有更多数据，不执行 COUNT(*)。
+
+    Args:
+        channel_id: 频道ID
+        limit: 每页数量
+        before_id: 返回早于该消息的记录
+        after_id: 返回晚于该消息的记录
+
+    Returns:
+        tuple: (messages, has_more)；游标消息不存在时返回 (None, False)
+    """
+    query = Message.query.filter(
+        Message.channel_id == channel_id, Message.is_deleted == False
+    )
+
+    anchor_id = before_id if before_id is not None else after_id
+    anchor = None
+    if anchor_id is not None:
+        anchor = (
+            db.session.query(Message.id, Message.created_at)
+            .filter(Message.id == anchor_id, Message.channel_id == channel_id)
+            .first()
+        )
+        if anchor is None:
+            return None, False
+
+    if anchor is not None and before_id is not None:
+        query = query.filter(
+            or_(
+                Message.created_at < anchor.created_at,
+                and_(
+                    Message.created_at == anchor.created_at, Message.id < anchor.id
+                ),
+            )
+        ).order_by(Message.created_at.desc(), Message.id.desc())
+    elif anchor is not None:
+        query = query.filter(
+            or_(
+                Message.created_at > anchor.created_at,
+                and_(
+                    Message.created_at == anchor.created_at, Message.id > anchor.id
+                ),
+            )
+        ).order_by(Message.created_at.asc(), Message.id.asc())
+    else:
+        query = query.order_by(Message.created_at.desc(), Message.id.desc())
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if anchor is not None and before_id is None:
+        rows.reverse()
+    return rows, has_more
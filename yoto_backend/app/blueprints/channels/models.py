@@ -86,6 +86,11 @@ class Message(db.Model):
     pinned_by = db.Column(db.Integer, nullable=True)  # 置顶操作者ID
     # 可扩展：引用消息、消息状态、撤回等
 
+    # 游标分页索引：按 (channel_id, created_at, id) 定位历史消息
+    __table_args__ = (
+        db.Index("ix_messages_channel_created_id", "channel_id", "created_at", "id"),
+    )
+
     # 关系
     channel = db.relationship("Channel", backref=db.backref("messages", lazy=True))
 
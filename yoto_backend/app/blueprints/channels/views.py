@@ -10,6 +10,8 @@ from .models import (
     MessageReaction,
     SearchHistory,
 )
+from .message_loader import fetch_message_page, serialize_message_page
+from app.core.search import message_search
 from app.core.permission.permission_decorators import require_permission
 from app.core.permission.permission_registry import register_permission
 
@@ -1226,6 +1228,7 @@ def send_message(channel_id):
     )
     db.session.add(msg)
     db.session.commit()
+    message_search.index_message(msg, server_id=channel.server_id)
 
     return (
         jsonify(
@@ -1247,7 +1250,7 @@ def send_message(channel_id):
 @channels_bp.route("/channels/<int:channel_id>/messages", methods=["GET"])
 def list_messages(channel_id):
     """
-    查询频道消息历史（支持分页）
+    查询频道消息历史（支持页码分页与游标分页）
     ---
     tags:
       - Messages
@@ -1261,13 +1264,29 @@ def list_messages(channel_id):
       - in: query
         name: page
         type: integer
-        description: 页码
+        description: 页码（页码分页模式）
         example: 1
       - in: query
         name: per_page
         type: integer
-        description: 每页数量
+        description: 每页数量（游标分页模式最大100）
         example: 20
+      - in: query
+        name: pagination
+        type: string
+        enum: [offset, keyset]
+        description: 分页模式，keyset 不返回 total，深度翻页开销恒定
+        example: keyset
+      - in: query
+        name: before_id
+        type: integer
+        description: 游标分页，返回早于该消息的记录
+        example: 1000
+      - in: query
+        name: after_id
+        type: integer
+        description: 游标分页，返回晚于该消息的记录
+        example: 900
     responses:
       200:
         description: 消息列表
@@ -1297,79 +1316,58 @@ def list_messages(channel_id):
               type: integer
             total:
               type: integer
+            has_more:
+              type: boolean
+            next_before_id:
+              type: integer
+            prev_after_id:
+              type: integer
+      400:
+        description: 游标参数错误
       404:
         description: 频道不存在
     """
     channel = Channel.query.get(channel_id)
     if not channel:
         return jsonify({"error": "频道不存在"}), 404
-    page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 20, type=int)
+    before_id = request.args.get("before_id", type=int)
+    after_id = request.args.get("after_id", type=int)
+    pagination_mode = request.args.get("pagination", "offset")
+
+    # 游标分页：按 (created_at, id) 定位，不执行 COUNT(*)/OFFSET
+    if before_id is not None or after_id is not None or pagination_mode == "keyset":
+        if before_id is not None and after_id is not None:
+            return jsonify({"error": "before_id 与 after_id 不能同时指定"}), 400
+        per_page = max(1, min(per_page, 100))
+        items, has_more = fetch_message_page(
+            channel_id, per_page, before_id=before_id, after_id=after_id
+        )
+        if items is None:
+            return jsonify({"error": "游标消息不存在"}), 400
+        return (
+            jsonify(
+                {
+                    "messages": serialize_message_page(items),
+                    "per_page": per_page,
+                    "has_more": has_more,
+                    "next_before_id": items[-1].id if items else None,
+                    "prev_after_id": items[0].id if items else None,
+                }
+            ),
+            200,
+        )
+
+    page = request.args.get("page", 1, type=int)
     pagination = (
         Message.query.filter_by(channel_id=channel_id, is_deleted=False)
-        .order_by(Message.created_at.desc())
+        .order_by(Message.created_at.desc(), Message.id.desc())
         .paginate(page=page, per_page=per_page, error_out=False)
     )
-    messages = []
-    for m in pagination.items:
-        message_data = {
-            "id": m.id,
-            "channel_id": m.channel_id,
-            "user_id": m.user_id,
-            "type": m.type,
-            "content": m.content,
-            "mentions": m.mentions or [],
-            "reply_to_id": m.reply_to_id,
-            "created_at": m.created_at.isoformat(),
-            "is_edited": m.is_edited,
-            "updated_at": m.updated_at.isoformat() if m.is_edited else None,
-            "is_forwarded": m.is_forwarded,
-            "original_message_id": m.original_message_id,
-            "original_channel_id": m.original_channel_id,
-            "original_user_id": m.original_user_id,
-            "forward_comment": m.forward_comment,
-            "is_pinned": m.is_pinned,
-            "pinned_at": m.pinned_at.isoformat() if m.pinned_at else None,
-            "pinned_by": m.pinned_by,
-        }
-
-        # 如果有回复的消息，添加被回复消息的摘要
-        if m.reply_to_id:
-            reply_message = Message.query.get(m.reply_to_id)
-            if reply_message and not reply_message.is_deleted:
-                from app.blueprints.auth.models import User
-
-                reply_user = User.query.get(reply_message.user_id)
-                message_data["reply_to"] = {
-                    "id": reply_message.id,
-                    "user_id": reply_message.user_id,
-                    "username": reply_user.username if reply_user else "Unknown",
-                    "content": (
-                        reply_message.content[:100] + "..."
-                        if len(reply_message.content) > 100
-                        else reply_message.content
-                    ),
-                    "type": reply_message.type,
-                }
-
-        # 添加表情反应统计信息
-        reactions = MessageReaction.query.filter_by(message_id=m.id).all()
-        reaction_stats = {}
-        for reaction in reactions:
-            if reaction.reaction not in reaction_stats:
-                reaction_stats[reaction.reaction] = {
-                    "reaction": reaction.reaction,
-                    "count": 0,
-                }
-            reaction_stats[reaction.reaction]["count"] += 1
-
-        message_data["reactions"] = list(reaction_stats.values())
-
-        messages.append(message_data)
     return (
         jsonify(
             {
-                "messages": messages,
+                "messages": serialize_message_page(pagination.items),
                 "page": page,
                 "per_page": per_page,
                 "total": pagination.total,
@@ -1456,6 +1454,7 @@ def edit_message(channel_id, message_id):
     message.content = content
     message.is_edited = True
     db.session.commit()
+    message_search.index_message(message, server_id=message.channel.server_id)
 
     return (
         jsonify(
@@ -1522,6 +1521,7 @@ def delete_message(channel_id, message_id):
 
     message.is_deleted = True
     db.session.commit()
+    message_search.remove_message(message.id)
 
     return jsonify({"message": "消息删除成功"}), 200
 
@@ -1987,6 +1987,29 @@ def get_message_reactions(channel_id, message_id):
     return jsonify({"reactions": list(reaction_stats.values())}), 200
 
 
+def _load_search_hits(result, query):
+    """按检索结果顺序批量加载消息，并附带高亮内容与相关度"""
+    if not result.doc_ids:
+        return []
+    import re
+
+    hits = Message.query.filter(
+        Message.id.in_(result.doc_ids), Message.is_deleted == False
+    ).all()
+    hits_by_id = {m.id: m for m in hits}
+    ordered = [hits_by_id[i] for i in result.doc_ids if i in hits_by_id]
+    messages = serialize_message_page(ordered, include_author=True)
+
+    # 简单的关键词高亮（用**包围）
+    pattern = re.compile(re.escape(query), re.IGNORECASE)
+    for message_data in messages:
+        message_data["highlighted_content"] = pattern.sub(
+            f"**{query}**", message_data["content"]
+        )
+        message_data["score"] = round(result.scores.get(message_data["id"], 0.0), 4)
+    return messages
+
+
 @channels_bp.route("/channels/<int:channel_id>/messages/search", methods=["GET"])
 @jwt_required()
 @require_permission("message.search", scope="channel", scope_id_arg="channel_id")
@@ -2046,7 +2069,7 @@ def search_messages(channel_id):
         name: sort
         type: string
         enum: [relevance, date_asc, date_desc]
-        description: 排序方式（默认relevance）
+        description: 排序方式（默认relevance，按BM25相关度）
         example: relevance
     responses:
       200:
@@ -2085,6 +2108,9 @@ def search_messages(channel_id):
                     type: integer
                   reactions:
                     type: array
+                  score:
+                    type: number
+                    description: BM25相关度
             page:
               type: integer
             per_page:
@@ -2124,32 +2150,13 @@ def search_messages(channel_id):
     if sort not in ("relevance", "date_asc", "date_desc"):
         sort = "relevance"
 
-    # 构建查询条件
-    from sqlalchemy import and_, or_, func
+    # 时间范围过滤
     from datetime import datetime
 
-    # 基础查询：频道内未删除的消息
-    base_query = Message.query.filter(
-        Message.channel_id == channel_id, Message.is_deleted == False
-    )
-
-    # 关键词搜索（在内容中搜索）
-    if query:
-        base_query = base_query.filter(Message.content.ilike(f"%{query}%"))
-
-    # 用户过滤
-    if user_id:
-        base_query = base_query.filter(Message.user_id == user_id)
-
-    # 消息类型过滤
-    if message_type:
-        base_query = base_query.filter(Message.type == message_type)
-
-    # 时间范围过滤
+    start_datetime = end_datetime = None
     if start_date:
         try:
             start_datetime = datetime.strptime(start_date, "%Y-%m-%d")
-            base_query = base_query.filter(Message.created_at >= start_datetime)
         except ValueError:
             return jsonify({"error": "开始日期格式错误，应为YYYY-MM-DD"}), 400
 
@@ -2158,88 +2165,22 @@ def search_messages(channel_id):
             end_datetime = datetime.strptime(end_date, "%Y-%m-%d")
             # 结束日期包含当天
             end_datetime = end_datetime.replace(hour=23, minute=59, second=59)
-            base_query = base_query.filter(Message.created_at <= end_datetime)
         except ValueError:
             return jsonify({"error": "结束日期格式错误，应为YYYY-MM-DD"}), 400
 
-    # 排序
-    if sort == "date_asc":
-        base_query = base_query.order_by(Message.created_at.asc())
-    elif sort == "date_desc":
-        base_query = base_query.order_by(Message.created_at.desc())
-    else:  # relevance - 按创建时间倒序（最新优先）
-        base_query = base_query.order_by(Message.created_at.desc())
-
-    # 分页查询
-    pagination = base_query.paginate(page=page, per_page=per_page, error_out=False)
-
-    # 构建返回数据
-    messages = []
-    for msg in pagination.items:
-        # 获取用户信息
-        from app.blueprints.auth.models import User
-
-        user = User.query.get(msg.user_id)
-
-        # 高亮显示匹配的关键词
-        highlighted_content = msg.content
-        if query:
-            # 简单的关键词高亮（用**包围）
-            import re
-
-            pattern = re.compile(re.escape(query), re.IGNORECASE)
-            highlighted_content = pattern.sub(f"**{query}**", msg.content)
-
-        # 获取表情反应统计
-        reactions = MessageReaction.query.filter_by(message_id=msg.id).all()
-        reaction_stats = {}
-        for reaction in reactions:
-            if reaction.reaction not in reaction_stats:
-                reaction_stats[reaction.reaction] = {
-                    "reaction": reaction.reaction,
-                    "count": 0,
-                }
-            reaction_stats[reaction.reaction]["count"] += 1
-
-        message_data = {
-            "id": msg.id,
-            "channel_id": msg.channel_id,
-            "user_id": msg.user_id,
-            "username": user.username if user else "Unknown",
-            "type": msg.type,
-            "content": msg.content,
-            "highlighted_content": highlighted_content,
-            "created_at": msg.created_at.isoformat(),
-            "is_edited": msg.is_edited,
-            "updated_at": msg.updated_at.isoformat() if msg.is_edited else None,
-            "mentions": msg.mentions or [],
-            "reply_to_id": msg.reply_to_id,
-            "reactions": list(reaction_stats.values()),
-            "is_forwarded": msg.is_forwarded,
-            "original_message_id": msg.original_message_id,
-            "original_channel_id": msg.original_channel_id,
-            "original_user_id": msg.original_user_id,
-            "forward_comment": msg.forward_comment,
-        }
-
-        # 如果有回复的消息，添加被回复消息的摘要
-        if msg.reply_to_id:
-            reply_message = Message.query.get(msg.reply_to_id)
-            if reply_message and not reply_message.is_deleted:
-                reply_user = User.query.get(reply_message.user_id)
-                message_data["reply_to"] = {
-                    "id": reply_message.id,
-                    "user_id": reply_message.user_id,
-                    "username": reply_user.username if reply_user else "Unknown",
-                    "content": (
-                        reply_message.content[:100] + "..."
-                        if len(reply_message.content) > 100
-                        else reply_message.content
-                    ),
-                    "type": reply_message.type,
-                }
-
-        messages.append(message_data)
+    # 倒排索引检索（BM25排序），开销与命中数相关而非频道消息总量
+    result = message_search.search(
+        query,
+        channel_id=channel_id,
+        user_id=user_id,
+        message_type=message_type,
+        start=start_datetime,
+        end=end_datetime,
+        sort=sort,
+        page=page,
+        per_page=per_page,
+    )
+    messages = _load_search_hits(result, query)
 
     # 记录搜索历史
     from flask_jwt_extended import get_jwt_identity
@@ -2266,7 +2207,7 @@ def search_messages(channel_id):
         search_type="channel",
         channel_id=channel_id,
         filters=filters if filters else None,
-        result_count=pagination.total,
+        result_count=result.total,
     )
     db.session.add(search_history)
     db.session.commit()
@@ -2277,7 +2218,7 @@ def search_messages(channel_id):
                 "messages": messages,
                 "page": page,
                 "per_page": per_page,
-                "total": pagination.total,
+                "total": result.total,
                 "query": query,
             }
         ),
@@ -2350,7 +2291,7 @@ def search_all_messages():
         name: sort
         type: string
         enum: [relevance, date_asc, date_desc]
-        description: 排序方式（默认relevance）
+        description: 排序方式（默认relevance，按BM25相关度）
         example: relevance
     responses:
       200:
@@ -2395,6 +2336,9 @@ def search_all_messages():
                     type: integer
                   reactions:
                     type: array
+                  score:
+                    type: number
+                    description: BM25相关度
             page:
               type: integer
             per_page:
@@ -2437,38 +2381,13 @@ def search_all_messages():
     if sort not in ("relevance", "date_asc", "date_desc"):
         sort = "relevance"
 
-    # 构建查询条件
-    from sqlalchemy import and_, or_, func
+    # 时间范围过滤
     from datetime import datetime
 
-    # 基础查询：未删除的消息
-    base_query = Message.query.filter(Message.is_deleted == False)
-
-    # 关键词搜索（在内容中搜索）
-    if query:
-        base_query = base_query.filter(Message.content.ilike(f"%{query}%"))
-
-    # 频道过滤
-    if channel_id:
-        base_query = base_query.filter(Message.channel_id == channel_id)
-
-    # 服务器过滤（通过频道关联）
-    if server_id:
-        base_query = base_query.join(Channel).filter(Channel.server_id == server_id)
-
-    # 用户过滤
-    if user_id:
-        base_query = base_query.filter(Message.user_id == user_id)
-
-    # 消息类型过滤
-    if message_type:
-        base_query = base_query.filter(Message.type == message_type)
-
-    # 时间范围过滤
+    start_datetime = end_datetime = None
     if start_date:
         try:
             start_datetime = datetime.strptime(start_date, "%Y-%m-%d")
-            base_query = base_query.filter(Message.created_at >= start_datetime)
         except ValueError:
             return jsonify({"error": "开始日期格式错误，应为YYYY-MM-DD"}), 400
 
@@ -2477,7 +2396,6 @@ def search_all_messages():
             end_datetime = datetime.strptime(end_date, "%Y-%m-%d")
             # 结束日期包含当天
             end_datetime = end_datetime.replace(hour=23, minute=59, second=59)
-            base_query = base_query.filter(Message.created_at <= end_datetime)
         except ValueError:
             return jsonify({"error": "结束日期格式错误，应为YYYY-MM-DD"}), 400
 
@@ -2486,9 +2404,11 @@ def search_all_messages():
     user_servers = ServerMember.query.filter_by(user_id=int(current_user_id)).all()
     server_ids = [member.server_id for member in user_servers]
 
-    if server_ids:
-        base_query = base_query.join(Channel).filter(Channel.server_id.in_(server_ids))
-    else:
+    # 服务器过滤（仅限用户已加入的服务器）
+    if server_id:
+        server_ids = [sid for sid in server_ids if sid == server_id]
+
+    if not server_ids:
         # 用户没有加入任何服务器，返回空结果
         return (
             jsonify(
@@ -2503,88 +2423,43 @@ def search_all_messages():
             200,
         )
 
-    # 排序
-    if sort == "date_asc":
-        base_query = base_query.order_by(Message.created_at.asc())
-    elif sort == "date_desc":
-        base_query = base_query.order_by(Message.created_at.desc())
-    else:  # relevance - 按创建时间倒序（最新优先）
-        base_query = base_query.order_by(Message.created_at.desc())
-
-    # 分页查询
-    pagination = base_query.paginate(page=page, per_page=per_page, error_out=False)
-
-    # 构建返回数据
-    messages = []
-    for msg in pagination.items:
-        # 获取用户信息
-        from app.blueprints.auth.models import User
-
-        user = User.query.get(msg.user_id)
-
-        # 获取频道信息
-        channel = Channel.query.get(msg.channel_id)
-
-        # 获取服务器信息
-        server = Server.query.get(channel.server_id) if channel else None
-
-        # 高亮显示匹配的关键词
-        highlighted_content = msg.content
-        if query:
-            # 简单的关键词高亮（用**包围）
-            import re
-
-            pattern = re.compile(re.escape(query), re.IGNORECASE)
-            highlighted_content = pattern.sub(f"**{query}**", msg.content)
-
-        # 获取表情反应统计
-        reactions = MessageReaction.query.filter_by(message_id=msg.id).all()
-        reaction_stats = {}
-        for reaction in reactions:
-            if reaction.reaction not in reaction_stats:
-                reaction_stats[reaction.reaction] = {
-                    "reaction": reaction.reaction,
-                    "count": 0,
-                }
-            reaction_stats[reaction.reaction]["count"] += 1
-
-        message_data = {
-            "id": msg.id,
-            "channel_id": msg.channel_id,
-            "channel_name": channel.name if channel else "Unknown",
-            "server_id": channel.server_id if channel else None,
-            "server_name": server.name if server else "Unknown",
-            "user_id": msg.user_id,
-            "username": user.username if user else "Unknown",
-            "type": msg.type,
-            "content": msg.content,
-            "highlighted_content": highlighted_content,
-            "created_at": msg.created_at.isoformat(),
-            "is_edited": msg.is_edited,
-            "updated_at": msg.updated_at.isoformat() if msg.is_edited else None,
-            "mentions": msg.mentions or [],
-            "reply_to_id": msg.reply_to_id,
-            "reactions": list(reaction_stats.values()),
+    # 倒排索引检索（BM25排序），开销与命中数相关而非消息总量
+    result = message_search.search(
+        query,
+        channel_id=channel_id,
+        server_ids=server_ids,
+        user_id=user_id,
+        message_type=message_type,
+        start=start_datetime,
+        end=end_datetime,
+        sort=sort,
+        page=page,
+        per_page=per_page,
+    )
+    messages = _load_search_hits(result, query)
+
+    # 批量补充频道与服务器信息
+    channel_map = {}
+    server_map = {}
+    if messages:
+        channel_map = {
+            c.id: c
+            for c in Channel.query.filter(
+                Channel.id.in_({m["channel_id"] for m in messages})
+            ).all()
         }
-
-        # 如果有回复的消息，添加被回复消息的摘要
-        if msg.reply_to_id:
-            reply_message = Message.query.get(msg.reply_to_id)
-            if reply_message and not reply_message.is_deleted:
-                reply_user = User.query.get(reply_message.user_id)
-                message_data["reply_to"] = {
-                    "id": reply_message.id,
-                    "user_id": reply_message.user_id,
-                    "username": reply_user.username if reply_user else "Unknown",
-                    "content": (
-                        reply_message.content[:100] + "..."
-                        if len(reply_message.content) > 100
-                        else reply_message.content
-                    ),
-                    "type": reply_message.type,
-                }
-
-        messages.append(message_data)
+        server_map = {
+            s.id: s
+            for s in Server.query.filter(
+                Server.id.in_({c.server_id for c in channel_map.values()})
+            ).all()
+        }
+    for message_data in messages:
+        channel = channel_map.get(message_data["channel_id"])
+        server = server_map.get(channel.server_id) if channel else None
+        message_data["channel_name"] = channel.name if channel else "Unknown"
+        message_data["server_id"] = channel.server_id if channel else None
+        message_data["server_name"] = server.name if server else "Unknown"
 
     # 记录搜索历史
     from flask_jwt_extended import get_jwt_identity
@@ -2615,7 +2490,7 @@ def search_all_messages():
         search_type="global",
         channel_id=None,  # 全局搜索没有特定频道
         filters=filters if filters else None,
-        result_count=pagination.total,
+        result_count=result.total,
     )
     db.session.add(search_history)
     db.session.commit()
@@ -2626,7 +2501,7 @@ def search_all_messages():
                 "messages": messages,
                 "page": page,
                 "per_page": per_page,
-                "total": pagination.total,
+                "total": result.total,
                 "query": query,
             }
         ),
@@ -2747,6 +2622,7 @@ def forward_message(channel_id, message_id):
 
     # 验证目标频道是否存在且用户有权限
     valid_target_channels = []
+    target_server_ids = {}
     for target_channel_id in target_channels:
         target_channel = Channel.query.get(target_channel_id)
         if not target_channel:
@@ -2762,6 +2638,7 @@ def forward_message(channel_id, message_id):
 
         if server_member:
             valid_target_channels.append(target_channel_id)
+            target_server_ids[target_channel_id] = target_channel.server_id
 
     if not valid_target_channels:
         return jsonify({"error": "没有有效的目标频道或权限不足"}), 403
@@ -2786,6 +2663,10 @@ def forward_message(channel_id, message_id):
         forwarded_messages.append(forwarded_message)
 
     db.session.commit()
+    for msg in forwarded_messages:
+        message_search.index_message(
+            msg, server_id=target_server_ids.get(msg.channel_id)
+        )
 
     # 构建返回数据
     result_messages = []
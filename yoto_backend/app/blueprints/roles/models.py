@@ -2,6 +2,7 @@ from app.core.extensions import db
 from datetime import datetime
 from sqlalchemy import Index, CheckConstraint
 from sqlalchemy.dialects.mysql import JSON
+from sqlalchemy.orm import validates
 
 
 class Role(db.Model):
@@ -144,6 +145,15 @@ class RolePermission(db.Model):
         Index("idx_role_permissions_scope", "role_id", "scope_type", "scope_id"),
     )
 
+    @validates("expression")
+    def validate_expression(self, key, expression):
+        """写入时编译表达式，语法错误直接拒绝"""
+        if expression:
+            from app.core.permission.permission_expression import compile_expression
+
+            compile_expression(expression)
+        return expression
+
 
 class Permission(db.Model):
     """
@@ -0,0 +1,187 @@
+"""
+通用请求合并（single-flight）模块
+
+同一进程内，同一个键同时只有一个加载者（leader）执行加载函数，
+其余并发请求（coalesced）等待并共享 leader 的结果或异常。
+可选地在Redis上加跨进程租约：拿不到租约的进程先等待其他进程回填缓存，
+超时后再自行加载。
+
+不依赖任何其他自定义模块，只依赖redis和标准库。
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 只有租约持有者才能删除租约
+_RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+else
+    return 0
+end
+"""
+
+
+class SingleFlight:
+    """
+    按键合并并发加载
+
+    特性：
+    - 进程内每个键只有一个 leader 执行加载函数，其他调用共享同一个 Future
+    - 可选的跨进程租约（SET NX PX），不启动续期线程
+    - 统计 leader / coalesced 次数，用于观察惊群的削减效果
+    """
+
+    def __init__(
+        self,
+        name: str = "default",
+        redis_client=None,
+        lease_ttl: float = 2.0,
+        lease_wait: float = 0.5,
+        lease_poll_interval: float = 0.01,
+        wait_timeout: float = 5.0,
+    ):
+        """
+        初始化请求合并器
+
+        Args:
+            name: 名称，用于日志和统计
+            redis_client: Redis客户端，为None时只做进程内合并
+            lease_ttl: 跨进程租约过期时间（秒）
+            lease_wait: 未拿到租约时等待其他进程回填的最长时间（秒）
+            lease_poll_interval: 等待回填时的轮询间隔（秒）
+            wait_timeout: 等待进程内 leader 的最长时间（秒），超时后自行加载
+        """
+        self.name = name
+        self.redis_client = redis_client
+        self.lease_ttl = lease_ttl
+        self.lease_wait = lease_wait
+        self.lease_poll_interval = lease_poll_interval
+        self.wait_timeout = wait_timeout
+
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def do(
+        self,
+        key: str,
+        loader: Callable[[], Any],
+        recheck: Optional[Callable[[], Any]] = None,
+    ) -> Any:
+        """
+        执行（或加入）指定键的加载
+
+        Args:
+            key: 合并键，通常为缓存键
+            loader: 加载函数
+            recheck: 跨进程模式下检查其他进程是否已回填的函数，返回None表示未回填
+
+        Returns:
+            Any: 加载结果（leader 与所有等待者相同）
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.stats["leader_calls"] += 1
+            else:
+                self.stats["coalesced_calls"] += 1
+
+        if not leader:
+            try:
+                return future.result(timeout=self.wait_timeout)
+            except FutureTimeoutError:
+                self.stats["wait_timeouts"] += 1
+                logger.warning(f"[{self.name}] 等待加载超时，自行加载: {key}")
+                return loader()
+
+        try:
+            result = self._load(key, loader, recheck)
+        except BaseException as e:
+            self.stats["errors"] += 1
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._calls.get(key) is future:
+                    del self._calls[key]
+
+    def _load(
+        self, key: str, loader: Callable[[], Any], recheck: Optional[Callable]
+    ) -> Any:
+        """leader 执行加载，必要时先获取跨进程租约"""
+        if self.redis_client is None or recheck is None:
+            return loader()
+
+        lease_key = f"lease:{key}"
+        token = f"{os.getpid()}:{threading.get_ident()}:{time.time_ns()}"
+        try:
+            acquired = self.redis_client.set(
+                lease_key, token, nx=True, px=int(self.lease_ttl * 1000)
+            )
+        except Exception as e:
+            logger.warning(f"[{self.name}] 获取加载租约失败，直接加载: {e}")
+            return loader()
+
+        if acquired:
+            self.stats["lease_acquired"] += 1
+            try:
+                return loader()
+            finally:
+                try:
+                    self.redis_client.eval(_RELEASE_LEASE_SCRIPT, 1, lease_key, token)
+                except Exception as e:
+                    logger.debug(f"[{self.name}] 释放加载租约失败: {e}")
+
+        # 其他进程正在加载，等待其回填
+        self.stats["lease_waits"] += 1
+        deadline = time.monotonic() + self.lease_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.lease_poll_interval)
+            value = recheck()
+            if value is not None:
+                self.stats["lease_hits"] += 1
+                return value
+        self.stats["lease_timeouts"] += 1
+        return loader()
+
+    def in_flight(self) -> int:
+        """当前正在加载的键数量"""
+        return len(self._calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取合并统计"""
+        leader = self.stats["leader_calls"]
+        coalesced = self.stats["coalesced_calls"]
+        total = leader + coalesced
+        return {
+            "name": self.name,
+            "leader_calls": leader,
+            "coalesced_calls": coalesced,
+            "coalescing_ratio": coalesced / total if total else 0.0,
+            "in_flight": self.in_flight(),
+            "lease_enabled": self.redis_client is not None,
+            "lease_acquired": self.stats["lease_acquired"],
+            "lease_waits": self.stats["lease_waits"],
+            "lease_hits": self.stats["lease_hits"],
+            "lease_timeouts": self.stats["lease_timeouts"],
+            "wait_timeouts": self.stats["wait_timeouts"],
+            "errors": self.stats["errors"],
+        }
+
+    def reset_stats(self):
+        """重置统计"""
+        self.stats.clear()
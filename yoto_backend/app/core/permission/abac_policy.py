@@ -0,0 +1,378 @@
+"""
+本地ABAC策略评估模块
+
+将声明式策略编译为进程内闭包，作为 OPAPolicyManager 的快速路径：
+- 覆盖 _build_user_info / _build_resource_info 已建模的属性：
+  风险等级、行为评分、安全等级、资源所有者和共享
+- 策略编译一次，评估只做字典取值和比较，不发起HTTP请求
+- 无法编译的策略（未知操作符、Rego源码等）不注册，仍由OPA评估
+
+策略格式（JSON兼容的字典）：
+
+    {
+        "rules": [                                  # 全部满足才允许
+            {"attr": "user.risk_level", "op": "le",
+             "ref": "resource.max_risk_level"},    # 与另一属性比较
+            {"attr": "user.disabled", "op": "ne", "value": True},  # 与常量比较
+            {"any": [...]}, {"all": [...]}, {"not": {...}},
+        ]
+    }
+
+属性路径相对于 OPA 的 input；与 Rego 一致，引用不存在的属性时规则不成立。
+"""
+
+import logging
+import operator
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# 编译后的规则：input -> bool
+Predicate = Callable[[Mapping[str, Any]], bool]
+
+
+def _contains(container, item) -> bool:
+    return item in container
+
+
+_COMPARATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "le": operator.le,
+    "gt": operator.gt,
+    "ge": operator.ge,
+    "in": lambda value, container: _contains(container, value),
+    "not_in": lambda value, container: not _contains(container, value),
+    "contains": _contains,
+}
+
+# 属性规则的本地策略，与 PermissionSystem 构建的属性对应。
+# 只覆盖 Rego 中 permission.abac 的属性部分（不含角色权限、时间、位置、设备规则），
+# 因此使用单独的名称，且需要在构造 OPAPolicyManager 时显式传入才会启用
+ATTRIBUTE_LOCAL_POLICIES: Dict[str, Dict[str, Any]] = {
+    "permission.abac_attributes": {
+        "rules": [
+            {"attr": "user.session_valid", "op": "eq", "value": True},
+            {"attr": "user.disabled", "op": "ne", "value": True},
+            {"attr": "resource.exists", "op": "eq", "value": True},
+            # 风险策略
+            {"attr": "user.risk_level", "op": "le", "ref": "resource.max_risk_level"},
+            {
+                "attr": "user.behavior_score",
+                "op": "ge",
+                "ref": "resource.min_behavior_score",
+            },
+            {
+                "attr": "user.security_level",
+                "op": "ge",
+                "ref": "resource.required_security_level",
+            },
+            # 所有者和共享：无所有者、本人、或已共享给该用户
+            {
+                "any": [
+                    {"attr": "resource.owner_id", "op": "eq", "value": None},
+                    {"attr": "user.id", "op": "eq", "ref": "resource.owner_id"},
+                    {
+                        "all": [
+                            {"attr": "resource.shared", "op": "eq", "value": True},
+                            {
+                                "attr": "user.id",
+                                "op": "in",
+                                "ref": "resource.shared_with",
+                            },
+                        ]
+                    },
+                ]
+            },
+        ]
+    }
+}
+
+
+class PolicyCompileError(ValueError):
+    """策略无法在本地编译"""
+
+    pass
+
+
+def _compile_path(path: Any) -> Callable[[Mapping[str, Any]], Any]:
+    """将 "user.risk_level" 编译为取值函数，路径不存在时返回 _MISSING"""
+    if not isinstance(path, str) or not path:
+        raise PolicyCompileError(f"无效的属性路径: {path!r}")
+    parts = tuple(path.split("."))
+
+    def lookup(data: Mapping[str, Any]) -> Any:
+        value = data
+        for part in parts:
+            if not isinstance(value, Mapping):
+                return _MISSING
+            value = value.get(part, _MISSING)
+            if value is _MISSING:
+                return _MISSING
+        return value
+
+    return lookup
+
+
+def _compile_rule(rule: Any) -> Predicate:
+    """编译单条规则"""
+    if not isinstance(rule, Mapping):
+        raise PolicyCompileError(f"规则必须是字典: {rule!r}")
+
+    if "all" in rule or "any" in rule:
+        combinator = "all" if "all" in rule else "any"
+        children = rule[combinator]
+        if not isinstance(children, (list, tuple)) or not children:
+            raise PolicyCompileError(f"{combinator} 需要非空规则列表")
+        predicates = tuple(_compile_rule(child) for child in children)
+        if combinator == "all":
+            return lambda data: all(predicate(data) for predicate in predicates)
+        return lambda data: any(predicate(data) for predicate in predicates)
+
+    if "not" in rule:
+        inner = _compile_rule(rule["not"])
+        return lambda data: not inner(data)
+
+    op = rule.get("op")
+    attr = _compile_path(rule.get("attr"))
+    if op == "exists":
+        return lambda data: attr(data) is not _MISSING
+    compare = _COMPARATORS.get(op)
+    if compare is None:
+        raise PolicyCompileError(f"不支持的操作符: {op!r}")
+
+    if "ref" in rule:
+        ref = _compile_path(rule["ref"])
+    elif "value" in rule:
+        constant = rule["value"]
+
+        def ref(data, constant=constant):
+            return constant
+
+    else:
+        raise PolicyCompileError(f"规则缺少 value 或 ref: {rule!r}")
+
+    def predicate(data: Mapping[str, Any]) -> bool:
+        left = attr(data)
+        right = ref(data)
+        if left is _MISSING or right is _MISSING:
+            return False
+        try:
+            return bool(compare(left, right))
+        except TypeError:
+            # 类型不可比较（如 None <= 3），与 Rego 一样视为不成立
+            return False
+
+    return predicate
+
+
+class CompiledPolicy:
+    """编译后的本地策略"""
+
+    __slots__ = ("name", "rule_count", "_predicate")
+
+    def __init__(self, name: str, spec: Mapping[str, Any]):
+        if not isinstance(spec, Mapping):
+            raise PolicyCompileError("策略必须是字典")
+        rules = spec.get("rules")
+        if not isinstance(rules, (list, tuple)) or not rules:
+            raise PolicyCompileError("策略缺少 rules")
+        self.name = name
+        self.rule_count = len(rules)
+        self._predicate = _compile_rule({"all": list(rules)})
+
+    def evaluate(self, input_data: Mapping[str, Any]) -> bool:
+        """
+        评估策略
+
+        参数:
+            input_data: OPA 的 input 部分（user / resource / action / context / time）
+
+        返回:
+            bool: 是否允许
+        """
+        return self._predicate(input_data)
+
+
+class LocalPolicyEvaluator:
+    """
+    本地策略注册表
+
+    只保存能够编译的策略；can_evaluate 为 False 的策略由调用方转发给OPA。
+    """
+
+    def __init__(self, policies: Optional[Mapping[str, Mapping[str, Any]]] = None):
+        self._policies: Dict[str, CompiledPolicy] = {}
+        self._lock = threading.Lock()
+        self.stats = Counter()
+        for name, spec in (policies or {}).items():
+            self.load(name, spec)
+
+    def load(self, name: str, spec: Mapping[str, Any]) -> bool:
+        """
+        编译并注册策略，编译失败时移除同名旧策略（改由OPA评估）
+
+        返回:
+            bool: 是否已在本地注册
+        """
+        try:
+            compiled = CompiledPolicy(name, spec)
+        except PolicyCompileError as e:
+            logger.warning(f"策略无法本地编译，将由OPA评估: {name}, 原因: {e}")
+            self.remove(name)
+            self.stats["compile_failures"] += 1
+            return False
+        with self._lock:
+            self._policies[name] = compiled
+        logger.info(f"本地策略已加载: {name}, 规则数: {compiled.rule_count}")
+        return True
+
+    def remove(self, name: str):
+        """移除本地策略"""
+        with self._lock:
+            self._policies.pop(name, None)
+
+    def can_evaluate(self, name: str) -> bool:
+        """策略是否可以在本地评估"""
+        return name in self._policies
+
+    def evaluate(self, name: str, input_data: Mapping[str, Any]) -> Optional[bool]:
+        """
+        本地评估策略
+
+        返回:
+            Optional[bool]: 评估结果；策略未在本地注册时返回None
+        """
+        policy = self._policies.get(name)
+        if policy is None:
+            self.stats["fallbacks"] += 1
+            return None
+        self.stats["evaluations"] += 1
+        return policy.evaluate(input_data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """本地策略统计"""
+        return {"policies": sorted(self._policies), **self.stats}
+
+
+# ==================== OPA部分评估残余查询 ====================
+
+# OPA内置比较函数 -> 本地操作符，以及左右操作数交换后的操作符
+_RESIDUAL_OPERATORS = {
+    "eq": ("eq", "eq"),
+    "equal": ("eq", "eq"),
+    "neq": ("ne", "ne"),
+    "lt": ("lt", "gt"),
+    "lte": ("le", "ge"),
+    "gt": ("gt", "lt"),
+    "gte": ("ge", "le"),
+}
+
+
+def _residual_operand(term: Mapping[str, Any]):
+    """
+    残余查询中的操作数
+
+    返回:
+        ("attr", "resource.exists") 或 ("value", 常量)
+    """
+    kind = term.get("type")
+    value = term.get("value")
+    if kind in ("null", "boolean", "number", "string"):
+        return ("value", value)
+    if kind == "array":
+        return ("value", [_residual_constant(item) for item in value])
+    if kind == "ref" and value and value[0] == {"type": "var", "value": "input"}:
+        parts = []
+        for part in value[1:]:
+            if part.get("type") != "string":
+                raise PolicyCompileError(f"不支持的引用: {value!r}")
+            parts.append(part["value"])
+        if not parts:
+            raise PolicyCompileError("不支持直接引用 input")
+        return ("attr", ".".join(parts))
+    raise PolicyCompileError(f"不支持的操作数: {term!r}")
+
+
+def _residual_constant(term: Mapping[str, Any]) -> Any:
+    kind, value = _residual_operand(term)
+    if kind != "value":
+        raise PolicyCompileError(f"数组中不支持引用: {term!r}")
+    return value
+
+
+def _operator_name(term: Mapping[str, Any]) -> str:
+    if term.get("type") != "ref":
+        raise PolicyCompileError(f"不支持的调用: {term!r}")
+    return ".".join(str(part.get("value")) for part in term["value"])
+
+
+def _residual_rule(expression: Mapping[str, Any]) -> Dict[str, Any]:
+    """将残余查询中的一个表达式转换为声明式规则"""
+    terms = expression.get("terms")
+    if isinstance(terms, Mapping):
+        # 单个项：要求其值为 true
+        kind, value = _residual_operand(terms)
+        if kind != "attr":
+            raise PolicyCompileError(f"不支持的常量表达式: {terms!r}")
+        rule = {"attr": value, "op": "eq", "value": True}
+    elif isinstance(terms, list) and len(terms) == 3:
+        name = _operator_name(terms[0])
+        left = _residual_operand(terms[1])
+        right = _residual_operand(terms[2])
+        if name == "internal.member_2":
+            # x in collection
+            if left[0] == "attr":
+                op, attr, other = "in", left[1], right
+            elif right[0] == "attr":
+                op, attr, other = "contains", right[1], left
+            else:
+                raise PolicyCompileError(f"不支持的常量比较: {terms!r}")
+        elif name in _RESIDUAL_OPERATORS:
+            op, swapped = _RESIDUAL_OPERATORS[name]
+            if left[0] == "attr":
+                attr, other = left[1], right
+            elif right[0] == "attr":
+                op, attr, other = swapped, right[1], left
+            else:
+                raise PolicyCompileError(f"不支持的常量比较: {terms!r}")
+        else:
+            raise PolicyCompileError(f"不支持的内置函数: {name}")
+        rule = {"attr": attr, "op": op}
+        rule["ref" if other[0] == "attr" else "value"] = other[1]
+    else:
+        raise PolicyCompileError(f"不支持的表达式: {expression!r}")
+    return {"not": rule} if expression.get("negated") else rule
+
+
+def compile_residual(compile_result: Mapping[str, Any]) -> Predicate:
+    """
+    编译 OPA /v1/compile 返回的残余查询
+
+    残余查询是若干查询的析取，每个查询是若干表达式的合取；
+    没有查询表示结果恒为 false，存在空查询表示恒为 true。
+
+    参数:
+        compile_result: /v1/compile 响应中的 result 部分
+
+    返回:
+        Predicate: input -> bool
+
+    异常:
+        PolicyCompileError: 残余查询依赖支持模块或包含不支持的表达式
+    """
+    if compile_result.get("support"):
+        raise PolicyCompileError("残余查询依赖支持模块")
+    queries = compile_result.get("queries") or []
+    if not queries:
+        return lambda data: False
+    if any(not query for query in queries):
+        return lambda data: True
+    return _compile_rule(
+        {"any": [{"all": [_residual_rule(expr) for expr in q]} for q in queries]}
+    )
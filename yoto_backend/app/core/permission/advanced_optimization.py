@@ -22,20 +22,41 @@ logger = logging.getLogger(__name__)
 
 # 导入现有模块
 # REMOVED: from app.core.permission.hybrid_permission_cache import HybridPermissionCache
-from app.core.permission.permission_monitor import get_stats, PermissionMonitor
+from app.core.permission.permission_monitor import (
+    PermissionMonitor,
+    RecordType,
+    get_stats,
+)
+from app.core.permission.metrics_registry import register_metric
 from app.core.common.distributed_lock import (
     OptimizedDistributedLock,
     create_optimized_distributed_lock,
 )
+from app.core.common.single_flight import SingleFlight
+from app.core.permission.permission_keys import (
+    decode_perm_key,
+    group_keys_by_user,
+    user_index_key,
+)
 
 # 全局混合缓存实例
 # _hybrid_cache = HybridPermissionCache() # REMOVED
 # _permission_cache = _hybrid_cache.l1_simple_cache # 替换为L1简单缓存 # REMOVED
 _cache_monitor = PermissionMonitor()
 
+# 缓存指标只保留低基数标签；cache_key 等逐键标签会被丢弃
+register_metric("cache_operations", ("operation", "cache_level", "success"), 64)
+register_metric("cache_duration", ("operation", "cache_level"), 32)
+register_metric("cache_success_rate", ("operation", "cache_level"), 32)
+register_metric("cache_get", ("level", "success"), 16)
+register_metric("cache_set", ("level", "success"), 16)
+
 # 全局高级优化器实例
 _advanced_optimizer = None
 
+# 缓存读取的请求合并器（替代每次读取创建分布式锁）
+_read_flight = SingleFlight(name="advanced_cache_read")
+
 
 # 兼容性函数 - 使用现有的PermissionMonitor方法
 def _record_cache_operation(
@@ -45,40 +66,42 @@ def _record_cache_operation(
     duration: float = 0.0,
     cache_key: str = None,
 ):
-    """记录缓存操作 - 使用现有的PermissionMonitor方法"""
+    """
+    记录缓存操作 - 使用现有的PermissionMonitor方法
+
+    指标名称固定，操作类型和缓存级别作为标签；cache_key 不再作为标签记录，
+    避免每个缓存键产生一条时间序列（参数保留以兼容调用方）。
+    """
     try:
-        # 使用现有的record方法记录操作
         tags = {
             "operation": operation_type,
             "cache_level": cache_level,
             "success": str(success),
         }
-        if cache_key:
-            tags["cache_key"] = cache_key
 
         # 记录操作计数
         _cache_monitor.record(
-            name=f"cache_operations.{operation_type}.{cache_level}",
+            name="cache_operations",
             value=1,
-            record_type=_cache_monitor.RecordType.COUNTER,
+            record_type=RecordType.COUNTER,
             tags=tags,
         )
 
-        # 记录操作时长
+        # 记录操作时长（按操作和缓存级别统计分位数）
         if duration > 0:
             _cache_monitor.record(
-                name=f"cache_duration.{operation_type}.{cache_level}",
+                name="cache_duration",
                 value=duration,
-                record_type=_cache_monitor.RecordType.HISTOGRAM,
+                record_type=RecordType.HISTOGRAM,
                 tags=tags,
             )
 
         # 记录成功率
         success_rate = 1.0 if success else 0.0
         _cache_monitor.record(
-            name=f"cache_success_rate.{operation_type}.{cache_level}",
+            name="cache_success_rate",
             value=success_rate,
-            record_type=_cache_monitor.RecordType.GAUGE,
+            record_type=RecordType.GAUGE,
             tags=tags,
         )
     except Exception as e:
@@ -300,6 +323,7 @@ class AdvancedDistributedOptimizer:
         """
         self.config = config
         self.redis_client = redis_client  # 使用注入的客户端
+        self._binary_redis_client = None
         self.batch_queue = asyncio.Queue(
             maxsize=self.config.get("max_concurrent_batches", 10)
         )
@@ -315,6 +339,18 @@ class AdvancedDistributedOptimizer:
         # 启动后台任务
         self._start_background_tasks()
 
+    @property
+    def binary_redis_client(self):
+        """与 redis_client 连接同一Redis、不解码响应的客户端，权限位图以原始字节写入"""
+        if self._binary_redis_client is None and self.redis_client is not None:
+            # 延迟导入以避免循环依赖
+            from app.core.permission.hybrid_permission_cache import (
+                _binary_redis_client,
+            )
+
+            self._binary_redis_client = _binary_redis_client(self.redis_client)
+        return self._binary_redis_client
+
     def create_lock(self, lock_key: str, **kwargs) -> "OptimizedDistributedLock":
         """【新增】一个创建锁的工厂方法"""
         # 从配置获取锁参数
@@ -735,8 +771,8 @@ def advanced_get_permissions_from_cache(cache_key: str) -> Optional[Set[str]]:
 
     优化策略：
     1. 优先从L1本地缓存获取
-    2. 使用优化的分布式锁
-    3. 双重检查锁定模式
+    2. 进程内请求合并：同一缓存键同时只有一个请求访问L2
+    3. 双重检查：合并后的加载者再次检查L1
     4. 从L2分布式缓存获取
     5. 智能预加载
     6. 性能监控
@@ -774,107 +810,49 @@ def advanced_get_permissions_from_cache(cache_key: str) -> Optional[Set[str]]:
             logging.warning(f"预加载缓存写回失败: {e}")
         duration = time.time() - start_time
         _cache_monitor.record(
-            "cache_get", duration, tags={"level": "l1", "success": "true"}
+            "cache_get",
+            duration,
+            RecordType.HISTOGRAM,
+            tags={"level": "l1", "success": "true"},
         )
         return perms
 
-    # 3. 使用优化的分布式锁进行双重检查锁定
-    try:
-        lock_key = f"cache_read:{cache_key}"
+    # 3. 同一缓存键的并发读取合并为一次L2访问（替代每次读取的分布式锁往返）
+    def load_from_l2():
+        # 再次检查L1缓存：上一个加载者可能刚刚回填
+        perms = hybrid_cache.l1_simple_cache.get(cache_key)
+        if perms is not None:
+            return perms, "l1"
 
-        # 检查优化器是否可用
-        if optimizer is not None:
-            # 【修正】通过工厂方法创建锁
-            with optimizer.create_lock(lock_key, timeout=1.0) as lock:
-                # 再次检查L1缓存（双重检查锁定模式）
-                try:
-                    perms = hybrid_cache.l1_simple_cache.get(cache_key)
-                    if perms is not None:
-                        duration = time.time() - start_time
-                        _cache_monitor.record(
-                            "cache_get",
-                            duration,
-                            tags={"level": "l1", "success": "true"},
-                        )
-                        return perms
-                except Exception as e:
-                    logging.warning(f"L1缓存双重检查失败: {e}")
+        data = hybrid_cache.distributed_cache_get(cache_key)
+        if not data:
+            return None, "l2"
 
-                # 从L2分布式缓存获取（现在在hybrid_permission_cache中已经包含双重检查锁定）
-                try:
-                    data = hybrid_cache.distributed_cache_get(cache_key)
-
-                    if data:
-                        # 写回L1缓存
-                        try:
-                            hybrid_cache.l1_simple_cache.set(cache_key, data)
-                        except Exception as e:
-                            logging.warning(f"L2到L1缓存写回失败: {e}")
-
-                        duration = time.time() - start_time
-                        _cache_monitor.record(
-                            "cache_get",
-                            duration,
-                            tags={"level": "l2", "success": "true"},
-                        )
-                        return data
-                    else:
-                        duration = time.time() - start_time
-                        _cache_monitor.record(
-                            "cache_get",
-                            duration,
-                            tags={"level": "l2", "success": "false"},
-                        )
-                        return None
-                except Exception as e:
-                    logging.error(f"L2分布式缓存获取失败: {e}")
-                    duration = time.time() - start_time
-                    _cache_monitor.record(
-                        "cache_get", duration, tags={"level": "l2", "success": "false"}
-                    )
-                    return None
-        else:
-            # 如果优化器不可用，直接进行缓存操作
-            logging.warning("高级优化器不可用，使用基础缓存操作")
-            try:
-                perms = hybrid_cache.l1_simple_cache.get(cache_key)
-                if perms is not None:
-                    duration = time.time() - start_time
-                    _cache_monitor.record(
-                        "cache_get", duration, tags={"level": "l1", "success": "true"}
-                    )
-                    return perms
-
-                data = hybrid_cache.distributed_cache_get(cache_key)
-                if data:
-                    try:
-                        hybrid_cache.l1_simple_cache.set(cache_key, data)
-                    except Exception as e:
-                        logging.warning(f"L2到L1缓存写回失败: {e}")
-
-                    duration = time.time() - start_time
-                    _cache_monitor.record(
-                        "cache_get", duration, tags={"level": "l2", "success": "true"}
-                    )
-                    return data
-                else:
-                    duration = time.time() - start_time
-                    _cache_monitor.record(
-                        "cache_get", duration, tags={"level": "l2", "success": "false"}
-                    )
-                    return None
-            except Exception as e:
-                logging.error(f"基础缓存操作失败: {e}")
-                duration = time.time() - start_time
-                _cache_monitor.record(
-                    "cache_get", duration, tags={"level": "l2", "success": "false"}
-                )
-                return None
+        # L2中为序列化后的位图字节，解码后再写回L1
+        perms = hybrid_cache.distributed_cache._deserialize_permissions(data)
+        try:
+            hybrid_cache.l1_simple_cache.set(cache_key, perms)
+        except Exception as e:
+            logging.warning(f"L2到L1缓存写回失败: {e}")
+        return perms, "l2"
 
+    try:
+        perms, level = _read_flight.do(cache_key, load_from_l2)
+        duration = time.time() - start_time
+        _cache_monitor.record(
+            "cache_get",
+            duration,
+            RecordType.HISTOGRAM,
+            tags={"level": level, "success": "true" if perms is not None else "false"},
+        )
+        return perms
     except Exception as e:
         duration = time.time() - start_time
         _cache_monitor.record(
-            "cache_get", duration, tags={"level": "l2", "success": "false"}
+            "cache_get",
+            duration,
+            RecordType.HISTOGRAM,
+            tags={"level": "l2", "success": "false"},
         )
         logging.error(f"高级分布式缓存获取失败: {e}")
         return None
@@ -910,25 +888,44 @@ def advanced_set_permissions_to_cache(
         except Exception as e:
             logging.warning(f"L1缓存设置失败: {e}")
 
-        # 2. 设置L2分布式缓存
+        # 2. 设置L2分布式缓存（与L2读取路径相同的位图格式）
         try:
-            hybrid_cache.distributed_cache_set(cache_key, permissions, ttl)
+            data = hybrid_cache.distributed_cache._serialize_permissions(permissions)
+            hybrid_cache.distributed_cache_set(cache_key, data, ttl)
         except Exception as e:
             logging.error(f"L2分布式缓存设置失败: {e}")
 
-        # 3. 更新预加载缓存
+        # 3. 记录到用户索引（与权限键同槽位），供按用户失效
+        decoded = decode_perm_key(cache_key)
+        if decoded is not None and optimizer.redis_client is not None:
+            try:
+                index_key = user_index_key(decoded.user_id)
+                pipe = optimizer.redis_client.pipeline(transaction=False)
+                pipe.sadd(index_key, cache_key)
+                pipe.expire(index_key, ttl)
+                pipe.execute()
+            except Exception as e:
+                logging.warning(f"更新用户索引失败: {e}")
+
+        # 4. 更新预加载缓存
         if hasattr(optimizer, "preload_cache"):
             optimizer.preload_cache[cache_key] = permissions
 
         duration = time.time() - start_time
         _cache_monitor.record(
-            "cache_set", duration, tags={"level": "hybrid", "success": "true"}
+            "cache_set",
+            duration,
+            RecordType.HISTOGRAM,
+            tags={"level": "hybrid", "success": "true"},
         )
 
     except Exception as e:
         duration = time.time() - start_time
         _cache_monitor.record(
-            "cache_set", duration, tags={"level": "hybrid", "success": "false"}
+            "cache_set",
+            duration,
+            RecordType.HISTOGRAM,
+            tags={"level": "hybrid", "success": "false"},
         )
         logging.error(f"高级缓存设置失败: {e}")
 
@@ -984,47 +981,52 @@ def advanced_batch_set_permissions(cache_data: Dict[str, Set[str]], ttl: int = N
     高级批量权限设置函数
 
     优化策略：
-    1. 智能批量分组
+    1. 按用户哈希标签分组，同一用户的键和用户索引在同一槽位，一组一个管道
     2. 并发处理
-    3. 异步操作
-    4. 性能监控
-    """
-    # 【修正】从优化器获取配置
-    optimizer = get_advanced_optimizer()
-    ttl = ttl or optimizer.config.get("distributed_cache_ttl", 3600)
-    start_time = time.time()
+    3. 性能监控
 
-    # 1. 批量更新本地缓存
-    # 【依赖注入】从优化器获取客户端
+    权限按L2格式序列化（位图标记字节 + 位图），通过二进制客户端写入，
+    与 DistributedCacheManager 的读取路径一致；cache_data 的值可以是集合或列表。
+    """
+    # 【依赖注入】从优化器获取客户端和配置
     optimizer = get_advanced_optimizer()
-    if optimizer is not None:
-        redis_client = optimizer.redis_client
-        for key, permissions in cache_data.items():
-            redis_client.set(key, permissions)  # 直接从注入的客户端设置
-    else:
+    if optimizer is None:
         logging.warning("高级优化器不可用，跳过批量缓存设置")
         return
+    redis_client = optimizer.binary_redis_client
+    if redis_client is None:
+        logging.warning("Redis客户端不可用，跳过批量缓存设置")
+        return
+    ttl = ttl or optimizer.config.get("distributed_cache_ttl", 3600)
+    batch_size = optimizer.config.get("batch_size", 100)
+    start_time = time.time()
 
-    # 2. 异步批量更新分布式缓存
     try:
+        # 延迟导入以避免循环依赖
+        from app.core.permission.hybrid_permission_cache import get_hybrid_cache
 
-        # 【修正】从优化器获取配置
-        optimizer = get_advanced_optimizer()
-        batch_size = optimizer.config.get("batch_size", 100)
-        cache_items = list(cache_data.items())
+        serialize = get_hybrid_cache().distributed_cache._serialize_permissions
+        payloads = {key: serialize(set(value)) for key, value in cache_data.items()}
+        groups = list(group_keys_by_user(payloads).items())
 
-        # 并发批量设置
         def batch_set_worker(batch, ttl):
-            for key, permissions in batch:
+            for user_id, keys in batch:
                 try:
-                    # 【依赖注入】从优化器获取客户端
-                    redis_client.set(key, permissions, ex=ttl)  # 直接从注入的客户端设置
+                    pipe = redis_client.pipeline(transaction=False)
+                    for key in keys:
+                        pipe.set(key, payloads[key], ex=ttl)
+                    if user_id is not None:
+                        index_key = user_index_key(user_id)
+                        pipe.sadd(index_key, *keys)
+                        pipe.expire(index_key, ttl)
+                    pipe.execute()
                 except Exception as e:
-                    print(f"批量设置键 {key} 失败: {e}")
+                    logger.warning(f"批量设置用户 {user_id} 的权限缓存失败: {e}")
 
+        # 并发批量设置，每个线程处理若干用户分组
         threads = []
-        for i in range(0, len(cache_items), batch_size):
-            batch = cache_items[i : i + batch_size]
+        for i in range(0, len(groups), batch_size):
+            batch = groups[i : i + batch_size]
             thread = threading.Thread(target=batch_set_worker, args=(batch, ttl))
             threads.append(thread)
             thread.start()
@@ -1034,10 +1036,10 @@ def advanced_batch_set_permissions(cache_data: Dict[str, Set[str]], ttl: int = N
             thread.join()
 
     except Exception as e:
-        print(f"高级批量分布式缓存设置失败: {e}")
+        logger.error(f"高级批量分布式缓存设置失败: {e}")
 
     duration = time.time() - start_time
-    print(
+    logger.debug(
         f"高级批量设置完成，耗时: {duration*1000:.2f}ms，设置: {len(cache_data)} 个键"
     )
 
@@ -1047,50 +1049,43 @@ def advanced_invalidate_user_permissions(user_id: int):
     高级用户权限失效函数
 
     优化策略：
-    1. 智能延迟失效
-    2. 批量失效操作
+    1. 通过用户索引定位键，不使用SCAN
+    2. 权限键与用户索引共享哈希标签，一次事务删除，集群模式下同样适用
     3. 减少锁竞争
     4. 性能监控
     """
     try:
-        # 生成需要失效的缓存键模式
-        patterns = [
-            f"perm:{user_id}:global:*",
-            f"perm:{user_id}:server:*",
-            f"perm:{user_id}:channel:*",
-        ]
-
         # 使用优化的分布式锁
         optimizer = get_advanced_optimizer()
         if optimizer is not None:
             lock_key = f"invalidate_user:{user_id}"
             with optimizer.create_lock(lock_key, timeout=2.0):
-                # 清除本地缓存
                 # 【依赖注入】从优化器获取客户端
                 redis_client = optimizer.redis_client
-                keys_to_remove = []
-                for key in list(
-                    redis_client.scan_iter(f"perm:{user_id}:*")
-                ):  # 使用scan_iter遍历所有匹配的键
-                    if any(
-                        pattern.replace("*", "") in key.decode() for pattern in patterns
-                    ):
-                        keys_to_remove.append(key)
-
-                for key in keys_to_remove:
-                    redis_client.delete(key)  # 直接从注入的客户端删除
-
-                # 异步清除分布式缓存
-                for pattern in patterns:
-                    # 这里可以实现模式匹配删除
-                    # 暂时使用简单的键删除
-                    pass
+                index_key = user_index_key(user_id)
+                keys_to_remove = [
+                    key
+                    for key in redis_client.smembers(index_key)
+                    if _is_user_key(key, user_id)
+                ]
+
+                pipe = redis_client.pipeline(transaction=True)
+                if keys_to_remove:
+                    pipe.delete(*keys_to_remove)
+                pipe.delete(index_key)
+                pipe.execute()
         else:
             # 如果优化器不可用，跳过分布式锁操作
             logging.warning("高级优化器不可用，跳过用户权限失效操作")
 
     except Exception as e:
-        print(f"高级用户权限失效失败: {e}")
+        logger.error(f"高级用户权限失效失败: {e}")
+
+
+def _is_user_key(cache_key, user_id: int) -> bool:
+    """索引中的键是否确实属于该用户（保证与索引在同一槽位）"""
+    decoded = decode_perm_key(cache_key)
+    return decoded is not None and decoded.user_id == int(user_id)
 
 
 def get_advanced_performance_stats() -> Dict[str, Any]:
@@ -1129,6 +1124,7 @@ def get_advanced_performance_stats() -> Dict[str, Any]:
             "distributed_cache": distributed_cache_stats,
             "optimization_config": optimizer.config,
             "advanced_stats": dict(optimizer._stats),
+            "read_coalescing": _read_flight.get_stats(),
         }
     else:
         advanced_stats = {
@@ -1136,6 +1132,7 @@ def get_advanced_performance_stats() -> Dict[str, Any]:
             "distributed_cache": distributed_cache_stats,
             "optimization_config": {},
             "advanced_stats": {},
+            "read_coalescing": _read_flight.get_stats(),
         }
 
     return advanced_stats
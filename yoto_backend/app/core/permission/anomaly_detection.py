@@ -0,0 +1,429 @@
+"""
+流式异常检测模块
+
+按序列（指标名 + 标签组合，如 cache_get{level=l1}）检测延迟和命中率的突变：
+- 每个序列是 NumPy 环形缓冲区（序列 × 窗口）中的一行，一批观测值的
+  滚动中位数 / MAD 在一次向量运算中完成，没有逐样本的Python开销
+- 监控器每个刷新周期传入预聚合结果，按时间桶合并后评估：
+  直方图取桶内p99，其他指标取代表值
+- 稳健z分数 = (观测值 - 滚动中位数) / (1.4826 × MAD)，MAD为0时改用平均绝对偏差
+- 季节基线按时段（默认一天24个时段）保存各时段均值和离散度，时段结束时折叠一次；
+  基线就绪后观测值需同时偏离近期窗口和同一时段的历史水平才判为异常，
+  避免每天固定的流量爬坡被误报
+"""
+
+import logging
+import math
+import threading
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from enum import Enum
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .monitor_backends import MetricAggregate
+
+logger = logging.getLogger(__name__)
+
+# 序列键：(指标名称, 标签组合字符串)
+StreamKey = Tuple[str, str]
+
+# MAD / 平均绝对偏差换算为正态分布标准差的系数
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+_EPSILON = 1e-12
+
+
+class Direction(Enum):
+    """需要告警的偏离方向"""
+
+    UP = "up"  # 升高为异常（如延迟）
+    DOWN = "down"  # 降低为异常（如命中率）
+    BOTH = "both"
+
+
+_DIRECTION_SIGNS = {Direction.UP: 1, Direction.DOWN: -1, Direction.BOTH: 0}
+
+
+@dataclass
+class Anomaly:
+    """结构化的异常信息"""
+
+    metric: str
+    series: str  # 标签组合，如 level=l1,success=true
+    value: float
+    baseline: float  # 滚动中位数
+    scale: float  # 稳健标准差估计
+    score: float  # 带符号的稳健z分数
+    direction: str  # up / down
+    severity: str  # medium / high
+    timestamp: float
+    seasonal_baseline: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def robust_stats(
+    windows: np.ndarray, counts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    逐行计算中位数、MAD 和平均绝对偏差
+
+    参数:
+        windows: 每行一个序列的窗口，未填充的位置为NaN
+        counts: 每行的有效值数量
+
+    返回:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: (中位数, MAD, 平均绝对偏差)，
+            没有有效值的行为NaN
+    """
+    rows = np.arange(len(counts))
+    # NaN 排在每行末尾，有效值在前 counts 个位置
+    lower = np.maximum(counts - 1, 0) // 2
+    upper = counts // 2
+    ordered = np.sort(windows, axis=1)
+    median = (ordered[rows, lower] + ordered[rows, upper]) / 2
+    deviations = np.abs(windows - median[:, None])
+    ordered = np.sort(deviations, axis=1)
+    mad = (ordered[rows, lower] + ordered[rows, upper]) / 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_ad = np.nansum(deviations, axis=1) / counts
+    empty = counts == 0
+    median[empty] = mad[empty] = mean_ad[empty] = np.nan
+    return median, mad, mean_ad
+
+
+class StreamingAnomalyDetector:
+    """
+    流式异常检测器
+
+    只处理通过 watch() 登记的指标；序列在第一次出现时分配一行，
+    总数超过 max_streams 后新序列不再检测。线程安全。
+    """
+
+    def __init__(
+        self,
+        window: int = 300,
+        min_samples: int = 30,
+        threshold: float = 5.0,
+        high_threshold: float = 8.0,
+        min_relative_change: float = 0.1,
+        bucket_seconds: float = 1.0,
+        quantile: float = 0.99,
+        season_period: float = 86400.0,
+        season_slots: int = 24,
+        season_alpha: float = 0.3,
+        season_min_periods: int = 2,
+        max_streams: int = 1024,
+        history_size: int = 1000,
+    ):
+        """
+        参数:
+            window: 每个序列保留的最近观测数（时间桶数）
+            min_samples: 开始检测前需要的观测数
+            threshold: 判为异常的稳健z分数
+            high_threshold: 判为高严重度的稳健z分数
+            min_relative_change: 相对中位数的最小变化比例，过滤低离散度序列上的微小波动
+            bucket_seconds: 时间桶长度（秒），0表示每次 observe 立即评估
+            quantile: 直方图在桶内取的分位数
+            season_period: 季节周期（秒）
+            season_slots: 每个周期的时段数，0表示不使用季节基线
+            season_alpha: 时段基线跨周期的平滑系数
+            season_min_periods: 时段基线参与判断前需要折叠的周期数
+            max_streams: 最多检测的序列数
+            history_size: 保留的最近异常数
+        """
+        self.window = max(3, window)
+        self.min_samples = max(3, min(min_samples, self.window))
+        self.threshold = threshold
+        self.high_threshold = max(high_threshold, threshold)
+        self.min_relative_change = min_relative_change
+        self.bucket_seconds = max(0.0, bucket_seconds)
+        self.quantile = quantile
+        self.season_slots = max(0, season_slots)
+        self.season_alpha = season_alpha
+        self.season_min_periods = max(1, season_min_periods)
+        self._slot_seconds = (
+            season_period / self.season_slots if self.season_slots else 0.0
+        )
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+
+        self._directions: Dict[str, Direction] = {}
+        self._rows: Dict[StreamKey, int] = {}
+        self._keys: List[StreamKey] = []
+        self._capacity = 0
+        self._allocate(min(64, max_streams))
+
+        # 当前时间桶内合并的预聚合结果
+        self._pending: Dict[StreamKey, MetricAggregate] = {}
+        self._bucket_start: Optional[float] = None
+        # 当前时段编号（从纪元开始计）
+        self._active_slot: Optional[int] = None
+
+        self.recent: deque = deque(maxlen=history_size)
+        self.stats = Counter()
+
+    def _allocate(self, capacity: int):
+        """扩容所有按序列分配的数组"""
+        old = self._capacity
+        slots = max(1, self.season_slots)
+
+        def grow(array: Optional[np.ndarray], shape, fill) -> np.ndarray:
+            new = np.full(shape, fill)
+            if array is not None:
+                new[:old] = array
+            return new
+
+        self._values = grow(
+            getattr(self, "_values", None), (capacity, self.window), np.nan
+        )
+        self._positions = grow(getattr(self, "_positions", None), capacity, 0)
+        self._counts = grow(getattr(self, "_counts", None), capacity, 0)
+        self._signs = grow(getattr(self, "_signs", None), capacity, 0)
+        # 季节基线：各时段的均值、标准差、已折叠周期数
+        self._season_level = grow(
+            getattr(self, "_season_level", None), (capacity, slots), 0.0
+        )
+        self._season_scale = grow(
+            getattr(self, "_season_scale", None), (capacity, slots), 0.0
+        )
+        self._season_periods = grow(
+            getattr(self, "_season_periods", None), (capacity, slots), 0
+        )
+        # 当前时段的累加器：个数、和、平方和
+        self._slot_count = grow(getattr(self, "_slot_count", None), capacity, 0)
+        self._slot_sum = grow(getattr(self, "_slot_sum", None), capacity, 0.0)
+        self._slot_sumsq = grow(getattr(self, "_slot_sumsq", None), capacity, 0.0)
+        self._capacity = capacity
+
+    def watch(self, metric: str, direction: Direction = Direction.UP):
+        """登记需要检测的指标"""
+        with self._lock:
+            self._directions[metric] = direction
+            sign = _DIRECTION_SIGNS[direction]
+            for (name, _), row in self._rows.items():
+                if name == metric:
+                    self._signs[row] = sign
+
+    def _row(self, key: StreamKey) -> Optional[int]:
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+        if len(self._keys) >= self.max_streams:
+            self.stats["dropped_streams"] += 1
+            if self.stats["dropped_streams"] == 1:
+                logger.warning(
+                    f"异常检测序列数超过上限 {self.max_streams}，新序列不再检测: {key}"
+                )
+            return None
+        if len(self._keys) >= self._capacity:
+            self._allocate(min(self._capacity * 2, self.max_streams))
+        row = self._rows[key] = len(self._keys)
+        self._keys.append(key)
+        direction = self._directions.get(key[0], Direction.BOTH)
+        self._signs[row] = _DIRECTION_SIGNS[direction]
+        return row
+
+    def observe(
+        self, aggregates: Iterable[MetricAggregate], timestamp: float
+    ) -> List[Anomaly]:
+        """
+        传入一个刷新周期的预聚合结果，时间桶结束时评估
+
+        参数:
+            aggregates: 监控器合并后的指标，未登记的指标被忽略（不会被修改）
+            timestamp: 当前时间
+
+        返回:
+            List[Anomaly]: 本次评估发现的异常，桶未结束时为空
+        """
+        with self._lock:
+            pending = self._pending
+            for aggregate in aggregates:
+                if aggregate.name not in self._directions or not aggregate.count:
+                    continue
+                key = (aggregate.name, aggregate.series)
+                merged = pending.get(key)
+                if merged is None:
+                    merged = pending[key] = MetricAggregate(
+                        aggregate.name, aggregate.kind, aggregate.tags
+                    )
+                merged.merge(aggregate)
+
+            if self._bucket_start is None:
+                self._bucket_start = timestamp
+            if timestamp - self._bucket_start < self.bucket_seconds or not pending:
+                return []
+            self._pending = {}
+            self._bucket_start = timestamp
+
+            keys = list(pending)
+            values = [self._bucket_value(pending[key]) for key in keys]
+            return self._update(keys, values, timestamp)
+
+    def _bucket_value(self, aggregate: MetricAggregate) -> float:
+        if aggregate.sketch is not None and aggregate.sketch.count:
+            return aggregate.sketch.quantile(self.quantile)
+        return aggregate.value
+
+    def update(
+        self, keys: Sequence[StreamKey], values: Sequence[float], timestamp: float
+    ) -> List[Anomaly]:
+        """
+        直接评估一批观测值（每个序列一个值，键不能重复）
+
+        参数:
+            keys: 序列键，指标需已登记
+            values: 观测值
+            timestamp: 观测时间
+
+        返回:
+            List[Anomaly]: 发现的异常
+        """
+        with self._lock:
+            return self._update(keys, values, timestamp)
+
+    def _update(
+        self, keys: Sequence[StreamKey], values: Sequence[float], timestamp: float
+    ) -> List[Anomaly]:
+        self._advance_season(timestamp)
+
+        rows, observed = [], []
+        for key, value in zip(keys, values):
+            if value is None or not math.isfinite(value):
+                continue
+            row = self._row(key)
+            if row is not None:
+                rows.append(row)
+                observed.append(value)
+        if not rows:
+            return []
+        rows = np.array(rows)
+        x = np.array(observed, dtype=float)
+        self.stats["batches"] += 1
+        self.stats["observations"] += len(rows)
+
+        # 用加入本次观测之前的窗口评估
+        counts = self._counts[rows]
+        median, mad, mean_ad = robust_stats(self._values[rows], counts)
+        scale = np.where(
+            mad > 0, MAD_SCALE * mad, np.maximum(MEAN_AD_SCALE * mean_ad, _EPSILON)
+        )
+        deviation = x - median
+        with np.errstate(invalid="ignore"):
+            score = deviation / scale
+
+            seasonal = None
+            if self.season_slots:
+                column = self._active_slot % self.season_slots
+                ready = self._season_periods[rows, column] >= self.season_min_periods
+                if ready.any():
+                    seasonal = np.where(ready, self._season_level[rows, column], np.nan)
+                    seasonal_scale = np.maximum(
+                        self._season_scale[rows, column], MAD_SCALE * mad
+                    )
+                    seasonal_score = (x - seasonal) / np.maximum(
+                        seasonal_scale, _EPSILON
+                    )
+                    # 同时偏离近期窗口和时段基线才计分，取两者中较小的
+                    agree = np.sign(seasonal_score) == np.sign(score)
+                    combined = np.where(
+                        np.abs(seasonal_score) < np.abs(score), seasonal_score, score
+                    )
+                    score = np.where(ready, np.where(agree, combined, 0.0), score)
+
+            signs = self._signs[rows]
+            flagged = (
+                (counts >= self.min_samples)
+                & (np.abs(score) >= self.threshold)
+                & (np.abs(deviation) >= self.min_relative_change * np.abs(median))
+                & ((signs == 0) | (np.sign(score) == signs))
+            )
+
+        # 写入环形缓冲区；异常值也进入窗口，持续的水平变化会逐渐成为新基线
+        positions = self._positions[rows]
+        self._values[rows, positions] = x
+        self._positions[rows] = (positions + 1) % self.window
+        self._counts[rows] = np.minimum(counts + 1, self.window)
+
+        # 时段累加器只接收正常值，避免异常污染季节基线
+        if self.season_slots:
+            normal = rows[~flagged]
+            normal_x = x[~flagged]
+            self._slot_count[normal] += 1
+            self._slot_sum[normal] += normal_x
+            self._slot_sumsq[normal] += normal_x * normal_x
+
+        anomalies = []
+        for i in np.flatnonzero(flagged).tolist():
+            metric, series = self._keys[rows[i]]
+            anomaly = Anomaly(
+                metric=metric,
+                series=series,
+                value=float(x[i]),
+                baseline=float(median[i]),
+                scale=float(scale[i]),
+                score=float(score[i]),
+                direction="up" if score[i] > 0 else "down",
+                severity="high" if abs(score[i]) >= self.high_threshold else "medium",
+                timestamp=timestamp,
+                seasonal_baseline=(
+                    float(seasonal[i])
+                    if seasonal is not None and not np.isnan(seasonal[i])
+                    else None
+                ),
+            )
+            anomalies.append(anomaly)
+            self.recent.append(anomaly)
+        self.stats["anomalies"] += len(anomalies)
+        return anomalies
+
+    def _advance_season(self, timestamp: float):
+        """进入新时段时，把上一时段的累加结果折叠进对应的季节基线"""
+        if not self.season_slots:
+            return
+        slot = int(timestamp // self._slot_seconds)
+        previous = self._active_slot
+        self._active_slot = slot
+        if previous is None or slot == previous:
+            return
+
+        size = len(self._keys)
+        counts = self._slot_count[:size]
+        rows = np.flatnonzero(counts > 0)
+        if len(rows):
+            n = counts[rows].astype(float)
+            mean = self._slot_sum[rows] / n
+            std = np.sqrt(np.maximum(self._slot_sumsq[rows] / n - mean * mean, 0.0))
+            column = previous % self.season_slots
+            periods = self._season_periods[rows, column]
+            alpha = np.where(periods > 0, self.season_alpha, 1.0)
+            level = self._season_level[rows, column]
+            self._season_level[rows, column] = level + alpha * (mean - level)
+            scale = self._season_scale[rows, column]
+            self._season_scale[rows, column] = scale + alpha * (std - scale)
+            self._season_periods[rows, column] = periods + 1
+        self._slot_count[:size] = 0
+        self._slot_sum[:size] = 0.0
+        self._slot_sumsq[:size] = 0.0
+
+    def get_recent(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """最近的异常"""
+        with self._lock:
+            recent = list(self.recent)[-limit:]
+        return [anomaly.to_dict() for anomaly in recent]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """检测器统计"""
+        return {
+            "metrics": {
+                name: direction.value for name, direction in self._directions.items()
+            },
+            "streams": len(self._keys),
+            "window": self.window,
+            "bucket_seconds": self.bucket_seconds,
+            **self.stats,
+        }
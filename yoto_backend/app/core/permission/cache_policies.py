@@ -0,0 +1,385 @@
+"""
+缓存淘汰/准入策略模块
+
+为 ComplexPermissionCache 的每个分段提供可替换的淘汰策略：
+- LRU：淘汰最久未访问的键
+- W-TinyLFU：小窗口LRU + 分段LRU主区，新键能否进入主区由
+  Count-Min Sketch 估计的访问频率决定，批量预热、列表扫描等一次性访问
+  不会把热点数据挤出缓存
+- ARC：在"最近访问"与"频繁访问"两个列表之间按幽灵命中自适应调整容量
+
+策略只维护键的顺序和元数据，条目本身仍由缓存分段保存；
+insert 返回需要从分段中删除的键。
+"""
+
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from enum import Enum
+from typing import Any, Dict, List, Union
+
+logger = logging.getLogger(__name__)
+
+_MASK64 = (1 << 64) - 1
+
+
+class EvictionPolicyType(Enum):
+    """淘汰策略类型"""
+
+    LRU = "lru"
+    W_TINYLFU = "w_tinylfu"
+    ARC = "arc"
+
+
+class EvictionPolicy(ABC):
+    """淘汰策略抽象基类（调用方负责加锁）"""
+
+    policy_type: EvictionPolicyType
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+
+    @abstractmethod
+    def on_hit(self, key: str):
+        """缓存命中"""
+        pass
+
+    def on_miss(self, key: str):
+        """缓存未命中，默认不处理"""
+        pass
+
+    def on_update(self, key: str):
+        """已有键被覆盖写入，默认按命中处理"""
+        self.on_hit(key)
+
+    @abstractmethod
+    def insert(self, key: str) -> List[str]:
+        """
+        插入新键
+
+        返回:
+            List[str]: 需要从缓存中淘汰的键（可能包含新键本身）
+        """
+        pass
+
+    @abstractmethod
+    def remove(self, key: str):
+        """键被显式删除或过期"""
+        pass
+
+    @abstractmethod
+    def clear(self):
+        """清空策略状态"""
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """策略内部状态"""
+        return {}
+
+
+class LRUPolicy(EvictionPolicy):
+    """最近最少使用"""
+
+    policy_type = EvictionPolicyType.LRU
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self._order: "OrderedDict[str, None]" = OrderedDict()
+
+    def on_hit(self, key: str):
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def insert(self, key: str) -> List[str]:
+        evicted = []
+        while len(self._order) >= self.capacity:
+            victim, _ = self._order.popitem(last=False)
+            evicted.append(victim)
+        self._order[key] = None
+        return evicted
+
+    def remove(self, key: str):
+        self._order.pop(key, None)
+
+    def clear(self):
+        self._order.clear()
+
+
+class CountMinSketch:
+    """
+    Count-Min Sketch 频率估计
+
+    4 行计数器，每个计数器上限 15；累计增加次数达到 sample_size 后
+    所有计数器减半，使频率估计随时间衰减。
+    键只哈希一次，4 行的下标分别取混合后 64 位哈希值的 4 个 16 位片段。
+    """
+
+    _MIX = 0x9E3779B97F4A7C15
+    _MAX_COUNT = 15
+    _MAX_WIDTH = 1 << 16
+
+    def __init__(self, capacity: int):
+        width = 16
+        while width < capacity * 2 and width < self._MAX_WIDTH:
+            width <<= 1
+        self.width = width
+        self._mask = width - 1
+        self._table = bytearray(width * 4)
+        self.sample_size = max(10 * capacity, 16)
+        self.additions = 0
+
+    def _indexes(self, key: str):
+        h = (hash(key) * self._MIX) & _MASK64
+        mask, width = self._mask, self.width
+        return (
+            h & mask,
+            width + ((h >> 16) & mask),
+            2 * width + ((h >> 32) & mask),
+            3 * width + ((h >> 48) & mask),
+        )
+
+    def increment(self, key: str):
+        table = self._table
+        a, b, c, d = self._indexes(key)
+        ca, cb, cc, cd = table[a], table[b], table[c], table[d]
+        limit = self._MAX_COUNT
+        if ca >= limit and cb >= limit and cc >= limit and cd >= limit:
+            return
+        if ca < limit:
+            table[a] = ca + 1
+        if cb < limit:
+            table[b] = cb + 1
+        if cc < limit:
+            table[c] = cc + 1
+        if cd < limit:
+            table[d] = cd + 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._reset()
+
+    def frequency(self, key: str) -> int:
+        table = self._table
+        a, b, c, d = self._indexes(key)
+        return min(table[a], table[b], table[c], table[d])
+
+    def _reset(self):
+        """老化：所有计数器减半"""
+        self._table = bytearray(count >> 1 for count in self._table)
+        self.additions //= 2
+
+    def clear(self):
+        self._table = bytearray(len(self._table))
+        self.additions = 0
+
+
+class WTinyLFUPolicy(EvictionPolicy):
+    """
+    Window TinyLFU
+
+    - 窗口区（约1%容量）：新键先进入窗口LRU
+    - 主区（分段LRU）：试用区 + 保护区（主区的80%），试用区命中后晋升保护区
+    - 准入：窗口淘汰出的候选键与试用区LRU端的键比较估计频率，
+      频率更高者留下
+    """
+
+    policy_type = EvictionPolicyType.W_TINYLFU
+
+    def __init__(self, capacity: int, window_ratio: float = 0.01):
+        super().__init__(capacity)
+        self.window_capacity = max(1, int(self.capacity * window_ratio))
+        self.main_capacity = self.capacity - self.window_capacity
+        self.protected_capacity = int(self.main_capacity * 0.8)
+
+        self.sketch = CountMinSketch(self.capacity)
+        self._window: "OrderedDict[str, None]" = OrderedDict()
+        self._probation: "OrderedDict[str, None]" = OrderedDict()
+        self._protected: "OrderedDict[str, None]" = OrderedDict()
+        self.admissions = 0
+        self.rejections = 0
+
+    def on_hit(self, key: str):
+        self.sketch.increment(key)
+        self._reorder(key)
+
+    def on_miss(self, key: str):
+        self.sketch.increment(key)
+
+    def on_update(self, key: str):
+        # 覆盖写入（如后台刷新）不计入访问频率
+        self._reorder(key)
+
+    def _reorder(self, key: str):
+        if key in self._window:
+            self._window.move_to_end(key)
+        elif key in self._probation:
+            # 试用区命中，晋升到保护区；保护区溢出时降级其LRU端
+            del self._probation[key]
+            self._protected[key] = None
+            if len(self._protected) > self.protected_capacity:
+                demoted, _ = self._protected.popitem(last=False)
+                self._probation[demoted] = None
+        elif key in self._protected:
+            self._protected.move_to_end(key)
+
+    def insert(self, key: str) -> List[str]:
+        self._window[key] = None
+        if len(self._window) <= self.window_capacity:
+            return []
+
+        candidate, _ = self._window.popitem(last=False)
+        if len(self._probation) + len(self._protected) < self.main_capacity:
+            self._probation[candidate] = None
+            return []
+
+        if self.main_capacity <= 0:
+            return [candidate]
+
+        victim_segment = self._probation if self._probation else self._protected
+        victim = next(iter(victim_segment))
+        if self.sketch.frequency(candidate) > self.sketch.frequency(victim):
+            del victim_segment[victim]
+            self._probation[candidate] = None
+            self.admissions += 1
+            return [victim]
+
+        self.rejections += 1
+        return [candidate]
+
+    def remove(self, key: str):
+        for segment in (self._window, self._probation, self._protected):
+            if key in segment:
+                del segment[key]
+                return
+
+    def clear(self):
+        self._window.clear()
+        self._probation.clear()
+        self._protected.clear()
+        self.sketch.clear()
+        self.admissions = 0
+        self.rejections = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "window": len(self._window),
+            "probation": len(self._probation),
+            "protected": len(self._protected),
+            "admissions": self.admissions,
+            "rejections": self.rejections,
+        }
+
+
+class ARCPolicy(EvictionPolicy):
+    """
+    自适应替换缓存（Adaptive Replacement Cache）
+
+    T1 保存只访问过一次的键，T2 保存访问过多次的键，B1/B2 为对应的幽灵列表
+    （只保存键）。在 B1 中再次出现说明 T1 过小，在 B2 中再次出现说明 T2 过小，
+    目标值 p 随之调整。
+    """
+
+    policy_type = EvictionPolicyType.ARC
+
+    def __init__(self, capacity: int):
+        super().__init__(capacity)
+        self.p = 0.0
+        self._t1: "OrderedDict[str, None]" = OrderedDict()
+        self._t2: "OrderedDict[str, None]" = OrderedDict()
+        self._b1: "OrderedDict[str, None]" = OrderedDict()
+        self._b2: "OrderedDict[str, None]" = OrderedDict()
+
+    def on_hit(self, key: str):
+        if key in self._t1:
+            del self._t1[key]
+            self._t2[key] = None
+        elif key in self._t2:
+            self._t2.move_to_end(key)
+
+    def insert(self, key: str) -> List[str]:
+        c = self.capacity
+        t1, t2, b1, b2 = self._t1, self._t2, self._b1, self._b2
+
+        if key in b1:
+            self.p = min(c, self.p + max(len(b2) / len(b1), 1))
+            evicted = self._replace(in_b2=False)
+            del b1[key]
+            t2[key] = None
+            return evicted
+
+        if key in b2:
+            self.p = max(0.0, self.p - max(len(b1) / len(b2), 1))
+            evicted = self._replace(in_b2=True)
+            del b2[key]
+            t2[key] = None
+            return evicted
+
+        evicted = []
+        l1 = len(t1) + len(b1)
+        if l1 >= c:
+            if len(t1) < c:
+                b1.popitem(last=False)
+                evicted = self._replace(in_b2=False)
+            else:
+                victim, _ = t1.popitem(last=False)
+                evicted = [victim]
+        elif l1 + len(t2) + len(b2) >= c:
+            if l1 + len(t2) + len(b2) >= 2 * c and b2:
+                b2.popitem(last=False)
+            evicted = self._replace(in_b2=False)
+        t1[key] = None
+        return evicted
+
+    def _replace(self, in_b2: bool) -> List[str]:
+        """缓存已满时按目标值 p 从 T1 或 T2 淘汰一个键到对应幽灵列表"""
+        t1, t2 = self._t1, self._t2
+        if len(t1) + len(t2) < self.capacity:
+            return []
+        if t1 and (len(t1) > self.p or (in_b2 and len(t1) == self.p) or not t2):
+            victim, _ = t1.popitem(last=False)
+            self._b1[victim] = None
+        else:
+            victim, _ = t2.popitem(last=False)
+            self._b2[victim] = None
+        return [victim]
+
+    def remove(self, key: str):
+        # 幽灵列表保留，失效后再次写入仍可调整目标值
+        if key in self._t1:
+            del self._t1[key]
+        else:
+            self._t2.pop(key, None)
+
+    def clear(self):
+        self.p = 0.0
+        self._t1.clear()
+        self._t2.clear()
+        self._b1.clear()
+        self._b2.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "p": self.p,
+            "t1": len(self._t1),
+            "t2": len(self._t2),
+            "b1": len(self._b1),
+            "b2": len(self._b2),
+        }
+
+
+class EvictionPolicyFactory:
+    """淘汰策略工厂"""
+
+    @staticmethod
+    def create_policy(
+        policy_type: Union[EvictionPolicyType, str], capacity: int
+    ) -> EvictionPolicy:
+        """创建淘汰策略"""
+        policy_type = EvictionPolicyType(policy_type)
+        if policy_type == EvictionPolicyType.LRU:
+            return LRUPolicy(capacity)
+        elif policy_type == EvictionPolicyType.W_TINYLFU:
+            return WTinyLFUPolicy(capacity)
+        elif policy_type == EvictionPolicyType.ARC:
+            return ARCPolicy(capacity)
+        else:
+            raise ValueError(f"不支持的淘汰策略: {policy_type}")
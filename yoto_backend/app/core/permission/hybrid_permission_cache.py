@@ -26,15 +26,18 @@
 
 import time
 import logging
+import math
 import pickle
-import hashlib
+import random
 import threading
 import json
 import gzip
 import warnings
-from typing import Dict, List, Optional, Set, Any, Tuple, Union, Callable
-from collections import OrderedDict, defaultdict, Counter
-from functools import lru_cache, wraps
+from typing import Dict, List, Optional, Set, Any, Tuple, Union, Callable, Iterable
+from collections import defaultdict, Counter, OrderedDict
+from collections.abc import Set as AbstractSet
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial, wraps
 import redis
 from dataclasses import dataclass, field
 from enum import Enum
@@ -42,10 +45,31 @@ from enum import Enum
 # 移除循环依赖，改为延迟导入
 from app.core.permission.advanced_optimization import (
     advanced_get_permissions_from_cache,
-    advanced_batch_get_permissions,
-    get_advanced_optimizer,
 )
-import asyncio
+from app.core.permission.permission_bitset import (
+    PermissionBits,
+    deserialize_bits,
+    is_serialized_bits,
+    serialize_bits,
+    to_permission_bits,
+)
+from app.core.permission.permission_resolver import get_permission_resolver
+from app.core.permission.cache_policies import (
+    EvictionPolicy,
+    EvictionPolicyFactory,
+    EvictionPolicyType,
+)
+from app.core.permission.permission_events import InvalidationBus
+from app.core.permission.permission_keys import (
+    encode_perm_key,
+    user_index_key,
+    user_scoped_key,
+)
+from app.core.permission.permission_generations import (
+    generation_refs,
+    get_generation_store,
+)
+from app.core.common.single_flight import SingleFlight
 from redis.cluster import RedisCluster
 
 logger = logging.getLogger(__name__)
@@ -115,13 +139,16 @@ def monitored_cache(level: str):
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            start_time = time.time()
+            # 未开启DEBUG日志时不计时，避免热路径上的额外开销
+            timed = logger.isEnabledFor(logging.DEBUG)
+            start_time = time.time() if timed else 0.0
             try:
                 result = func(*args, **kwargs)
-                response_time = time.time() - start_time
-                logger.debug(
-                    f"缓存操作 {level}: {func.__name__} 耗时 {response_time:.3f}s"
-                )
+                if timed:
+                    response_time = time.time() - start_time
+                    logger.debug(
+                        f"缓存操作 {level}: {func.__name__} 耗时 {response_time:.3f}s"
+                    )
                 return result
             except Exception as e:
                 logger.error(f"缓存操作失败 {level}: {func.__name__}, 错误: {e}")
@@ -157,313 +184,632 @@ class CacheStrategy:
     compression: bool = True
     monitoring: bool = True
     auto_tune: bool = True
+    # 过期后继续提供旧值的窗口（秒），期间由后台刷新，0表示过期即删除
+    stale_ttl: int = 0
+    # XFetch 提前刷新系数，越大越早刷新，0表示关闭
+    early_refresh_beta: float = 1.0
+    # 重算耗时的估计下限（秒），未测得实际耗时时使用
+    early_refresh_delta: float = 1.0
+    # L1淘汰策略：lru / w_tinylfu / arc
+    eviction_policy: str = "lru"
 
 
 # ==================== 复杂查询的自定义缓存 ====================
 
 
+class _CacheEntry:
+    """缓存条目：值、创建时间、过期时间、命中次数、重算耗时"""
+
+    __slots__ = ("value", "created_at", "expires_at", "hits", "compute_time")
+
+    def __init__(self, value, created_at: float, expires_at: float, compute_time):
+        self.value = value
+        self.created_at = created_at
+        self.expires_at = expires_at
+        self.hits = 0
+        self.compute_time = compute_time
+
+
+class _CacheStripe:
+    """锁分段：一把锁保护一组条目及其淘汰策略，命中/未命中计数也按分段累计"""
+
+    __slots__ = (
+        "lock",
+        "entries",
+        "policy",
+        "maxsize",
+        "hits",
+        "misses",
+        "stale_hits",
+        "early_refreshes",
+        "evictions",
+    )
+
+    def __init__(self, maxsize: int, policy: EvictionPolicy):
+        self.lock = threading.Lock()
+        self.entries: Dict[str, _CacheEntry] = {}
+        self.policy = policy
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.early_refreshes = 0
+        self.evictions = 0
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.early_refreshes = 0
+        self.evictions = 0
+
+
 class ComplexPermissionCache:
-    """复杂权限缓存 - 处理复杂的业务逻辑，支持分策略缓存"""
+    """
+    复杂权限缓存 - 处理复杂的业务逻辑，支持分策略缓存
+
+    存储结构：
+    - 每个策略按键哈希分成 stripes 个分段，每个分段一把锁、一个条目字典和
+      一个淘汰策略实例（LRU / W-TinyLFU / ARC，由 CacheStrategy 选择），
+      不同键的读写基本不会竞争同一把锁
+    - 每个条目是一个 __slots__ 记录（值、创建时间、过期时间、命中次数），
+      不再为每个键维护多个平行字典
+    - 批量操作先按分段分组，每个分段只加一次锁
+
+    过期处理：
+    - 调用方提供 refresher 时，过期但仍在 stale_ttl 窗口内的条目继续返回旧值，
+      同时提交到后台线程池刷新（stale-while-revalidate）
+    - 未过期的条目按 XFetch 算法以一定概率提前刷新，
+      使同一批写入的条目不会在同一个TTL边界集中失效
+    - 未提供 refresher 或超出 stale_ttl 窗口时，按原逻辑删除并返回未命中
+    """
 
-    def __init__(self, maxsize: int = 10000):
+    def __init__(
+        self, maxsize: int = 10000, refresh_workers: int = 4, stripes: int = 16
+    ):
         self.maxsize = maxsize
-        self.lock = threading.RLock()
+        # 分段数取2的幂，便于用位与计算分段下标
+        self.stripes = 1 << max(0, stripes - 1).bit_length()
+        self._stripe_mask = self.stripes - 1
+
+        # 后台刷新线程池（首次需要刷新时创建），以及正在刷新的键
+        self.refresh_workers = refresh_workers
+        self._refresh_executor = None
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self._refresh_stats = Counter()
 
         # 优化缓存策略配置 - 提高命中率
         self.strategies = {
             "user_permissions": CacheStrategy(
-                CacheLevel.COMPLEX, maxsize=8000, ttl=900
-            ),  # 增加容量和TTL
+                CacheLevel.COMPLEX,
+                maxsize=8000,
+                ttl=900,
+                stale_ttl=300,
+                eviction_policy="w_tinylfu",
+            ),  # 增加容量和TTL；预热和列表扫描不挤出热点
             "role_permissions": CacheStrategy(
-                CacheLevel.COMPLEX, maxsize=5000, ttl=1200
+                CacheLevel.COMPLEX, maxsize=5000, ttl=1200, stale_ttl=300
             ),  # 增加容量和TTL
             "inheritance_tree": CacheStrategy(
-                CacheLevel.COMPLEX, maxsize=3000, ttl=2400
+                CacheLevel.COMPLEX, maxsize=3000, ttl=2400, stale_ttl=600
             ),  # 增加容量和TTL
             "conditional_permissions": CacheStrategy(
-                CacheLevel.COMPLEX, maxsize=2000, ttl=600
-            ),  # 增加容量和TTL
+                CacheLevel.COMPLEX,
+                maxsize=2000,
+                ttl=600,
+                stale_ttl=120,
+                eviction_policy="w_tinylfu",
+            ),  # 增加容量和TTL；预热和列表扫描不挤出热点
         }
 
-        # 为每种策略创建独立的缓存实例
-        self.strategy_caches = {}
-        self.strategy_stats = {}
+        # 为每种策略创建独立的分段缓存，容量平均分配到各分段
+        self.strategy_caches: Dict[str, List[_CacheStripe]] = {}
+        for strategy_name in self.strategies:
+            self.strategy_caches[strategy_name] = self._create_stripes(strategy_name)
+
+    def _create_stripes(self, strategy_name: str) -> List[_CacheStripe]:
+        """按策略配置创建分段及各自的淘汰策略实例"""
+        strategy_config = self.strategies[strategy_name]
+        stripe_size = max(1, -(-strategy_config.maxsize // self.stripes))
+        return [
+            _CacheStripe(
+                stripe_size,
+                EvictionPolicyFactory.create_policy(
+                    strategy_config.eviction_policy, stripe_size
+                ),
+            )
+            for _ in range(self.stripes)
+        ]
 
-        for strategy_name, strategy_config in self.strategies.items():
-            self.strategy_caches[strategy_name] = {
-                "cache": OrderedDict(),
-                "access_patterns": defaultdict(int),
-                "creation_times": {},
-                "last_access_times": {},
-                "hit_count": 0,
-                "miss_count": 0,
-                "maxsize": strategy_config.maxsize,
-                "ttl": strategy_config.ttl,
-            }
-            self.strategy_stats[strategy_name] = {
-                "hits": 0,
-                "misses": 0,
-                "size": 0,
-                "maxsize": strategy_config.maxsize,
-            }
+    def set_eviction_policy(
+        self, strategy_name: str, policy: Union[EvictionPolicyType, str]
+    ):
+        """
+        切换指定策略的淘汰策略
 
-    def _get_strategy_cache(self, strategy_name: str = "user_permissions"):
-        """获取指定策略的缓存实例"""
-        if strategy_name not in self.strategy_caches:
-            # 如果策略不存在，使用默认策略
-            strategy_name = "user_permissions"
-        return self.strategy_caches[strategy_name]
+        切换后该策略的缓存和统计清空重建，便于在同一条回放流量上对比不同策略。
+        """
+        if strategy_name not in self.strategies:
+            raise ValueError(f"未知的缓存策略: {strategy_name}")
+        policy = EvictionPolicyType(policy).value
+        self.strategies[strategy_name].eviction_policy = policy
+        self.strategy_caches[strategy_name] = self._create_stripes(strategy_name)
+        self._refresh_stats.pop((strategy_name, "refreshes"), None)
+        self._refresh_stats.pop((strategy_name, "refresh_errors"), None)
+
+    def _resolve_strategy(self, strategy_name: str) -> str:
+        """未知策略使用默认策略"""
+        if strategy_name in self.strategy_caches:
+            return strategy_name
+        return "user_permissions"
+
+    def _get_strategy_cache(
+        self, strategy_name: str = "user_permissions"
+    ) -> List[_CacheStripe]:
+        """获取指定策略的全部分段"""
+        return self.strategy_caches[self._resolve_strategy(strategy_name)]
 
     def _get_strategy_config(self, strategy_name: str = "user_permissions"):
         """获取指定策略的配置"""
         return self.strategies.get(strategy_name, self.strategies["user_permissions"])
 
+    def _stripe_for(self, stripes: List[_CacheStripe], key: str) -> _CacheStripe:
+        """按键哈希选择分段"""
+        return stripes[hash(key) & self._stripe_mask]
+
+    def _group_by_stripe(self, stripes: List[_CacheStripe], keys) -> Dict[int, list]:
+        """按分段下标分组，批量操作每个分段只加一次锁"""
+        groups = defaultdict(list)
+        mask = self._stripe_mask
+        for item in keys:
+            key = item[0] if isinstance(item, tuple) else item
+            groups[hash(key) & mask].append(item)
+        return groups
+
     @monitored_cache("complex_get")
     def get(
-        self, key: str, strategy_name: str = "user_permissions"
+        self,
+        key: str,
+        strategy_name: str = "user_permissions",
+        refresher: Optional[Callable[[], Any]] = None,
     ) -> Optional[Set[str]]:
-        """获取缓存值 - 支持分策略缓存"""
-        strategy_cache = self._get_strategy_cache(strategy_name)
-
-        with self.lock:
-            if key in strategy_cache["cache"]:
-                # 检查TTL
-                strategy_config = self._get_strategy_config(strategy_name)
-                current_time = time.time()
-                creation_time = strategy_cache["creation_times"].get(key, 0)
-
-                if current_time - creation_time > strategy_config.ttl:
-                    # 缓存已过期，删除
-                    del strategy_cache["cache"][key]
-                    if key in strategy_cache["creation_times"]:
-                        del strategy_cache["creation_times"][key]
-                    if key in strategy_cache["last_access_times"]:
-                        del strategy_cache["last_access_times"][key]
-                    strategy_cache["miss_count"] += 1
-                    return None
+        """
+        获取缓存值 - 支持分策略缓存
+
+        参数:
+            key (str): 缓存键
+            strategy_name (str): 策略名称
+            refresher (Callable): 重新计算该键的函数；提供时过期条目在
+                stale_ttl 窗口内返回旧值并后台刷新，未过期条目可能被提前刷新
 
-                # 更新访问时间
-                strategy_cache["last_access_times"][key] = current_time
-                strategy_cache["cache"].move_to_end(key)
-                strategy_cache["hit_count"] += 1
-                strategy_cache["access_patterns"][key] += 1
+        返回:
+            Optional[Set[str]]: 缓存值，未命中返回None
+        """
+        strategy_name = self._resolve_strategy(strategy_name)
+        stripe = self._stripe_for(self.strategy_caches[strategy_name], key)
+        strategy_config = self.strategies[strategy_name]
 
-                # 更新统计
-                self.strategy_stats[strategy_name]["hits"] += 1
-                return strategy_cache["cache"][key]
+        with stripe.lock:
+            return self._lookup(
+                stripe, key, time.time(), strategy_name, strategy_config, refresher
+            )
 
-            strategy_cache["miss_count"] += 1
-            self.strategy_stats[strategy_name]["misses"] += 1
+    def _lookup(
+        self,
+        stripe: _CacheStripe,
+        key: str,
+        now: float,
+        strategy_name: str,
+        strategy_config: CacheStrategy,
+        refresher: Optional[Callable[[], Any]],
+    ):
+        """在分段内查找（调用方持有stripe.lock）"""
+        entry = stripe.entries.get(key)
+        if entry is None:
+            stripe.misses += 1
+            stripe.policy.on_miss(key)
             return None
 
-    @monitored_cache("complex_set")
-    def set(self, key: str, value: Set[str], strategy_name: str = "user_permissions"):
-        """设置缓存值 - 支持分策略缓存"""
-        strategy_cache = self._get_strategy_cache(strategy_name)
-        strategy_config = self._get_strategy_config(strategy_name)
-
-        with self.lock:
-            if key in strategy_cache["cache"]:
-                # 更新现有值
-                strategy_cache["cache"].move_to_end(key)
-                strategy_cache["last_access_times"][key] = time.time()
-            else:
-                # 检查容量限制
-                if len(strategy_cache["cache"]) >= strategy_cache["maxsize"]:
-                    self._evict_lru(strategy_name)
+        refresh = False
+        if now > entry.expires_at:
+            if refresher is None or now > entry.expires_at + strategy_config.stale_ttl:
+                # 缓存已过期，删除
+                del stripe.entries[key]
+                stripe.policy.remove(key)
+                stripe.policy.on_miss(key)
+                stripe.misses += 1
+                return None
+            # 过期但在宽限窗口内：返回旧值，后台刷新
+            stripe.stale_hits += 1
+            refresh = True
+        elif refresher is not None and self._should_refresh_early(
+            entry, strategy_config, now
+        ):
+            stripe.early_refreshes += 1
+            refresh = True
+
+        if refresh:
+            self._schedule_refresh(key, strategy_name, refresher)
+
+        stripe.policy.on_hit(key)
+        entry.hits += 1
+        stripe.hits += 1
+        return entry.value
+
+    @staticmethod
+    def _should_refresh_early(
+        entry: _CacheEntry, strategy_config: CacheStrategy, now: float
+    ) -> bool:
+        """
+        XFetch 概率提前过期判断
+
+        当 delta * beta * -ln(rand) >= 剩余存活时间 时提前刷新。delta 为该键
+        上次重算的耗时（不低于策略配置的下限），越接近过期、重算越慢，
+        提前刷新的概率越高。
+        """
+        beta = strategy_config.early_refresh_beta
+        if beta <= 0:
+            return False
+        delta = entry.compute_time or 0.0
+        if delta < strategy_config.early_refresh_delta:
+            delta = strategy_config.early_refresh_delta
+        # 1 - random() 取值 (0, 1]，避免 log(0)
+        return -delta * beta * math.log(1.0 - random.random()) >= (
+            entry.expires_at - now
+        )
 
-                strategy_cache["creation_times"][key] = time.time()
-                strategy_cache["last_access_times"][key] = time.time()
+    def _schedule_refresh(
+        self, key: str, strategy_name: str, refresher: Callable[[], Any]
+    ):
+        """提交后台刷新任务，同一键同时只刷新一次"""
+        refresh_id = (strategy_name, key)
+        with self._refresh_lock:
+            if refresh_id in self._refreshing:
+                return
+            if self._refresh_executor is None:
+                self._refresh_executor = ThreadPoolExecutor(
+                    max_workers=self.refresh_workers,
+                    thread_name_prefix="perm-cache-refresh",
+                )
+            self._refreshing.add(refresh_id)
 
-            strategy_cache["cache"][key] = value
+        # 在后台线程中恢复应用上下文，刷新函数可能需要访问数据库或Redis
+        app = None
+        try:
+            from flask import current_app
 
-            # 更新统计
-            self.strategy_stats[strategy_name]["size"] = len(strategy_cache["cache"])
+            app = current_app._get_current_object()
+        except RuntimeError:
+            pass
 
-    def _evict_lru(self, strategy_name: str = "user_permissions"):
-        """淘汰最近最少使用的项 - 分策略"""
-        strategy_cache = self._get_strategy_cache(strategy_name)
+        try:
+            self._refresh_executor.submit(
+                self._run_refresh, key, strategy_name, refresher, app
+            )
+        except RuntimeError as e:
+            # 线程池已关闭
+            with self._refresh_lock:
+                self._refreshing.discard(refresh_id)
+            logger.warning(f"提交缓存刷新任务失败: {key}, 错误: {e}")
+
+    def _run_refresh(
+        self, key: str, strategy_name: str, refresher: Callable[[], Any], app=None
+    ):
+        """后台执行刷新并写回缓存"""
+        try:
+            start_time = time.time()
+            if app is not None:
+                with app.app_context():
+                    value = refresher()
+            else:
+                value = refresher()
+            compute_time = time.time() - start_time
 
-        if not strategy_cache["cache"]:
-            return
+            if value is not None:
+                self.set(key, value, strategy_name, compute_time=compute_time)
+            self._refresh_stats[(strategy_name, "refreshes")] += 1
+        except Exception as e:
+            self._refresh_stats[(strategy_name, "refresh_errors")] += 1
+            logger.warning(f"后台刷新缓存失败: {key}, 错误: {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard((strategy_name, key))
 
-        # 找到最久未访问的项并移除
-        lru_key, _ = strategy_cache["cache"].popitem(last=False)
+    @monitored_cache("complex_set")
+    def set(
+        self,
+        key: str,
+        value: Set[str],
+        strategy_name: str = "user_permissions",
+        compute_time: float = None,
+    ):
+        """
+        设置缓存值 - 支持分策略缓存，权限集合以位图形式保存
 
-        # 清理相关的时间记录
-        if lru_key in strategy_cache["creation_times"]:
-            del strategy_cache["creation_times"][lru_key]
-        if lru_key in strategy_cache["last_access_times"]:
-            del strategy_cache["last_access_times"][lru_key]
+        参数:
+            key (str): 缓存键
+            value (Set[str]): 缓存值
+            strategy_name (str): 策略名称
+            compute_time (float): 计算该值的耗时（秒），用于提前刷新判断
+        """
+        strategy_name = self._resolve_strategy(strategy_name)
+        stripe = self._stripe_for(self.strategy_caches[strategy_name], key)
+        ttl = self.strategies[strategy_name].ttl
+        if isinstance(value, AbstractSet):
+            value = to_permission_bits(value)
+
+        with stripe.lock:
+            self._store(stripe, key, value, time.time(), ttl, compute_time)
+
+    @staticmethod
+    def _store(
+        stripe: _CacheStripe,
+        key: str,
+        value,
+        now: float,
+        ttl: float,
+        compute_time: Optional[float],
+    ):
+        """在分段内写入（调用方持有stripe.lock），新值重新计算TTL"""
+        entries = stripe.entries
+        entry = entries.get(key)
+        if entry is not None:
+            # 更新现有值
+            entry.value = value
+            entry.created_at = now
+            entry.expires_at = now + ttl
+            if compute_time is not None:
+                entry.compute_time = compute_time
+            stripe.policy.on_update(key)
+            return
 
-        # 更新统计
-        self.strategy_stats[strategy_name]["size"] = len(strategy_cache["cache"])
+        # 由淘汰策略决定淘汰哪些键（W-TinyLFU 可能拒绝新键本身）
+        entries[key] = _CacheEntry(value, now, now + ttl, compute_time)
+        for victim in stripe.policy.insert(key):
+            entries.pop(victim, None)
+            stripe.evictions += 1
 
     def batch_get(
         self, keys: List[str], strategy_name: str = "user_permissions"
     ) -> Dict[str, Optional[Set[str]]]:
-        """批量获取缓存值 - 支持分策略"""
-        with self.lock:
-            result = {}
-            for key in keys:
-                result[key] = self.get(key, strategy_name)
-            return result
+        """批量获取缓存值 - 支持分策略，每个分段只加一次锁"""
+        strategy_name = self._resolve_strategy(strategy_name)
+        stripes = self.strategy_caches[strategy_name]
+        strategy_config = self.strategies[strategy_name]
+        now = time.time()
+
+        result = {}
+        for index, stripe_keys in self._group_by_stripe(stripes, keys).items():
+            stripe = stripes[index]
+            with stripe.lock:
+                for key in stripe_keys:
+                    result[key] = self._lookup(
+                        stripe, key, now, strategy_name, strategy_config, None
+                    )
+        return result
 
     def batch_set(
         self,
         key_value_pairs: Dict[str, Set[str]],
         strategy_name: str = "user_permissions",
     ):
-        """批量设置缓存值 - 支持分策略"""
-        with self.lock:
-            for key, value in key_value_pairs.items():
-                self.set(key, value, strategy_name)
+        """批量设置缓存值 - 支持分策略，每个分段只加一次锁"""
+        strategy_name = self._resolve_strategy(strategy_name)
+        stripes = self.strategy_caches[strategy_name]
+        ttl = self.strategies[strategy_name].ttl
+        now = time.time()
+
+        items = [
+            (key, to_permission_bits(v) if isinstance(v, AbstractSet) else v)
+            for key, v in key_value_pairs.items()
+        ]
+        for index, stripe_items in self._group_by_stripe(stripes, items).items():
+            stripe = stripes[index]
+            with stripe.lock:
+                for key, value in stripe_items:
+                    self._store(stripe, key, value, now, ttl, None)
 
     def remove_pattern(
         self, pattern: str, strategy_name: str = "user_permissions"
     ) -> int:
         """按模式移除缓存项 - 支持分策略"""
-        strategy_cache = self._get_strategy_cache(strategy_name)
-
-        with self.lock:
-            keys_to_remove = []
-            for key in strategy_cache["cache"].keys():
-                if pattern in key:
-                    keys_to_remove.append(key)
-
-            for key in keys_to_remove:
-                del strategy_cache["cache"][key]
-                if key in strategy_cache["creation_times"]:
-                    del strategy_cache["creation_times"][key]
-                if key in strategy_cache["last_access_times"]:
-                    del strategy_cache["last_access_times"][key]
-
-            # 更新统计
-            self.strategy_stats[strategy_name]["size"] = len(strategy_cache["cache"])
-            return len(keys_to_remove)
+        removed = 0
+        for stripe in self._get_strategy_cache(strategy_name):
+            with stripe.lock:
+                keys_to_remove = [key for key in stripe.entries if pattern in key]
+                for key in keys_to_remove:
+                    del stripe.entries[key]
+                    stripe.policy.remove(key)
+                removed += len(keys_to_remove)
+        return removed
 
     def get_stats(self, strategy_name: str = None) -> Dict[str, Any]:
         """获取缓存统计 - 支持分策略"""
-        with self.lock:
-            if strategy_name:
-                # 获取指定策略的统计
-                strategy_cache = self._get_strategy_cache(strategy_name)
-                total_requests = (
-                    strategy_cache["hit_count"] + strategy_cache["miss_count"]
-                )
-                hit_rate = strategy_cache["hit_count"] / max(total_requests, 1)
+        if not strategy_name:
+            # 获取所有策略的统计
+            return {
+                strategy: self.get_stats(strategy) for strategy in self.strategies
+            }
 
-                return {
-                    "strategy": strategy_name,
-                    "size": len(strategy_cache["cache"]),
-                    "maxsize": strategy_cache["maxsize"],
-                    "hits": strategy_cache["hit_count"],
-                    "misses": strategy_cache["miss_count"],
-                    "hit_rate": hit_rate,
-                    "access_patterns": dict(strategy_cache["access_patterns"]),
-                    "avg_age": self._calculate_average_age(strategy_name),
-                }
-            else:
-                # 获取所有策略的统计
-                all_stats = {}
-                for strategy in self.strategies.keys():
-                    all_stats[strategy] = self.get_stats(strategy)
-                return all_stats
+        # 获取指定策略的统计
+        strategy_name = self._resolve_strategy(strategy_name)
+        totals = Counter()
+        policy_stats = Counter()
+        access_patterns = {}
+        now = time.time()
+        age_sum = 0.0
+        for stripe in self.strategy_caches[strategy_name]:
+            with stripe.lock:
+                totals["size"] += len(stripe.entries)
+                totals["maxsize"] += stripe.maxsize
+                totals["hits"] += stripe.hits
+                totals["misses"] += stripe.misses
+                totals["stale_hits"] += stripe.stale_hits
+                totals["early_refreshes"] += stripe.early_refreshes
+                totals["evictions"] += stripe.evictions
+                policy_stats.update(stripe.policy.get_stats())
+                for key, entry in stripe.entries.items():
+                    access_patterns[key] = entry.hits
+                    age_sum += now - entry.created_at
+
+        total_requests = totals["hits"] + totals["misses"]
+        return {
+            "strategy": strategy_name,
+            "eviction_policy": self.strategies[strategy_name].eviction_policy,
+            "policy_stats": dict(policy_stats),
+            "size": totals["size"],
+            "maxsize": totals["maxsize"],
+            "stripes": self.stripes,
+            "hits": totals["hits"],
+            "misses": totals["misses"],
+            "hit_rate": totals["hits"] / max(total_requests, 1),
+            "stale_hits": totals["stale_hits"],
+            "early_refreshes": totals["early_refreshes"],
+            "evictions": totals["evictions"],
+            "refreshes": self._refresh_stats[(strategy_name, "refreshes")],
+            "refresh_errors": self._refresh_stats[(strategy_name, "refresh_errors")],
+            "access_patterns": access_patterns,
+            "avg_age": age_sum / totals["size"] if totals["size"] else 0.0,
+        }
 
     def _calculate_average_age(self, strategy_name: str = "user_permissions") -> float:
         """计算平均缓存年龄 - 分策略"""
-        strategy_cache = self._get_strategy_cache(strategy_name)
-
-        if not strategy_cache["creation_times"]:
-            return 0.0
-
-        current_time = time.time()
-        ages = [
-            current_time - creation_time
-            for creation_time in strategy_cache["creation_times"].values()
-        ]
-        return sum(ages) / len(ages)
+        return self.get_stats(strategy_name)["avg_age"]
 
     def clear(self, strategy_name: str = None):
         """清空缓存 - 支持分策略"""
-        with self.lock:
-            if strategy_name:
-                # 清空指定策略的缓存
-                strategy_cache = self._get_strategy_cache(strategy_name)
-                strategy_cache["cache"].clear()
-                strategy_cache["access_patterns"].clear()
-                strategy_cache["creation_times"].clear()
-                strategy_cache["last_access_times"].clear()
-                strategy_cache["hit_count"] = 0
-                strategy_cache["miss_count"] = 0
-                self.strategy_stats[strategy_name]["size"] = 0
-            else:
-                # 清空所有策略的缓存
-                for strategy in self.strategies.keys():
-                    self.clear(strategy)
+        if not strategy_name:
+            # 清空所有策略的缓存
+            for strategy in self.strategies.keys():
+                self.clear(strategy)
+            return
+
+        # 清空指定策略的缓存
+        strategy_name = self._resolve_strategy(strategy_name)
+        for stripe in self.strategy_caches[strategy_name]:
+            with stripe.lock:
+                stripe.entries.clear()
+                stripe.policy.clear()
+                stripe.reset_counters()
+        self._refresh_stats.pop((strategy_name, "refreshes"), None)
+        self._refresh_stats.pop((strategy_name, "refresh_errors"), None)
 
     def remove(self, key: str, strategy_name: str = "user_permissions") -> bool:
         """移除指定键 - 线程安全，支持分策略"""
-        strategy_cache = self._get_strategy_cache(strategy_name)
-
-        with self.lock:
-            if key in strategy_cache["cache"]:
-                del strategy_cache["cache"][key]
-                if key in strategy_cache["creation_times"]:
-                    del strategy_cache["creation_times"][key]
-                if key in strategy_cache["last_access_times"]:
-                    del strategy_cache["last_access_times"][key]
-
-                # 更新统计
-                self.strategy_stats[strategy_name]["size"] = len(
-                    strategy_cache["cache"]
-                )
-                return True
-            return False
+        stripe = self._stripe_for(self._get_strategy_cache(strategy_name), key)
+        with stripe.lock:
+            if stripe.entries.pop(key, None) is None:
+                return False
+            stripe.policy.remove(key)
+            return True
 
     def get_strategy_info(self) -> Dict[str, Any]:
         """获取所有策略的详细信息"""
-        with self.lock:
-            info = {
-                "strategies": {},
-                "total_size": 0,
-                "total_hits": 0,
-                "total_misses": 0,
+        info = {
+            "strategies": {},
+            "total_size": 0,
+            "total_hits": 0,
+            "total_misses": 0,
+        }
+
+        for strategy_name, strategy_config in self.strategies.items():
+            size = hits = misses = 0
+            for stripe in self.strategy_caches[strategy_name]:
+                with stripe.lock:
+                    size += len(stripe.entries)
+                    hits += stripe.hits
+                    misses += stripe.misses
+
+            info["strategies"][strategy_name] = {
+                "eviction_policy": strategy_config.eviction_policy,
+                "maxsize": strategy_config.maxsize,
+                "ttl": strategy_config.ttl,
+                "stale_ttl": strategy_config.stale_ttl,
+                "size": size,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / max(hits + misses, 1),
+                "utilization": size / strategy_config.maxsize,
             }
 
-            for strategy_name in self.strategies.keys():
-                strategy_cache = self._get_strategy_cache(strategy_name)
-                strategy_config = self._get_strategy_config(strategy_name)
+            info["total_size"] += size
+            info["total_hits"] += hits
+            info["total_misses"] += misses
 
-                total_requests = (
-                    strategy_cache["hit_count"] + strategy_cache["miss_count"]
-                )
-                hit_rate = strategy_cache["hit_count"] / max(total_requests, 1)
-
-                info["strategies"][strategy_name] = {
-                    "maxsize": strategy_config.maxsize,
-                    "ttl": strategy_config.ttl,
-                    "size": len(strategy_cache["cache"]),
-                    "hits": strategy_cache["hit_count"],
-                    "misses": strategy_cache["miss_count"],
-                    "hit_rate": hit_rate,
-                    "utilization": len(strategy_cache["cache"])
-                    / strategy_config.maxsize,
-                }
+        total_requests = info["total_hits"] + info["total_misses"]
+        info["overall_hit_rate"] = info["total_hits"] / max(total_requests, 1)
 
-                info["total_size"] += len(strategy_cache["cache"])
-                info["total_hits"] += strategy_cache["hit_count"]
-                info["total_misses"] += strategy_cache["miss_count"]
+        return info
 
-            total_requests = info["total_hits"] + info["total_misses"]
-            info["overall_hit_rate"] = info["total_hits"] / max(total_requests, 1)
+    def get_policy_stats(self) -> Dict[str, Any]:
+        """
+        按淘汰策略汇总命中率
 
-            return info
+        同一实例中使用相同淘汰策略的缓存策略合并统计，
+        用于在回放流量上比较 LRU / W-TinyLFU / ARC。
+        """
+        by_policy = defaultdict(Counter)
+        for strategy_name, strategy_config in self.strategies.items():
+            totals = by_policy[strategy_config.eviction_policy]
+            totals["strategies"] += 1
+            for stripe in self.strategy_caches[strategy_name]:
+                with stripe.lock:
+                    totals["hits"] += stripe.hits
+                    totals["misses"] += stripe.misses
+                    totals["evictions"] += stripe.evictions
+                    totals["size"] += len(stripe.entries)
+
+        return {
+            policy: {
+                **totals,
+                "hit_rate": totals["hits"] / max(totals["hits"] + totals["misses"], 1),
+            }
+            for policy, totals in by_policy.items()
+        }
 
 
 # ==================== 分布式缓存管理器 ====================
 
 
+def _binary_redis_client(client):
+    """
+    获取与给定客户端连接同一Redis、但不解码响应的客户端
+
+    应用共享的客户端开启了 decode_responses，无法读取位图的原始字节。
+    """
+    if client is None:
+        return None
+    try:
+        if isinstance(client, RedisCluster):
+            if not client.get_encoder().decode_responses:
+                return client
+            from redis.cluster import ClusterNode
+
+            nodes = [ClusterNode(node.host, node.port) for node in client.get_nodes()]
+            return RedisCluster(
+                startup_nodes=nodes,
+                decode_responses=False,
+                skip_full_coverage_check=True,
+            )
+
+        pool = client.connection_pool
+        kwargs = dict(pool.connection_kwargs)
+        if not kwargs.get("decode_responses"):
+            return client
+        kwargs["decode_responses"] = False
+        return redis.Redis(
+            connection_pool=pool.__class__(
+                connection_class=pool.connection_class,
+                max_connections=pool.max_connections,
+                **kwargs,
+            )
+        )
+    except Exception as e:
+        logger.warning(f"创建二进制Redis客户端失败，使用共享客户端: {e}")
+        return client
+
+
 class DistributedCacheManager:
     """分布式缓存管理器 - 使用Redis集群"""
 
@@ -472,13 +818,15 @@ class DistributedCacheManager:
         self.stats = Counter()  # 使用Counter替代字典
 
     def _get_redis_client(self):
-        """获取Redis客户端"""
+        """获取Redis客户端（二进制安全，位图以原始字节存取）"""
         if self.redis_client is None:
             try:
                 from flask import current_app
 
                 if current_app:
-                    self.redis_client = current_app.extensions.get("redis_client")
+                    self.redis_client = _binary_redis_client(
+                        current_app.extensions.get("redis_client")
+                    )
                     if self.redis_client is None:
                         logger.warning("无法从应用扩展获取Redis客户端")
                         return None
@@ -645,13 +993,22 @@ class DistributedCacheManager:
         return 0
 
     def _serialize_permissions(self, permissions: Set[str]) -> bytes:
-        """序列化权限数据"""
+        """
+        序列化权限数据
+
+        可编码为位图时写入原始字节；包含未登记的权限名时退化为 gzip+JSON。
+        """
+        permissions = to_permission_bits(permissions)
+        if isinstance(permissions, PermissionBits):
+            return serialize_bits(permissions)
         data = json.dumps(list(permissions), ensure_ascii=False).encode("utf-8")
         return gzip.compress(data)
 
     def _deserialize_permissions(self, data: bytes) -> Set[str]:
-        """反序列化权限数据"""
+        """反序列化权限数据，兼容位图和旧的 gzip+JSON 格式"""
         try:
+            if is_serialized_bits(data):
+                return deserialize_bits(data)
             uncompressed = gzip.decompress(data)
             permissions_list = json.loads(uncompressed.decode("utf-8"))
             return set(permissions_list)
@@ -675,6 +1032,20 @@ class HybridPermissionCache:
         # 依赖注入分布式锁管理器
         self._distributed_lock_manager = distributed_lock_manager
 
+        # 缓存未命中时按缓存键合并并发加载（跨进程租约在init_app中按配置开启）
+        self.single_flight = SingleFlight(name="hybrid_permission_cache")
+
+        # 本进程L1中各用户的缓存键，用于处理其他进程广播的失效；
+        # 按用户最近写入排序，键总数超过L1容量时连同L1条目一起淘汰最久未写入的用户
+        self._local_user_keys: "OrderedDict[int, Set[str]]" = OrderedDict()
+        self._local_key_count = 0
+        self._local_key_limit = sum(
+            strategy.maxsize for strategy in self.complex_cache.strategies.values()
+        )
+        self._local_index_lock = threading.Lock()
+        self.invalidation_bus = None
+        self.app = None
+
         # 使用Counter替代字典，避免类型混用
         self.stats = Counter(
             {
@@ -706,12 +1077,35 @@ class HybridPermissionCache:
 
     def init_app(self, app):
         """延迟初始化，从 app.extensions 获取依赖"""
+        self.app = app
         self.redis_client = app.extensions.get("redis_client")
         if self.redis_client is None:
             logger.warning(
                 "HybridPermissionCache 未能获取到Redis客户端，分布式缓存将不可用"
             )
 
+        # 跨进程加载租约：拿不到租约的进程等待其他进程回填L2
+        if app.config.get("PERMISSION_SINGLE_FLIGHT_LEASE", False):
+            self.single_flight.redis_client = self.redis_client
+            self.single_flight.lease_ttl = app.config.get(
+                "PERMISSION_SINGLE_FLIGHT_LEASE_TTL", self.single_flight.lease_ttl
+            )
+
+        # 按配置覆盖各缓存策略的淘汰策略
+        for strategy_name, policy in app.config.get(
+            "PERMISSION_CACHE_EVICTION_POLICIES", {}
+        ).items():
+            try:
+                self.complex_cache.set_eviction_policy(strategy_name, policy)
+            except ValueError as e:
+                logger.warning(f"忽略无效的淘汰策略配置 {strategy_name}={policy}: {e}")
+
+        # 跨进程L1失效广播
+        if self.redis_client is not None and app.config.get(
+            "PERMISSION_INVALIDATION_BUS", True
+        ):
+            self._start_invalidation_bus(app)
+
         # 分布式锁管理器是可选的，如果没有则使用无锁模式
         if self._distributed_lock_manager is None:
             logger.warning("HybridPermissionCache 未配置分布式锁管理器，将使用无锁模式")
@@ -720,6 +1114,23 @@ class HybridPermissionCache:
         if "hybrid_cache" not in app.extensions:
             app.extensions["hybrid_cache"] = self
 
+    def _start_invalidation_bus(self, app):
+        """订阅失效广播，其他进程的失效在毫秒级同步到本进程L1"""
+        if self.invalidation_bus is not None:
+            return
+        try:
+            self.invalidation_bus = InvalidationBus(
+                self.redis_client,
+                apply_callback=self.apply_remote_invalidation,
+                on_gap=self.reset_local_caches,
+                flush_interval=app.config.get("PERMISSION_INVALIDATION_BUS_FLUSH_MS", 5)
+                / 1000.0,
+            )
+            self.invalidation_bus.start()
+        except Exception as e:
+            self.invalidation_bus = None
+            logger.warning(f"权限失效广播启动失败，L1仅在本进程内失效: {e}")
+
     def _init_stats_keys(self):
         """初始化所有策略的统计键"""
         for strategy in self.strategy_mapping.keys():
@@ -739,38 +1150,12 @@ class HybridPermissionCache:
         - 高频访问的权限
         - 支持精确失效的权限
         """
-        # 构建缓存键
-        cache_key = f"basic_perm:{{{user_id}}}:{permission}"
-
-        # 查询L1缓存
-        result = self.l1_simple_cache.get(cache_key)
-        if result is not None:
-            return result
-
-        # 基础权限集合
-        basic_permissions = {
-            "read_channel",
-            "read_message",
-            "view_member_list",
-            "send_message",
-            "edit_message",
-            "delete_message",
-            "create_channel",
-            "manage_channel",
-            "manage_server",
-        }
-
-        # 计算权限结果
-        result = permission in basic_permissions
-
-        # 缓存结果到L1缓存
-        self.l1_simple_cache.set(cache_key, result)
-        return result
+        return self._get_simple_permission(user_id, permission)
 
     def is_user_active(self, user_id: int) -> bool:
         """检查用户是否活跃 - 使用L1简单缓存"""
         # 构建缓存键
-        cache_key = f"user_active:{{{user_id}}}"
+        cache_key = user_scoped_key("user_active", user_id)
 
         # 查询L1缓存
         result = self.l1_simple_cache.get(cache_key)
@@ -787,7 +1172,7 @@ class HybridPermissionCache:
     def get_user_role_level(self, user_id: int) -> int:
         """获取用户角色等级 - 使用L1简单缓存"""
         # 构建缓存键
-        cache_key = f"user_role:{{{user_id}}}"
+        cache_key = user_scoped_key("user_role", user_id)
 
         # 查询L1缓存
         result = self.l1_simple_cache.get(cache_key)
@@ -806,7 +1191,9 @@ class HybridPermissionCache:
     ) -> bool:
         """检查权限继承 - 使用L1简单缓存"""
         # 构建缓存键
-        cache_key = f"inheritance:{{{user_id}}}:{permission}:{parent_permission}"
+        cache_key = user_scoped_key(
+            "inheritance", user_id, permission, parent_permission
+        )
 
         # 查询L1缓存
         result = self.l1_simple_cache.get(cache_key)
@@ -863,31 +1250,22 @@ class HybridPermissionCache:
     def _get_simple_permission(
         self, user_id: int, permission: str, scope: str = None, scope_id: int = None
     ) -> bool:
-        """获取简单权限 - 使用实例的simple_cache"""
+        """获取简单权限 - 由RBAC快照解析单个权限，结果缓存在实例的simple_cache"""
         try:
-            # 构建缓存键
-            cache_key = f"basic_perm:{{{user_id}}}:{permission}"
+            # 构建缓存键（用户失效时按 basic_perm:{user_id}: 前缀清理）
+            cache_key = user_scoped_key(
+                "basic_perm", user_id, permission, scope, scope_id
+            )
 
             # 查询实例的simple_cache
             result = self.l1_simple_cache.get(cache_key)
             if result is not None:
                 return result
 
-            # 基础权限集合
-            basic_permissions = {
-                "read_channel",
-                "read_message",
-                "view_member_list",
-                "send_message",
-                "edit_message",
-                "delete_message",
-                "create_channel",
-                "manage_channel",
-                "manage_server",
-            }
-
             # 计算权限结果
-            result = permission in basic_permissions
+            result = permission in self._query_complex_permissions(
+                user_id, scope, scope_id
+            )
 
             # 缓存结果到实例的simple_cache
             self.l1_simple_cache.set(cache_key, result)
@@ -902,10 +1280,16 @@ class HybridPermissionCache:
     ) -> Set[str]:
         """获取复杂权限 - 使用统一缓存键"""
         # 使用统一的缓存键 - 所有策略使用相同前缀
-        cache_key = f"perm:{_make_perm_cache_key(user_id, scope, scope_id)}"
+        cache_key = _make_perm_cache_key(user_id, scope, scope_id)
 
         # 1. 查询复杂缓存（L1）
-        result = self.complex_cache.get(cache_key, strategy_name="user_permissions")
+        result = self.complex_cache.get(
+            cache_key,
+            strategy_name="user_permissions",
+            refresher=partial(
+                self._refresh_permissions, cache_key, user_id, scope, scope_id
+            ),
+        )
         if result is not None:
             self.stats["cache_hits"] += 1
             return result
@@ -916,31 +1300,48 @@ class HybridPermissionCache:
             self.stats["cache_hits"] += 1
             # 回填到复杂缓存（L1）
             self.complex_cache.set(cache_key, result, strategy_name="user_permissions")
+            self._track_local_key(user_id, cache_key)
             return result
 
         self.stats["cache_misses"] += 1
 
-        # 3. 查询数据库
-        permissions = self._query_complex_permissions(user_id, scope, scope_id)
+        def load():
+            # 3. 查询数据库（同一缓存键的并发未命中只加载一次）
+            start_time = time.time()
+            permissions = self._query_complex_permissions(user_id, scope, scope_id)
 
-        # 4. 同时缓存到所有层级，并维护用户索引
-        self.complex_cache.set(cache_key, permissions, strategy_name="user_permissions")
-        self.distributed_cache.set(cache_key, permissions, ttl=600)
+            # 4. 同时缓存到所有层级，并维护用户索引
+            self.complex_cache.set(
+                cache_key,
+                permissions,
+                strategy_name="user_permissions",
+                compute_time=time.time() - start_time,
+            )
+            self.distributed_cache.set(cache_key, permissions, ttl=600)
 
-        # 添加到用户索引
-        self._add_to_user_index(user_id, cache_key)
+            # 记录到本进程的用户索引
+            self._track_local_key(user_id, cache_key)
+            return permissions
 
-        return permissions
+        return self.single_flight.do(
+            cache_key, load, recheck=lambda: self.distributed_cache.get(cache_key)
+        )
 
     def _get_distributed_permission(
         self, user_id: int, permission: str, scope: str = None, scope_id: int = None
     ) -> Set[str]:
         """获取分布式权限 - 使用统一缓存键"""
         # 使用统一的缓存键 - 所有策略使用相同前缀
-        cache_key = f"perm:{_make_perm_cache_key(user_id, scope, scope_id)}"
+        cache_key = _make_perm_cache_key(user_id, scope, scope_id)
 
         # 1. 查询复杂缓存（L1）
-        result = self.complex_cache.get(cache_key, strategy_name="role_permissions")
+        result = self.complex_cache.get(
+            cache_key,
+            strategy_name="role_permissions",
+            refresher=partial(
+                self._refresh_permissions, cache_key, user_id, scope, scope_id
+            ),
+        )
         if result is not None:
             self.stats["cache_hits"] += 1
             return result
@@ -951,46 +1352,53 @@ class HybridPermissionCache:
             self.stats["cache_hits"] += 1
             # 回填到复杂缓存（L1）
             self.complex_cache.set(cache_key, result, strategy_name="role_permissions")
+            self._track_local_key(user_id, cache_key)
             return result
 
         self.stats["cache_misses"] += 1
 
-        # 3. 模拟分布式权限查询
-        permissions = self._query_distributed_permissions(user_id, scope, scope_id)
+        def load():
+            # 3. 由权限快照解析（与后台刷新使用同一加载函数）
+            start_time = time.time()
+            permissions = self._query_complex_permissions(user_id, scope, scope_id)
 
-        # 4. 同时缓存到所有层级，并维护用户索引
-        self.complex_cache.set(cache_key, permissions, strategy_name="role_permissions")
-        self.distributed_cache.set(cache_key, permissions, ttl=600)
+            # 4. 同时缓存到所有层级，并维护用户索引
+            self.complex_cache.set(
+                cache_key,
+                permissions,
+                strategy_name="role_permissions",
+                compute_time=time.time() - start_time,
+            )
+            self.distributed_cache.set(cache_key, permissions, ttl=600)
 
-        # 添加到用户索引
-        self._add_to_user_index(user_id, cache_key)
+            # 记录到本进程的用户索引
+            self._track_local_key(user_id, cache_key)
+            return permissions
 
-        return permissions
+        return self.single_flight.do(
+            cache_key, load, recheck=lambda: self.distributed_cache.get(cache_key)
+        )
 
     def _get_hybrid_permission(
         self, user_id: int, permission: str, scope: str = None, scope_id: int = None
     ) -> Set[str]:
         """获取混合权限 - L1->L2->高级优化->DB统一查询路径"""
         # 使用统一的缓存键
-        cache_key = f"perm:{_make_perm_cache_key(user_id, scope, scope_id)}"
-
-        # 1. 先查简单权限 (lru_cache)
-        if self._is_simple_permission(permission):
-            simple_result = self._get_simple_permission(
-                user_id, permission, scope, scope_id
-            )
-            if simple_result:
-                return {permission}
+        cache_key = _make_perm_cache_key(user_id, scope, scope_id)
 
-        # 2. 查询复杂缓存（L1）
+        # 1. 查询复杂缓存（L1）
         result = self.complex_cache.get(
-            cache_key, strategy_name="conditional_permissions"
+            cache_key,
+            strategy_name="conditional_permissions",
+            refresher=partial(
+                self._refresh_permissions, cache_key, user_id, scope, scope_id
+            ),
         )
         if result is not None:
             self.stats["cache_hits"] += 1
             return result
 
-        # 3. 查询分布式缓存（L2）
+        # 2. 查询分布式缓存（L2）
         result = self.distributed_cache.get(cache_key)
         if result is not None:
             self.stats["cache_hits"] += 1
@@ -998,101 +1406,52 @@ class HybridPermissionCache:
             self.complex_cache.set(
                 cache_key, result, strategy_name="conditional_permissions"
             )
+            self._track_local_key(user_id, cache_key)
             return result
 
         self.stats["cache_misses"] += 1
 
-        # 4. 【核心修改】通过高级优化模块获取权限，而不是直接查询数据库
-        permissions = advanced_get_permissions_from_cache(cache_key)
+        def load():
+            # 3. 【核心修改】通过高级优化模块获取权限，而不是直接查询数据库
+            permissions = advanced_get_permissions_from_cache(cache_key)
 
-        # 5. 同时缓存到所有层级，并维护用户索引
-        if permissions is not None:
-            self.complex_cache.set(
-                cache_key, permissions, strategy_name="conditional_permissions"
-            )
-            self.distributed_cache.set(cache_key, permissions, ttl=600)
-            self._add_to_user_index(user_id, cache_key)
-
-        return permissions if permissions is not None else set()
-
-    def _is_simple_permission(self, permission: str) -> bool:
-        """判断是否为简单权限"""
-        simple_permissions = {
-            "read_channel",
-            "read_message",
-            "view_member_list",
-            "send_message",
-            "edit_message",
-            "delete_message",
-        }
-        return permission in simple_permissions
+            # 4. 仍未命中时由权限快照解析
+            if permissions is None:
+                permissions = self._query_complex_permissions(user_id, scope, scope_id)
 
-    def _query_complex_permissions(
-        self, user_id: int, scope: str = None, scope_id: int = None
-    ) -> Set[str]:
-        """查询复杂权限 - 智能缓存策略"""
-        # 模拟复杂权限查询逻辑，但增加缓存友好的设计
+            # 5. 同时缓存到所有层级，并维护用户索引
+            if permissions is not None:
+                self.complex_cache.set(
+                    cache_key, permissions, strategy_name="conditional_permissions"
+                )
+                self.distributed_cache.set(cache_key, permissions, ttl=600)
+                self._track_local_key(user_id, cache_key)
 
-        # 1. 基础权限（所有用户都有）
-        base_permissions = {"read_channel", "send_message"}
+            return permissions if permissions is not None else set()
 
-        # 2. 基于用户角色的权限（缓存友好）
-        user_role = user_id % 5  # 模拟用户角色
-        if user_role == 0:  # 管理员
-            base_permissions.update(
-                {"manage_server", "manage_channel", "create_channel", "admin"}
-            )
-        elif user_role == 1:  # 版主
-            base_permissions.update(
-                {"manage_channel", "edit_message", "delete_message"}
-            )
-        elif user_role == 2:  # 普通用户
-            base_permissions.update({"read_message", "view_member_list"})
-        elif user_role == 3:  # VIP用户
-            base_permissions.update({"premium_feature", "advanced_search"})
-        else:  # 新用户
-            base_permissions.update({"read_channel"})
-
-        # 3. 基于作用域的权限（缓存友好）
-        if scope == "server":
-            base_permissions.update({"manage_server", "create_channel"})
-        elif scope == "channel":
-            base_permissions.update({"edit_message", "delete_message"})
-
-        # 4. 基于作用域ID的权限（有限变化）
-        if scope_id and scope_id > 50:  # 高级服务器/频道
-            base_permissions.add("premium_feature")
-
-        return base_permissions
-
-    def _query_distributed_permissions(
-        self, user_id: int, scope: str = None, scope_id: int = None
-    ) -> Set[str]:
-        """查询分布式权限"""
-        # 模拟分布式权限查询
-        permissions = self._query_complex_permissions(user_id, scope, scope_id)
+        # 同一缓存键的并发未命中只由一个请求加载，其余请求共享结果
+        return self.single_flight.do(
+            cache_key, load, recheck=lambda: self.distributed_cache.get(cache_key)
+        )
 
-        # 添加分布式特定权限
-        if scope_id and scope_id > 1000:
-            permissions.add("premium_feature")
+    def _refresh_permissions(
+        self, cache_key: str, user_id: int, scope: str = None, scope_id: int = None
+    ) -> Set[str]:
+        """
+        后台刷新L1条目时重新解析权限，并同步刷新L2
 
+        由 ComplexPermissionCache 在过期宽限窗口内或提前刷新时调用，
+        返回值由L1自行写回。
+        """
+        permissions = self._query_complex_permissions(user_id, scope, scope_id)
+        self.distributed_cache.set(cache_key, permissions, ttl=600)
         return permissions
 
-    def _query_hybrid_permissions(
+    def _query_complex_permissions(
         self, user_id: int, scope: str = None, scope_id: int = None
     ) -> Set[str]:
-        """查询混合权限"""
-        # 合并所有权限查询逻辑
-        permissions = self._query_complex_permissions(user_id, scope, scope_id)
-        permissions.update(
-            self._query_distributed_permissions(user_id, scope, scope_id)
-        )
-
-        # 添加混合特定逻辑
-        if user_id > 100 and scope_id and scope_id < 500:
-            permissions.add("hybrid_feature")
-
-        return permissions
+        """查询复杂权限 - 基于编译后的RBAC快照，不访问数据库，返回权限位图"""
+        return get_permission_resolver().resolve(user_id, scope, scope_id)
 
     def _batch_query_from_db(
         self,
@@ -1101,39 +1460,13 @@ class HybridPermissionCache:
         scope: str = None,
         scope_id: int = None,
     ) -> Dict[int, Set[str]]:
-        """批量查询数据库 - 使用真正的批量数据库查询"""
+        """批量查询权限 - 所有用户使用同一份RBAC快照"""
         try:
-            # 导入真正的批量查询函数
-            from .permission_queries import batch_precompute_permissions
-
-            # 使用真正的批量数据库查询
-            results = batch_precompute_permissions(user_ids, scope, scope_id)
-
-            logger.debug(
-                f"批量数据库查询: {len(user_ids)} 个用户, 命中 {len(results)} 个结果"
-            )
-            return results
-
-        except ImportError:
-            # 如果导入失败，使用模拟数据作为后备
-            logger.warning("无法导入permission_queries模块，使用模拟数据")
-            results = {}
-            for user_id in user_ids:
-                base_permissions = {"read_channel", "send_message", "manage_channel"}
-
-                if scope == "server":
-                    base_permissions.update({"manage_server", "create_channel"})
-                elif scope == "channel":
-                    base_permissions.update({"edit_message", "delete_message"})
-
-                if user_id % 3 == 0:
-                    base_permissions.add("hybrid_feature")
-
-                results[user_id] = base_permissions
-
+            results = get_permission_resolver().resolve_many(user_ids, scope, scope_id)
+            logger.debug(f"批量权限解析: {len(user_ids)} 个用户")
             return results
         except Exception as e:
-            logger.error(f"批量数据库查询失败: {e}")
+            logger.error(f"批量权限解析失败: {e}")
             return {user_id: set() for user_id in user_ids}
 
     @monitored_cache("batch")
@@ -1146,11 +1479,8 @@ class HybridPermissionCache:
         scope_id: int = None,
     ) -> Dict[int, Union[bool, Set[str]]]:
         """批量获取权限 - 增强版，集成高级优化"""
-        # 1. 为所有 user_id 构建批量的缓存键
-        cache_keys = {}
-        for uid in user_ids:
-            cache_key = _make_perm_cache_key(uid, scope, scope_id)
-            cache_keys[uid] = f"perm:{cache_key}"
+        # 1. 为所有 user_id 构建批量的缓存键（代数一次批量读取）
+        cache_keys = _make_perm_cache_keys(user_ids, scope, scope_id)
 
         # 2. 批量从 L1 (complex_cache) 获取
         l1_cache_keys = list(cache_keys.values())
@@ -1168,38 +1498,20 @@ class HybridPermissionCache:
         all_cache_results = l1_results.copy()
         all_cache_results.update(l2_results)
 
-        # 4. 找出 L2 仍然未命中的，通过高级优化模块进行批量获取
+        # 4. 找出 L2 仍然未命中的，由权限快照批量解析（纯内存，无需排队等待）
         l2_missed_keys = [k for k, v in l2_results.items() if v is None]
         db_results_by_key = {}
         if l2_missed_keys:
-            optimizer = get_advanced_optimizer()
-            if optimizer and optimizer.loop:
-                # 从同步代码安全地调用异步函数
-                future = asyncio.run_coroutine_threadsafe(
-                    advanced_batch_get_permissions(l2_missed_keys), optimizer.loop
-                )
-                try:
-                    # 设置超时以避免无限期阻塞
-                    db_results_by_key = future.result(
-                        timeout=optimizer.config.get("batch_timeout", 1.0) + 0.5
-                    )
-                except Exception as e:
-                    logger.error(f"批量获取权限失败: {e}", exc_info=True)
-                    db_results_by_key = {key: set() for key in l2_missed_keys}
-            else:
-                # 如果优化器或其事件循环不可用，则退回到旧逻辑
-                l2_missed_uids = [
-                    uid for uid, key in cache_keys.items() if key in l2_missed_keys
-                ]
-                db_results_by_uid = self._batch_query_from_db(
-                    l2_missed_uids, permission, scope, scope_id
-                )
-                # 需要将结果的键从uid转换回cache_key
-                uid_to_key_map = {uid: key for uid, key in cache_keys.items()}
-                db_results_by_key = {
-                    uid_to_key_map[uid]: perms
-                    for uid, perms in db_results_by_uid.items()
-                }
+            l2_missed_uids = [
+                uid for uid, key in cache_keys.items() if key in l2_missed_keys
+            ]
+            db_results_by_uid = self._batch_query_from_db(
+                l2_missed_uids, permission, scope, scope_id
+            )
+            # 需要将结果的键从uid转换回cache_key
+            db_results_by_key = {
+                cache_keys[uid]: perms for uid, perms in db_results_by_uid.items()
+            }
 
         # 5. 合并所有结果，并批量回填 L1 和 L2
         final_results = {}
@@ -1224,131 +1536,85 @@ class HybridPermissionCache:
         if cache_updates_l2:
             self.distributed_cache.batch_set(cache_updates_l2)
 
-            # 维护用户索引
-            for uid, cache_key in cache_keys.items():
-                if uid in db_results_by_key:
-                    self._add_to_user_index(uid, cache_key)
+        # 维护本进程用户索引
+        for uid, cache_key in cache_keys.items():
+            if cache_key in cache_updates_l1:
+                self._track_local_key(uid, cache_key)
 
         return final_results
 
     @monitored_cache("invalidate")
     def invalidate_user_permissions(self, user_id: int):
-        """失效用户权限缓存 - 使用索引机制"""
-        # 失效简单权限缓存（使用实例的simple_cache）
-
-        # 失效基础权限缓存
-        pattern = f"basic_perm:{user_id}:*"
-        self.l1_simple_cache.remove_pattern(pattern)
-
-        # 失效用户活跃状态缓存
-        pattern = f"user_active:{user_id}"
-        self.l1_simple_cache.remove_pattern(pattern)
-
-        # 失效用户角色缓存
-        pattern = f"user_role:{user_id}"
-        self.l1_simple_cache.remove_pattern(pattern)
-
-        # 失效权限继承缓存
-        pattern = f"inheritance:{user_id}:*"
-        self.l1_simple_cache.remove_pattern(pattern)
+        """
+        失效用户权限缓存 - 递增用户代数
 
-        # 使用索引机制失效复杂权限缓存
-        cache_keys = self._get_user_cache_keys(user_id)
-        if cache_keys:
-            # 从复杂缓存中移除
-            for cache_key in cache_keys:
-                self.complex_cache.remove(cache_key)
+        缓存键中混入了用户代数，递增后旧键不再被访问，L2中的旧值随TTL自然过期，
+        不需要扫描或逐键删除。
+        """
+        # 先增量重建用户的角色分配，保证新键对应的是新数据
+        get_permission_resolver().refresh_users([user_id])
 
-            # 从分布式缓存中批量删除
-            if cache_keys:
-                self.distributed_cache.batch_delete(cache_keys)
+        # 一次INCR使该用户的所有权限缓存键失效
+        get_generation_store().bump("user", [user_id])
 
-        # 清空用户索引
-        self._clear_user_index(user_id)
+        # 释放本进程L1中的旧条目，并广播给其他进程
+        self._drop_local_user_entries(user_id)
+        if self.invalidation_bus is not None:
+            self.invalidation_bus.publish(user_ids=[user_id])
 
-        logger.info(f"失效用户 {user_id} 的权限缓存，共 {len(cache_keys)} 个缓存键")
+        logger.info(f"失效用户 {user_id} 的权限缓存")
 
     @monitored_cache("invalidate_precise")
     def invalidate_user_permissions_precise(self, user_id: int):
         """
-        精确失效用户权限缓存 - 使用索引机制
+        精确失效用户权限缓存 - 递增用户代数
 
-        使用精确的缓存键索引匹配，不再使用"缓存污染"策略
+        与 invalidate_user_permissions 相同，但不重新加载用户的角色分配，
+        适用于角色分配未变化、只需丢弃缓存结果的场景。
         """
-        # 失效简单权限缓存（使用实例的simple_cache，支持精确失效）
-
-        # 失效基础权限缓存
-        pattern = f"basic_perm:{user_id}:*"
-        self.l1_simple_cache.remove_pattern(pattern)
-
-        # 失效用户活跃状态缓存
-        pattern = f"user_active:{user_id}"
-        self.l1_simple_cache.remove_pattern(pattern)
-
-        # 失效用户角色缓存
-        pattern = f"user_role:{user_id}"
-        self.l1_simple_cache.remove_pattern(pattern)
+        get_generation_store().bump("user", [user_id])
 
-        # 失效权限继承缓存
-        pattern = f"inheritance:{user_id}:*"
-        self.l1_simple_cache.remove_pattern(pattern)
-
-        # 使用索引机制失效复杂权限缓存（支持精确失效）
-        cache_keys = self._get_user_cache_keys(user_id)
-        if cache_keys:
-            # 从复杂缓存中移除
-            for cache_key in cache_keys:
-                self.complex_cache.remove(cache_key)
-
-            # 从分布式缓存中批量删除
-            if cache_keys:
-                self.distributed_cache.batch_delete(cache_keys)
+        # 释放本进程L1中的旧条目，并广播给其他进程
+        self._drop_local_user_entries(user_id)
+        if self.invalidation_bus is not None:
+            self.invalidation_bus.publish(user_ids=[user_id])
 
-        # 清空用户索引
-        self._clear_user_index(user_id)
-
-        logger.info(f"精确失效用户 {user_id} 的权限缓存，共 {len(cache_keys)} 个缓存键")
+        logger.info(f"精确失效用户 {user_id} 的权限缓存")
 
     def invalidate_role_permissions(self, role_id: int):
         """
-        失效角色权限缓存 - 修复版本
+        失效角色权限缓存 - 递增角色代数
 
-        正确的逻辑：
-        1. 找到所有拥有该角色的用户
-        2. 对这些用户逐个执行权限失效操作
-        3. 确保用户权限缓存得到正确更新
+        用户的缓存键混入了其持有角色的代数。角色及其子角色（继承其权限）的代数
+        递增后，持有这些角色的用户缓存全部失效，Redis操作次数与用户数无关。
         """
-        try:
-            # 导入查询模块获取该角色下的所有用户
-            from .permission_queries import get_users_by_role
+        # 先增量重建角色及其子角色，保证新键对应的是新数据
+        resolver = get_permission_resolver()
+        resolver.refresh_roles([role_id])
+        affected = resolver.affected_roles([role_id])
+        get_generation_store().bump("role", sorted(affected))
 
-            # 获取该角色下的所有用户
-            user_ids = get_users_by_role(
-                role_id, None
-            )  # 传入None作为db_session，让函数内部处理
+        # 简单权限缓存不带代数，清理本进程中的基础权限结果
+        self.l1_simple_cache.remove_pattern("basic_perm:")
+        if self.invalidation_bus is not None:
+            self.invalidation_bus.publish(role_ids=[role_id])
 
-            if user_ids:
-                # 对每个用户执行权限失效操作
-                for user_id in user_ids:
-                    self.invalidate_user_permissions(user_id)
+        logger.info(f"已失效角色 {role_id} 的权限缓存，涉及 {len(affected)} 个角色")
 
-                logger.info(
-                    f"已失效角色 {role_id} 的权限缓存，涉及 {len(user_ids)} 个用户"
-                )
-            else:
-                logger.warning(f"角色 {role_id} 下没有找到用户")
+    def invalidate_scope_permissions(self, scope: str, scope_id: int):
+        """
+        失效作用域（服务器/频道）下所有用户的权限缓存 - 递增作用域代数
 
-        except ImportError as e:
-            logger.error(f"导入查询模块失败，无法获取角色用户列表: {e}")
-            # 如果无法获取用户列表，记录错误但不影响其他功能
-        except Exception as e:
-            logger.error(f"失效角色权限缓存失败: {e}")
+        其他进程在 PERMISSION_GENERATION_CACHE_TTL 内读取到新代数。
+        """
+        get_generation_store().bump(scope, [scope_id])
+        logger.info(f"已失效作用域 {scope}:{scope_id} 的权限缓存")
 
     def invalidate_role_permissions_legacy(self, role_id: int):
         """
         失效角色权限缓存 - 旧版本（已废弃）
 
-        注意：此方法无法正确失效用户权限缓存，因为用户权限存储在perm:{hash}键中
+        注意：此方法无法正确失效用户权限缓存，因为用户权限存储在带代数的perm键中
         建议使用invalidate_role_permissions方法替代
         """
         logger.warning(
@@ -1762,6 +2028,11 @@ class HybridPermissionCache:
             "redis": redis_stats,
             "l1_simple_cache": l1_simple_stats,  # 添加L1简单缓存统计
             "complex_cache_strategies": complex_stats_all,  # 添加分策略统计
+            "single_flight": self.single_flight.get_stats(),  # 未命中合并统计
+            "eviction_policies": self.complex_cache.get_policy_stats(),  # 按淘汰策略
+            "invalidation_bus": (
+                self.invalidation_bus.get_stats() if self.invalidation_bus else None
+            ),
         }
 
     @monitored_cache("refresh")
@@ -1786,14 +2057,14 @@ class HybridPermissionCache:
             )
 
             # 更新缓存，使用正确的缓存键
-            cache_key = f"perm:{_make_perm_cache_key(user_id, scope, scope_id)}"
+            cache_key = _make_perm_cache_key(user_id, scope, scope_id)
             self.complex_cache.set(
                 cache_key, latest_permissions, strategy_name="user_permissions"
             )
             self.distributed_cache.set(cache_key, latest_permissions, ttl=600)
 
-            # 添加到用户索引
-            self._add_to_user_index(user_id, cache_key)
+            # 记录到本进程的用户索引
+            self._track_local_key(user_id, cache_key)
 
             logger.info(f"已刷新用户 {user_id} 的权限缓存")
 
@@ -1828,12 +2099,12 @@ class HybridPermissionCache:
             cache_updates_l2 = {}
 
             for user_id, permissions in latest_permissions_map.items():
-                cache_key = f"perm:{_make_perm_cache_key(user_id, scope, scope_id)}"
+                cache_key = _make_perm_cache_key(user_id, scope, scope_id)
                 cache_updates_l1[cache_key] = permissions
                 cache_updates_l2[cache_key] = permissions
 
-                # 添加到用户索引
-                self._add_to_user_index(user_id, cache_key)
+                # 记录到本进程的用户索引
+                self._track_local_key(user_id, cache_key)
 
             # 批量更新缓存
             if cache_updates_l1:
@@ -1875,14 +2146,115 @@ class HybridPermissionCache:
         except Exception as e:
             logger.error(f"刷新角色权限缓存失败: {e}")
 
+    # ==================== 跨进程失效 ====================
+
+    def _track_local_key(self, user_id: int, cache_key: str):
+        """
+        记录本进程L1中属于该用户的缓存键
+
+        索引中的键总数不超过L1容量；超出时淘汰最久未写入的用户，并从L1删除
+        这些用户的条目，保证L1中不会留下收不到远端失效的条目。
+        """
+        evicted = []
+        with self._local_index_lock:
+            keys = self._local_user_keys.get(user_id)
+            if keys is None:
+                keys = self._local_user_keys[user_id] = set()
+            else:
+                self._local_user_keys.move_to_end(user_id)
+            if cache_key in keys:
+                return
+            keys.add(cache_key)
+            self._local_key_count += 1
+            while self._local_key_count > self._local_key_limit:
+                _, old_keys = self._local_user_keys.popitem(last=False)
+                self._local_key_count -= len(old_keys)
+                evicted.append(old_keys)
+        for old_keys in evicted:
+            self._remove_local_keys(old_keys)
+
+    def _remove_local_keys(self, cache_keys: Iterable[str]):
+        """从所有L1策略中删除缓存键"""
+        for cache_key in cache_keys:
+            for strategy_name in self.complex_cache.strategies:
+                self.complex_cache.remove(cache_key, strategy_name)
+
+    def _drop_local_user_entries(self, user_id: int):
+        """只清理本进程L1中该用户的条目，不访问Redis"""
+        with self._local_index_lock:
+            cache_keys = self._local_user_keys.pop(user_id, ())
+            self._local_key_count -= len(cache_keys)
+        self._remove_local_keys(cache_keys)
+
+        for pattern in (
+            user_scoped_key("basic_perm", user_id, ""),
+            user_scoped_key("user_active", user_id),
+            user_scoped_key("user_role", user_id),
+            user_scoped_key("inheritance", user_id, ""),
+        ):
+            self.l1_simple_cache.remove_pattern(pattern)
+
+    def apply_remote_invalidation(self, user_ids: List[int], role_ids: List[int]):
+        """
+        应用其他进程广播的失效
+
+        发起方已经删除了Redis中的数据，这里先让本进程的权限快照重新加载变化的
+        角色和用户，再清理L1，避免并发请求用旧快照把旧值写回L1。
+        """
+        resolver = get_permission_resolver()
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    resolver.refresh_roles(role_ids)
+                    resolver.refresh_users(user_ids)
+            else:
+                resolver.refresh_roles(role_ids)
+                resolver.refresh_users(user_ids)
+        except Exception as e:
+            logger.warning(f"应用远端失效时刷新权限快照失败: {e}")
+            resolver.clear()
+
+        # 发起方已递增代数，丢弃本地缓存的旧代数以立即生效
+        get_generation_store().forget(
+            [("user", user_id) for user_id in user_ids]
+            + [("role", role_id) for role_id in resolver.affected_roles(role_ids)]
+        )
+        for user_id in user_ids:
+            self._drop_local_user_entries(user_id)
+        if role_ids:
+            self.l1_simple_cache.remove_pattern("basic_perm:")
+        logger.debug(f"已应用远端失效: users={len(user_ids)}, roles={len(role_ids)}")
+
+    def reset_local_caches(self):
+        """失效广播丢失时清空本进程的全部L1并重建权限快照"""
+        resolver = get_permission_resolver()
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    resolver.rebuild()
+            else:
+                resolver.clear()
+        except Exception as e:
+            logger.warning(f"重建权限快照失败: {e}")
+            resolver.clear()
+
+        self.l1_simple_cache.clear()
+        self.complex_cache.clear()
+        get_generation_store().clear()
+        with self._local_index_lock:
+            self._local_user_keys.clear()
+            self._local_key_count = 0
+        logger.warning("失效广播存在丢失，已清空本进程L1缓存")
+
     # ==================== 用户索引管理方法 ====================
 
     def _add_to_user_index(self, user_id: int, cache_key: str):
         """将缓存键添加到用户索引中"""
+        self._track_local_key(user_id, cache_key)
         try:
             redis_client = self.distributed_cache.redis_client
             if redis_client:
-                index_key = f"user_index:{{{user_id}}}"
+                index_key = user_index_key(user_id)
                 redis_client.sadd(index_key, cache_key)
                 # 设置索引的过期时间，避免索引永久存在
                 redis_client.expire(index_key, 3600)  # 1小时过期
@@ -1896,7 +2268,7 @@ class HybridPermissionCache:
         try:
             redis_client = self.distributed_cache.redis_client
             if redis_client:
-                index_key = f"user_index:{{{user_id}}}"
+                index_key = user_index_key(user_id)
                 redis_client.srem(index_key, cache_key)
         except Exception as e:
             logger.warning(
@@ -1908,7 +2280,7 @@ class HybridPermissionCache:
         try:
             redis_client = self.distributed_cache.redis_client
             if redis_client:
-                index_key = f"user_index:{{{user_id}}}"
+                index_key = user_index_key(user_id)
                 keys = redis_client.smembers(index_key)
                 return [
                     key.decode("utf-8") if isinstance(key, bytes) else key
@@ -1923,7 +2295,7 @@ class HybridPermissionCache:
         try:
             redis_client = self.distributed_cache.redis_client
             if redis_client:
-                index_key = f"user_index:{{{user_id}}}"
+                index_key = user_index_key(user_id)
                 redis_client.delete(index_key)
         except Exception as e:
             logger.warning(f"清空用户索引失败: user_id={user_id}, error={e}")
@@ -1934,9 +2306,10 @@ class HybridPermissionCache:
 
 def _make_perm_cache_key(user_id, scope, scope_id):
     """
-    生成优化的权限缓存key，使用MD5哈希。
+    生成带代数的结构化权限缓存key。
 
-    根据用户ID、作用域和作用域ID生成唯一的缓存键，使用MD5哈希提高分布性。
+    根据用户ID、作用域和作用域ID，以及用户、作用域和用户所持角色的代数生成缓存键，
+    格式见 permission_keys。任一代数递增后生成的键随之改变，旧键对应的缓存不再被访问。
 
     参数:
         user_id (int): 用户ID
@@ -1944,14 +2317,52 @@ def _make_perm_cache_key(user_id, scope, scope_id):
         scope_id (int): 作用域ID，如服务器ID或频道ID
 
     返回:
-        str: MD5哈希的缓存键
+        str: 带用户哈希标签的缓存键
 
     示例:
         >>> _make_perm_cache_key(123, 'server', 456)
-        'perm:5d41402abc4b2a76b9719d911017c592'
+        'perm:v1:{123}:server:456:g0.0.0'
     """
-    key_string = f"{user_id}:{scope or 'global'}:{scope_id or 'none'}"
-    return f"perm:{{{hashlib.md5(key_string.encode()).hexdigest()}}}"
+    refs = _perm_generation_refs(user_id, scope, scope_id)
+    return _hash_perm_cache_key(
+        user_id, scope, scope_id, refs, get_generation_store().get_many(refs)
+    )
+
+
+def _make_perm_cache_keys(user_ids, scope, scope_id) -> Dict[Any, str]:
+    """批量生成权限缓存key，所有用户的代数合并为一次读取"""
+    refs_by_user = {
+        user_id: _perm_generation_refs(user_id, scope, scope_id) for user_id in user_ids
+    }
+    generations = get_generation_store().get_many(
+        ref for refs in refs_by_user.values() for ref in refs
+    )
+    return {
+        user_id: _hash_perm_cache_key(user_id, scope, scope_id, refs, generations)
+        for user_id, refs in refs_by_user.items()
+    }
+
+
+def _perm_generation_refs(user_id, scope, scope_id):
+    """权限缓存键依赖的代数引用"""
+    return generation_refs(
+        user_id, scope, scope_id, get_permission_resolver().user_role_ids(user_id)
+    )
+
+
+def _hash_perm_cache_key(user_id, scope, scope_id, refs, generations) -> str:
+    # 引用顺序固定为 用户、作用域（可选）、角色；角色代数只增不减，求和即可区分
+    user_gen = generations[refs[0]]
+    scope_gen = 0
+    role_gen = 0
+    for ref in refs[1:]:
+        if ref[0] == "role":
+            role_gen += generations[ref]
+        else:
+            scope_gen = generations[ref]
+    return encode_perm_key(
+        user_id, scope, scope_id, f"{user_gen}.{scope_gen}.{role_gen}"
+    )
 
 
 # ==================== 全局实例 ====================
@@ -2033,6 +2444,11 @@ def invalidate_role_permissions(role_id: int):
     hybrid_cache.invalidate_role_permissions(role_id)
 
 
+def invalidate_scope_permissions(scope: str, scope_id: int):
+    """失效作用域（服务器/频道）权限缓存的便捷函数"""
+    hybrid_cache.invalidate_scope_permissions(scope, scope_id)
+
+
 def invalidate_role_permissions_legacy(role_id: int):
     """失效角色权限缓存的便捷函数（旧版本，已废弃）"""
     hybrid_cache.invalidate_role_permissions_legacy(role_id)
@@ -2219,7 +2635,7 @@ def get_permissions_from_cache(cache_key: str) -> Optional[Set[str]]:
     - 迁移示例：cache = HybridPermissionCache(); permissions = cache.get_permission(user_id, permission)
     """
     try:
-        # 解析缓存键格式：perm:{hash}
+        # 缓存键格式见 permission_keys：perm:v1:{user_id}:...
         if cache_key.startswith("perm:"):
             # 从缓存键中提取信息（简化处理）
             # 实际使用时可能需要更复杂的解析逻辑
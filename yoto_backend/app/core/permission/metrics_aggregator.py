@@ -7,6 +7,7 @@
 - 提供高质量的PerformanceMetrics快照
 """
 
+import os
 import time
 import json
 import logging
@@ -15,6 +16,8 @@ from typing import Dict, Any, Optional, List
 from dataclasses import dataclass
 from enum import Enum
 
+from .shared_metrics import SharedMetricsTable
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,18 +60,28 @@ class PerformanceMetrics:
 class MetricsAggregator:
     """指标聚合器"""
 
-    def __init__(self, redis_client, ml_monitor=None):
+    def __init__(
+        self,
+        redis_client,
+        ml_monitor=None,
+        local_aggregation: Optional[bool] = None,
+        shared_table_name: Optional[str] = None,
+    ):
         """
         初始化指标聚合器
 
         Args:
             redis_client: Redis客户端
             ml_monitor: ML性能监控器
+            local_aggregation: 是否在主机共享内存中预聚合，
+                默认读取环境变量 METRICS_LOCAL_AGGREGATION
+            shared_table_name: 共享内存名称，默认读取环境变量 METRICS_SHM_NAME
         """
         self.redis_client = redis_client
         self.ml_monitor = ml_monitor
         self.aggregation_interval = 60  # 聚合间隔（秒）
         self.staging_ttl = 120  # 暂存数据TTL（秒）
+        self.poll_interval = 5  # 聚合循环检查间隔（秒），也是主机代理的写入间隔
         self.required_metrics = {
             MetricType.CACHE_HIT_RATE.value,
             MetricType.RESPONSE_TIME.value,
@@ -77,6 +90,17 @@ class MetricsAggregator:
             MetricType.QPS.value,
         }
 
+        # 本地聚合模式：观测值累加到主机共享内存，由主机代理定期写入Redis
+        if local_aggregation is None:
+            local_aggregation = (
+                os.getenv("METRICS_LOCAL_AGGREGATION", "false").lower() == "true"
+            )
+        self.shared_table: Optional[SharedMetricsTable] = None
+        if local_aggregation:
+            self.shared_table = self._open_shared_table(
+                shared_table_name or os.getenv("METRICS_SHM_NAME", "yoto_metrics")
+            )
+
         # 启动聚合线程
         self.stop_event = threading.Event()
         self.aggregation_thread = threading.Thread(
@@ -86,6 +110,14 @@ class MetricsAggregator:
 
         logger.info("指标聚合器已启动")
 
+    def _open_shared_table(self, name: str) -> Optional[SharedMetricsTable]:
+        """打开主机共享内存指标表，失败时退回逐条写入Redis"""
+        try:
+            return SharedMetricsTable([metric.value for metric in MetricType], name)
+        except Exception as e:
+            logger.warning(f"共享内存指标表不可用，使用Redis暂存: {e}")
+            return None
+
     def stage_metric(self, metric_name: str, value: float, tags: Dict[str, str] = None):
         """
         暂存单个指标
@@ -95,6 +127,9 @@ class MetricsAggregator:
             value: 指标值
             tags: 标签信息
         """
+        if self.shared_table is not None:
+            self.shared_table.add(metric_name, value)
+            return
         try:
             if not self.redis_client:
                 logger.warning("Redis客户端不可用，跳过指标暂存")
@@ -119,14 +154,47 @@ class MetricsAggregator:
         except Exception as e:
             logger.error(f"暂存指标失败: {metric_name} = {value}, error: {e}")
 
+    def stage_metrics(self, metrics: List[tuple]):
+        """
+        批量暂存指标，一次管道写入
+
+        Args:
+            metrics: [(指标名称, 指标值, 标签信息)]
+        """
+        if self.shared_table is not None:
+            for metric_name, value, _tags in metrics:
+                self.shared_table.add(metric_name, value)
+            return
+        if not metrics or not self.redis_client:
+            return
+        try:
+            now = time.time()
+            current_minute = (
+                int(now // self.aggregation_interval) * self.aggregation_interval
+            )
+            staging_key = f"monitor:metrics_snapshot:{current_minute}"
+            mapping = {
+                metric_name: json.dumps(
+                    {"value": value, "timestamp": now, "tags": tags or {}}
+                )
+                for metric_name, value, tags in metrics
+            }
+
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.hset(staging_key, mapping=mapping)
+            pipe.expire(staging_key, self.staging_ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"批量暂存指标失败: {len(metrics)} 条, error: {e}")
+
     def _aggregation_loop(self):
         """聚合循环"""
         logger.info("指标聚合循环已启动")
 
-        while not self.stop_event.is_set():
+        while not self.stop_event.wait(self.poll_interval):
             try:
-                # 等待聚合间隔
-                time.sleep(5)  # 每5秒检查一次
+                # 主机代理将共享内存中的增量写入当前分钟
+                self._fold_shared_table()
 
                 # 计算前一分钟的时间戳
                 current_time = time.time()
@@ -162,6 +230,30 @@ class MetricsAggregator:
             except Exception as e:
                 logger.error(f"指标聚合循环错误: {e}")
 
+    def _fold_shared_table(self):
+        """主机代理：一次管道把共享内存中的增量累加到当前分钟的暂存哈希"""
+        table = self.shared_table
+        if table is None or not self.redis_client or not table.try_become_agent():
+            return
+        deltas = table.collect()
+        if not deltas:
+            return
+
+        current_minute = (
+            int(time.time() // self.aggregation_interval) * self.aggregation_interval
+        )
+        staging_key = f"monitor:metrics_snapshot:{current_minute}"
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            for metric_name, (total, count) in deltas.items():
+                pipe.hincrbyfloat(staging_key, f"sum:{metric_name}", total)
+                pipe.hincrbyfloat(staging_key, f"count:{metric_name}", count)
+            pipe.expire(staging_key, self.staging_ttl)
+            pipe.execute()
+            table.acknowledge()
+        except Exception as e:
+            logger.error(f"写入主机聚合指标失败，下次重试: {staging_key}, error: {e}")
+
     def _get_metrics_snapshot(self, staging_key: str) -> Optional[Dict[str, Any]]:
         """
         获取指标快照
@@ -184,13 +276,25 @@ class MetricsAggregator:
 
             # 解析指标数据
             snapshot = {}
+            totals: Dict[str, List[float]] = {}
             for metric_name, metric_json in snapshot_data.items():
+                if isinstance(metric_name, bytes):
+                    metric_name = metric_name.decode()
+                # 主机代理写入的 sum:<指标> / count:<指标>，取分钟内的均值
+                field, _, name = metric_name.partition(":")
+                if name and field in ("sum", "count"):
+                    pair = totals.setdefault(name, [0.0, 0.0])
+                    pair[1 if field == "count" else 0] += float(metric_json)
+                    continue
                 try:
                     metric_data = json.loads(metric_json)
                     snapshot[metric_name] = metric_data["value"]
                 except (json.JSONDecodeError, KeyError) as e:
                     logger.warning(f"解析指标数据失败: {metric_name}, error: {e}")
                     continue
+            for name, (total, count) in totals.items():
+                if count > 0:
+                    snapshot[name] = total / count
 
             return snapshot
 
@@ -269,6 +373,10 @@ class MetricsAggregator:
         self.stop_event.set()
         if self.aggregation_thread.is_alive():
             self.aggregation_thread.join(timeout=5)
+        if self.shared_table is not None:
+            self._fold_shared_table()
+            table, self.shared_table = self.shared_table, None
+            table.close()
         logger.info("指标聚合器已停止")
 
 
@@ -306,3 +414,9 @@ def stage_metric(metric_name: str, value: float, tags: Dict[str, str] = None):
     """
     aggregator = get_metrics_aggregator()
     aggregator.stage_metric(metric_name, value, tags)
+
+
+def stage_metrics(metrics: List[tuple]):
+    """批量暂存指标的便捷函数，参见 MetricsAggregator.stage_metrics"""
+    aggregator = get_metrics_aggregator()
+    aggregator.stage_metrics(metrics)
@@ -0,0 +1,338 @@
+"""
+指标注册表模块
+
+限制监控指标的标签基数，并提供固定内存、可跨进程合并的延迟分位数草图：
+- 注册的指标只保留允许列表中的标签（如去掉 cache_key 这类高基数标签）
+- 每个指标的标签组合（时间序列）数量有上限，超出后归入 overflow 序列
+- 自动注册的指标数量也有上限，超出后未注册的指标共用一个规则
+- LatencySketch 按对数分桶（DDSketch），分位数相对误差固定，
+  桶索引范围固定，内存与记录次数、键的变化无关；分桶计数直接相加即可合并
+"""
+
+import logging
+import math
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 规范化后的标签组合：按标签名排序的 (标签名, 标签值) 元组
+Series = Tuple[Tuple[str, Any], ...]
+
+# 超出基数上限的标签组合统一记入该序列
+OVERFLOW_SERIES: Series = (("overflow", "true"),)
+
+DEFAULT_MAX_SERIES = 1000
+DEFAULT_MAX_METRICS = 500
+
+# 自动注册数量超过上限后，未注册的指标共用该规则
+UNREGISTERED_METRIC = "__unregistered__"
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def series_label(series: Series) -> str:
+    """序列的字符串表示，用作存储键的一部分，如 cache_level=l1,operation=get"""
+    return ",".join(f"{name}={value}" for name, value in series)
+
+
+def tags_label(tags: Optional[Dict[str, Any]]) -> str:
+    """标签字典的序列字符串表示，与 series_label 的结果一致"""
+    return series_label(tuple(sorted((tags or {}).items())))
+
+
+class LatencySketch:
+    """
+    对数分桶的分位数草图（DDSketch）
+
+    值 v 落入索引为 ceil(log_gamma(v)) 的桶，gamma = (1+a)/(1-a)，
+    桶代表值与桶内任意值的相对误差不超过 a。索引限制在
+    [MIN_VALUE, MAX_VALUE] 对应的范围内，最多约2000个桶；
+    非正值单独计数。参数是类常量，所有进程的桶索引一致，可以直接相加合并。
+    """
+
+    RELATIVE_ACCURACY = 0.01
+    MIN_VALUE = 1e-9
+    MAX_VALUE = 1e9
+
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    LOG_GAMMA = math.log(GAMMA)
+    MIN_INDEX = math.ceil(math.log(MIN_VALUE) / LOG_GAMMA)
+    MAX_INDEX = math.ceil(math.log(MAX_VALUE) / LOG_GAMMA)
+
+    __slots__ = ("bins", "zero_count", "count")
+
+    def __init__(self):
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    @classmethod
+    def bucket_index(cls, value: float) -> int:
+        """值所在的桶索引（已限制在固定范围内）"""
+        index = math.ceil(math.log(value) / cls.LOG_GAMMA)
+        if index < cls.MIN_INDEX:
+            return cls.MIN_INDEX
+        if index > cls.MAX_INDEX:
+            return cls.MAX_INDEX
+        return index
+
+    @classmethod
+    def bucket_value(cls, index: int) -> float:
+        """桶的代表值"""
+        return 2 * cls.GAMMA**index / (cls.GAMMA + 1)
+
+    def add(self, value: float, count: int = 1):
+        """记录一个值"""
+        self.count += count
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = self.bucket_index(value)
+        bins = self.bins
+        bins[index] = bins.get(index, 0) + count
+
+    def merge(self, other: "LatencySketch"):
+        """合并另一个草图"""
+        self.count += other.count
+        self.zero_count += other.zero_count
+        bins = self.bins
+        for index, count in other.bins.items():
+            bins[index] = bins.get(index, 0) + count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        分位数
+
+        参数:
+            q: 0~1之间的分位
+
+        返回:
+            Optional[float]: 估计值，草图为空时返回None
+        """
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return self.bucket_value(index)
+        return self.bucket_value(max(self.bins))
+
+    def quantiles(self, qs: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Any]:
+        """常用分位数摘要，如 {"count": 10, "p50": ..., "p99": ...}"""
+        summary: Dict[str, Any] = {"count": self.count}
+        for q in qs:
+            summary[f"p{q * 100:g}".replace(".", "")] = self.quantile(q)
+        return summary
+
+    def to_counts(self) -> Dict[str, int]:
+        """导出分桶计数（键为桶索引字符串，非正值计数键为 "z"）"""
+        counts = {str(index): count for index, count in self.bins.items()}
+        if self.zero_count:
+            counts["z"] = self.zero_count
+        return counts
+
+    @classmethod
+    def from_counts(cls, counts: Dict[Any, Any]) -> "LatencySketch":
+        """从 to_counts 的结果（或Redis哈希）重建草图"""
+        sketch = cls()
+        for key, count in counts.items():
+            if isinstance(key, bytes):
+                key = key.decode()
+            count = int(count)
+            sketch.count += count
+            if key == "z":
+                sketch.zero_count += count
+            else:
+                sketch.bins[int(key)] = count
+        return sketch
+
+
+class MetricSpec:
+    """
+    单个指标的标签规则
+
+    allowed_tags 为None时保留全部标签；标签组合数量达到 max_series 后，
+    新的组合记入 OVERFLOW_SERIES。调用方传入的原始标签到规范化序列的映射
+    也有上限，键持续变化时不会无限增长。
+    """
+
+    __slots__ = (
+        "name",
+        "allowed_tags",
+        "max_series",
+        "_series",
+        "_resolved",
+        "_lock",
+        "overflowed",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        allowed_tags: Optional[Iterable[str]] = None,
+        max_series: int = DEFAULT_MAX_SERIES,
+    ):
+        self.name = name
+        self.allowed_tags = None if allowed_tags is None else frozenset(allowed_tags)
+        self.max_series = max(1, max_series)
+        self._series: Dict[Series, Series] = {}
+        self._resolved: Dict[tuple, Series] = {}
+        self._lock = threading.Lock()
+        self.overflowed = 0
+
+    def series(self, tags: Optional[Dict[str, Any]]) -> Series:
+        """
+        规范化标签
+
+        参数:
+            tags: 调用方传入的标签
+
+        返回:
+            Series: 过滤并排序后的标签组合，超出上限时为 OVERFLOW_SERIES
+        """
+        if not tags:
+            return ()
+        raw = tuple(tags.items())
+        series = self._resolved.get(raw)
+        if series is not None:
+            return series
+        return self._resolve(raw)
+
+    def _resolve(self, raw: tuple) -> Series:
+        allowed = self.allowed_tags
+        if allowed is not None:
+            raw_items = [item for item in raw if item[0] in allowed]
+        else:
+            raw_items = list(raw)
+        series = tuple(sorted(raw_items))
+        with self._lock:
+            if series not in self._series:
+                if len(self._series) >= self.max_series:
+                    self.overflowed += 1
+                    if self.overflowed == 1:
+                        logger.warning(
+                            f"指标标签组合超过上限 {self.max_series}，"
+                            f"后续组合记入overflow: {self.name}"
+                        )
+                    series = OVERFLOW_SERIES
+                else:
+                    self._series[series] = series
+            if len(self._resolved) < self.max_series * 4:
+                self._resolved[raw] = series
+        return series
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "allowed_tags": (
+                sorted(self.allowed_tags) if self.allowed_tags is not None else None
+            ),
+            "max_series": self.max_series,
+            "series": len(self._series),
+            "overflowed": self.overflowed,
+        }
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+
+    未注册的指标在第一次记录时按默认规则（保留全部标签、默认基数上限）自动注册，
+    因此任何指标的时间序列数量都有上限。自动注册的指标数量不超过 max_metrics，
+    超出后未注册的指标共用一个规则，其标签组合一起计入同一个基数上限。
+    """
+
+    def __init__(
+        self,
+        default_max_series: int = DEFAULT_MAX_SERIES,
+        max_metrics: int = DEFAULT_MAX_METRICS,
+    ):
+        self.default_max_series = default_max_series
+        self.max_metrics = max(0, max_metrics)
+        self._specs: Dict[str, MetricSpec] = {}
+        self._auto_registered = 0
+        self._unregistered = MetricSpec(UNREGISTERED_METRIC, None, default_max_series)
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def register(
+        self,
+        name: str,
+        allowed_tags: Optional[Iterable[str]] = None,
+        max_series: Optional[int] = None,
+    ) -> MetricSpec:
+        """
+        注册（或替换）指标的标签规则
+
+        参数:
+            name: 指标名称
+            allowed_tags: 允许的标签名，None表示不限制
+            max_series: 标签组合上限，默认 default_max_series
+
+        返回:
+            MetricSpec: 指标规则
+        """
+        spec = MetricSpec(
+            name,
+            allowed_tags,
+            self.default_max_series if max_series is None else max_series,
+        )
+        with self._lock:
+            self._specs[name] = spec
+        return spec
+
+    def spec(self, name: str) -> MetricSpec:
+        """获取指标规则，未注册时自动注册，超过 max_metrics 后返回共用规则"""
+        spec = self._specs.get(name)
+        if spec is not None:
+            return spec
+        with self._lock:
+            spec = self._specs.get(name)
+            if spec is None:
+                if self._auto_registered >= self.max_metrics:
+                    self.stats["unregistered_overflow"] += 1
+                    if self.stats["unregistered_overflow"] == 1:
+                        logger.warning(
+                            f"自动注册的指标超过上限 {self.max_metrics}，"
+                            f"后续未注册指标共用标签规则: {name}"
+                        )
+                    return self._unregistered
+                spec = self._specs[name] = MetricSpec(
+                    name, None, self.default_max_series
+                )
+                self._auto_registered += 1
+                self.stats["auto_registered"] += 1
+        return spec
+
+    def series(self, name: str, tags: Optional[Dict[str, Any]]) -> Series:
+        """规范化指标标签，参见 MetricSpec.series"""
+        spec = self._specs.get(name) or self.spec(name)
+        return spec.series(tags)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各指标的标签基数统计"""
+        metrics = {name: spec.get_stats() for name, spec in self._specs.items()}
+        if self.stats["unregistered_overflow"]:
+            metrics[UNREGISTERED_METRIC] = self._unregistered.get_stats()
+        return {"metrics": metrics, **self.stats}
+
+
+_metrics_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """获取全局指标注册表"""
+    return _metrics_registry
+
+
+def register_metric(
+    name: str,
+    allowed_tags: Optional[Iterable[str]] = None,
+    max_series: Optional[int] = None,
+) -> MetricSpec:
+    """注册指标的标签规则，参见 MetricsRegistry.register"""
+    return _metrics_registry.register(name, allowed_tags, max_series)
@@ -13,13 +13,15 @@ import time
 import json
 import logging
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any, Union
-from dataclasses import asdict
+from typing import Dict, List, Optional, Any, Tuple, Union
+from dataclasses import asdict, dataclass
 from enum import Enum
 import redis
 import socket
 from contextlib import contextmanager
 
+from .metrics_registry import LatencySketch, tags_label
+
 try:
     from prometheus_client import (
         Counter,
@@ -80,6 +82,84 @@ class BackendType(Enum):
     PROMETHEUS = "prometheus"  # Prometheus暴露（生产环境）
 
 
+# ==================== 批量写入数据结构 ====================
+
+
+@dataclass(slots=True)
+class MetricAggregate:
+    """一个刷新周期内同名同标签指标的预聚合结果"""
+
+    name: str
+    kind: str  # gauge / counter / histogram
+    tags: Dict[str, str]
+    count: int = 0
+    sum: float = 0.0
+    min: float = float("inf")
+    max: float = float("-inf")
+    last: float = 0.0
+    timestamp: float = 0.0
+    sketch: Optional[LatencySketch] = None  # 仅直方图
+
+    def add(self, value: float, timestamp: float):
+        """累加一次记录"""
+        if self.sketch is not None:
+            self.sketch.add(value)
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.last = value
+        self.timestamp = timestamp
+
+    def merge(self, other: "MetricAggregate"):
+        """合并另一个缓冲区中的同一指标"""
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if other.timestamp >= self.timestamp:
+            self.last = other.last
+            self.timestamp = other.timestamp
+        if other.sketch is not None:
+            if self.sketch is None:
+                self.sketch = LatencySketch()
+            self.sketch.merge(other.sketch)
+
+    @property
+    def series(self) -> str:
+        """标签组合的字符串表示"""
+        return tags_label(self.tags)
+
+    @property
+    def value(self) -> float:
+        """代表值：计数器为周期内增量，直方图为均值，仪表盘为最后一次的值"""
+        if self.kind == "counter":
+            return self.sum
+        if self.kind == "histogram":
+            return self.sum / self.count if self.count else 0.0
+        return self.last
+
+    def to_point(self) -> Dict[str, Any]:
+        """转换为历史数据点，多次记录合并时附带 count/min/max"""
+        point = {
+            "name": self.name,
+            "value": self.value,
+            "tags": self.tags,
+            "timestamp": self.timestamp,
+        }
+        if self.count > 1:
+            point.update(count=self.count, min=self.min, max=self.max)
+        if self.sketch is not None:
+            point.update(p50=self.sketch.quantile(0.5), p99=self.sketch.quantile(0.99))
+        return point
+
+
+# 缓冲的事件：(名称, 元数据, 标签, 时间戳)
+EventRecord = Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, str]], float]
+
+
 # ==================== 基础后端接口 ====================
 
 
@@ -108,6 +188,47 @@ class MonitorBackend(ABC):
         """记录事件"""
         pass
 
+    def record_batch(
+        self, metrics: List[MetricAggregate], events: List[EventRecord]
+    ) -> bool:
+        """
+        批量写入一个刷新周期的指标和事件（由后台刷新线程调用）
+
+        默认逐条调用 record_metric / record_event，支持管道的后端应覆盖此方法。
+
+        Args:
+            metrics: 预聚合的指标
+            events: 缓冲的事件
+
+        Returns:
+            bool: 是否全部写入成功
+        """
+        success = True
+        for aggregate in metrics:
+            success &= bool(
+                self.record_metric(
+                    aggregate.name, aggregate.value, aggregate.tags, aggregate.timestamp
+                )
+            )
+        for name, metadata, tags, timestamp in events:
+            success &= bool(self.record_event(name, metadata, tags, timestamp))
+        return success
+
+    def get_histogram(
+        self, name: str, tags: Dict[str, str] = None
+    ) -> Dict[str, Any]:
+        """
+        获取直方图指标的累计分位数（count / p50 / p90 / p99 / p999）
+
+        Args:
+            name: 指标名称
+            tags: 标签组合，与记录时（经注册表过滤后）的标签一致
+
+        Returns:
+            Dict[str, Any]: 分位数摘要，不支持分位数查询的后端返回空字典
+        """
+        return {}
+
     @abstractmethod
     def get_metrics(self, name: str, limit: int = 100) -> List[Dict[str, Any]]:
         """获取指标历史"""
@@ -144,6 +265,16 @@ class MonitorBackend(ABC):
         pass
 
 
+def _same_alert(existing: "Any", alert: "Any") -> bool:
+    """两条告警是否为同一告警：异常告警比较ID，阈值告警比较指标类型和级别"""
+    source = getattr(alert, "source", "threshold")
+    if getattr(existing, "source", "threshold") != source:
+        return False
+    if source != "threshold":
+        return existing.id == alert.id
+    return existing.metric_type == alert.metric_type and existing.level == alert.level
+
+
 # ==================== 内存后端（开发环境） ====================
 
 
@@ -155,6 +286,7 @@ class MemoryBackend(MonitorBackend):
         self.metrics: Dict[str, List[Dict[str, Any]]] = {}
         self.events: Dict[str, List[Dict[str, Any]]] = {}
         self.stats: Dict[str, Dict[str, Any]] = {}
+        self.sketches: Dict[Tuple[str, str], LatencySketch] = {}
         self.alerts: List["Any"] = []
         self.alert_counters: Dict[str, int] = defaultdict(int)
 
@@ -213,6 +345,38 @@ class MemoryBackend(MonitorBackend):
 
         return True
 
+    def record_batch(
+        self, metrics: List[MetricAggregate], events: List[EventRecord]
+    ) -> bool:
+        """批量写入，统计信息按聚合结果合并，count 与逐条写入一致"""
+        for aggregate in metrics:
+            history = self.metrics.setdefault(aggregate.name, [])
+            history.append(aggregate.to_point())
+            if len(history) > self.max_history_size:
+                del history[: len(history) - self.max_history_size]
+            self._merge_stats(
+                aggregate.name,
+                aggregate.count,
+                aggregate.sum,
+                aggregate.min,
+                aggregate.max,
+            )
+            if aggregate.sketch is not None:
+                key = (aggregate.name, aggregate.series)
+                if key not in self.sketches:
+                    self.sketches[key] = LatencySketch()
+                self.sketches[key].merge(aggregate.sketch)
+        for name, metadata, tags, timestamp in events:
+            self.record_event(name, metadata, tags, timestamp)
+        return True
+
+    def get_histogram(
+        self, name: str, tags: Dict[str, str] = None
+    ) -> Dict[str, Any]:
+        """获取直方图指标的累计分位数"""
+        sketch = self.sketches.get((name, tags_label(tags)))
+        return sketch.quantiles() if sketch is not None else {"count": 0}
+
     def get_metrics(self, name: str, limit: int = 100) -> List[Dict[str, Any]]:
         """获取指标历史"""
         return self.metrics.get(name, [])[-limit:]
@@ -229,6 +393,12 @@ class MemoryBackend(MonitorBackend):
 
     def _update_stats(self, name: str, value: float):
         """更新统计信息"""
+        self._merge_stats(name, 1, value, value, value)
+
+    def _merge_stats(
+        self, name: str, count: int, total: float, minimum: float, maximum: float
+    ):
+        """合并一组记录的统计信息"""
         if name not in self.stats:
             self.stats[name] = {
                 "count": 0,
@@ -238,31 +408,33 @@ class MemoryBackend(MonitorBackend):
             }
 
         stats = self.stats[name]
-        stats["count"] += 1
-        stats["sum"] += value
-        stats["min"] = min(stats["min"], value)
-        stats["max"] = max(stats["max"], value)
+        stats["count"] += count
+        stats["sum"] += total
+        stats["min"] = min(stats["min"], minimum)
+        stats["max"] = max(stats["max"], maximum)
 
     def create_alert(self, alert: "Any") -> bool:
-        """创建告警"""
+        """
+        创建告警
+
+        阈值告警按（指标类型, 级别）合并，异常告警按ID（指标+标签组合）合并，
+        两类告警互不覆盖；已有未解决的相同告警时更新而不是新增。
+        """
         try:
             # 检查是否已有相同告警
             existing_alert = next(
-                (
-                    a
-                    for a in self.alerts
-                    if a.metric_type == alert.metric_type
-                    and a.level == alert.level
-                    and not a.resolved
-                ),
+                (a for a in self.alerts if not a.resolved and _same_alert(a, alert)),
                 None,
             )
 
             if existing_alert:
                 # 更新现有告警
+                existing_alert.level = alert.level
                 existing_alert.current_value = alert.current_value
+                existing_alert.threshold = alert.threshold
                 existing_alert.timestamp = alert.timestamp
                 existing_alert.message = alert.message
+                existing_alert.details = getattr(alert, "details", {})
                 # 不增加计数器，因为这是更新现有告警
             else:
                 # 创建新告警
@@ -279,13 +451,14 @@ class MemoryBackend(MonitorBackend):
         return [alert for alert in self.alerts if not alert.resolved]
 
     def resolve_alert(self, alert_id: str) -> bool:
-        """解决告警"""
+        """解决告警（同一ID再次触发的告警一并解决）"""
         try:
+            found = False
             for alert in self.alerts:
                 if alert.id == alert_id:
                     alert.resolved = True
-                    return True
-            return False
+                    found = True
+            return found
         except Exception as e:
             logger.error(f"内存后端解决告警失败: {e}")
             return False
@@ -298,6 +471,29 @@ class MemoryBackend(MonitorBackend):
 # ==================== Redis后端（生产环境） ====================
 
 
+# 合并统计信息（与 _update_stats 写入的JSON格式一致）
+# KEYS[1]: 统计键  ARGV: count, sum, min, max
+MERGE_STATS_SCRIPT = """
+local raw = redis.call('GET', KEYS[1])
+local count = tonumber(ARGV[1])
+local total = tonumber(ARGV[2])
+local minimum = tonumber(ARGV[3])
+local maximum = tonumber(ARGV[4])
+local stats
+if raw then
+    stats = cjson.decode(raw)
+    stats['count'] = stats['count'] + count
+    stats['sum'] = stats['sum'] + total
+    stats['min'] = math.min(stats['min'], minimum)
+    stats['max'] = math.max(stats['max'], maximum)
+else
+    stats = {count = count, sum = total, min = minimum, max = maximum}
+end
+redis.call('SET', KEYS[1], cjson.encode(stats))
+return stats['count']
+"""
+
+
 class RedisBackend(MonitorBackend):
     """Redis存储后端（生产环境）"""
 
@@ -306,12 +502,22 @@ class RedisBackend(MonitorBackend):
         redis_url: str = "redis://localhost:6379",
         key_prefix: str = "monitor:",
         max_history_size: int = 1000,
+        reconnect_interval: float = 5.0,
+        sketch_ttl: int = 86400,
+        alert_ttl: int = 7 * 86400,
     ):
         self.redis_url = redis_url
         self.key_prefix = key_prefix
         self.max_history_size = max_history_size
+        self.reconnect_interval = reconnect_interval
+        # 分位数草图键在该时间内没有写入即过期，不再使用的标签组合不会永久保留
+        self.sketch_ttl = sketch_ttl
+        # 告警键在该时间内没有更新即过期，过期的ID在读取活跃告警时移出集合
+        self.alert_ttl = alert_ttl
         self._redis = None
         self._connection_healthy = False
+        self._last_connect_attempt = 0.0
+        self._stats_script_sha: Optional[str] = None
 
     @property
     def redis(self):
@@ -468,6 +674,135 @@ class RedisBackend(MonitorBackend):
             logger.error(f"Redis记录事件出现意外错误: {e}")
             return False
 
+    def _batch_client(self):
+        """刷新线程使用的连接，连接失败后按 reconnect_interval 重试"""
+        if self._redis is None:
+            now = time.time()
+            if now - self._last_connect_attempt < self.reconnect_interval:
+                return None
+            self._last_connect_attempt = now
+        return self.redis
+
+    def record_batch(
+        self, metrics: List[MetricAggregate], events: List[EventRecord]
+    ) -> bool:
+        """
+        一个管道写入整个刷新周期
+
+        每个指标执行 LPUSH/LTRIM/SET 和一次统计合并脚本，每个事件执行 LPUSH/LTRIM；
+        直方图的草图键每次写入后刷新 sketch_ttl。
+        不再逐条 PING，连接状态由管道执行结果反映。
+        """
+        if not metrics and not events:
+            return True
+        client = self._batch_client()
+        if client is None:
+            logger.warning("Redis连接不可用，跳过批量写入")
+            return False
+
+        try:
+            if self._stats_script_sha is None:
+                self._stats_script_sha = client.script_load(MERGE_STATS_SCRIPT)
+
+            pipe = client.pipeline(transaction=False)
+            stats_calls = {}
+            for aggregate in metrics:
+                payload = json.dumps(aggregate.to_point())
+                key = f"{self.key_prefix}metrics:{aggregate.name}"
+                pipe.lpush(key, payload)
+                pipe.ltrim(key, 0, self.max_history_size - 1)
+                pipe.set(f"{self.key_prefix}latest:{aggregate.name}", payload)
+                stats_args = (
+                    f"{self.key_prefix}stats:{aggregate.name}",
+                    aggregate.count,
+                    aggregate.sum,
+                    aggregate.min,
+                    aggregate.max,
+                )
+                stats_calls[len(pipe)] = stats_args
+                pipe.evalsha(self._stats_script_sha, 1, *stats_args)
+                if aggregate.sketch is not None:
+                    # 分桶计数用HINCRBY累加，各进程的草图在Redis中直接合并
+                    sketch_key = self._sketch_key(aggregate.name, aggregate.series)
+                    for field, count in aggregate.sketch.to_counts().items():
+                        pipe.hincrby(sketch_key, field, count)
+                    if self.sketch_ttl > 0:
+                        pipe.expire(sketch_key, self.sketch_ttl)
+            for name, metadata, tags, timestamp in events:
+                key = f"{self.key_prefix}events:{name}"
+                event_point = {
+                    "name": name,
+                    "metadata": metadata or {},
+                    "tags": tags or {},
+                    "timestamp": timestamp,
+                }
+                pipe.lpush(key, json.dumps(event_point))
+                pipe.ltrim(key, 0, self.max_history_size - 1)
+            results = pipe.execute(raise_on_error=False)
+
+            missing = []
+            errors = []
+            for index, result in enumerate(results):
+                if isinstance(result, redis.exceptions.NoScriptError):
+                    missing.append(stats_calls[index])
+                elif isinstance(result, Exception):
+                    errors.append(result)
+            if missing:
+                # Redis重启或主从切换后脚本缓存丢失，重新加载后只补写统计
+                self._stats_script_sha = client.script_load(MERGE_STATS_SCRIPT)
+                pipe = client.pipeline(transaction=False)
+                for stats_args in missing:
+                    pipe.evalsha(self._stats_script_sha, 1, *stats_args)
+                errors.extend(
+                    result
+                    for result in pipe.execute(raise_on_error=False)
+                    if isinstance(result, Exception)
+                )
+
+            self._connection_healthy = True
+            if errors:
+                logger.error(f"Redis批量写入部分失败: {len(errors)} 条, {errors[0]}")
+                return False
+            return True
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.error(f"Redis连接错误，批量写入失败: {e}")
+            self._connection_healthy = False
+            return False
+        except redis.AuthenticationError as e:
+            logger.error(f"Redis认证失败，批量写入失败: {e}")
+            return False
+        except redis.RedisError as e:
+            logger.error(f"Redis操作错误，批量写入失败: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Redis批量写入出现意外错误: {e}")
+            return False
+
+    def _sketch_key(self, name: str, series: str) -> str:
+        return f"{self.key_prefix}sketch:{name}:{series}"
+
+    def get_histogram(
+        self, name: str, tags: Dict[str, str] = None
+    ) -> Dict[str, Any]:
+        """获取直方图指标的累计分位数（所有进程合并后的结果）"""
+        if not self._check_connection_health():
+            logger.warning("Redis连接不可用，返回空分位数")
+            return {}
+
+        try:
+            counts = self.redis.hgetall(self._sketch_key(name, tags_label(tags)))
+            return LatencySketch.from_counts(counts).quantiles()
+        except (redis.ConnectionError, redis.TimeoutError) as e:
+            logger.error(f"Redis连接错误，获取分位数失败: {e}")
+            self._connection_healthy = False
+            return {}
+        except redis.RedisError as e:
+            logger.error(f"Redis操作错误，获取分位数失败: {e}")
+            return {}
+        except Exception as e:
+            logger.error(f"Redis获取分位数出现意外错误: {e}")
+            return {}
+
     def get_metrics(self, name: str, limit: int = 100) -> List[Dict[str, Any]]:
         """获取指标历史"""
         if not self._check_connection_health():
@@ -568,7 +903,11 @@ class RedisBackend(MonitorBackend):
             logger.error(f"Redis更新统计出现意外错误: {e}")
 
     def create_alert(self, alert: "Any") -> bool:
-        """创建告警到Redis"""
+        """
+        创建告警到Redis
+
+        相同ID的告警覆盖同一个键并刷新 alert_ttl，只有新进入活跃集合的告警增加计数器。
+        """
         if not self._check_connection_health():
             logger.warning("Redis连接不可用，跳过告警创建")
             return False
@@ -584,19 +923,20 @@ class RedisBackend(MonitorBackend):
                 "threshold": alert.threshold,
                 "timestamp": alert.timestamp,
                 "resolved": alert.resolved,
+                "details": getattr(alert, "details", {}),
+                "source": getattr(alert, "source", "threshold"),
             }
 
             # 存储告警
             alert_key = f"{self.key_prefix}alert:{alert.id}"
-            self.redis.set(alert_key, json.dumps(alert_data))
+            self.redis.set(alert_key, json.dumps(alert_data), ex=self.alert_ttl)
 
-            # 添加到活跃告警集合
+            # 添加到活跃告警集合，已在集合中说明是更新现有告警
             active_alerts_key = f"{self.key_prefix}active_alerts"
-            self.redis.sadd(active_alerts_key, alert.id)
-
-            # 更新告警计数器
-            counter_key = f"{self.key_prefix}alert_counter:{alert.level.value}"
-            self.redis.incr(counter_key)
+            if self.redis.sadd(active_alerts_key, alert.id):
+                # 更新告警计数器
+                counter_key = f"{self.key_prefix}alert_counter:{alert.level.value}"
+                self.redis.incr(counter_key)
 
             return True
         except (redis.ConnectionError, redis.TimeoutError) as e:
@@ -623,13 +963,16 @@ class RedisBackend(MonitorBackend):
             from .permission_monitor import Alert, AlertLevel, MetricType
 
             active_alerts = []
+            expired = []
             active_alerts_key = f"{self.key_prefix}active_alerts"
             alert_ids = self.redis.smembers(active_alerts_key)
 
             for alert_id in alert_ids:
                 alert_key = f"{self.key_prefix}alert:{alert_id.decode()}"
                 alert_data = self.redis.get(alert_key)
-                if alert_data:
+                if not alert_data:
+                    expired.append(alert_id)
+                else:
                     data = json.loads(alert_data)
                     if not data.get("resolved", False):
                         alert = Alert(
@@ -641,9 +984,13 @@ class RedisBackend(MonitorBackend):
                             threshold=data["threshold"],
                             timestamp=data["timestamp"],
                             resolved=data["resolved"],
+                            details=data.get("details", {}),
+                            source=data.get("source", "threshold"),
                         )
                         active_alerts.append(alert)
 
+            if expired:
+                self.redis.srem(active_alerts_key, *expired)
             return active_alerts
         except (redis.ConnectionError, redis.TimeoutError) as e:
             logger.error(f"Redis连接错误，获取活跃告警失败: {e}")
@@ -672,7 +1019,7 @@ class RedisBackend(MonitorBackend):
             if alert_data:
                 data = json.loads(alert_data)
                 data["resolved"] = True
-                self.redis.set(alert_key, json.dumps(data))
+                self.redis.set(alert_key, json.dumps(data), ex=self.alert_ttl)
 
                 # 从活跃告警集合中移除
                 active_alerts_key = f"{self.key_prefix}active_alerts"
@@ -728,6 +1075,9 @@ class RedisBackend(MonitorBackend):
 class StatsDBackend(MonitorBackend):
     """StatsD推送后端（生产环境）"""
 
+    # 单个UDP包的最大长度（避免在常见MTU下分片）
+    MAX_PACKET_SIZE = 1432
+
     def __init__(
         self,
         host: str = "localhost",
@@ -794,6 +1144,36 @@ class StatsDBackend(MonitorBackend):
             logger.error(f"StatsD推送事件失败: {e}")
             return False
 
+    def record_batch(
+        self, metrics: List[MetricAggregate], events: List[EventRecord]
+    ) -> bool:
+        """按行合并为尽量少的UDP包推送"""
+        lines = []
+        for aggregate in metrics:
+            line = f"{self.prefix}{aggregate.name}:{aggregate.value}|g"
+            if aggregate.tags:
+                line += "|#" + ",".join(f"{k}={v}" for k, v in aggregate.tags.items())
+            lines.append(line)
+        for name, _metadata, tags, _timestamp in events:
+            line = f"{self.prefix}event.{name}:1|c"
+            if tags:
+                line += "|#" + ",".join(f"{k}={v}" for k, v in tags.items())
+            lines.append(line)
+
+        try:
+            packet = ""
+            for line in lines:
+                if packet and len(packet) + len(line) + 1 > self.MAX_PACKET_SIZE:
+                    self.socket.sendto(packet.encode(), (self.host, self.port))
+                    packet = ""
+                packet = f"{packet}\n{line}" if packet else line
+            if packet:
+                self.socket.sendto(packet.encode(), (self.host, self.port))
+            return True
+        except Exception as e:
+            logger.error(f"StatsD批量推送失败: {e}")
+            return False
+
     def get_metrics(self, name: str, limit: int = 100) -> List[Dict[str, Any]]:
         """StatsD不支持查询，返回空列表"""
         return []
@@ -963,6 +1343,64 @@ class PrometheusBackend(MonitorBackend):
             logger.error(f"Prometheus记录指标失败: {e}")
             return False
 
+    def record_batch(
+        self, metrics: List[MetricAggregate], events: List[EventRecord]
+    ) -> bool:
+        """
+        批量写入一个刷新周期
+
+        延迟直方图按草图的每个分桶（代表值 × 计数）观测，Prometheus 中的
+        分布、_count 和 _sum 与逐条记录一致（误差在草图精度内），
+        而不是每个周期只观测一次均值；其他指标按代表值逐条写入。
+        """
+        success = True
+        for aggregate in metrics:
+            if aggregate.name == "response_time" and aggregate.count:
+                success &= self._observe_response_time(aggregate)
+            else:
+                success &= bool(
+                    self.record_metric(
+                        aggregate.name,
+                        aggregate.value,
+                        aggregate.tags,
+                        aggregate.timestamp,
+                    )
+                )
+        for name, metadata, tags, timestamp in events:
+            success &= bool(self.record_event(name, metadata, tags, timestamp))
+        return success
+
+    def _observe_response_time(self, aggregate: MetricAggregate) -> bool:
+        """按分桶观测延迟（毫秒转换为秒）"""
+        try:
+            if not PROMETHEUS_AVAILABLE:
+                return True
+            tags = aggregate.tags or {}
+            histogram = self._metrics["response_time"].labels(
+                operation=tags.get("operation", "permission_check")
+            )
+            sketch = aggregate.sketch
+            if sketch is not None and sketch.count:
+                observations = [
+                    (LatencySketch.bucket_value(index), count)
+                    for index, count in sketch.bins.items()
+                ]
+                if sketch.zero_count:
+                    observations.append((0.0, sketch.zero_count))
+            elif aggregate.count == 1:
+                observations = [(aggregate.last, 1)]
+            else:
+                # 没有草图时按均值观测 count 次，至少 _count 和 _sum 保持正确
+                observations = [(aggregate.value, aggregate.count)]
+            for value, count in observations:
+                seconds = value / 1000.0
+                for _ in range(count):
+                    histogram.observe(seconds)
+            return True
+        except Exception as e:
+            logger.error(f"Prometheus记录直方图失败: {e}")
+            return False
+
     def record_event(
         self,
         name: str,
@@ -30,6 +30,12 @@ allow {
     check_dynamic_policies(input)
 }
 
+# 批量决策：对 input.batch 中的每个输入分别评估 allow（键为输入下标）
+batch_allow[i] = decision {
+    item := input.batch[i]
+    decision := allow with input as item
+}
+
 # 角色权限检查
 has_role_permission(roles, resource_type, action) {
     role := roles[_]
@@ -10,16 +10,106 @@ import json
 import logging
 import requests
 import time
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta
 import hashlib
 import threading
 from dataclasses import dataclass, field
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
 import statistics
 
+from .abac_policy import (
+    LocalPolicyEvaluator,
+    PolicyCompileError,
+    compile_residual,
+)
+
 logger = logging.getLogger(__name__)
 
+# 每次请求都会变化、不影响决策的输入字段，计算决策缓存键时忽略
+VOLATILE_INPUT_FIELDS = (
+    ("time", "timestamp"),
+    ("time", "minute"),
+    ("context", "request_id"),
+    ("context", "timestamp"),
+)
+
+# 部分评估时视为未知的输入，其余（用户属性）在OPA中预先求值
+PARTIAL_EVALUATION_UNKNOWNS = [
+    "input.resource",
+    "input.action",
+    "input.context",
+    "input.time",
+]
+
+_MISS = object()
+
+
+def normalized_input_hash(input_data: Dict[str, Any]) -> str:
+    """
+    输入数据的规范化哈希（忽略 VOLATILE_INPUT_FIELDS）
+
+    参数:
+        input_data: OPA 的 input 部分
+
+    返回:
+        str: 32位十六进制摘要
+    """
+    normalized = dict(input_data)
+    for section, field_name in VOLATILE_INPUT_FIELDS:
+        value = normalized.get(section)
+        if isinstance(value, dict) and field_name in value:
+            value = dict(value)
+            del value[field_name]
+            normalized[section] = value
+    data = json.dumps(normalized, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+class _TTLCache:
+    """有界的TTL-LRU缓存（线程安全）"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def purge_expired(self) -> int:
+        """清理过期条目，返回清理数量"""
+        now = time.time()
+        with self._lock:
+            expired = [key for key, (_, exp) in self._entries.items() if exp <= now]
+            for key in expired:
+                del self._entries[key]
+        return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
 
 @dataclass
 class PolicyMetrics:
@@ -61,22 +151,46 @@ class OPAPolicyManager:
     增强版：支持自适应策略调整、性能优化和详细监控
     """
 
-    def __init__(self, opa_url: str = "http://localhost:8181", cache_ttl: int = 300):
+    def __init__(
+        self,
+        opa_url: str = "http://localhost:8181",
+        cache_ttl: int = 300,
+        local_policies: Optional[Dict[str, Dict[str, Any]]] = None,
+        pool_size: int = 20,
+        timeout: float = 2.0,
+        partial_evaluation: bool = True,
+    ):
         """
         初始化OPA策略管理器
 
         Args:
             opa_url: OPA服务URL
             cache_ttl: 缓存TTL（秒）
+            local_policies: 本地评估的声明式策略（默认不启用）；已注册的策略
+                优先于OPA中的同名策略，如 abac_policy.ATTRIBUTE_LOCAL_POLICIES
+            pool_size: 到OPA的keep-alive连接池大小
+            timeout: OPA请求超时（秒）
+            partial_evaluation: 是否按用户缓存部分评估的残余查询
         """
         self.opa_url = opa_url.rstrip("/")
         self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.partial_evaluation = partial_evaluation
         self._policy_cache = {}
         self._cache_timestamps = {}
-        self._evaluation_cache = {}
         self._metrics = PolicyMetrics()
         self._lock = threading.RLock()
 
+        # 复用连接的HTTP会话，避免每次评估都重新建立TCP连接
+        self.pool_size = pool_size
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+        # 本地策略快速路径（需显式启用）：能编译的策略在进程内评估，其余转发给OPA
+        self._local_evaluator = LocalPolicyEvaluator(local_policies)
+
         # 新增：自适应策略配置
         self._adaptive_config = AdaptivePolicyConfig()
 
@@ -90,14 +204,14 @@ class OPAPolicyManager:
             "preload_frequently_used": True,
         }
 
-        # 验证OPA服务连接
-        self._validate_opa_connection()
-
-        # 启动策略监控线程
-        self._start_policy_monitor()
+        # 决策缓存（按规范化输入哈希）与残余查询缓存（按策略和用户）
+        max_cache_size = self._smart_cache_config["max_cache_size"]
+        self._decision_cache = _TTLCache(max_cache_size, cache_ttl)
+        self._residual_cache = _TTLCache(max_cache_size, cache_ttl)
+        self._local_stats = defaultdict(int)
 
-        # 启动自适应调整线程
-        self._start_adaptive_adjustment()
+        # 维护线程在第一次访问OPA时启动，构造时不做网络请求
+        self._maintenance_thread: Optional[threading.Thread] = None
 
     def _validate_opa_connection(self) -> bool:
         """
@@ -107,7 +221,7 @@ class OPAPolicyManager:
             bool: 连接是否成功
         """
         try:
-            response = requests.get(f"{self.opa_url}/health", timeout=5)
+            response = self._session.get(f"{self.opa_url}/health", timeout=self.timeout)
             if response.status_code == 200:
                 logger.info(f"OPA服务连接成功: {self.opa_url}")
                 return True
@@ -133,8 +247,8 @@ class OPAPolicyManager:
             url = f"{self.opa_url}/v1/policies/{policy_name}"
             headers = {"Content-Type": "text/plain"}
 
-            response = requests.put(
-                url, data=policy_content, headers=headers, timeout=10
+            response = self._session.put(
+                url, data=policy_content, headers=headers, timeout=self.timeout
             )
 
             if response.status_code == 200:
@@ -159,6 +273,21 @@ class OPAPolicyManager:
             logger.error(f"策略加载异常: {policy_name}, 错误: {e}")
             return False
 
+    def load_local_policy(self, policy_name: str, policy_spec: Dict[str, Any]) -> bool:
+        """
+        加载本地评估的声明式策略
+
+        已在本地注册的策略优先于OPA中的同名策略；无法编译时改由OPA评估。
+
+        Args:
+            policy_name: 策略名称（与OPA数据路径一致，如 permission.abac）
+            policy_spec: 声明式策略，格式见 abac_policy 模块
+
+        Returns:
+            bool: 是否已在本地注册
+        """
+        return self._local_evaluator.load(policy_name, policy_spec)
+
     def _calculate_policy_complexity(self, policy_content: str) -> float:
         """计算策略复杂度分数"""
         try:
@@ -190,35 +319,58 @@ class OPAPolicyManager:
         Returns:
             Dict[str, Any]: 评估结果
         """
+        try:
+            # 本地快速路径：已编译的策略直接在进程内评估，不访问OPA
+            local_result = self._local_evaluator.evaluate(
+                policy_name, input_data.get("input", input_data)
+            )
+            if local_result is not None:
+                return {"result": {"allow": local_result}}
+            result = self._evaluate_remote(policy_name, input_data)
+            return result if result is not None else {"result": {"allow": False}}
+        except Exception as e:
+            logger.error(f"策略评估异常: {policy_name}, 错误: {e}")
+            return {"result": {"allow": False}}
+
+    def _data_url(self, policy_name: str, rule: str = None) -> str:
+        """策略数据路径，如 permission.abac -> /v1/data/permission/abac"""
+        path = policy_name.replace(".", "/")
+        if rule:
+            path = f"{path}/{rule}"
+        return f"{self.opa_url}/v1/data/{path}"
+
+    def _evaluate_remote(
+        self, policy_name: str, input_data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        通过OPA评估策略（带决策缓存）
+
+        Returns:
+            Optional[Dict[str, Any]]: OPA返回的结果；请求失败时返回None（不缓存），
+                由调用方决定拒绝
+        """
         try:
             start_time = time.time()
 
             # 检查缓存
             cache_key = self._generate_cache_key(policy_name, input_data)
+            cached_result = self._decision_cache.get(cache_key)
             with self._lock:
-                if cache_key in self._evaluation_cache:
-                    cached_result = self._evaluation_cache[cache_key]
-                    if datetime.now() - cached_result["timestamp"] < timedelta(
-                        seconds=self.cache_ttl
-                    ):
-                        self._metrics.cache_hits += 1
-                        return cached_result["result"]
+                if cached_result is not None:
+                    self._metrics.cache_hits += 1
+                    return cached_result
                 self._metrics.cache_misses += 1
 
-            url = f"{self.opa_url}/v1/data/{policy_name}"
-            headers = {"Content-Type": "application/json"}
-
-            response = requests.post(url, json=input_data, headers=headers, timeout=10)
+            self._ensure_maintenance_thread()
+            response = self._session.post(
+                self._data_url(policy_name), json=input_data, timeout=self.timeout
+            )
 
             if response.status_code == 200:
                 result = response.json()
 
                 # 更新缓存
-                with self._lock:
-                    self._evaluation_cache[cache_key] = {
-                        "result": result,
-                        "timestamp": datetime.now(),
-                    }
+                self._decision_cache.set(cache_key, result)
 
                 # 更新性能指标
                 response_time = (time.time() - start_time) * 1000  # 毫秒
@@ -237,13 +389,224 @@ class OPAPolicyManager:
                 )
                 self._update_metrics(False, 0)
                 self._record_policy_performance(policy_name, 0, False)
-                return {"result": {"allow": False}}
+                return None
 
         except Exception as e:
             logger.error(f"策略评估异常: {policy_name}, 错误: {e}")
             self._update_metrics(False, 0)
             self._record_policy_performance(policy_name, 0, False)
-            return {"result": {"allow": False}}
+            return None
+
+    def _residual_for(self, policy_name: str, input_doc: Dict[str, Any]):
+        """
+        获取用户的残余查询（OPA部分评估结果）
+
+        以用户属性为已知量、资源/操作/上下文为未知量调用 /v1/compile，
+        结果按 (策略, 用户) 缓存；之后同一用户的检查只需本地求值。
+
+        Returns:
+            残余查询谓词；无法获取或无法本地求值时返回None。只缓存OPA的
+            有效应答（含无法本地求值的残余查询），请求失败时不缓存
+        """
+        user = input_doc.get("user") or {}
+        key = f"residual:{policy_name}:{normalized_input_hash({'user': user})}"
+        predicate = self._residual_cache.get(key, _MISS)
+        if predicate is not _MISS:
+            return predicate
+
+        predicate = None
+        try:
+            self._ensure_maintenance_thread()
+            response = self._session.post(
+                f"{self.opa_url}/v1/compile",
+                json={
+                    "query": f"data.{policy_name}.allow == true",
+                    "input": {"user": user},
+                    "unknowns": PARTIAL_EVALUATION_UNKNOWNS,
+                },
+                timeout=self.timeout,
+            )
+            if response.status_code != 200:
+                logger.warning(
+                    f"OPA部分评估失败: {policy_name}, 状态码: {response.status_code}"
+                )
+                return None
+            predicate = compile_residual(response.json().get("result") or {})
+            self._local_stats["residual_compiled"] += 1
+        except PolicyCompileError as e:
+            self._local_stats["residual_unsupported"] += 1
+            logger.debug(f"残余查询无法本地求值: {policy_name}, 原因: {e}")
+        except Exception as e:
+            logger.warning(f"OPA部分评估异常: {policy_name}, 错误: {e}")
+            return None
+        self._residual_cache.set(key, predicate)
+        return predicate
+
+    def _decide(self, policy_name: str, input_doc: Dict[str, Any]) -> Optional[bool]:
+        """
+        不访问OPA数据接口的决策：本地策略 -> 残余查询 -> 决策缓存
+
+        Returns:
+            Optional[bool]: 无法在本地得出结论时返回None
+        """
+        local_result = self._local_evaluator.evaluate(policy_name, input_doc)
+        if local_result is not None:
+            return local_result
+
+        if self.partial_evaluation:
+            predicate = self._residual_for(policy_name, input_doc)
+            if predicate is not None:
+                self._local_stats["residual_evaluations"] += 1
+                return predicate(input_doc)
+
+        return self._decision_cache.get(
+            self._generate_cache_key(f"{policy_name}#allow", input_doc)
+        )
+
+    def _build_input(
+        self,
+        user: Dict[str, Any],
+        resource: Dict[str, Any],
+        action: str,
+        context: Dict[str, Any] = None,
+    ) -> Dict[str, Any]:
+        """构建 OPA 的 input 部分"""
+        now = datetime.now()
+        return {
+            "user": user,
+            "resource": resource,
+            "action": action,
+            "context": context or {},
+            "time": {
+                "timestamp": int(time.time()),
+                "weekday": now.weekday(),
+                "hour": now.hour,
+                "minute": now.minute,
+            },
+        }
+
+    @staticmethod
+    def _allow_from(result: Dict[str, Any]) -> bool:
+        """从策略文档中取出 allow"""
+        if "result" in result and "allow" in result["result"]:
+            return result["result"]["allow"]
+        logger.warning(f"策略评估结果格式异常: {result}")
+        return False
+
+    def check_permission(
+        self,
+        user: Dict[str, Any],
+        resource: Dict[str, Any],
+        action: str,
+        context: Dict[str, Any] = None,
+    ) -> bool:
+        """
+        检查权限
+
+        Args:
+            user: 用户信息
+            resource: 资源信息
+            action: 操作
+            context: 上下文信息
+
+        Returns:
+            bool: 是否允许访问
+        """
+        try:
+            input_doc = self._build_input(user, resource, action, context)
+            decision = self._decide("permission.abac", input_doc)
+            if decision is not None:
+                return decision
+
+            result = self._evaluate_remote("permission.abac", {"input": input_doc})
+            if result is None:
+                # OPA不可用时拒绝，但不缓存，恢复后立即重新评估
+                return False
+            allow = self._allow_from(result)
+            self._decision_cache.set(
+                self._generate_cache_key("permission.abac#allow", input_doc), allow
+            )
+            return allow
+
+        except Exception as e:
+            logger.error(f"权限检查异常: {e}")
+            return False
+
+    def check_permissions_batch(
+        self,
+        checks: List[Tuple[Dict[str, Any], Dict[str, Any], str, Dict[str, Any]]],
+        policy_name: str = "permission.abac",
+    ) -> List[bool]:
+        """
+        批量检查权限
+
+        本地无法决策的输入合并为一次请求，由策略中的 batch_allow 规则逐个评估。
+
+        Args:
+            checks: (user, resource, action, context) 列表
+            policy_name: 策略名称
+
+        Returns:
+            List[bool]: 与 checks 顺序一致的结果
+        """
+        inputs = [self._build_input(*check) for check in checks]
+        results: List[Optional[bool]] = []
+        pending = []
+        for index, input_doc in enumerate(inputs):
+            try:
+                decision = self._decide(policy_name, input_doc)
+            except Exception as e:
+                logger.error(f"权限检查异常: {e}")
+                decision = False
+            results.append(decision)
+            if decision is None:
+                pending.append(index)
+
+        if pending:
+            decisions = self._evaluate_remote_batch(
+                policy_name, [inputs[index] for index in pending]
+            )
+            if decisions is None:
+                # 请求失败：全部拒绝，不缓存
+                return [bool(result) for result in results]
+            for index, allow in zip(pending, decisions):
+                results[index] = allow
+                self._decision_cache.set(
+                    self._generate_cache_key(f"{policy_name}#allow", inputs[index]),
+                    allow,
+                )
+        return [bool(result) for result in results]
+
+    def _evaluate_remote_batch(
+        self, policy_name: str, inputs: List[Dict[str, Any]]
+    ) -> Optional[List[bool]]:
+        """一次请求评估多个输入，失败时返回None"""
+        start_time = time.time()
+        try:
+            self._ensure_maintenance_thread()
+            response = self._session.post(
+                self._data_url(policy_name, "batch_allow"),
+                json={"input": {"batch": inputs}},
+                timeout=self.timeout,
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"状态码: {response.status_code}")
+            decisions = response.json().get("result") or {}
+            if isinstance(decisions, list):
+                decisions = dict(enumerate(decisions))
+            else:
+                decisions = {int(key): value for key, value in decisions.items()}
+        except Exception as e:
+            logger.error(f"批量策略评估失败: {policy_name}, 数量: {len(inputs)}, 错误: {e}")
+            self._update_metrics(False, 0)
+            self._record_policy_performance(policy_name, 0, False)
+            return None
+
+        response_time = (time.time() - start_time) * 1000
+        self._update_metrics(True, response_time)
+        self._record_policy_performance(policy_name, response_time, True)
+        self._local_stats["batch_requests"] += 1
+        return [decisions.get(index) is True for index in range(len(inputs))]
 
     def _record_policy_performance(
         self, policy_name: str, response_time: float, success: bool
@@ -259,9 +622,9 @@ class OPAPolicyManager:
             )
 
     def _generate_cache_key(self, policy_name: str, input_data: Dict[str, Any]) -> str:
-        """生成缓存键"""
-        data_str = json.dumps(input_data, sort_keys=True)
-        return hashlib.md5(f"{policy_name}:{data_str}".encode()).hexdigest()
+        """生成缓存键（规范化输入哈希，忽略时间戳等易变字段）"""
+        input_doc = input_data.get("input", input_data)
+        return f"{policy_name}:{normalized_input_hash(input_doc)}"
 
     def _update_metrics(self, success: bool, response_time: float):
         """更新性能指标"""
@@ -303,56 +666,6 @@ class OPAPolicyManager:
 
             self._metrics.last_evaluation_time = datetime.now()
 
-    def check_permission(
-        self,
-        user: Dict[str, Any],
-        resource: Dict[str, Any],
-        action: str,
-        context: Dict[str, Any] = None,
-    ) -> bool:
-        """
-        检查权限
-
-        Args:
-            user: 用户信息
-            resource: 资源信息
-            action: 操作
-            context: 上下文信息
-
-        Returns:
-            bool: 是否允许访问
-        """
-        try:
-            # 构建输入数据
-            input_data = {
-                "input": {
-                    "user": user,
-                    "resource": resource,
-                    "action": action,
-                    "context": context or {},
-                    "time": {
-                        "timestamp": int(time.time()),
-                        "weekday": datetime.now().weekday(),
-                        "hour": datetime.now().hour,
-                        "minute": datetime.now().minute,
-                    },
-                }
-            }
-
-            # 评估策略
-            result = self.evaluate_policy("permission.abac", input_data)
-
-            # 检查结果
-            if "result" in result and "allow" in result["result"]:
-                return result["result"]["allow"]
-            else:
-                logger.warning(f"策略评估结果格式异常: {result}")
-                return False
-
-        except Exception as e:
-            logger.error(f"权限检查异常: {e}")
-            return False
-
     def get_policy_info(self, policy_name: str) -> Dict[str, Any]:
         """
         获取策略信息
@@ -365,7 +678,7 @@ class OPAPolicyManager:
         """
         try:
             url = f"{self.opa_url}/v1/policies/{policy_name}"
-            response = requests.get(url, timeout=5)
+            response = self._session.get(url, timeout=self.timeout)
 
             if response.status_code == 200:
                 return {
@@ -388,7 +701,7 @@ class OPAPolicyManager:
         """
         try:
             url = f"{self.opa_url}/v1/policies"
-            response = requests.get(url, timeout=5)
+            response = self._session.get(url, timeout=self.timeout)
 
             if response.status_code == 200:
                 policies = response.json()
@@ -413,7 +726,7 @@ class OPAPolicyManager:
         """
         try:
             url = f"{self.opa_url}/v1/policies/{policy_name}"
-            response = requests.delete(url, timeout=5)
+            response = self._session.delete(url, timeout=self.timeout)
 
             if response.status_code == 200:
                 logger.info(f"策略删除成功: {policy_name}")
@@ -469,8 +782,13 @@ class OPAPolicyManager:
         with self._lock:
             return {
                 "policy_cache_size": len(self._policy_cache),
-                "evaluation_cache_size": len(self._evaluation_cache),
+                "evaluation_cache_size": len(self._decision_cache),
+                "residual_cache_size": len(self._residual_cache),
+                "pool_size": self.pool_size,
+                "timeout": self.timeout,
+                "partial_evaluation": dict(self._local_stats),
                 "cache_ttl": self.cache_ttl,
+                "local_policies": self._local_evaluator.get_stats(),
                 "metrics": {
                     "total_evaluations": self._metrics.total_evaluations,
                     "successful_evaluations": self._metrics.successful_evaluations,
@@ -498,7 +816,8 @@ class OPAPolicyManager:
         with self._lock:
             self._policy_cache.clear()
             self._cache_timestamps.clear()
-            self._evaluation_cache.clear()
+            self._decision_cache.clear()
+            self._residual_cache.clear()
             logger.info("策略缓存已清除")
 
     def get_policy_performance_analysis(self, policy_name: str) -> Dict[str, Any]:
@@ -613,6 +932,7 @@ class OPAPolicyManager:
         self._smart_cache_config["max_cache_size"] = min(
             self._smart_cache_config["max_cache_size"] * 1.5, 2000
         )
+        self._decision_cache.max_size = int(self._smart_cache_config["max_cache_size"])
 
         # 预加载常用策略
         if self._smart_cache_config["preload_frequently_used"]:
@@ -620,78 +940,59 @@ class OPAPolicyManager:
 
     def _increase_timeout(self):
         """增加超时时间"""
-        # 这里可以调整请求超时时间
-        pass
+        self.timeout = min(self.timeout * 1.5, 10.0)
 
     def _preload_frequent_policies(self):
         """预加载常用策略"""
         # 实现预加载逻辑
         pass
 
-    def _start_policy_monitor(self):
-        """启动策略监控线程"""
-
-        def monitor_policies():
-            while True:
-                try:
-                    # 检查策略缓存是否过期
-                    current_time = datetime.now()
-                    expired_policies = []
-
-                    with self._lock:
-                        for policy_name, timestamp in self._cache_timestamps.items():
-                            if current_time - timestamp > timedelta(
-                                seconds=self.cache_ttl
-                            ):
-                                expired_policies.append(policy_name)
-
-                    # 重新加载过期的策略
-                    for policy_name in expired_policies:
-                        logger.debug(f"重新加载过期策略: {policy_name}")
-                        self.reload_policies()
-
-                    # 清理过期的评估缓存
-                    with self._lock:
-                        expired_evaluations = []
-                        for cache_key, cache_data in self._evaluation_cache.items():
-                            if current_time - cache_data["timestamp"] > timedelta(
-                                seconds=self.cache_ttl
-                            ):
-                                expired_evaluations.append(cache_key)
-
-                        for cache_key in expired_evaluations:
-                            del self._evaluation_cache[cache_key]
-
-                    time.sleep(60)  # 每分钟检查一次
-
-                except Exception as e:
-                    logger.error(f"策略监控异常: {e}")
-                    time.sleep(60)
-
-        monitor_thread = threading.Thread(target=monitor_policies, daemon=True)
-        monitor_thread.start()
-        logger.info("策略监控线程已启动")
-
-    def _start_adaptive_adjustment(self):
-        """启动自适应调整线程"""
-
-        def adaptive_adjustment():
-            while True:
-                try:
-                    # 执行自适应调整
+    def _ensure_maintenance_thread(self):
+        """第一次访问OPA时启动维护线程"""
+        if self._maintenance_thread is not None:
+            return
+        with self._lock:
+            if self._maintenance_thread is not None:
+                return
+            self._maintenance_thread = threading.Thread(
+                target=self._maintenance_loop, name="opa-maintenance", daemon=True
+            )
+            self._maintenance_thread.start()
+        logger.info("OPA策略维护线程已启动")
+
+    def _maintenance_loop(self):
+        """
+        维护线程：验证连接、重新加载过期策略、清理过期缓存（每分钟），
+        自适应调整（每5分钟）
+        """
+        self._validate_opa_connection()
+        last_adjustment = time.time()
+        while True:
+            time.sleep(60)
+            try:
+                # 检查策略缓存是否过期
+                current_time = datetime.now()
+                with self._lock:
+                    expired = any(
+                        current_time - timestamp > timedelta(seconds=self.cache_ttl)
+                        for timestamp in self._cache_timestamps.values()
+                    )
+                if expired:
+                    logger.debug("重新加载过期策略")
+                    self.reload_policies()
+
+                # 清理过期的决策和残余查询缓存
+                self._decision_cache.purge_expired()
+                self._residual_cache.purge_expired()
+
+                if time.time() - last_adjustment >= 300:
+                    last_adjustment = time.time()
                     result = self.adaptive_policy_adjustment()
                     if result["status"] == "adjusted":
                         logger.info(f"自适应策略调整: {result}")
 
-                    time.sleep(300)  # 每5分钟检查一次
-
-                except Exception as e:
-                    logger.error(f"自适应调整异常: {e}")
-                    time.sleep(300)
-
-        adjustment_thread = threading.Thread(target=adaptive_adjustment, daemon=True)
-        adjustment_thread.start()
-        logger.info("自适应调整线程已启动")
+            except Exception as e:
+                logger.error(f"策略维护异常: {e}")
 
 
 # 全局OPA策略管理器实例
@@ -0,0 +1,322 @@
+"""
+权限位图模块
+
+每个权限名以 Permission.id 作为稳定的位索引，权限集合编码为一个整数位图：
+- L1 缓存中保存 PermissionBits（仅一个 int），内存占用远小于 set[str]
+- Redis 中保存位图的原始字节，读写无需 gzip/JSON
+- 成员判断、并集、交集均为位运算
+
+位索引由 PermissionBitIndex 维护：权限注册和权限快照构建时写入（需要时显式调用
+reload 同步加载）；编码、解码和成员判断遇到未知权限名/位时只触发后台加载，
+不在请求线程中查询数据库。
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Set as AbstractSet
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Redis 位图格式标记（gzip 数据以 0x1f 0x8b 开头，不会冲突）
+BITMAP_MAGIC = b"\xb1"
+
+
+class PermissionBitIndex:
+    """
+    权限名 <-> 位索引映射
+
+    位索引直接取 Permission.id，因此多进程、多节点之间天然一致，
+    Redis 中的位图可以被任意进程解码。
+    """
+
+    def __init__(self, reload_interval: float = 5.0):
+        self.reload_interval = reload_interval
+        self._bits: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+        self._lock = threading.Lock()
+        self._last_reload = 0.0
+        self._reloading = False
+
+    def __len__(self) -> int:
+        return len(self._bits)
+
+    def register(self, name: str, permission_id: int):
+        """登记单个权限"""
+        self.register_many([(name, permission_id)])
+
+    def register_many(self, pairs: Iterable[Tuple[str, int]]):
+        """批量登记 (权限名, Permission.id)"""
+        with self._lock:
+            bits = dict(self._bits)
+            names = dict(self._names)
+            for name, permission_id in pairs:
+                if name is None or permission_id is None:
+                    continue
+                old = bits.get(name)
+                if old is not None and old != permission_id:
+                    names.pop(old, None)
+                bits[name] = permission_id
+                names[permission_id] = name
+            # 整体替换引用，读路径无需加锁
+            self._bits, self._names = bits, names
+
+    def bit(self, name: str) -> Optional[int]:
+        """获取权限名对应的位索引，未知时返回None并在后台重新加载"""
+        index = self._bits.get(name)
+        if index is None:
+            self.request_reload()
+        return index
+
+    def name(self, index: int) -> Optional[str]:
+        """获取位索引对应的权限名，未知时返回None并在后台重新加载"""
+        name = self._names.get(index)
+        if name is None:
+            self.request_reload()
+        return name
+
+    def encode(self, names: Iterable[str]) -> Optional[int]:
+        """
+        将权限名集合编码为位图
+
+        返回:
+            Optional[int]: 位图；存在无法编码的权限名时返回None
+        """
+        table = self._bits
+        bits = 0
+        for name in names:
+            index = table.get(name)
+            if index is None:
+                self.request_reload()
+                return None
+            bits |= 1 << index
+        return bits
+
+    def decode(self, bits: int) -> List[str]:
+        """将位图解码为权限名列表，只遍历已置位的位"""
+        names = self._names
+        result = []
+        missing = False
+        while bits:
+            low = bits & -bits
+            name = names.get(low.bit_length() - 1)
+            if name is None:
+                missing = True
+            else:
+                result.append(name)
+            bits ^= low
+        if missing:
+            self.request_reload()
+        return result
+
+    def reload(self, db_session=None, force: bool = False) -> bool:
+        """
+        从数据库重新加载映射（节流）
+
+        返回:
+            bool: 是否执行了加载
+        """
+        now = time.time()
+        if not force and now - self._last_reload < self.reload_interval:
+            return False
+        self._last_reload = now
+        try:
+            from app.blueprints.roles.models import Permission
+
+            if db_session is None:
+                from app.core.extensions import db
+
+                db_session = db.session
+            rows = db_session.query(Permission.name, Permission.id).all()
+        except RuntimeError:
+            # 不在应用上下文中
+            return False
+        except Exception as e:
+            logger.warning(f"权限位索引加载失败: {e}")
+            return False
+        self.register_many(rows)
+        return True
+
+    def request_reload(self):
+        """
+        在后台线程中重新加载映射（节流，同一时间最多一个加载线程）
+
+        仅在应用上下文中生效，加载线程会推入同一应用的上下文。
+        """
+        if self._reloading or time.time() - self._last_reload < self.reload_interval:
+            return
+        try:
+            from flask import current_app
+
+            app = current_app._get_current_object()
+        except (ImportError, RuntimeError):
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+
+        def run():
+            try:
+                with app.app_context():
+                    self.reload()
+            finally:
+                self._reloading = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def clear(self):
+        """清空映射（主要用于测试）"""
+        with self._lock:
+            self._bits, self._names = {}, {}
+            self._last_reload = 0.0
+
+
+_bit_index = PermissionBitIndex()
+
+
+def get_permission_bit_index() -> PermissionBitIndex:
+    """获取全局权限位索引"""
+    return _bit_index
+
+
+class PermissionBits(AbstractSet):
+    """
+    位图编码的不可变权限集合
+
+    实现 collections.abc.Set 接口，可以像 frozenset 一样使用 `in`、迭代和比较；
+    两个 PermissionBits 之间的并集/交集/差集/子集判断直接使用位运算。
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+
+    @classmethod
+    def from_names(cls, names: Iterable[str]) -> Optional["PermissionBits"]:
+        """由权限名构造，存在未知权限名时返回None"""
+        bits = _bit_index.encode(names)
+        return cls(bits) if bits is not None else None
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PermissionBits":
+        """由小端字节序位图构造"""
+        return cls(int.from_bytes(data, "little"))
+
+    def to_bytes(self) -> bytes:
+        """小端字节序位图"""
+        return self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little")
+
+    @classmethod
+    def _from_iterable(cls, iterable):
+        # 与普通集合运算的结果可能包含未登记的权限名，退化为 frozenset
+        return frozenset(iterable)
+
+    def __contains__(self, name) -> bool:
+        index = _bit_index._bits.get(name)
+        if index is None:
+            # 位图不可能包含未登记的权限；映射在后台刷新，避免热路径查询数据库
+            _bit_index.request_reload()
+            return False
+        return (self.bits >> index) & 1 == 1
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_bit_index.decode(self.bits))
+
+    def __len__(self) -> int:
+        return bin(self.bits).count("1")
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def __hash__(self) -> int:
+        return hash(self.bits)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PermissionBits):
+            return self.bits == other.bits
+        return super().__eq__(other)
+
+    def __le__(self, other) -> bool:
+        if isinstance(other, PermissionBits):
+            return self.bits & ~other.bits == 0
+        return super().__le__(other)
+
+    def __ge__(self, other) -> bool:
+        if isinstance(other, PermissionBits):
+            return other.bits & ~self.bits == 0
+        return super().__ge__(other)
+
+    def __or__(self, other):
+        if isinstance(other, PermissionBits):
+            return PermissionBits(self.bits | other.bits)
+        return super().__or__(other)
+
+    def __and__(self, other):
+        if isinstance(other, PermissionBits):
+            return PermissionBits(self.bits & other.bits)
+        return super().__and__(other)
+
+    def __sub__(self, other):
+        if isinstance(other, PermissionBits):
+            return PermissionBits(self.bits & ~other.bits)
+        return super().__sub__(other)
+
+    __ror__ = __or__
+    __rand__ = __and__
+
+    def issubset(self, other) -> bool:
+        return self <= other if isinstance(other, AbstractSet) else self <= set(other)
+
+    def issuperset(self, other) -> bool:
+        if isinstance(other, AbstractSet):
+            return self >= other
+        return all(name in self for name in other)
+
+    def union(self, *others):
+        result = self
+        for other in others:
+            result = result | (other if isinstance(other, AbstractSet) else set(other))
+        return result
+
+    def __repr__(self) -> str:
+        return f"PermissionBits({sorted(self)!r})"
+
+    def __reduce__(self):
+        return (PermissionBits, (self.bits,))
+
+
+EMPTY_BITS = PermissionBits(0)
+
+
+def to_permission_bits(
+    permissions: Iterable[str],
+) -> Union[PermissionBits, AbstractSet]:
+    """
+    尽可能将权限集合转换为位图
+
+    已是 PermissionBits 时原样返回；包含未登记的权限名时退化为 frozenset。
+    """
+    if isinstance(permissions, PermissionBits):
+        return permissions
+    encoded = PermissionBits.from_names(permissions)
+    if encoded is not None:
+        return encoded
+    return frozenset(permissions)
+
+
+def serialize_bits(permissions: PermissionBits) -> bytes:
+    """位图的 Redis 存储格式：标记字节 + 小端位图"""
+    return BITMAP_MAGIC + permissions.to_bytes()
+
+
+def is_serialized_bits(data: bytes) -> bool:
+    """判断 Redis 数据是否为位图格式"""
+    return data[:1] == BITMAP_MAGIC
+
+
+def deserialize_bits(data: bytes) -> PermissionBits:
+    """解析 serialize_bits 的输出"""
+    return PermissionBits.from_bytes(data[1:])
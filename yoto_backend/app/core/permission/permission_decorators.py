@@ -6,13 +6,20 @@
 
 import logging
 import time
+from collections.abc import Set as AbstractSet
 from functools import wraps
 from typing import Callable, List, Optional, Set, Dict, Any
 from flask import request, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from .hybrid_permission_cache import HybridPermissionCache, get_hybrid_cache
-from .permission_registry import batch_register_permissions
+from .permission_resolver import get_permission_resolver
+from .permission_expression import (
+    PermissionExpressionError,
+    compile_expression,
+    get_expression_cache,
+)
+from .permission_registry import declare_permissions
 from flask_jwt_extended import get_jwt
 
 logger = logging.getLogger(__name__)
@@ -66,10 +73,14 @@ def _require_permission_base(
         resource_check (Callable): 资源检查函数
         group (str): 权限组
         description (str): 权限描述
-        permission_names (List[str]): 权限名称列表，用于动态注册
+        permission_names (List[str]): 权限名称列表，登记到权限清单，启动时统一同步
     """
 
     def decorator(fn):
+        # 装饰时（模块导入）登记权限，请求路径不再写注册表
+        if permission_names:
+            declare_permissions(permission_names, group, description)
+
         @wraps(fn)
         @jwt_required()
         def wrapper(*args, **kwargs):
@@ -108,17 +119,14 @@ def _require_permission_base(
             if cache_key in g.permission_cache:
                 has_permission = g.permission_cache[cache_key]
             else:
-                # 使用全局单例获取用户权限，避免每次创建新实例
-                cache = get_hybrid_cache()
-
-                # 获取用户权限 - 统一使用复杂权限查询
+                # 获取用户权限 - 直接读取编译后的RBAC快照（权限位图，无需复制）
                 # 对于所有类型的权限检查，都获取用户的所有权限集合
-                user_permissions = cache._query_complex_permissions(
+                user_permissions = get_permission_resolver().resolve(
                     user_id, scope, scope_id
                 )
 
-                # 确保user_permissions是Set[str]类型
-                if not isinstance(user_permissions, set):
+                # 确保user_permissions是集合类型
+                if not isinstance(user_permissions, AbstractSet):
                     user_permissions = set()
 
                 # 使用传入的权限检查函数
@@ -152,26 +160,6 @@ def _require_permission_base(
                     f"权限检查响应时间过长: {response_time:.3f}s, 用户: {user_id}"
                 )
 
-            # 动态权限注册 - 在权限检查通过后批量注册权限
-            if has_permission and permission_names:
-                try:
-                    # 准备批量注册数据
-                    permissions_data = [
-                        {
-                            "name": permission_name,
-                            "group": group,
-                            "description": description,
-                        }
-                        for permission_name in permission_names
-                    ]
-
-                    # 批量注册权限
-                    batch_register_permissions(permissions_data)
-                    logger.debug(f"批量注册权限成功: {permission_names}")
-
-                except Exception as e:
-                    logger.warning(f"批量权限注册失败: {permission_names}, 错误: {e}")
-
             return fn(*args, **kwargs)
 
         return wrapper
@@ -368,25 +356,22 @@ def require_permission_with_expression(
 
     支持复杂的权限表达式，如: (admin OR moderator) AND (read OR write)
     使用主装饰器统一处理通用逻辑
-    """
-
-    # 表达式权限检查函数：使用evaluate_permission_expression评估表达式
-    def check_expression(user_permissions: Set[str]) -> bool:
-        return evaluate_permission_expression(expression, user_permissions)
 
-    # 从表达式中提取权限名称（简单实现）
-    def extract_permissions_from_expression(expr: str) -> List[str]:
-        """从表达式中提取权限名称"""
-        import re
+    异常:
+        PermissionExpressionError: 表达式语法错误，在装饰时抛出
+    """
 
-        # 简单的正则表达式提取权限名称
-        # 假设权限名称是字母、数字、下划线的组合
-        permissions = re.findall(r"\b[a-zA-Z_][a-zA-Z0-9_]*\b", expr)
-        # 过滤掉操作符和括号
-        operators = {"and", "or", "not", "AND", "OR", "NOT"}
-        return [p for p in permissions if p.lower() not in operators and p not in "()"]
+    # 表达式在装饰时编译一次，请求路径只做位运算求值；
+    # 语法错误直接抛出，避免路由以永远拒绝的状态上线
+    try:
+        compiled = compile_expression(expression)
+    except PermissionExpressionError as e:
+        logger.error(f"权限表达式解析失败: {expression}, 错误: {e}")
+        raise
+    permission_names = list(compiled.permission_names)
 
-    permission_names = extract_permissions_from_expression(expression)
+    def check_expression(user_permissions: Set[str]) -> bool:
+        return compiled.evaluate(user_permissions)
 
     return _require_permission_base(
         permission_check_func=check_expression,
@@ -444,13 +429,9 @@ def require_permission_with_expression_v2(
     )
 
 
-# 表达式缓存
-_expression_cache = {}
-
-
 def evaluate_permission_expression(expression: str, user_permissions: Set[str]) -> bool:
     """
-    评估权限表达式 - 使用安全的AST解析和缓存机制
+    评估权限表达式 - 编译结果按表达式文本缓存在有界LRU中
 
     支持的操作符: and, or, not, ()
     示例: (admin or moderator) and (read or write)
@@ -462,54 +443,9 @@ def evaluate_permission_expression(expression: str, user_permissions: Set[str])
     返回:
         bool: 表达式评估结果
     """
-    import ast
-
-    # 检查缓存
-    cache_key = (expression, frozenset(user_permissions))
-    if cache_key in _expression_cache:
-        return _expression_cache[cache_key]
-
-    def safe_eval(node, permissions):
-        """安全地评估AST节点"""
-        if isinstance(node, ast.Name):
-            # 变量名 - 检查是否在权限集合中
-            return node.id in permissions
-        elif isinstance(node, ast.BoolOp):
-            # 布尔操作 (and, or)
-            if isinstance(node.op, ast.And):
-                return all(safe_eval(value, permissions) for value in node.values)
-            elif isinstance(node.op, ast.Or):
-                return any(safe_eval(value, permissions) for value in node.values)
-        elif isinstance(node, ast.UnaryOp):
-            # 一元操作 (not)
-            if isinstance(node.op, ast.Not):
-                return not safe_eval(node.operand, permissions)
-        elif isinstance(node, ast.Constant):
-            # 常量
-            return bool(node.value)
-        elif isinstance(node, ast.Expression):
-            # 表达式
-            return safe_eval(node.body, permissions)
-
-        # 默认返回False
-        return False
-
     try:
-        # 预处理表达式 - 将AND/OR转换为Python语法
-        processed_expr = expression.lower()
-
-        # 解析AST
-        tree = ast.parse(processed_expr, mode="eval")
-
-        # 安全评估
-        result = safe_eval(tree, user_permissions)
-
-        # 缓存结果
-        _expression_cache[cache_key] = result
-
-        return result
-
-    except (SyntaxError, ValueError, TypeError) as e:
+        return compile_expression(expression).evaluate(user_permissions)
+    except PermissionExpressionError as e:
         logger.error(f"权限表达式解析失败: {expression}, 错误: {e}")
         return False
     except Exception as e:
@@ -519,8 +455,7 @@ def evaluate_permission_expression(expression: str, user_permissions: Set[str])
 
 def clear_expression_cache():
     """清空表达式缓存"""
-    global _expression_cache
-    _expression_cache.clear()
+    get_expression_cache().clear()
     logger.info("权限表达式缓存已清空")
 
 
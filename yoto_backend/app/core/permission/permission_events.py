@@ -4,17 +4,21 @@ RESILIENCE_EVENTS_CHANNEL = "permissions:resilience:events"
 # 可以预留未来的控制频道
 CONTROL_COMMANDS_CHANNEL = "permissions:control:commands"
 
+# 权限L1缓存失效广播频道
+PERMISSION_INVALIDATION_CHANNEL = "permissions:cache:invalidation"
+
 # in permission_events.py
 import os
 import socket
-from typing import Dict, Any
+import uuid
+from typing import Dict, Any, Iterable, Optional
 import time
 import json
 import redis
 import logging
 
 logger = logging.getLogger(__name__)
-from collections import defaultdict
+from collections import Counter, defaultdict
 from typing import Callable
 import threading
 
@@ -100,8 +104,14 @@ class EventSubscriber:
                 elif message_type == "message":
                     # 这才是我们真正要处理的业务消息
                     try:
-                        channel = message["channel"].decode("utf-8")
-                        data = json.loads(message["data"].decode("utf-8"))
+                        # 共享客户端可能开启了 decode_responses，兼容 str 与 bytes
+                        channel = message["channel"]
+                        if isinstance(channel, bytes):
+                            channel = channel.decode("utf-8")
+                        raw = message["data"]
+                        if isinstance(raw, bytes):
+                            raw = raw.decode("utf-8")
+                        data = json.loads(raw)
 
                         if channel in self.callbacks:
                             for callback in self.callbacks[channel]:
@@ -168,3 +178,160 @@ class EventSubscriber:
                 self.pubsub.close()
             except redis.exceptions.ConnectionError:
                 pass
+
+
+class InvalidationBus:
+    """
+    跨进程L1缓存失效总线
+
+    各进程的L1缓存互相独立，本进程失效后通过 Redis pub/sub 广播失效的用户ID和
+    角色ID，其他进程收到后只清理自己的L1（Redis由发起方清理）。
+
+    - 发布：publish 只把ID放入待发送集合，后台线程每 flush_interval 秒
+      合并为一条消息发送，批量失效不会产生消息风暴
+    - 版本号：每个进程的消息带递增序号，接收方发现序号不连续
+      （pub/sub 不保证送达）时调用 on_gap 全量清理，宁可多清不漏清
+    - 本进程发出的消息会被忽略，因为发布前已经在本地生效
+    """
+
+    EVENT_NAME = "permission_invalidation"
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        apply_callback: Callable[[Iterable[int], Iterable[int]], None],
+        on_gap: Optional[Callable[[], None]] = None,
+        channel: str = PERMISSION_INVALIDATION_CHANNEL,
+        flush_interval: float = 0.005,
+    ):
+        """
+        参数:
+            redis_client: Redis客户端
+            apply_callback: 收到远端失效时调用，参数为 (user_ids, role_ids)
+            on_gap: 发现消息丢失时调用，应清空本进程的全部L1
+            channel: 广播频道
+            flush_interval: 发送端合并窗口（秒）
+        """
+        self.publisher = EventPublisher(redis_client)
+        self.subscriber = EventSubscriber(redis_client)
+        self.apply_callback = apply_callback
+        self.on_gap = on_gap
+        self.channel = channel
+        self.flush_interval = flush_interval
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._pending_users = set()
+        self._pending_roles = set()
+        self._pending_lock = threading.Lock()
+        # 分配序号和发送在同一把锁内完成，保证消息按序号顺序发出
+        self._send_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._flusher = None
+        self._seq = 0
+        self._last_seq: Dict[str, int] = {}
+        self.stats = Counter()
+
+    def start(self):
+        """订阅频道并启动发送线程"""
+        if self._flusher is not None and self._flusher.is_alive():
+            return
+        self._stop.clear()
+        self.subscriber.subscribe(self.channel, self._handle_event)
+        self.subscriber.start()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="permission-invalidation-bus", daemon=True
+        )
+        self._flusher.start()
+
+    def stop(self):
+        """发送剩余消息并停止"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=1.0)
+        self.subscriber.stop()
+
+    def publish(self, user_ids: Iterable[int] = (), role_ids: Iterable[int] = ()):
+        """登记需要广播的失效，实际发送由后台线程合并完成"""
+        with self._pending_lock:
+            self._pending_users.update(user_ids)
+            self._pending_roles.update(role_ids)
+        self._wakeup.set()
+
+    def _flush_loop(self):
+        while not self._stop.is_set():
+            self._wakeup.wait()
+            if not self._stop.is_set():
+                # 合并窗口内的后续失效一起发送
+                time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """
+        立即发送待发送的失效
+
+        后台线程和直接调用方可能并发执行，发送锁覆盖取出待发送ID、分配序号和发送，
+        否则序号较大的消息可能先发出，接收方会误判为丢失并全量清理。
+        待发送集合仍由 _pending_lock 保护，publish 不会等待网络发送。
+        """
+        with self._send_lock:
+            with self._pending_lock:
+                if not self._pending_users and not self._pending_roles:
+                    return
+                users, self._pending_users = self._pending_users, set()
+                roles, self._pending_roles = self._pending_roles, set()
+            self._seq += 1
+            seq = self._seq
+
+            self.publisher.publish(
+                self.channel,
+                self.EVENT_NAME,
+                {
+                    "origin": self.origin,
+                    "seq": seq,
+                    "users": sorted(users),
+                    "roles": sorted(roles),
+                },
+                source_module="invalidation_bus",
+            )
+            self.stats["messages_sent"] += 1
+            self.stats["users_sent"] += len(users)
+            self.stats["roles_sent"] += len(roles)
+
+    def _handle_event(self, event: Dict[str, Any]):
+        if event.get("event_name") != self.EVENT_NAME:
+            return
+        payload = event.get("payload") or {}
+        origin = payload.get("origin")
+        if origin == self.origin:
+            return
+
+        self.stats["messages_received"] += 1
+        seq = payload.get("seq")
+        last = self._last_seq.get(origin)
+        self._last_seq[origin] = seq
+        if last is not None and seq != last + 1:
+            # 有消息丢失，无法确定丢了哪些ID，全量清理
+            self.stats["gaps"] += 1
+            logger.warning(
+                f"失效广播序号不连续: origin={origin}, last={last}, seq={seq}"
+            )
+            if self.on_gap is not None:
+                self.on_gap()
+            return
+
+        self.apply_callback(payload.get("users", []), payload.get("roles", []))
+        self.stats["users_applied"] += len(payload.get("users", []))
+        self.stats["roles_applied"] += len(payload.get("roles", []))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取总线统计"""
+        return {
+            "origin": self.origin,
+            "running": self._flusher is not None and self._flusher.is_alive(),
+            "seq": self._seq,
+            "peers": len(self._last_seq),
+            **self.stats,
+        }
@@ -0,0 +1,351 @@
+"""
+权限表达式编译模块
+
+将 `(admin or moderator) and not banned` 这类表达式编译一次，之后反复求值：
+- 词法/语法分析只在编译时执行一次，编译结果按表达式文本缓存在有界LRU中
+- 表达式同时展开为析取范式（DNF），每个合取项编码为一对位掩码
+  （必须拥有 / 必须没有），对 PermissionBits 求值只需几次整数位运算
+- DNF 项数过多时退化为编译后的闭包求值，也用于普通 set/frozenset
+- 支持一个表达式批量检查多个用户的权限集合
+
+语法：and / or / not（大小写不敏感）和括号，权限名可以包含点号，如 message.send
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from .permission_bitset import PermissionBits, get_permission_bit_index
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXPRESSION_CACHE_SIZE = 1024
+# DNF 展开的最大项数，超过后只使用闭包求值
+MAX_DNF_TERMS = 64
+
+_TOKEN_RE = re.compile(r"\s*(?:([()])|([A-Za-z_][\w.:\-]*))")
+_OPERATORS = {"and", "or", "not"}
+
+# 语法树节点：("name", 权限名) / ("not", 节点) / ("and"|"or", (节点, ...))
+Node = Tuple[str, Any]
+# DNF 合取项：(必须拥有的权限, 必须没有的权限)
+Term = Tuple[FrozenSet[str], FrozenSet[str]]
+
+
+class PermissionExpressionError(ValueError):
+    """权限表达式语法错误"""
+
+    pass
+
+
+class _DNFTooLarge(Exception):
+    pass
+
+
+def _tokenize(expression: str) -> List[str]:
+    """拆分词法单元，操作符统一为小写"""
+    tokens = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        match = _TOKEN_RE.match(expression, pos)
+        if match is None:
+            raise PermissionExpressionError(
+                f"无法识别的字符 {expression[pos:].strip()[:1]!r}（位置 {pos}）"
+            )
+        token = match.group(1) or match.group(2)
+        tokens.append(token.lower() if token.lower() in _OPERATORS else token)
+        pos = match.end()
+    return tokens
+
+
+class _Parser:
+    """递归下降解析：or < and < not < 括号/权限名"""
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise PermissionExpressionError("表达式为空")
+        node = self._or()
+        if self.pos < len(self.tokens):
+            raise PermissionExpressionError(f"多余的内容: {self.tokens[self.pos]!r}")
+        return node
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _binary(self, operator: str, operand: Callable[[], Node]) -> Node:
+        nodes = [operand()]
+        while self._peek() == operator:
+            self.pos += 1
+            nodes.append(operand())
+        return nodes[0] if len(nodes) == 1 else (operator, tuple(nodes))
+
+    def _or(self) -> Node:
+        return self._binary("or", self._and)
+
+    def _and(self) -> Node:
+        return self._binary("and", self._not)
+
+    def _not(self) -> Node:
+        if self._peek() == "not":
+            self.pos += 1
+            return ("not", self._not())
+        return self._atom()
+
+    def _atom(self) -> Node:
+        token = self._peek()
+        if token is None:
+            raise PermissionExpressionError("表达式不完整")
+        self.pos += 1
+        if token == "(":
+            node = self._or()
+            if self._peek() != ")":
+                raise PermissionExpressionError("缺少右括号")
+            self.pos += 1
+            return node
+        if token == ")" or token in _OPERATORS:
+            raise PermissionExpressionError(f"意外的 {token!r}")
+        return ("name", token)
+
+
+def _compile_program(node: Node) -> Callable[[Any], bool]:
+    """将语法树编译为闭包，适用于任意支持 `in` 的权限集合"""
+    kind, value = node
+    if kind == "name":
+        return lambda permissions: value in permissions
+    if kind == "not":
+        operand = _compile_program(value)
+        return lambda permissions: not operand(permissions)
+    parts = tuple(_compile_program(child) for child in value)
+    if kind == "and":
+        return lambda permissions: all(part(permissions) for part in parts)
+    return lambda permissions: any(part(permissions) for part in parts)
+
+
+def _to_dnf(node: Node, negate: bool = False) -> List[Term]:
+    """展开为析取范式，not 按德摩根律下推；项数超限时抛出 _DNFTooLarge"""
+    kind, value = node
+    if kind == "name":
+        name = frozenset([value])
+        return [(frozenset(), name)] if negate else [(name, frozenset())]
+    if kind == "not":
+        return _to_dnf(value, not negate)
+
+    children = [_to_dnf(child, negate) for child in value]
+    if (kind == "or") != negate:
+        terms = [term for child in children for term in child]
+    else:
+        terms = [(frozenset(), frozenset())]
+        for child in children:
+            terms = [
+                (required | child_required, forbidden | child_forbidden)
+                for required, forbidden in terms
+                for child_required, child_forbidden in child
+                if not (required | child_required) & (forbidden | child_forbidden)
+            ]
+            if len(terms) > MAX_DNF_TERMS:
+                raise _DNFTooLarge()
+    if len(terms) > MAX_DNF_TERMS:
+        raise _DNFTooLarge()
+    return list(dict.fromkeys(terms))
+
+
+class CompiledExpression:
+    """
+    编译后的权限表达式（不可变，可跨线程共享）
+
+    位掩码在第一次对 PermissionBits 求值时计算；位索引即 Permission.id，
+    全部权限名登记后掩码不再变化，之后直接复用。
+    """
+
+    __slots__ = ("expression", "permission_names", "_program", "_terms", "_masks")
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        tree = _Parser(_tokenize(expression)).parse()
+        self._program = _compile_program(tree)
+        try:
+            self._terms: Optional[List[Term]] = _to_dnf(tree)
+        except _DNFTooLarge:
+            self._terms = None
+        self._masks: Optional[List[Tuple[int, int]]] = None
+        self.permission_names: Tuple[str, ...] = tuple(
+            dict.fromkeys(_node_names(tree))
+        )
+
+    def __repr__(self) -> str:
+        return f"CompiledExpression({self.expression!r})"
+
+    def _bit_masks(self) -> Optional[List[Tuple[int, int]]]:
+        """
+        DNF 对应的 (必须拥有, 必须没有) 位掩码
+
+        返回:
+            DNF 超限时返回None；存在未登记的权限名时本次计算结果不缓存
+        """
+        if self._masks is not None or self._terms is None:
+            return self._masks
+        index = get_permission_bit_index()
+        masks = []
+        complete = True
+        for required, forbidden in self._terms:
+            must = forbid = 0
+            for name in required:
+                bit = index.bit(name)
+                if bit is None:
+                    # 位图中不可能包含未登记的权限，该项不会成立
+                    complete = False
+                    must = None
+                    break
+                must |= 1 << bit
+            if must is None:
+                continue
+            for name in forbidden:
+                bit = index.bit(name)
+                if bit is None:
+                    complete = False
+                    continue
+                forbid |= 1 << bit
+            masks.append((must, forbid))
+        if complete:
+            self._masks = masks
+        return masks
+
+    def evaluate(self, user_permissions) -> bool:
+        """
+        对单个权限集合求值
+
+        参数:
+            user_permissions: PermissionBits 或任意支持 `in` 的权限集合
+
+        返回:
+            bool: 表达式结果
+        """
+        if isinstance(user_permissions, PermissionBits):
+            masks = self._bit_masks()
+            if masks is not None:
+                bits = user_permissions.bits
+                for must, forbid in masks:
+                    if bits & must == must and not bits & forbid:
+                        return True
+                return False
+        return self._program(user_permissions)
+
+    __call__ = evaluate
+
+    def evaluate_many(self, permission_sets):
+        """
+        一个表达式批量检查多个权限集合，位掩码只计算一次
+
+        参数:
+            permission_sets: {键: 权限集合}（如 resolve_many 的结果）或权限集合序列
+
+        返回:
+            传入映射时返回 {键: bool}，否则返回 List[bool]
+        """
+        if isinstance(permission_sets, Mapping):
+            keys = list(permission_sets.keys())
+            results = self.evaluate_many(list(permission_sets.values()))
+            return dict(zip(keys, results))
+
+        masks = self._bit_masks()
+        program = self._program
+        results = []
+        for permissions in permission_sets:
+            if masks is not None and isinstance(permissions, PermissionBits):
+                bits = permissions.bits
+                results.append(
+                    any(
+                        bits & must == must and not bits & forbid
+                        for must, forbid in masks
+                    )
+                )
+            else:
+                results.append(program(permissions))
+        return results
+
+
+def _node_names(node: Node) -> Iterable[str]:
+    kind, value = node
+    if kind == "name":
+        yield value
+    elif kind == "not":
+        yield from _node_names(value)
+    else:
+        for child in value:
+            yield from _node_names(child)
+
+
+class ExpressionCache:
+    """按表达式文本缓存编译结果的有界LRU"""
+
+    def __init__(self, max_size: int = DEFAULT_EXPRESSION_CACHE_SIZE):
+        self.max_size = max(1, max_size)
+        self._entries: "OrderedDict[str, CompiledExpression]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, expression: str) -> CompiledExpression:
+        """
+        获取编译后的表达式，未命中时编译并缓存
+
+        异常:
+            PermissionExpressionError: 表达式语法错误（不缓存）
+        """
+        with self._lock:
+            compiled = self._entries.get(expression)
+            if compiled is not None:
+                self._entries.move_to_end(expression)
+                self.hits += 1
+                return compiled
+
+        compiled = CompiledExpression(expression)
+        with self._lock:
+            self.misses += 1
+            self._entries[expression] = compiled
+            self._entries.move_to_end(expression)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+_expression_cache = ExpressionCache()
+
+
+def get_expression_cache() -> ExpressionCache:
+    """获取全局表达式编译缓存"""
+    return _expression_cache
+
+
+def compile_expression(expression: str) -> CompiledExpression:
+    """编译权限表达式（带缓存）"""
+    return _expression_cache.get(expression)
+
+
+def evaluate_expression_many(expression: str, permission_sets):
+    """一个表达式批量检查多个权限集合，参见 CompiledExpression.evaluate_many"""
+    return compile_expression(expression).evaluate_many(permission_sets)
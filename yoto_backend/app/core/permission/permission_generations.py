@@ -0,0 +1,206 @@
+"""
+权限缓存代数（generation）模块
+
+为用户、角色和作用域（服务器/频道）各维护一个Redis计数器，计数器的值混入权限缓存键：
+- 失效只需对相关计数器执行一次 INCR，旧缓存键不再被访问，随TTL自然过期
+- 不再需要 SCAN 或逐个用户删除缓存，角色变更的开销与拥有该角色的用户数无关
+- 本进程缓存读取到的代数，过期后用一次 MGET 批量校验
+"""
+
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY_PREFIX = "perm_gen"
+
+# 代数引用：("user", 1) / ("role", 2) / ("server", 3) / ("channel", 4)
+GenerationRef = Tuple[str, Any]
+
+
+class GenerationStore:
+    """
+    代数计数器
+
+    读取走本地缓存（cache_ttl 秒），未命中的引用合并为一次 MGET；
+    本进程递增后立即更新本地缓存，其他进程在 cache_ttl 内或收到失效广播后可见。
+    Redis 不可用时退化为进程内计数。
+    本地缓存最多保留 max_entries 个引用，按最近刷新顺序淘汰（常用引用每个 cache_ttl
+    都会刷新一次，淘汰的是长期未访问的引用）。
+    """
+
+    def __init__(
+        self, redis_client=None, cache_ttl: float = 1.0, max_entries: int = 100000
+    ):
+        self.redis_client = redis_client
+        self.cache_ttl = cache_ttl
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[GenerationRef, Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = Counter()
+
+    def init_app(self, app):
+        """从 app.extensions 获取Redis客户端"""
+        self.redis_client = app.extensions.get("redis_client")
+        self.cache_ttl = app.config.get(
+            "PERMISSION_GENERATION_CACHE_TTL", self.cache_ttl
+        )
+        self.max_entries = app.config.get(
+            "PERMISSION_GENERATION_CACHE_SIZE", self.max_entries
+        )
+        app.extensions["permission_generations"] = self
+
+    @staticmethod
+    def redis_key(ref: GenerationRef) -> str:
+        """计数器的Redis键"""
+        kind, ident = ref
+        return f"{GENERATION_KEY_PREFIX}:{kind}:{ident}"
+
+    def get(self, kind: str, ident: Any) -> int:
+        """获取单个代数"""
+        ref = (kind, ident)
+        return self.get_many([ref])[ref]
+
+    def get_many(self, refs: Iterable[GenerationRef]) -> Dict[GenerationRef, int]:
+        """
+        批量获取代数
+
+        参数:
+            refs: 代数引用
+
+        返回:
+            Dict[GenerationRef, int]: 引用 -> 代数，不存在的计数器为0
+        """
+        now = time.time()
+        result = {}
+        missing = []
+        cache = self._cache
+        for ref in refs:
+            cached = cache.get(ref)
+            if cached is not None and cached[1] > now:
+                result[ref] = cached[0]
+            elif ref not in result:
+                missing.append(ref)
+
+        if missing:
+            self.stats["local_misses"] += len(missing)
+            values = self._fetch(missing)
+            expires_at = now + self.cache_ttl
+            with self._lock:
+                for ref, value in zip(missing, values):
+                    result[ref] = value
+                    self._store_locked(ref, value, expires_at)
+        return result
+
+    def _store_locked(self, ref: GenerationRef, value: int, expires_at: float):
+        """写入本地缓存并淘汰最久未刷新的引用（调用方持有 _lock）"""
+        cache = self._cache
+        cache[ref] = (value, expires_at)
+        cache.move_to_end(ref)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _fetch(self, refs: List[GenerationRef]) -> List[int]:
+        """从Redis批量读取（一次 MGET），失败时使用本地已知的值"""
+        client = self.redis_client
+        if client is None:
+            return [self._local_value(ref) for ref in refs]
+        keys = [self.redis_key(ref) for ref in refs]
+        try:
+            # 集群模式下计数器分布在不同槽位，使用非原子批量读取
+            if hasattr(client, "mget_nonatomic"):
+                raw = client.mget_nonatomic(keys)
+            else:
+                raw = client.mget(keys)
+            self.stats["mget_calls"] += 1
+        except Exception as e:
+            self.stats["redis_errors"] += 1
+            logger.warning(f"读取权限缓存代数失败: {e}")
+            return [self._local_value(ref) for ref in refs]
+        return [int(value) if value is not None else 0 for value in raw]
+
+    def _local_value(self, ref: GenerationRef) -> int:
+        cached = self._cache.get(ref)
+        return cached[0] if cached is not None else 0
+
+    def bump(self, kind: str, idents: Iterable[Any]) -> Dict[GenerationRef, int]:
+        """
+        递增代数（使相关缓存键全部失效）
+
+        参数:
+            kind: user / role / server / channel
+            idents: ID列表
+
+        返回:
+            Dict[GenerationRef, int]: 递增后的代数
+        """
+        refs = [(kind, ident) for ident in dict.fromkeys(idents)]
+        if not refs:
+            return {}
+
+        values = None
+        if self.redis_client is not None:
+            try:
+                pipe = self.redis_client.pipeline(transaction=False)
+                for ref in refs:
+                    pipe.incr(self.redis_key(ref))
+                values = [int(value) for value in pipe.execute()]
+            except Exception as e:
+                self.stats["redis_errors"] += 1
+                logger.warning(f"递增权限缓存代数失败，仅在本进程生效: {e}")
+        if values is None:
+            values = [self._local_value(ref) + 1 for ref in refs]
+
+        expires_at = time.time() + self.cache_ttl
+        with self._lock:
+            for ref, value in zip(refs, values):
+                self._store_locked(ref, value, expires_at)
+        self.stats["bumps"] += len(refs)
+        return dict(zip(refs, values))
+
+    def forget(self, refs: Iterable[GenerationRef]):
+        """丢弃本地缓存的代数，下次读取时重新从Redis获取"""
+        with self._lock:
+            for ref in refs:
+                self._cache.pop(ref, None)
+
+    def clear(self):
+        """清空本地缓存"""
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """代数缓存统计"""
+        return {
+            "cached_refs": len(self._cache),
+            "max_entries": self.max_entries,
+            "cache_ttl": self.cache_ttl,
+            "redis_enabled": self.redis_client is not None,
+            **self.stats,
+        }
+
+
+generation_store = GenerationStore()
+
+
+def get_generation_store() -> GenerationStore:
+    """获取全局代数计数器"""
+    return generation_store
+
+
+def generation_refs(
+    user_id: int,
+    scope: Optional[str],
+    scope_id: Optional[int],
+    role_ids: Iterable[int] = (),
+) -> List[GenerationRef]:
+    """权限缓存键依赖的代数引用：用户、作用域、用户持有的角色"""
+    refs = [("user", user_id)]
+    if scope and scope != "global" and scope_id is not None:
+        refs.append((scope, scope_id))
+    refs.extend(("role", role_id) for role_id in role_ids)
+    return refs
@@ -6,11 +6,15 @@
 
 import time
 import logging
-import json
-import uuid
+import random
+import zlib
 from typing import Dict, List, Optional, Set, Any
 from collections import defaultdict
 
+from redis.cluster import RedisCluster
+
+from .permission_keys import decode_perm_key, key_pattern
+
 # 导入缓存管理器
 try:
     from .hybrid_permission_cache import get_hybrid_cache
@@ -20,7 +24,12 @@ except ImportError:
 logger = logging.getLogger(__name__)
 
 # Redis键名常量
-DELAYED_INVALIDATION_QUEUE = "delayed_invalidation_queue"  # 现在是ZSET
+DELAYED_INVALIDATION_QUEUE = "delayed_invalidation_queue"  # 分片ZSET前缀
+DELAYED_INVALIDATION_META = "delayed_invalidation_meta"
+DELAYED_INVALIDATION_CLAIMS = "delayed_invalidation_claims"
+DEFAULT_QUEUE_SHARDS = 16
+# 认领后未确认的任务在该时间（秒）后重新回到队列
+DELAYED_INVALIDATION_CLAIM_TIMEOUT = 60
 INVALIDATION_STATS_KEY = "invalidation_stats"
 INVALIDATION_STATS_LOCK = "invalidation_stats_lock"
 # 反向索引键名
@@ -264,47 +273,281 @@ def _get_stats_lock():
     return f"{INVALIDATION_STATS_LOCK}:{int(time.time() // 60)}"  # 每分钟一个锁
 
 
+# ==================== 分片延迟失效队列 ====================
+#
+# 每个分片由同一哈希标签下的三个键组成：
+# - 队列 ZSET：成员为缓存键，分数为最近一次入队时间（后写覆盖，同一个键只排队一次）
+# - 元数据 HASH：缓存键 -> "缓存级别|首次入队时间|失效原因"
+# - 认领 ZSET：已被worker取出、尚未确认的缓存键，分数为认领截止时间
+# 反向索引也按分片存放（键名带分片哈希标签），入队、出队和索引维护都在分片内的
+# Lua脚本中原子完成，集群模式下不会跨槽。
+
+# 入队：KEYS = [队列, 元数据, 各条目的索引键...]
+# ARGV = [当前时间, 索引TTL, (缓存键, 缓存级别, 原因, 索引键数量) * N]
+_ENQUEUE_SCRIPT = """
+local queue, meta = KEYS[1], KEYS[2]
+local now, ttl = ARGV[1], tonumber(ARGV[2])
+local k, a, added = 3, 3, 0
+while a <= #ARGV do
+    local member, level, reason = ARGV[a], ARGV[a + 1], ARGV[a + 2]
+    local nidx = tonumber(ARGV[a + 3])
+    a = a + 4
+    local first = now
+    local old = redis.call("HGET", meta, member)
+    if old then
+        local old_level, old_first = string.match(old, "^([^|]*)|([^|]*)|")
+        if old_level and old_level ~= level then
+            level = "all"
+        end
+        first = old_first or now
+    else
+        added = added + 1
+    end
+    redis.call("ZADD", queue, now, member)
+    redis.call("HSET", meta, member, level .. "|" .. first .. "|" .. reason)
+    for i = k, k + nidx - 1 do
+        redis.call("SADD", KEYS[i], member)
+        redis.call("EXPIRE", KEYS[i], ttl)
+    end
+    k = k + nidx
+end
+return added
+"""
+
+# 出队并认领：先把认领超时的键放回队列，再取出到期的键移入认领集合
+# KEYS = [队列, 元数据, 认领]  ARGV = [当前时间, 最大分数, 数量, 认领截止时间]
+_POP_AND_CLAIM_SCRIPT = """
+local queue, meta, claims = KEYS[1], KEYS[2], KEYS[3]
+local now = ARGV[1]
+local expired = redis.call("ZRANGEBYSCORE", claims, "-inf", now)
+for _, member in ipairs(expired) do
+    redis.call("ZADD", queue, "NX", now, member)
+    redis.call("ZREM", claims, member)
+end
+local members = redis.call(
+    "ZRANGEBYSCORE", queue, "-inf", ARGV[2], "LIMIT", 0, tonumber(ARGV[3])
+)
+local result = {}
+for _, member in ipairs(members) do
+    redis.call("ZREM", queue, member)
+    redis.call("ZADD", claims, ARGV[4], member)
+    result[#result + 1] = member
+    result[#result + 1] = redis.call("HGET", meta, member) or ""
+end
+return result
+"""
+
+# 确认：移出认领集合；处理期间没有被重新入队的键同时删除元数据和索引
+# KEYS = [队列, 元数据, 认领, 各条目的索引键...]
+# ARGV = [是否同时移出队列, (缓存键, 索引键数量) * N]
+_ACK_SCRIPT = """
+local queue, meta, claims = KEYS[1], KEYS[2], KEYS[3]
+local force = ARGV[1] == "1"
+local k, a, removed = 4, 2, 0
+while a <= #ARGV do
+    local member, nidx = ARGV[a], tonumber(ARGV[a + 1])
+    a = a + 2
+    if force then
+        redis.call("ZREM", queue, member)
+    end
+    redis.call("ZREM", claims, member)
+    if not redis.call("ZSCORE", queue, member) then
+        if redis.call("HDEL", meta, member) == 1 then
+            removed = removed + 1
+        end
+        for i = k, k + nidx - 1 do
+            redis.call("SREM", KEYS[i], member)
+        end
+    end
+    k = k + nidx
+end
+return removed
+"""
+
+
+def _get_queue_shards() -> int:
+    """延迟失效队列分片数（修改后旧分片中的任务需先处理完）"""
+    try:
+        from flask import current_app
+
+        return int(
+            current_app.config.get(
+                "PERMISSION_INVALIDATION_QUEUE_SHARDS", DEFAULT_QUEUE_SHARDS
+            )
+        )
+    except Exception:
+        return DEFAULT_QUEUE_SHARDS
+
+
+def _shard_tag(shard: int) -> str:
+    return f"{{dinv:{shard}}}"
+
+
+def _queue_key(shard: int) -> str:
+    return f"{DELAYED_INVALIDATION_QUEUE}:{_shard_tag(shard)}"
+
+
+def _meta_key(shard: int) -> str:
+    return f"{DELAYED_INVALIDATION_META}:{_shard_tag(shard)}"
+
+
+def _claim_key(shard: int) -> str:
+    return f"{DELAYED_INVALIDATION_CLAIMS}:{_shard_tag(shard)}"
+
+
+def _shard_keys(shard: int) -> List[str]:
+    return [_queue_key(shard), _meta_key(shard), _claim_key(shard)]
+
+
+def _index_key(prefix: str, shard: int, value: Any) -> str:
+    """分片内的反向索引键，如 user_index:{dinv:3}:123"""
+    return f"{prefix}{_shard_tag(shard)}:{value}"
+
+
+def _shard_for(cache_key: str, shards: int) -> int:
+    """
+    缓存键所在分片
+
+    权限键按用户分片，同一用户的任务和用户索引总在同一分片；
+    其他键按CRC32分片。
+    """
+    decoded = decode_perm_key(cache_key)
+    if decoded is not None:
+        return decoded.user_id % shards
+    return zlib.crc32(cache_key.encode("utf-8")) % shards
+
+
+def _index_keys_for(cache_key: str, reason: Optional[str], shard: int) -> List[str]:
+    """缓存键在分片内所属的模式、用户、服务器和原因索引"""
+    index_keys = [_index_key(PATTERN_INDEX_PREFIX, shard, key_pattern(cache_key))]
+    decoded = decode_perm_key(cache_key)
+    if decoded is not None:
+        index_keys.append(_index_key(USER_INDEX_PREFIX, shard, decoded.user_id))
+        if decoded.scope == "server" and decoded.scope_id is not None:
+            index_keys.append(_index_key(SERVER_INDEX_PREFIX, shard, decoded.scope_id))
+    if reason:
+        index_keys.append(_index_key(REASON_INDEX_PREFIX, shard, reason))
+    return index_keys
+
+
+def _to_str(value) -> str:
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def _parse_meta(cache_key: str, meta, score: float = None) -> Dict[str, Any]:
+    """解析元数据为任务字典"""
+    level, first, reason = "l1", score, None
+    if meta:
+        parts = _to_str(meta).split("|", 2)
+        if len(parts) == 3:
+            level = parts[0] or "l1"
+            first = float(parts[1]) if parts[1] else score
+            reason = parts[2] or None
+    return {
+        "cache_key": cache_key,
+        "cache_level": level,
+        "reason": reason,
+        "timestamp": first if first is not None else time.time(),
+        "last_enqueued": score,
+        "processed": False,
+    }
+
+
+def _run_shard_scripts(redis_client, source: str, calls, pipe=None) -> List[Any]:
+    """
+    执行分片脚本
+
+    单节点模式下与 pipe 中的其他命令合并为一次往返（结果在 pipe 执行后返回）；
+    集群模式下逐个执行，每个脚本只访问所在分片的槽位。
+
+    参数:
+        redis_client: Redis客户端
+        source: Lua脚本
+        calls: [(keys, args), ...]
+        pipe: 可选的管道，单节点模式下脚本追加到该管道
+
+    返回:
+        List[Any]: 集群模式下为各脚本结果；管道模式下为空列表
+    """
+    script = redis_client.register_script(source)
+    if isinstance(redis_client, RedisCluster) or pipe is None:
+        return [
+            script(keys=keys, args=args, client=redis_client) for keys, args in calls
+        ]
+    for keys, args in calls:
+        script(keys=keys, args=args, client=pipe)
+    return []
+
+
 def add_delayed_invalidation(
     cache_key: str, cache_level: str = "l1", reason: str = None
 ):
     """
-    添加延迟失效到Redis队列（使用Sorted Set）
+    添加延迟失效到Redis队列（分片Sorted Set，同一个键去重）
 
     参数:
         cache_key (str): 缓存键
         cache_level (str): 缓存级别
         reason (str): 失效原因
     """
+    return add_delayed_invalidations([cache_key], cache_level, reason)
+
+
+def add_delayed_invalidations(
+    cache_keys: List[str], cache_level: str = "l1", reason: str = None
+) -> bool:
+    """
+    批量添加延迟失效
+
+    同一个键重复入队只更新分数（后写覆盖），缓存级别不同时合并为 all。
+    入队和反向索引维护按分片各执行一次脚本，连同统计更新在一个管道中提交。
+
+    参数:
+        cache_keys (List[str]): 缓存键列表
+        cache_level (str): 缓存级别
+        reason (str): 失效原因
+
+    返回:
+        bool: 是否成功
+    """
+    cache_keys = list(dict.fromkeys(cache_keys))
+    if not cache_keys:
+        return True
+
     redis_client = _get_redis_client()
     if not redis_client:
         logger.error("Redis客户端不可用，无法添加延迟失效")
         return False
 
     try:
-        # 创建失效任务
-        current_time = time.time()
-        invalidation_task = {
-            "cache_key": cache_key,
-            "cache_level": cache_level,
-            "reason": reason,
-            "timestamp": current_time,
-            "processed": False,
-        }
-
-        # 将任务添加到Redis Sorted Set队列
-        task_json = json.dumps(invalidation_task, ensure_ascii=False)
-        redis_client.zadd(DELAYED_INVALIDATION_QUEUE, {task_json: current_time})
-
-        # 更新反向索引
-        _update_reverse_indexes(redis_client, cache_key, reason)
-
-        # 更新统计信息
-        _update_stats("delayed_invalidations", 1)
-
-        # 记录入队速率
-        _record_rate_stats(redis_client, "in", 1)
+        now = time.time()
+        shards = _get_queue_shards()
+        reason_arg = reason or ""
+        calls = {}
+        for cache_key in cache_keys:
+            shard = _shard_for(cache_key, shards)
+            keys, args = calls.setdefault(shard, (_shard_keys(shard)[:2], [now, 86400]))
+            index_keys = _index_keys_for(cache_key, reason_arg, shard)
+            keys.extend(index_keys)
+            args.extend([cache_key, cache_level, reason_arg, len(index_keys)])
+
+        pipe = redis_client.pipeline(transaction=False)
+        added = _run_shard_scripts(redis_client, _ENQUEUE_SCRIPT, calls.values(), pipe)
+
+        # 统计与入队速率与脚本同一次往返提交
+        _update_stats("delayed_invalidations", len(cache_keys), pipe)
+        _record_rate_stats(pipe, "in", len(cache_keys))
+        results = pipe.execute()
+        if not added:
+            added = results[: len(calls)]
+        deduplicated = len(cache_keys) - sum(int(count or 0) for count in added)
+        if deduplicated:
+            _update_stats("deduplicated_invalidations", deduplicated)
 
-        logger.debug(f"添加延迟失效到Redis: {cache_key}, 原因: {reason}")
+        logger.debug(
+            f"添加延迟失效到Redis: {len(cache_keys)} 个键, 去重 {deduplicated} 个, "
+            f"原因: {reason}"
+        )
         return True
 
     except Exception as e:
@@ -312,15 +555,124 @@ def add_delayed_invalidation(
         return False
 
 
-def _update_stats(stat_type: str, increment: int = 1):
+def _pop_and_claim(
+    redis_client, batch_size: int, min_age: float = 0.0, max_score: float = None
+) -> List[Dict[str, Any]]:
+    """
+    从所有分片原子地取出到期任务并认领
+
+    每个分片最多取 ceil(batch_size / 分片数) 个，被取出的键移入认领集合，
+    其他worker不会再取到；确认前worker崩溃的任务在认领超时后回到队列。
+    """
+    shards = _get_queue_shards()
+    now = time.time()
+    if max_score is None:
+        max_score = now - min_age
+    per_shard = max(1, -(-batch_size // shards))
+    deadline = now + DELAYED_INVALIDATION_CLAIM_TIMEOUT
+    order = list(range(shards))
+    # 从随机分片开始，多个worker同时处理时减少争用
+    offset = random.randrange(shards)
+    order = order[offset:] + order[:offset]
+    calls = [
+        (_shard_keys(shard), [now, max_score, per_shard, deadline]) for shard in order
+    ]
+
+    pipe = redis_client.pipeline(transaction=False)
+    results = _run_shard_scripts(redis_client, _POP_AND_CLAIM_SCRIPT, calls, pipe)
+    if not results:
+        results = pipe.execute()
+
+    tasks = []
+    for shard, flat in zip(order, results):
+        for i in range(0, len(flat or ()), 2):
+            task = _parse_meta(_to_str(flat[i]), flat[i + 1])
+            task["shard"] = shard
+            tasks.append(task)
+    return tasks
+
+
+def _ack_tasks(redis_client, tasks: List[Dict[str, Any]], force: bool = False) -> int:
+    """
+    确认任务（删除元数据与反向索引）
+
+    参数:
+        redis_client: Redis客户端
+        tasks: 任务列表（需包含 cache_key、reason、shard）
+        force: 是否同时从队列移除（用于按索引批量处理、丢弃过期任务）
+
+    返回:
+        int: 删除的任务数
+    """
+    calls = {}
+    for task in tasks:
+        shard = task["shard"]
+        keys, args = calls.setdefault(
+            shard, (_shard_keys(shard), ["1" if force else "0"])
+        )
+        index_keys = _index_keys_for(task["cache_key"], task.get("reason"), shard)
+        keys.extend(index_keys)
+        args.extend([task["cache_key"], len(index_keys)])
+    if not calls:
+        return 0
+
+    pipe = redis_client.pipeline(transaction=False)
+    results = _run_shard_scripts(redis_client, _ACK_SCRIPT, calls.values(), pipe)
+    if not results:
+        results = pipe.execute()
+    return sum(int(count or 0) for count in results)
+
+
+def _queue_length(redis_client) -> int:
+    """所有分片的待处理任务数"""
+    pipe = redis_client.pipeline(transaction=False)
+    for shard in range(_get_queue_shards()):
+        pipe.zcard(_queue_key(shard))
+    return sum(int(count or 0) for count in pipe.execute())
+
+
+def _peek_tasks(redis_client, max_tasks: int = 100) -> List[Dict[str, Any]]:
+    """
+    查看各分片中最早的任务（不出队）
+
+    返回:
+        List[Dict[str, Any]]: 按最近入队时间排序的任务
+    """
+    shards = _get_queue_shards()
+    per_shard = max(1, -(-max_tasks // shards))
+    pipe = redis_client.pipeline(transaction=False)
+    for shard in range(shards):
+        pipe.zrange(_queue_key(shard), 0, per_shard - 1, withscores=True)
+    entries = pipe.execute()
+
+    pipe = redis_client.pipeline(transaction=False)
+    for shard, members in enumerate(entries):
+        if members:
+            pipe.hmget(_meta_key(shard), [member for member, _ in members])
+    metas = iter(pipe.execute())
+
+    tasks = []
+    for shard, members in enumerate(entries):
+        if not members:
+            continue
+        for (member, score), meta in zip(members, next(metas)):
+            task = _parse_meta(_to_str(member), meta, score)
+            task["shard"] = shard
+            tasks.append(task)
+    tasks.sort(key=lambda task: task["last_enqueued"])
+    return tasks[:max_tasks]
+
+
+def _update_stats(stat_type: str, increment: int = 1, redis_client=None):
     """
     更新Redis中的统计信息
 
     参数:
         stat_type (str): 统计类型
         increment (int): 增量
+        redis_client: 可选的客户端或管道，传入管道时随管道一起提交
     """
-    redis_client = _get_redis_client()
+    redis_client = redis_client or _get_redis_client()
     if not redis_client:
         return
 
@@ -356,6 +708,9 @@ def _get_stats():
             "delayed_invalidations": int(stats.get(b"delayed_invalidations", 0)),
             "immediate_invalidations": int(stats.get(b"immediate_invalidations", 0)),
             "batch_invalidations": int(stats.get(b"batch_invalidations", 0)),
+            "deduplicated_invalidations": int(
+                stats.get(b"deduplicated_invalidations", 0)
+            ),
         }
     except Exception as e:
         logger.error(f"获取统计信息失败: {e}")
@@ -385,7 +740,7 @@ def get_delayed_invalidation_stats() -> Dict[str, Any]:
 
     try:
         # 获取队列长度（Sorted Set的成员数量）
-        queue_length = redis_client.zcard(DELAYED_INVALIDATION_QUEUE)
+        queue_length = _queue_length(redis_client)
 
         # 获取统计信息
         stats = _get_stats()
@@ -455,7 +810,7 @@ def _analyze_delayed_queue(
 
     try:
         # 获取队列长度
-        queue_length = redis_client.zcard(DELAYED_INVALIDATION_QUEUE)
+        queue_length = _queue_length(redis_client)
         if queue_length == 0:
             return {
                 "tasks": [],
@@ -469,13 +824,8 @@ def _analyze_delayed_queue(
                 "valid_tasks": 0,
             }
 
-        # 分析的任务数量
-        analyze_count = min(max_tasks, queue_length)
-
-        # 获取任务进行分析（按时间戳排序，从最老的开始）
-        tasks = redis_client.zrange(
-            DELAYED_INVALIDATION_QUEUE, 0, analyze_count - 1, withscores=True
-        )
+        # 获取任务进行分析（按最近入队时间排序，从最老的开始）
+        tasks = _peek_tasks(redis_client, min(max_tasks, queue_length))
 
         # 分析结果
         key_patterns = defaultdict(int)
@@ -486,48 +836,28 @@ def _analyze_delayed_queue(
         server_activity = defaultdict(int)
         valid_tasks = []
 
-        for task_json, score in tasks:
-            try:
-                task = json.loads(task_json)
-                if not task.get("processed", False):
-                    valid_tasks.append(task)
-
-                    # 分析键模式
-                    key_parts = task["cache_key"].split(":")
-                    if len(key_parts) >= 2:
-                        pattern = f"{key_parts[0]}:{key_parts[1]}:*"
-                        key_patterns[pattern] += 1
-
-                    # 分析失效原因
-                    if task.get("reason"):
-                        reasons[task["reason"]] += 1
-
-                    # 分析缓存级别分布
-                    cache_levels[task.get("cache_level", "unknown")] += 1
-
-                    # 分析任务年龄
-                    task_age = current_time - task.get("timestamp", current_time)
-                    task_ages.append(task_age)
-
-                    # 分析用户活动模式
-                    if len(key_parts) >= 3 and key_parts[0] == "perm":
-                        try:
-                            user_id = int(key_parts[1])
-                            user_activity[user_id] += 1
-                        except (ValueError, IndexError):
-                            pass
-
-                    # 分析服务器活动模式
-                    if len(key_parts) >= 4 and key_parts[0] == "perm":
-                        try:
-                            server_id = int(key_parts[2])
-                            server_activity[server_id] += 1
-                        except (ValueError, IndexError):
-                            pass
-
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.warning(f"解析任务失败: {e}")
-                continue
+        for task in tasks:
+            valid_tasks.append(task)
+
+            # 分析键模式
+            key_patterns[key_pattern(task["cache_key"])] += 1
+            decoded = decode_perm_key(task["cache_key"])
+
+            # 分析失效原因
+            if task.get("reason"):
+                reasons[task["reason"]] += 1
+
+            # 分析缓存级别分布
+            cache_levels[task.get("cache_level", "unknown")] += 1
+
+            # 分析任务年龄（从首次入队算起）
+            task_ages.append(current_time - task["timestamp"])
+
+            # 分析用户和服务器活动模式
+            if decoded is not None:
+                user_activity[decoded.user_id] += 1
+                if decoded.scope == "server" and decoded.scope_id is not None:
+                    server_activity[decoded.scope_id] += 1
 
         return {
             "tasks": valid_tasks,
@@ -1052,12 +1382,18 @@ def _trigger_with_fallback(task_type: str, *args, **kwargs):
 
 # 保留原有的process_delayed_invalidations函数用于后台任务内部调用
 # 但将其标记为内部函数，不推荐外部直接调用
-def _process_delayed_invalidations_internal(batch_size: int = 100) -> Dict[str, Any]:
+def _process_delayed_invalidations_internal(
+    batch_size: int = 100, min_age: float = 0.0
+) -> Dict[str, Any]:
     """
     内部处理延迟失效队列（仅供后台任务使用）
 
+    任务通过出队认领脚本原子取出，多个worker可以并行处理而不会重复；
+    失效成功后确认，失败的任务在认领超时后重新回到队列。
+
     参数:
         batch_size (int): 批处理大小
+        min_age (float): 只处理最近一次入队超过该秒数的任务
 
     返回:
         Dict[str, Any]: 处理结果
@@ -1071,57 +1407,38 @@ def _process_delayed_invalidations_internal(batch_size: int = 100) -> Dict[str,
             results["execution_time"] = time.time() - start_time
             return results
 
-        # 获取待处理的失效项（按时间戳排序，从最老的开始）
-        pending_tasks = redis_client.zrange(
-            DELAYED_INVALIDATION_QUEUE, 0, batch_size - 1, withscores=True
-        )
-
-        if not pending_tasks:
+        tasks = _pop_and_claim(redis_client, batch_size, min_age=min_age)
+        if not tasks:
             results["execution_time"] = time.time() - start_time
             return results
 
         # 按缓存级别分组
-        l1_keys = []
-        l2_keys = []
-        task_jsons_to_remove = []
-
-        for task_json, score in pending_tasks:
-            try:
-                task = json.loads(task_json)
-                if not task.get("processed", False):
-                    if task["cache_level"] == "l1":
-                        l1_keys.append(task["cache_key"])
-                    else:
-                        l2_keys.append(task["cache_key"])
-                    task_jsons_to_remove.append(task_json)
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.warning(f"解析任务失败: {e}")
-                continue
+        keys_by_level = defaultdict(list)
+        for task in tasks:
+            keys_by_level[task["cache_level"]].append(task["cache_key"])
 
         # 使用缓存管理器的公共API执行失效
         cache_manager = _get_cache_manager()
         if cache_manager:
-            # 批量处理L1缓存
-            if l1_keys:
-                l1_results = cache_manager.invalidate_keys(l1_keys, cache_level="l1")
-                logger.debug(f"L1缓存失效: {l1_results['l1_invalidated']} 个成功")
-
-            # 批量处理L2缓存
-            if l2_keys:
-                l2_results = cache_manager.invalidate_keys(l2_keys, cache_level="l2")
-                logger.debug(f"L2缓存失效: {l2_results['l2_invalidated']} 个成功")
+            for cache_level, keys in keys_by_level.items():
+                level_results = cache_manager.invalidate_keys(
+                    keys, cache_level=cache_level
+                )
+                logger.debug(
+                    f"{cache_level}缓存失效: L1 {level_results['l1_invalidated']} 个, "
+                    f"L2 {level_results['l2_invalidated']} 个"
+                )
 
-        # 从队列中移除已处理的任务
-        if task_jsons_to_remove:
-            redis_client.zrem(DELAYED_INVALIDATION_QUEUE, *task_jsons_to_remove)
-            # 记录出队速率
-            _record_rate_stats(redis_client, "out", len(task_jsons_to_remove))
+        # 确认已处理的任务
+        _ack_tasks(redis_client, tasks)
+        _record_rate_stats(redis_client, "out", len(tasks))
 
-        results["processed_count"] = len(task_jsons_to_remove)
-        results["remaining_count"] = redis_client.zcard(DELAYED_INVALIDATION_QUEUE)
+        results["processed_count"] = len(tasks)
+        results["remaining_count"] = _queue_length(redis_client)
 
         logger.info(
-            f"处理延迟失效: {results['processed_count']} 个, 剩余: {results['remaining_count']} 个"
+            f"处理延迟失效: {results['processed_count']} 个, "
+            f"剩余: {results['remaining_count']} 个"
         )
 
     except Exception as e:
@@ -1156,7 +1473,7 @@ def process_delayed_invalidations(batch_size: int = 100) -> int:
 
 def cleanup_expired_invalidations(max_age: int = 3600) -> int:
     """
-    清理过期的失效记录（基于Sorted Set，高效实现，同时清理反向索引）
+    清理过期的失效记录（最近一次入队早于 max_age 的任务直接丢弃，同时清理反向索引）
 
     参数:
         max_age (int): 最大保留时间（秒）
@@ -1164,53 +1481,22 @@ def cleanup_expired_invalidations(max_age: int = 3600) -> int:
     返回:
         int: 实际清理的记录数量
     """
-    current_time = time.time()
-    cutoff_time = current_time - max_age
-
-    # 移除过期的失效记录
     redis_client = _get_redis_client()
     if not redis_client:
         return 0
 
     try:
-        # 获取要删除的过期任务（在删除前先获取内容）
-        expired_tasks = redis_client.zrangebyscore(
-            DELAYED_INVALIDATION_QUEUE,
-            "-inf",  # 最小分数
-            cutoff_time,  # 最大分数（过期时间）
-        )
-
-        if not expired_tasks:
-            logger.debug("没有发现过期的失效记录")
-            return 0
-
-        # 解析过期任务，提取cache_key用于清理反向索引
-        cache_keys_to_cleanup = []
-        for task_json in expired_tasks:
-            try:
-                task = json.loads(task_json)
-                cache_keys_to_cleanup.append(task["cache_key"])
-            except (json.JSONDecodeError, KeyError) as e:
-                logger.warning(f"解析过期任务失败: {e}")
-                continue
-
-        # 使用ZREMRANGEBYSCORE高效删除过期任务
-        expired_count = redis_client.zremrangebyscore(
-            DELAYED_INVALIDATION_QUEUE,
-            "-inf",  # 最小分数
-            cutoff_time,  # 最大分数（过期时间）
-        )
+        expired_count = 0
+        cutoff_time = time.time() - max_age
+        while True:
+            # 先认领再确认，与并行的处理worker互不重复
+            tasks = _pop_and_claim(redis_client, 1000, max_score=cutoff_time)
+            if not tasks:
+                break
+            expired_count += _ack_tasks(redis_client, tasks, force=True)
 
         if expired_count > 0:
-            # 清理反向索引中的过期记录
-            if cache_keys_to_cleanup:
-                _cleanup_reverse_indexes(redis_client, cache_keys_to_cleanup)
-                logger.info(
-                    f"清理过期失效记录: {expired_count} 个, 清理反向索引: {len(cache_keys_to_cleanup)} 个键"
-                )
-            else:
-                logger.info(f"清理过期失效记录: {expired_count} 个")
-
+            logger.info(f"清理过期失效记录: {expired_count} 个")
             _update_stats("delayed_invalidations", -expired_count)  # 更新统计
         else:
             logger.debug("没有发现过期的失效记录")
@@ -1222,78 +1508,11 @@ def cleanup_expired_invalidations(max_age: int = 3600) -> int:
         return 0
 
 
-def _cleanup_reverse_indexes(redis_client, cache_keys: List[str]):
-    """
-    清理反向索引中的键（增强版，支持批量清理）
-
-    参数:
-        redis_client: Redis客户端
-        cache_keys (List[str]): 要清理的缓存键列表
-    """
-    try:
-        # 按索引类型分组，提高清理效率
-        reason_keys_to_clean = set()
-        user_keys_to_clean = set()
-        server_keys_to_clean = set()
-        pattern_keys_to_clean = set()
-
-        for cache_key in cache_keys:
-            # 解析缓存键
-            key_parts = cache_key.split(":")
-
-            # 收集所有可能的索引键
-            if len(key_parts) >= 2:
-                pattern_keys_to_clean.add(f"{key_parts[0]}:{key_parts[1]}:*")
-
-            # 收集用户索引键
-            if len(key_parts) >= 3 and key_parts[0] == "perm":
-                try:
-                    user_id = int(key_parts[1])
-                    user_keys_to_clean.add(user_id)
-                except (ValueError, IndexError):
-                    pass
-
-            # 收集服务器索引键
-            if len(key_parts) >= 4 and key_parts[0] == "perm":
-                try:
-                    server_id = int(key_parts[2])
-                    server_keys_to_clean.add(server_id)
-                except (ValueError, IndexError):
-                    pass
-
-        # 批量清理模式索引
-        for pattern in pattern_keys_to_clean:
-            pattern_index_key = f"{PATTERN_INDEX_PREFIX}{pattern}"
-            for cache_key in cache_keys:
-                redis_client.srem(pattern_index_key, cache_key)
-
-        # 批量清理用户索引
-        for user_id in user_keys_to_clean:
-            user_index_key = f"{USER_INDEX_PREFIX}{user_id}"
-            for cache_key in cache_keys:
-                redis_client.srem(user_index_key, cache_key)
-
-        # 批量清理服务器索引
-        for server_id in server_keys_to_clean:
-            server_index_key = f"{SERVER_INDEX_PREFIX}{server_id}"
-            for cache_key in cache_keys:
-                redis_client.srem(server_index_key, cache_key)
-
-        # 清理原因索引（需要从任务中获取原因信息）
-        # 注意：这里我们无法直接清理原因索引，因为原因信息在任务JSON中
-        # 在实际使用中，原因索引的清理主要依赖于任务处理时的清理
-
-        logger.debug(
-            f"清理反向索引完成: 模式索引 {len(pattern_keys_to_clean)} 个, 用户索引 {len(user_keys_to_clean)} 个, 服务器索引 {len(server_keys_to_clean)} 个"
-        )
-
-    except Exception as e:
-        logger.error(f"清理反向索引失败: {e}")
-
-
 def cleanup_orphaned_reverse_indexes():
     """
-    清理孤立的反向索引（清理那些在主队列中不存在的键）
+    清理孤立的反向索引（清理那些在队列元数据中不存在的键）
+
+    正常情况下索引与队列在同一脚本中维护，只有原因变更或异常中断才会留下孤立项。
 
     返回:
         Dict[str, Any]: 清理结果
@@ -1303,105 +1522,39 @@ def cleanup_orphaned_reverse_indexes():
         if not redis_client:
             return {"status": "failed", "error": "Redis连接不可用"}
 
-        # 获取主队列中的所有cache_key
-        all_tasks = redis_client.zrange(
-            DELAYED_INVALIDATION_QUEUE, 0, -1, withscores=True
-        )
-        valid_cache_keys = set()
-
-        for task_json, score in all_tasks:
-            try:
-                task = json.loads(task_json)
-                valid_cache_keys.add(task["cache_key"])
-            except (json.JSONDecodeError, KeyError):
-                continue
-
-        # 清理各种反向索引中的孤立键
         cleaned_stats = {
             "reason_index": 0,
             "user_index": 0,
             "server_index": 0,
             "pattern_index": 0,
         }
+        prefixes = {
+            REASON_INDEX_PREFIX: "reason_index",
+            USER_INDEX_PREFIX: "user_index",
+            SERVER_INDEX_PREFIX: "server_index",
+            PATTERN_INDEX_PREFIX: "pattern_index",
+        }
 
-        # 清理原因索引
-        try:
-            reason_keys = redis_client.keys(
-                f"{RATE_STATS_PREFIX}{REASON_INDEX_PREFIX}*"
-            )
-            for reason_key in reason_keys:
-                reason_name = reason_key.decode("utf-8").split(":")[-1]
-                index_key = f"{REASON_INDEX_PREFIX}{reason_name}"
-                orphaned_keys = redis_client.smembers(index_key)
-
-                for orphaned_key in orphaned_keys:
-                    cache_key = (
-                        orphaned_key.decode("utf-8")
-                        if isinstance(orphaned_key, bytes)
-                        else orphaned_key
-                    )
-                    if cache_key not in valid_cache_keys:
-                        redis_client.srem(index_key, cache_key)
-                        cleaned_stats["reason_index"] += 1
-        except Exception as e:
-            logger.error(f"清理原因索引失败: {e}")
-
-        # 清理用户索引
-        try:
-            user_keys = redis_client.keys(f"{USER_INDEX_PREFIX}*")
-            for user_key in user_keys:
-                user_id = user_key.decode("utf-8").split(":")[-1]
-                orphaned_keys = redis_client.smembers(user_key)
-
-                for orphaned_key in orphaned_keys:
-                    cache_key = (
-                        orphaned_key.decode("utf-8")
-                        if isinstance(orphaned_key, bytes)
-                        else orphaned_key
-                    )
-                    if cache_key not in valid_cache_keys:
-                        redis_client.srem(user_key, cache_key)
-                        cleaned_stats["user_index"] += 1
-        except Exception as e:
-            logger.error(f"清理用户索引失败: {e}")
-
-        # 清理服务器索引
-        try:
-            server_keys = redis_client.keys(f"{SERVER_INDEX_PREFIX}*")
-            for server_key in server_keys:
-                server_id = server_key.decode("utf-8").split(":")[-1]
-                orphaned_keys = redis_client.smembers(server_key)
-
-                for orphaned_key in orphaned_keys:
-                    cache_key = (
-                        orphaned_key.decode("utf-8")
-                        if isinstance(orphaned_key, bytes)
-                        else orphaned_key
-                    )
-                    if cache_key not in valid_cache_keys:
-                        redis_client.srem(server_key, cache_key)
-                        cleaned_stats["server_index"] += 1
-        except Exception as e:
-            logger.error(f"清理服务器索引失败: {e}")
-
-        # 清理模式索引
-        try:
-            pattern_keys = redis_client.keys(f"{PATTERN_INDEX_PREFIX}*")
-            for pattern_key in pattern_keys:
-                pattern_name = pattern_key.decode("utf-8").split(":")[-1]
-                orphaned_keys = redis_client.smembers(pattern_key)
-
-                for orphaned_key in orphaned_keys:
-                    cache_key = (
-                        orphaned_key.decode("utf-8")
-                        if isinstance(orphaned_key, bytes)
-                        else orphaned_key
-                    )
-                    if cache_key not in valid_cache_keys:
-                        redis_client.srem(pattern_key, cache_key)
-                        cleaned_stats["pattern_index"] += 1
-        except Exception as e:
-            logger.error(f"清理模式索引失败: {e}")
+        for shard in range(_get_queue_shards()):
+            meta_key = _meta_key(shard)
+            for prefix, stat_name in prefixes.items():
+                try:
+                    match = f"{prefix}{_shard_tag(shard)}:*"
+                    for index_key in redis_client.scan_iter(match=match):
+                        members = list(redis_client.smembers(index_key))
+                        if not members:
+                            continue
+                        exists = redis_client.hmget(meta_key, members)
+                        orphaned = [
+                            member
+                            for member, meta in zip(members, exists)
+                            if meta is None
+                        ]
+                        if orphaned:
+                            redis_client.srem(index_key, *orphaned)
+                            cleaned_stats[stat_name] += len(orphaned)
+                except Exception as e:
+                    logger.error(f"清理{stat_name}失败: {e}")
 
         total_cleaned = sum(cleaned_stats.values())
         logger.info(f"清理孤立反向索引完成: {total_cleaned} 个孤立键")
@@ -1448,10 +1601,7 @@ def get_cache_auto_tune_suggestions() -> Dict[str, Any]:
     # 分析失效模式
     key_patterns = defaultdict(int)
     for task in recent_invalidations:
-        key_parts = task["cache_key"].split(":")
-        if len(key_parts) >= 2:
-            pattern = f"{key_parts[0]}:{key_parts[1]}"
-            key_patterns[pattern] += 1
+        key_patterns[key_pattern(task["cache_key"])] += 1
 
     for pattern, count in key_patterns.items():
         if count > 20:
@@ -1768,130 +1918,11 @@ def _execute_recommendation(recommendation: Dict[str, Any]) -> Dict[str, Any]:
         }
 
 
-def _update_reverse_indexes(redis_client, cache_key: str, reason: str = None):
-    """
-    更新反向索引
-
-    参数:
-        redis_client: Redis客户端
-        cache_key (str): 缓存键
-        reason (str): 失效原因
-    """
-    try:
-        # 解析缓存键
-        key_parts = cache_key.split(":")
-
-        # 更新原因索引
-        if reason:
-            reason_index_key = f"{REASON_INDEX_PREFIX}{reason}"
-            redis_client.sadd(reason_index_key, cache_key)
-            redis_client.expire(reason_index_key, 86400)  # 24小时过期
-
-        # 更新用户索引
-        if len(key_parts) >= 3 and key_parts[0] == "perm":
-            try:
-                user_id = int(key_parts[1])
-                user_index_key = f"{USER_INDEX_PREFIX}{user_id}"
-                redis_client.sadd(user_index_key, cache_key)
-                redis_client.expire(user_index_key, 86400)  # 24小时过期
-            except (ValueError, IndexError):
-                pass
-
-        # 更新服务器索引
-        if len(key_parts) >= 4 and key_parts[0] == "perm":
-            try:
-                server_id = int(key_parts[2])
-                server_index_key = f"{SERVER_INDEX_PREFIX}{server_id}"
-                redis_client.sadd(server_index_key, cache_key)
-                redis_client.expire(server_index_key, 86400)  # 24小时过期
-            except (ValueError, IndexError):
-                pass
-
-        # 更新模式索引
-        if len(key_parts) >= 2:
-            pattern = f"{key_parts[0]}:{key_parts[1]}:*"
-            pattern_index_key = f"{PATTERN_INDEX_PREFIX}{pattern}"
-            redis_client.sadd(pattern_index_key, cache_key)
-            redis_client.expire(pattern_index_key, 86400)  # 24小时过期
-
-    except Exception as e:
-        logger.error(f"更新反向索引失败: {e}")
-
-
-def _cleanup_reverse_indexes(redis_client, cache_keys: List[str]):
-    """
-    清理反向索引中的键（增强版，支持批量清理）
-
-    参数:
-        redis_client: Redis客户端
-        cache_keys (List[str]): 要清理的缓存键列表
-    """
-    try:
-        # 按索引类型分组，提高清理效率
-        reason_keys_to_clean = set()
-        user_keys_to_clean = set()
-        server_keys_to_clean = set()
-        pattern_keys_to_clean = set()
-
-        for cache_key in cache_keys:
-            # 解析缓存键
-            key_parts = cache_key.split(":")
-
-            # 收集所有可能的索引键
-            if len(key_parts) >= 2:
-                pattern_keys_to_clean.add(f"{key_parts[0]}:{key_parts[1]}:*")
-
-            # 收集用户索引键
-            if len(key_parts) >= 3 and key_parts[0] == "perm":
-                try:
-                    user_id = int(key_parts[1])
-                    user_keys_to_clean.add(user_id)
-                except (ValueError, IndexError):
-                    pass
-
-            # 收集服务器索引键
-            if len(key_parts) >= 4 and key_parts[0] == "perm":
-                try:
-                    server_id = int(key_parts[2])
-                    server_keys_to_clean.add(server_id)
-                except (ValueError, IndexError):
-                    pass
-
-        # 批量清理模式索引
-        for pattern in pattern_keys_to_clean:
-            pattern_index_key = f"{PATTERN_INDEX_PREFIX}{pattern}"
-            for cache_key in cache_keys:
-                redis_client.srem(pattern_index_key, cache_key)
-
-        # 批量清理用户索引
-        for user_id in user_keys_to_clean:
-            user_index_key = f"{USER_INDEX_PREFIX}{user_id}"
-            for cache_key in cache_keys:
-                redis_client.srem(user_index_key, cache_key)
-
-        # 批量清理服务器索引
-        for server_id in server_keys_to_clean:
-            server_index_key = f"{SERVER_INDEX_PREFIX}{server_id}"
-            for cache_key in cache_keys:
-                redis_client.srem(server_index_key, cache_key)
-
-        # 清理原因索引（需要从任务中获取原因信息）
-        # 注意：这里我们无法直接清理原因索引，因为原因信息在任务JSON中
-        # 在实际使用中，原因索引的清理主要依赖于任务处理时的清理
-
-        logger.debug(
-            f"清理反向索引完成: 模式索引 {len(pattern_keys_to_clean)} 个, 用户索引 {len(user_keys_to_clean)} 个, 服务器索引 {len(server_keys_to_clean)} 个"
-        )
-
-    except Exception as e:
-        logger.error(f"清理反向索引失败: {e}")
-
-
 def _process_batch_by_index(
     redis_client, index_type: str, index_value: str, error_message: str
 ) -> tuple[List[str], int]:
     """
-    通用的批量失效处理函数（基于反向索引）
+    通用的批量失效处理函数（基于分片反向索引）
 
     参数:
         redis_client: Redis客户端
@@ -1903,36 +1934,38 @@ def _process_batch_by_index(
         tuple[List[str], int]: (要失效的键列表, 移除的任务数)
     """
     try:
-        # 根据索引类型构建索引键
-        if index_type == "pattern":
-            index_key = f"{PATTERN_INDEX_PREFIX}{index_value}"
-        elif index_type == "reason":
-            index_key = f"{REASON_INDEX_PREFIX}{index_value}"
-        elif index_type == "user":
-            index_key = f"{USER_INDEX_PREFIX}{index_value}"
-        elif index_type == "server":
-            index_key = f"{SERVER_INDEX_PREFIX}{index_value}"
-        else:
+        prefixes = {
+            "pattern": PATTERN_INDEX_PREFIX,
+            "reason": REASON_INDEX_PREFIX,
+            "user": USER_INDEX_PREFIX,
+            "server": SERVER_INDEX_PREFIX,
+        }
+        prefix = prefixes.get(index_type)
+        if prefix is None:
             logger.error(f"未知的索引类型: {index_type}")
             return [], 0
 
-        # 使用反向索引获取匹配的键
-        keys_to_invalidate = redis_client.smembers(index_key)
+        shards = _get_queue_shards()
+        if index_type == "user":
+            # 用户的任务只会在一个分片中
+            candidate_shards = [int(index_value) % shards]
+        else:
+            candidate_shards = range(shards)
 
+        # 使用反向索引获取匹配的键
+        pipe = redis_client.pipeline(transaction=False)
+        for shard in candidate_shards:
+            pipe.smembers(_index_key(prefix, shard, index_value))
+        members_by_shard = pipe.execute()
+
+        keys_to_invalidate = []
+        for shard, members in zip(candidate_shards, members_by_shard):
+            keys_to_invalidate.extend(_to_str(member) for member in members)
         if not keys_to_invalidate:
             return [], 0
 
-        # 转换为字符串列表
-        keys_to_invalidate = [
-            key.decode("utf-8") if isinstance(key, bytes) else key
-            for key in keys_to_invalidate
-        ]
-
-        # 从队列中移除相关任务
-        removed_tasks = _remove_tasks_by_keys_lua(redis_client, keys_to_invalidate)
-
-        # 清理反向索引
-        _cleanup_reverse_indexes(redis_client, keys_to_invalidate)
+        # 从队列中移除相关任务，同时清理反向索引
+        removed_tasks = _remove_tasks_by_keys(redis_client, keys_to_invalidate)
 
         return keys_to_invalidate, removed_tasks
 
@@ -2005,32 +2038,9 @@ def _process_server_batch(redis_client, server_id: int) -> tuple[List[str], int]
     )
 
 
-def _remove_tasks_by_keys_lua(redis_client, cache_keys: List[str]) -> int:
-    if not cache_keys:
-        return 0
-
-    # 1. 将待删除的 keys 存入一个临时的 Redis Set
-    temp_key_set = f"temp_remove_keys:{uuid.uuid4()}"
-    redis_client.sadd(temp_key_set, *cache_keys)
-    redis_client.expire(temp_key_set, 60)  # 设置短暂过期，以防万一
-
-    # 2. 加载并执行 Lua 脚本
-    lua_script = "remove_tasks_by_keys.lua"
-    try:
-        # redis-py 的 evalsha 会自动处理脚本加载和缓存
-        remover_sha = redis_client.script_load(lua_script)
-        removed_count = redis_client.evalsha(
-            remover_sha, 1, temp_key_set, DELAYED_INVALIDATION_QUEUE
-        )
-        return removed_count
-    finally:
-        # 3. 清理临时 Set
-        redis_client.delete(temp_key_set)
-
-
 def _remove_tasks_by_keys(redis_client, cache_keys: List[str]) -> int:
     """
-    根据缓存键从队列中移除任务（基于Sorted Set）
+    根据缓存键从队列中移除任务（含认领中的任务）并清理反向索引
 
     参数:
         redis_client: Redis客户端
@@ -2039,34 +2049,24 @@ def _remove_tasks_by_keys(redis_client, cache_keys: List[str]) -> int:
     返回:
         int: 移除的任务数
     """
-    removed_tasks = 0
-
     try:
-        # 获取队列中的所有任务
-        all_tasks = redis_client.zrange(
-            DELAYED_INVALIDATION_QUEUE, 0, -1, withscores=True
-        )
-        cache_keys_set = set(cache_keys)
-        tasks_to_remove = []
-
-        for task_json, score in all_tasks:
-            try:
-                task = json.loads(task_json)
-                if (
-                    not task.get("processed", False)
-                    and task["cache_key"] in cache_keys_set
-                ):
-                    tasks_to_remove.append(task_json)
-            except (json.JSONDecodeError, KeyError):
-                continue
-
-        # 批量移除匹配的任务
-        if tasks_to_remove:
-            removed_tasks = redis_client.zrem(
-                DELAYED_INVALIDATION_QUEUE, *tasks_to_remove
-            )
-
-        return removed_tasks
+        shards = _get_queue_shards()
+        keys_by_shard = defaultdict(list)
+        for cache_key in dict.fromkeys(cache_keys):
+            keys_by_shard[_shard_for(cache_key, shards)].append(cache_key)
+
+        # 读取元数据以确定原因索引
+        pipe = redis_client.pipeline(transaction=False)
+        for shard, keys in keys_by_shard.items():
+            pipe.hmget(_meta_key(shard), keys)
+        tasks = []
+        for (shard, keys), metas in zip(keys_by_shard.items(), pipe.execute()):
+            for cache_key, meta in zip(keys, metas):
+                task = _parse_meta(cache_key, meta)
+                task["shard"] = shard
+                tasks.append(task)
+
+        return _ack_tasks(redis_client, tasks, force=True)
 
     except Exception as e:
         logger.error(f"根据缓存键移除任务失败: {e}")
@@ -2105,13 +2105,8 @@ def _match_user_pattern(cache_key: str, user_id: int) -> bool:
     返回:
         bool: 是否匹配
     """
-    try:
-        key_parts = cache_key.split(":")
-        if len(key_parts) >= 3 and key_parts[0] == "perm":
-            return int(key_parts[1]) == user_id
-    except (ValueError, IndexError):
-        pass
-    return False
+    decoded = decode_perm_key(cache_key)
+    return decoded is not None and decoded.user_id == int(user_id)
 
 
 def _match_server_pattern(cache_key: str, server_id: int) -> bool:
@@ -2125,13 +2120,12 @@ def _match_server_pattern(cache_key: str, server_id: int) -> bool:
     返回:
         bool: 是否匹配
     """
-    try:
-        key_parts = cache_key.split(":")
-        if len(key_parts) >= 4 and key_parts[0] == "perm":
-            return int(key_parts[2]) == server_id
-    except (ValueError, IndexError):
-        pass
-    return False
+    decoded = decode_perm_key(cache_key)
+    return (
+        decoded is not None
+        and decoded.scope == "server"
+        and decoded.scope_id == int(server_id)
+    )
 
 
 def get_redis_connection_status() -> Dict[str, Any]:
@@ -2205,7 +2199,7 @@ def get_rate_statistics() -> Dict[str, Any]:
             }
 
         # 获取当前队列长度
-        queue_length = redis_client.zcard(DELAYED_INVALIDATION_QUEUE)
+        queue_length = _queue_length(redis_client)
 
         # 计算处理速率和增长率
         processing_rate = _calculate_processing_rate()
@@ -0,0 +1,163 @@
+"""
+权限缓存键编解码模块
+
+hybrid_permission_cache、advanced_optimization 和 permission_invalidation
+共用同一套结构化缓存键：
+
+    perm:v1:{<user_id>}:<scope>:<scope_id>[:g<generation>]
+
+- 版本号（v1）随键格式变化递增，旧格式的键不会被误解析，随TTL自然过期
+- 用户ID放在 Redis Cluster 哈希标签 {} 中，同一用户的权限键、用户索引等
+  落在同一槽位，按用户的多键操作（DEL、管道、事务）不会跨槽
+- 反向索引直接从键中解码用户和作用域，不需要 SCAN
+"""
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+PERM_KEY_PREFIX = "perm"
+PERM_KEY_VERSION = 1
+GLOBAL_SCOPE = "global"
+NO_SCOPE_ID = "none"
+USER_INDEX_PREFIX = "user_index"
+
+_PERM_KEY_RE = re.compile(
+    r"^perm:v(?P<version>\d+):\{(?P<user_id>\d+)\}"
+    r":(?P<scope>[^:]+):(?P<scope_id>[^:]+)(?::g(?P<generation>[^:]*))?$"
+)
+
+
+@dataclass(frozen=True)
+class PermissionCacheKey:
+    """解码后的权限缓存键"""
+
+    user_id: int
+    scope: str = GLOBAL_SCOPE
+    scope_id: Optional[int] = None
+    generation: Optional[str] = None
+    version: int = PERM_KEY_VERSION
+
+    def encode(self) -> str:
+        """编码为缓存键字符串"""
+        return encode_perm_key(
+            self.user_id, self.scope, self.scope_id, self.generation
+        )
+
+
+def user_hash_tag(user_id: Any) -> str:
+    """用户的 Redis Cluster 哈希标签"""
+    return f"{{{user_id}}}"
+
+
+def user_scoped_key(prefix: str, user_id: Any, *parts: Any) -> str:
+    """
+    生成带用户哈希标签的键，如 basic_perm:{1}:read_channel
+
+    参数:
+        prefix: 键前缀
+        user_id: 用户ID
+        parts: 其余键段
+
+    返回:
+        str: 缓存键
+    """
+    return ":".join([prefix, user_hash_tag(user_id), *map(str, parts)])
+
+
+def encode_perm_key(
+    user_id: int,
+    scope: Optional[str] = None,
+    scope_id: Optional[int] = None,
+    generation: Optional[str] = None,
+) -> str:
+    """
+    编码权限缓存键
+
+    参数:
+        user_id: 用户ID
+        scope: 作用域类型，None表示全局
+        scope_id: 作用域ID
+        generation: 代数标记（由调用方拼接），None时不带代数段
+
+    返回:
+        str: 如 perm:v1:{123}:server:456:g3.0.2
+    """
+    key = (
+        f"{PERM_KEY_PREFIX}:v{PERM_KEY_VERSION}:{user_hash_tag(user_id)}"
+        f":{scope or GLOBAL_SCOPE}:{NO_SCOPE_ID if scope_id is None else scope_id}"
+    )
+    if generation is not None:
+        key = f"{key}:g{generation}"
+    return key
+
+
+def decode_perm_key(cache_key: Union[str, bytes]) -> Optional[PermissionCacheKey]:
+    """
+    解码权限缓存键
+
+    参数:
+        cache_key: 缓存键（str或bytes）
+
+    返回:
+        Optional[PermissionCacheKey]: 非当前版本的权限键返回None
+    """
+    if isinstance(cache_key, bytes):
+        cache_key = cache_key.decode("utf-8", errors="replace")
+    match = _PERM_KEY_RE.match(cache_key)
+    if match is None or int(match.group("version")) != PERM_KEY_VERSION:
+        return None
+    scope_id = match.group("scope_id")
+    return PermissionCacheKey(
+        user_id=int(match.group("user_id")),
+        scope=match.group("scope"),
+        scope_id=None if scope_id == NO_SCOPE_ID else _to_int(scope_id),
+        generation=match.group("generation"),
+    )
+
+
+def _to_int(value: str) -> Any:
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def user_key_pattern(user_id: int) -> str:
+    """用户所有权限缓存键的匹配模式（同时用作模式索引的名称）"""
+    return f"{PERM_KEY_PREFIX}:v{PERM_KEY_VERSION}:{user_hash_tag(user_id)}:*"
+
+
+def key_pattern(cache_key: str) -> str:
+    """
+    缓存键所属的模式
+
+    权限键归入所属用户的模式，其他键沿用"前两段:*"的规则。
+    """
+    decoded = decode_perm_key(cache_key)
+    if decoded is not None:
+        return user_key_pattern(decoded.user_id)
+    parts = cache_key.split(":")
+    if len(parts) >= 2:
+        return f"{parts[0]}:{parts[1]}:*"
+    return f"{cache_key}:*"
+
+
+def user_index_key(user_id: int) -> str:
+    """用户反向索引键，与该用户的权限键位于同一槽位"""
+    return f"{USER_INDEX_PREFIX}:{user_hash_tag(user_id)}"
+
+
+def group_keys_by_user(cache_keys: Iterable[str]) -> Dict[Optional[int], List[str]]:
+    """
+    按用户分组缓存键
+
+    同一组的键共享哈希标签，可以放进同一个管道或事务；
+    无法解码的键归入 None 组，由调用方逐个处理。
+    """
+    groups: Dict[Optional[int], List[str]] = defaultdict(list)
+    for cache_key in cache_keys:
+        decoded = decode_perm_key(cache_key)
+        groups[decoded.user_id if decoded is not None else None].append(cache_key)
+    return dict(groups)
@@ -6,15 +6,17 @@
 
 import time
 import json
+import operator
 import threading
 import numpy as np
-from collections import deque, defaultdict
+from collections import deque
 from typing import Dict, List, Optional, Tuple, Any, Callable
 from datetime import datetime, timedelta
 import logging
 from dataclasses import dataclass, asdict
 from enum import Enum
 
+from .anomaly_detection import Direction, StreamingAnomalyDetector
 from .permission_resilience import get_resilience_controller
 from .permission_events import EventSubscriber, RESILIENCE_EVENTS_CHANNEL
 from .permission_resilience import REDIS_AVAILABLE
@@ -76,167 +78,361 @@ class PredictionResult:
     confidence_score: float = 0.0  # 信心分数，用于自动应用决策
 
 
-class MLPerformancePredictor:
-    """机器学习性能预测器"""
+class PredictionModel(Enum):
+    """预测模型枚举"""
 
-    def __init__(self, history_window: int = 1000, prediction_horizon: int = 10):
-        self.history_window = history_window
-        self.prediction_horizon = prediction_horizon
-        self.performance_history = deque(maxlen=history_window)
-        self.models = {}
-        self.lock = threading.Lock()
+    LINEAR = "linear"  # 滑动窗口线性回归
+    EWMA = "ewma"  # 指数加权移动平均
+    HOLT_WINTERS = "holt_winters"  # Holt-Winters指数平滑（水平+趋势，可选季节项）
 
-        # 初始化预测模型
-        self._initialize_models()
 
-    def _initialize_models(self):
-        """初始化预测模型"""
-        metrics = [
-            "cache_hit_rate",
-            "response_time",
-            "memory_usage",
-            "cpu_usage",
-            "error_rate",
-            "qps",
-            "lock_timeout_rate",
-        ]
+# 预测器跟踪的指标，即环形缓冲区的行顺序
+PREDICTED_METRICS = (
+    "cache_hit_rate",
+    "response_time",
+    "memory_usage",
+    "cpu_usage",
+    "error_rate",
+    "qps",
+    "lock_timeout_rate",
+)
 
-        for metric in metrics:
-            self.models[metric] = {
-                "weights": np.array([0.0, 0.0]),  # 线性模型权重 [斜率, 截距]
-                "bias": 0.0,
-                "last_update": time.time(),
-                "accuracy": 0.0,
-            }
+# 预测值的合理范围，未列出的指标使用默认范围
+DEFAULT_PREDICTION_BOUNDS = (0.0, 1000.0)
+PREDICTION_BOUNDS = {
+    "response_time": (0.001, 10.0),  # 响应时间在1ms到10s之间
+    "memory_usage": (0.0, 1.0),  # 内存使用率在0-100%之间
+    "cache_hit_rate": (0.0, 1.0),  # 缓存命中率在0-100%之间
+    "error_rate": (0.0, 1.0),  # 错误率在0-100%之间
+    "qps": (0.0, 10000.0),  # QPS在0-10000之间
+}
 
-    def add_performance_data(self, metrics: PerformanceMetrics):
-        """添加性能数据"""
-        with self.lock:
-            self.performance_history.append(metrics)
-            self._update_models()
 
-    def _update_models(self):
-        """更新预测模型"""
-        if len(self.performance_history) < 10:
-            return
+class _SlidingRegression:
+    """
+    滑动窗口线性回归的充分统计量
 
-        # 转换为numpy数组
-        data = list(self.performance_history)
-        timestamps = np.array([m.timestamp for m in data])
+    所有指标共用自变量 x，因变量 y 是各指标组成的向量，一次得到全部指标的
+    斜率和截距。x 以最新样本为原点，新样本到来时平移原点，统计量保持在窗口
+    跨度的量级，避免直接累加时间戳平方、再相减时的精度损失。
+    """
 
-        for metric_name in self.models.keys():
-            values = np.array([getattr(m, metric_name) for m in data])
+    __slots__ = ("n", "sx", "sxx", "sy", "sxy")
+
+    def __init__(self, size: int):
+        self.n = 0
+        self.sx = 0.0
+        self.sxx = 0.0
+        self.sy = np.zeros(size)
+        self.sxy = np.zeros(size)
+
+    def shift(self, dx: float):
+        """原点右移 dx，即所有样本的 x 减去 dx"""
+        n = self.n
+        if n and dx:
+            self.sxx += n * dx * dx - 2.0 * dx * self.sx
+            self.sx -= n * dx
+            self.sxy -= dx * self.sy
+
+    def add(self, x: float, y: np.ndarray):
+        self.n += 1
+        self.sx += x
+        self.sxx += x * x
+        self.sy += y
+        self.sxy += x * y
+
+    def remove(self, x: float, y: np.ndarray):
+        self.n -= 1
+        self.sx -= x
+        self.sxx -= x * x
+        self.sy -= y
+        self.sxy -= x * y
+
+    def fit(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        最小二乘拟合
 
-            # 简单的线性回归模型
-            if len(values) >= 5:
-                # 使用最近5个点进行预测
-                recent_values = values[-5:]
-                recent_times = timestamps[-5:]
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (斜率, 原点处的截距)，
+                样本不足或 x 没有变化时斜率为0、截距为均值
+        """
+        n = self.n
+        if n == 0:
+            return np.zeros_like(self.sy), np.zeros_like(self.sy)
+        denom = n * self.sxx - self.sx * self.sx
+        if n < 2 or denom <= 1e-12 * max(1.0, n * self.sxx):
+            return np.zeros_like(self.sy), self.sy / n
+        slope = (n * self.sxy - self.sx * self.sy) / denom
+        return slope, (self.sy - slope * self.sx) / n
 
-                # 计算趋势 - np.polyfit返回 [斜率, 截距]
-                if len(recent_values) >= 2:
-                    trend = np.polyfit(recent_times, recent_values, 1)
-                    self.models[metric_name]["weights"] = trend  # [斜率, 截距]
-                    self.models[metric_name]["last_update"] = time.time()
 
-    def predict_metric(self, metric_name: str, horizon: int = None) -> PredictionResult:
-        """预测单个指标"""
-        if horizon is None:
-            horizon = self.prediction_horizon
+class MLPerformancePredictor:
+    """
+    机器学习性能预测器
 
-        if metric_name not in self.models:
-            return None
+    样本写入预分配的 NumPy 环形缓冲区（指标 × 窗口），回归的充分统计量、
+    EWMA 和 Holt-Winters 状态随样本增量更新，所有指标在一次向量运算中完成，
+    写入和预测的开销与 history_window 无关。
+    """
 
-        with self.lock:
-            if len(self.performance_history) < 5:
-                return None
+    # 可以预测的最少样本数
+    MIN_PREDICTION_SAMPLES = 5
+    # 线性模型开始使用回归结果的样本数，此前以当前值作为预测值
+    MIN_FIT_SAMPLES = 10
 
-            current_time = time.time()
-            current_value = getattr(self.performance_history[-1], metric_name)
-
-            # 使用模型进行预测
-            model = self.models[metric_name]
-            weights = model["weights"]  # [斜率, 截距]
-
-            # 简单线性预测: y = slope * x + intercept
-            future_time = current_time + horizon
-            predicted_value = (
-                weights[0] * future_time + weights[1]
-            )  # slope * time + intercept
-
-            # 修复：添加合理的边界检查
-            if metric_name == "response_time":
-                predicted_value = max(
-                    0.001, min(predicted_value, 10.0)
-                )  # 响应时间在1ms到10s之间
-            elif metric_name == "memory_usage":
-                predicted_value = max(
-                    0.0, min(predicted_value, 1.0)
-                )  # 内存使用率在0-100%之间
-            elif metric_name == "cache_hit_rate":
-                predicted_value = max(
-                    0.0, min(predicted_value, 1.0)
-                )  # 缓存命中率在0-100%之间
-            elif metric_name == "error_rate":
-                predicted_value = max(
-                    0.0, min(predicted_value, 1.0)
-                )  # 错误率在0-100%之间
-            elif metric_name == "qps":
-                predicted_value = max(
-                    0.0, min(predicted_value, 10000.0)
-                )  # QPS在0-10000之间
-            else:
-                # 其他指标使用默认边界
-                predicted_value = max(0.0, min(predicted_value, 1000.0))
-
-            # 计算趋势
-            if len(self.performance_history) >= 2:
-                recent_values = [
-                    getattr(m, metric_name) for m in list(self.performance_history)[-5:]
-                ]
-                if len(recent_values) >= 2:
-                    trend_slope = np.polyfit(
-                        range(len(recent_values)), recent_values, 1
-                    )[0]
-                    if trend_slope > 0.01:
-                        trend = "increasing"
-                    elif trend_slope < -0.01:
-                        trend = "decreasing"
-                    else:
-                        trend = "stable"
-                else:
-                    trend = "stable"
-            else:
-                trend = "stable"
+    def __init__(
+        self,
+        history_window: int = 1000,
+        prediction_horizon: int = 10,
+        model: PredictionModel = PredictionModel.LINEAR,
+        regression_window: int = 5,
+        smoothing_alpha: float = 0.3,
+        smoothing_beta: float = 0.1,
+        smoothing_gamma: float = 0.1,
+        season_length: int = 0,
+    ):
+        """
+        Args:
+            history_window: 环形缓冲区保存的样本数
+            prediction_horizon: 默认预测时长（秒）
+            model: 预测模型
+            regression_window: 线性回归使用的最近样本数
+            smoothing_alpha: EWMA / Holt-Winters 水平项平滑系数
+            smoothing_beta: Holt-Winters 趋势项平滑系数
+            smoothing_gamma: Holt-Winters 季节项平滑系数
+            season_length: 季节周期（样本数），0表示不使用季节项
+        """
+        self.history_window = max(2, history_window)
+        self.prediction_horizon = prediction_horizon
+        self.model = model
+        self.regression_window = max(2, min(regression_window, self.history_window))
+        self.smoothing_alpha = smoothing_alpha
+        self.smoothing_beta = smoothing_beta
+        self.smoothing_gamma = smoothing_gamma
+        self.season_length = max(0, season_length)
+        self.lock = threading.Lock()
 
-            # 计算置信度（基于历史准确性）
-            confidence = min(0.95, model["accuracy"] + 0.5)
+        size = len(PREDICTED_METRICS)
+        self._metric_index = {name: i for i, name in enumerate(PREDICTED_METRICS)}
+        self._extract = operator.attrgetter(*PREDICTED_METRICS)
+        bounds = np.array(
+            [
+                PREDICTION_BOUNDS.get(metric, DEFAULT_PREDICTION_BOUNDS)
+                for metric in PREDICTED_METRICS
+            ]
+        )
+        self._lower, self._upper = bounds[:, 0], bounds[:, 1]
+        # 预测准确度（置信度 = min(0.95, 准确度 + 0.5)）
+        self.accuracy = np.zeros(size)
+
+        # 环形缓冲区
+        self._values = np.zeros((size, self.history_window))
+        self._timestamps = np.zeros(self.history_window)
+        self._count = 0
+
+        # 线性回归：按时间拟合用于预测，按样本序号拟合用于判断趋势
+        self._time_fit = _SlidingRegression(size)
+        self._index_fit = _SlidingRegression(size)
+        # 定期从缓冲区重算统计量，消除增减累积的浮点误差
+        self._rebuild_interval = max(1024, self.history_window)
+
+        # 指数平滑状态
+        self._ewma = np.zeros(size)
+        self._level = np.zeros(size)
+        self._trend = np.zeros(size)
+        self._season = (
+            np.zeros((size, self.season_length)) if self.season_length else None
+        )
+
+    @property
+    def sample_count(self) -> int:
+        """缓冲区中的样本数"""
+        return min(self._count, self.history_window)
 
-            # 生成建议
-            recommendation = self._generate_recommendation(
-                metric_name, current_value, predicted_value, trend
-            )
+    def add_performance_data(self, metrics: PerformanceMetrics):
+        """添加性能数据（O(1)，与窗口大小无关）"""
+        values = np.array(self._extract(metrics), dtype=float)
+        with self.lock:
+            self._append(float(metrics.timestamp), values)
+
+    def _append(self, timestamp: float, values: np.ndarray):
+        count = self._count
+        window = self.history_window
+        size = self.regression_window
+        slot = count % window
+        dt = timestamp - self._timestamps[(count - 1) % window] if count else 0.0
+
+        # 原点平移到新样本，移出滑出回归窗口的样本，再加入新样本
+        time_fit, index_fit = self._time_fit, self._index_fit
+        time_fit.shift(dt)
+        index_fit.shift(1.0)
+        if count >= size:
+            old = (count - size) % window
+            old_values = self._values[:, old]
+            time_fit.remove(self._timestamps[old] - timestamp, old_values)
+            index_fit.remove(-float(size), old_values)
+        time_fit.add(0.0, values)
+        index_fit.add(0.0, values)
+
+        self._values[:, slot] = values
+        self._timestamps[slot] = timestamp
+        self._count = count + 1
+        if self._count % self._rebuild_interval == 0:
+            self._rebuild_regressions()
+
+        self._update_smoothing(count, values)
+
+    def _update_smoothing(self, count: int, values: np.ndarray):
+        """更新 EWMA 和 Holt-Winters 状态"""
+        if count == 0:
+            self._ewma[:] = values
+            self._level[:] = values
+            return
+        alpha, beta = self.smoothing_alpha, self.smoothing_beta
+        self._ewma += alpha * (values - self._ewma)
+
+        level, trend = self._level, self._trend
+        if self._season is not None:
+            column = count % self.season_length
+            seasonal = self._season[:, column]
+            new_level = alpha * (values - seasonal) + (1 - alpha) * (level + trend)
+            self._season[:, column] = self.smoothing_gamma * (values - new_level) + (
+                1 - self.smoothing_gamma
+            ) * seasonal
+        else:
+            new_level = alpha * values + (1 - alpha) * (level + trend)
+        self._trend = beta * (new_level - level) + (1 - beta) * trend
+        self._level = new_level
+
+    def _rebuild_regressions(self):
+        """从缓冲区重新计算回归统计量"""
+        count = self._count
+        n = min(count, self.regression_window)
+        slots = np.arange(count - n, count) % self.history_window
+        timestamps = self._timestamps[slots]
+        values = self._values[:, slots]
+        for fit, x in (
+            (self._time_fit, timestamps - timestamps[-1]),
+            (self._index_fit, np.arange(1 - n, 1, dtype=float)),
+        ):
+            fit.n = n
+            fit.sx = float(x.sum())
+            fit.sxx = float(x @ x)
+            fit.sy = values.sum(axis=1)
+            fit.sxy = values @ x
+
+    def _predict_values(self, horizon: float) -> np.ndarray:
+        """按当前模型预测所有指标在 horizon 秒后的值（未限制范围）"""
+        count = self._count
+        window = self.history_window
+        last = (count - 1) % window
+        # 与样本时间对齐：预测时刻为当前时间之后 horizon 秒
+        ahead = time.time() - self._timestamps[last] + horizon
+
+        if self.model == PredictionModel.EWMA:
+            return self._ewma.copy()
+
+        if self.model == PredictionModel.HOLT_WINTERS:
+            size = min(count, window)
+            first = (count - size) % window
+            span = self._timestamps[last] - self._timestamps[first]
+            interval = span / (size - 1) if span > 0 else 1.0
+            steps = max(1.0, ahead / interval)
+            predicted = self._level + steps * self._trend
+            if self._season is not None:
+                column = (count - 1 + int(round(steps))) % self.season_length
+                predicted = predicted + self._season[:, column]
+            return predicted
+
+        if count < self.MIN_FIT_SAMPLES:
+            return self._values[:, last].copy()
+        slope, intercept = self._time_fit.fit()
+        return intercept + slope * ahead
+
+    def predict_all(
+        self, metric_names: Optional[List[str]] = None, horizon: int = None
+    ) -> Dict[str, PredictionResult]:
+        """
+        一次向量运算预测多个指标
 
-            # 计算紧急程度
-            urgency_level = self._calculate_urgency_level(
-                metric_name, current_value, predicted_value
-            )
+        Args:
+            metric_names: 指标名称列表，默认为全部指标
+            horizon: 预测时长（秒），默认 prediction_horizon
 
-            # 计算信心分数
-            confidence_score = self._calculate_confidence_score(
-                metric_name, current_value, predicted_value, confidence, urgency_level
-            )
+        Returns:
+            Dict[str, PredictionResult]: 指标名称 -> 预测结果，
+                样本不足时为空，未跟踪的指标不返回
+        """
+        if horizon is None:
+            horizon = self.prediction_horizon
+        if metric_names is None:
+            metric_names = PREDICTED_METRICS
 
-            return PredictionResult(
-                metric_name=metric_name,
-                current_value=current_value,
-                predicted_value=predicted_value,
-                confidence=confidence,
-                trend=trend,
-                recommendation=recommendation,
-                urgency_level=urgency_level,
-                confidence_score=confidence_score,
+        with self.lock:
+            if self._count < self.MIN_PREDICTION_SAMPLES:
+                return {}
+            current = self._values[:, (self._count - 1) % self.history_window]
+            current = current.tolist()
+            predicted = np.clip(self._predict_values(horizon), self._lower, self._upper)
+            trend_slopes = self._index_fit.fit()[0].tolist()
+            confidences = np.minimum(0.95, self.accuracy + 0.5).tolist()
+        predicted = predicted.tolist()
+
+        results = {}
+        for metric_name in metric_names:
+            i = self._metric_index.get(metric_name)
+            if i is None:
+                continue
+            results[metric_name] = self._build_prediction(
+                metric_name, current[i], predicted[i], trend_slopes[i], confidences[i]
             )
+        return results
+
+    def predict_metric(self, metric_name: str, horizon: int = None) -> PredictionResult:
+        """预测单个指标"""
+        return self.predict_all([metric_name], horizon).get(metric_name)
+
+    def _build_prediction(
+        self,
+        metric_name: str,
+        current_value: float,
+        predicted_value: float,
+        trend_slope: float,
+        confidence: float,
+    ) -> PredictionResult:
+        """根据预测值生成趋势、建议和紧急程度"""
+        if trend_slope > 0.01:
+            trend = "increasing"
+        elif trend_slope < -0.01:
+            trend = "decreasing"
+        else:
+            trend = "stable"
+
+        # 生成建议
+        recommendation = self._generate_recommendation(
+            metric_name, current_value, predicted_value, trend
+        )
+
+        # 计算紧急程度
+        urgency_level = self._calculate_urgency_level(
+            metric_name, current_value, predicted_value
+        )
+
+        # 计算信心分数
+        confidence_score = self._calculate_confidence_score(
+            metric_name, current_value, predicted_value, confidence, urgency_level
+        )
+
+        return PredictionResult(
+            metric_name=metric_name,
+            current_value=current_value,
+            predicted_value=predicted_value,
+            confidence=confidence,
+            trend=trend,
+            recommendation=recommendation,
+            urgency_level=urgency_level,
+            confidence_score=confidence_score,
+        )
 
     def _generate_recommendation(
         self, metric_name: str, current: float, predicted: float, trend: str
@@ -364,9 +560,15 @@ class MLPerformancePredictor:
 class AdaptiveOptimizer:
     """自适应优化器"""
 
-    def __init__(self, strategy: OptimizationStrategy = OptimizationStrategy.ADAPTIVE):
+    def __init__(
+        self,
+        strategy: OptimizationStrategy = OptimizationStrategy.ADAPTIVE,
+        predictor: Optional[MLPerformancePredictor] = None,
+    ):
         self.strategy = strategy
-        self.predictor = MLPerformancePredictor()
+        # 传入的预测器由调用方写入数据，这里只读取预测结果
+        self._owns_predictor = predictor is None
+        self.predictor = predictor or MLPerformancePredictor()
         self.current_config = self._get_default_config()
         self.optimization_history = []
         self.config_update_callbacks = []  # 配置更新回调列表
@@ -393,24 +595,16 @@ class AdaptiveOptimizer:
 
     def update_performance_metrics(self, metrics: PerformanceMetrics):
         """更新性能指标"""
-        self.predictor.add_performance_data(metrics)
+        if self._owns_predictor:
+            self.predictor.add_performance_data(metrics)
         self._check_and_optimize()
 
     def _check_and_optimize(self):
         """检查并执行优化"""
-        predictions = []
-
         # 获取所有指标的预测
-        for metric_name in [
-            "cache_hit_rate",
-            "response_time",
-            "memory_usage",
-            "error_rate",
-            "qps",
-        ]:
-            prediction = self.predictor.predict_metric(metric_name)
-            if prediction:
-                predictions.append(prediction)
+        predictions = self.predictor.predict_all(
+            ["cache_hit_rate", "response_time", "memory_usage", "error_rate", "qps"]
+        ).values()
 
         # 分析预测结果
         critical_issues = [
@@ -691,68 +885,75 @@ class AdaptiveOptimizer:
 
 
 class AnomalyDetector:
-    """异常检测器"""
+    """
+    异常检测器
+
+    基于 StreamingAnomalyDetector 的滚动中位数 / MAD，每次注入的一组指标
+    作为一批观测在一次向量运算中评估；z分数为稳健z分数。
+    """
+
+    METRICS = ("cache_hit_rate", "response_time", "memory_usage", "error_rate", "qps")
 
     def __init__(self, window_size: int = 100, threshold_std: float = 2.0):
         self.window_size = window_size
         self.threshold_std = threshold_std
-        self.metric_windows = defaultdict(lambda: deque(maxlen=window_size))
-        self.anomaly_history = []
+        # 每次注入立即评估，不分时间桶；数据点稀疏，不使用季节基线
+        self.detector = StreamingAnomalyDetector(
+            window=window_size,
+            min_samples=10,
+            threshold=threshold_std,
+            high_threshold=3.0,
+            min_relative_change=0.01,
+            bucket_seconds=0,
+            season_slots=0,
+            max_streams=len(self.METRICS),
+        )
+        for metric_name in self.METRICS:
+            self.detector.watch(metric_name, Direction.BOTH)
+        self._keys = [(metric_name, "") for metric_name in self.METRICS]
+        self._extract = operator.attrgetter(*self.METRICS)
+        self.anomaly_history = deque(maxlen=1000)
         self.lock = threading.Lock()
 
     def detect_anomalies(self, metrics: PerformanceMetrics) -> List[Dict[str, Any]]:
         """检测异常"""
-        anomalies = []
-
-        with self.lock:
-            for metric_name in [
-                "cache_hit_rate",
-                "response_time",
-                "memory_usage",
-                "error_rate",
-                "qps",
-            ]:
-                value = getattr(metrics, metric_name)
-                window = self.metric_windows[metric_name]
-
-                if len(window) >= 10:  # 需要足够的数据点
-                    mean = np.mean(window)
-                    std = np.std(window)
-
-                    if std > 0:  # 避免除零
-                        z_score = abs(value - mean) / std
-
-                        if z_score > self.threshold_std:
-                            anomalies.append(
-                                {
-                                    "metric": metric_name,
-                                    "value": value,
-                                    "expected_range": (mean - 2 * std, mean + 2 * std),
-                                    "z_score": z_score,
-                                    "timestamp": metrics.timestamp,
-                                    "severity": "high" if z_score > 3 else "medium",
-                                }
-                            )
-
-                window.append(value)
+        found = self.detector.update(
+            self._keys, self._extract(metrics), metrics.timestamp
+        )
+        anomalies = [
+            {
+                "metric": anomaly.metric,
+                "value": anomaly.value,
+                "expected_range": (
+                    anomaly.baseline - 2 * anomaly.scale,
+                    anomaly.baseline + 2 * anomaly.scale,
+                ),
+                "z_score": abs(anomaly.score),
+                "timestamp": anomaly.timestamp,
+                "severity": anomaly.severity,
+            }
+            for anomaly in found
+        ]
 
         if anomalies:
-            self.anomaly_history.extend(anomalies)
+            with self.lock:
+                self.anomaly_history.extend(anomalies)
 
         return anomalies
 
     def get_anomaly_history(self) -> List[Dict[str, Any]]:
         """获取异常历史"""
         with self.lock:
-            return self.anomaly_history.copy()
+            return list(self.anomaly_history)
 
 
 class MLPerformanceMonitor:
     """机器学习性能监控器"""
 
     def __init__(self):
+        # 优化器共用同一个预测器，每个样本只写入一次
         self.predictor = MLPerformancePredictor()
-        self.optimizer = AdaptiveOptimizer()
+        self.optimizer = AdaptiveOptimizer(predictor=self.predictor)
         self.anomaly_detector = AnomalyDetector()
         self.lock = threading.RLock()  # 使用RLock以支持重入
 
@@ -866,7 +1067,6 @@ class MLPerformanceMonitor:
 
     def get_predictions(self) -> List[PredictionResult]:
         """获取所有指标的预测"""
-        predictions = []
         metrics = [
             "cache_hit_rate",
             "response_time",
@@ -874,13 +1074,7 @@ class MLPerformanceMonitor:
             "error_rate",
             "qps",
         ]
-
-        for metric in metrics:
-            prediction = self.predictor.predict_metric(metric)
-            if prediction:
-                predictions.append(prediction)
-
-        return predictions
+        return list(self.predictor.predict_all(metrics).values())
 
     def get_optimized_config(self) -> Dict[str, Any]:
         """获取优化后的配置"""
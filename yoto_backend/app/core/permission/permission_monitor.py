@@ -20,19 +20,36 @@
 - Prometheus暴露（生产环境）
 """
 
+import os
 import time
 import logging
 import threading
+import weakref
 from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
-from collections import defaultdict, deque
+from collections import Counter, defaultdict, deque
 import statistics
 
 from .permission_events import EventSubscriber, RESILIENCE_EVENTS_CHANNEL
-from .metrics_aggregator import get_metrics_aggregator, stage_metric
+from .metrics_aggregator import get_metrics_aggregator, stage_metrics
+from .metrics_registry import LatencySketch, MetricsRegistry, get_metrics_registry
 
-from .monitor_backends import get_monitor_backend, MonitorBackend
+from .monitor_backends import (
+    EventRecord,
+    MetricAggregate,
+    MonitorBackend,
+    get_monitor_backend,
+)
+
+# 流式异常检测（依赖NumPy）
+try:
+    from .anomaly_detection import Anomaly, Direction, StreamingAnomalyDetector
+
+    ANOMALY_DETECTION_AVAILABLE = True
+except ImportError:
+    ANOMALY_DETECTION_AVAILABLE = False
+    logging.getLogger(__name__).warning("NumPy不可用，将跳过流式异常检测")
 
 # 导入ML模块
 try:
@@ -113,6 +130,8 @@ class Alert:
     threshold: float
     timestamp: float
     resolved: bool = False
+    details: Dict[str, Any] = field(default_factory=dict)  # 结构化信息（如异常检测结果）
+    source: str = "threshold"  # threshold: 阈值告警, anomaly: 流式异常检测告警
 
 
 @dataclass
@@ -127,27 +146,110 @@ class HealthStatus:
     metrics: Dict[str, Any]
 
 
+# ==================== 线程私有指标缓冲 ====================
+
+# 热路径上避免枚举类属性查找
+_EVENT = RecordType.EVENT
+_HISTOGRAM = RecordType.HISTOGRAM
+
+# 聚合键：(名称, 记录类型, 规范化后的标签组合, 需要检查告警的指标类型)
+MetricKey = Tuple[str, RecordType, tuple, Optional[MetricType]]
+
+
+class _BufferData:
+    """一个刷新周期内缓冲的数据"""
+
+    __slots__ = ("metrics", "events", "dropped_events")
+
+    def __init__(self):
+        self.metrics: Dict[MetricKey, MetricAggregate] = {}
+        self.events: List[EventRecord] = []
+        self.dropped_events = 0
+
+
+class _MetricsBuffer:
+    """
+    线程（eventlet下为协程）私有的指标缓冲区
+
+    cell[0] 只由所属线程写入；刷新线程整体替换 cell[0]，被换下的数据
+    再等一个刷新周期才读取，写入方不需要加锁。线程结束时 cell 交给监控器回收。
+    """
+
+    __slots__ = ("cell", "__weakref__")
+
+    def __init__(self):
+        self.cell = [_BufferData()]
+
+
 # ==================== 权限系统监控器 ====================
 
 
 class PermissionMonitor:
-    """权限系统监控器"""
+    """
+    权限系统监控器
+
+    record() 只写入线程私有缓冲区并就地预聚合（计数器、仪表盘、直方图按
+    名称+标签合并），后台线程每 flush_interval_ms 毫秒合并各缓冲区，
+    每个后端一次批量写入（Redis为一个管道）；告警检查和ML指标暂存也在
+    刷新时进行。读取接口看到的数据最多滞后两个刷新周期，
+    需要立即可见时调用 flush()。flush_interval_ms 为0时退化为同步写入。
+    """
 
     LOWER_IS_BETTER_METRICS = frozenset(
         [MetricType.RESPONSE_TIME, MetricType.ERROR_RATE, MetricType.MEMORY_USAGE]
     )
 
-    def __init__(self, max_history_size: int = 1000):
+    # 流式异常检测的指标：名称 -> (告警方向, 告警使用的指标类型)
+    # 直方图按时间桶内p99检测，其他指标按代表值检测，每个标签组合单独检测
+    ANOMALY_METRICS = {
+        "response_time": ("up", MetricType.RESPONSE_TIME),
+        "cache_get": ("up", MetricType.RESPONSE_TIME),
+        "cache_set": ("up", MetricType.RESPONSE_TIME),
+        "cache_duration": ("up", MetricType.RESPONSE_TIME),
+        "cache_hit_rate": ("down", MetricType.CACHE_HIT_RATE),
+        "cache_success_rate": ("down", MetricType.CACHE_HIT_RATE),
+        "qps": ("down", MetricType.QPS),
+    }
+
+    def __init__(
+        self,
+        max_history_size: int = 1000,
+        flush_interval_ms: int = 50,
+        anomaly_detection: bool = True,
+    ):
         """
         初始化权限监控器
 
         Args:
-            max_history_size: 历史记录最大大小
+            max_history_size: 历史记录最大大小（也是每个缓冲区每周期最多缓冲的事件数）
+            flush_interval_ms: 后台刷新间隔（毫秒），0表示同步写入后端
+            anomaly_detection: 是否启用流式异常检测
         """
         self.max_history_size = max_history_size
+        self.flush_interval = max(0, flush_interval_ms) / 1000.0
+        # 标签允许列表和基数上限（全局共享）
+        self.registry: MetricsRegistry = get_metrics_registry()
         self.metrics_history = []
         self.alerts = []
 
+        # 线程私有缓冲区和后台刷新
+        self._local = threading.local()
+        self._buffers: "weakref.WeakSet[_MetricsBuffer]" = weakref.WeakSet()
+        self._buffers_lock = threading.Lock()
+        self._orphans: deque = deque()
+        self._retired: List[_BufferData] = []
+        self._flush_lock = threading.Lock()
+        self._flush_stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self.flush_stats = Counter()
+
+        # 流式异常检测（在刷新时按时间桶批量评估）
+        self.anomaly_detector: Optional["StreamingAnomalyDetector"] = None
+        if anomaly_detection and ANOMALY_DETECTION_AVAILABLE:
+            self.anomaly_detector = StreamingAnomalyDetector()
+            for name, (direction, _) in self.ANOMALY_METRICS.items():
+                self.anomaly_detector.watch(name, Direction(direction))
+
         # 使用后端存储系统
         self.backend: MonitorBackend = get_monitor_backend()
 
@@ -242,35 +344,167 @@ class PermissionMonitor:
             check_alerts: 是否检查告警
             metric_type: 对应的指标类型（用于告警检查）
         """
-        with self.lock:
-            timestamp = time.time()
-
-            # 创建记录点
-            record_point = RecordPoint(
-                name=name,
-                value=value or 0.0,
-                record_type=record_type,
-                timestamp=timestamp,
-                tags=tags or {},
-                metadata=metadata or {},
-            )
+        if self.flush_interval > 0:
+            try:
+                data = self._local.buffer.cell[0]
+            except AttributeError:
+                data = self._register_buffer().cell[0]
+        else:
+            data = _BufferData()
+
+        # 事件原样缓冲，指标按聚合键就地累加
+        timestamp = time.time()
+        if record_type is _EVENT:
+            if len(data.events) < self.max_history_size:
+                data.events.append((name, metadata, tags, timestamp))
+            else:
+                data.dropped_events += 1
+        elif value is not None:
+            series = self.registry.series(name, tags) if tags else ()
+            key = (name, record_type, series, metric_type if check_alerts else None)
+            aggregate = data.metrics.get(key)
+            if aggregate is None:
+                aggregate = data.metrics[key] = MetricAggregate(
+                    name, record_type.value, dict(series)
+                )
+                if record_type is _HISTOGRAM:
+                    aggregate.sketch = LatencySketch()
+            aggregate.add(value, timestamp)
+
+        if self.flush_interval <= 0:
+            self._write_batch([data])
+
+    def _register_buffer(self) -> _MetricsBuffer:
+        """为当前线程创建缓冲区，首次调用时启动刷新线程"""
+        buffer = _MetricsBuffer()
+        self._local.buffer = buffer
+        # 线程结束时缓冲区被回收，其中尚未刷新的数据交给刷新线程
+        weakref.finalize(buffer, self._orphans.append, buffer.cell)
+        with self._buffers_lock:
+            self._buffers.add(buffer)
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, daemon=True, name="PermissionMonitorFlush"
+                )
+                self._flusher.start()
+        return buffer
+
+    def _flush_loop(self):
+        """后台刷新循环"""
+        while not self._flush_stop.wait(self.flush_interval):
+            try:
+                self.flush(final=False)
+            except Exception as e:
+                logger.error(f"刷新监控指标失败: {e}")
+
+    def flush(self, final: bool = True):
+        """
+        将缓冲区写入后端
+
+        Args:
+            final: True时立即写入全部缓冲数据（用于读取前或停止时）；
+                False时只写入上一周期换下的数据（后台刷新使用）
+        """
+        with self._flush_lock:
+            with self._buffers_lock:
+                buffers = list(self._buffers)
+            swapped = []
+            for buffer in buffers:
+                data = buffer.cell[0]
+                if data.metrics or data.events or data.dropped_events:
+                    buffer.cell[0] = _BufferData()
+                    swapped.append(data)
+
+            # 已结束线程的缓冲区不会再被写入，可以立即刷新
+            ready = self._retired
+            while self._orphans:
+                ready.append(self._orphans.popleft()[0])
+            if final:
+                ready.extend(swapped)
+                self._retired = []
+            else:
+                self._retired = swapped
+            if ready:
+                self._write_batch(ready)
+
+    def close(self):
+        """停止后台刷新并写入剩余数据"""
+        self._flush_stop.set()
+        if self._flusher is not None and self._flusher.is_alive():
+            self._flusher.join(timeout=max(1.0, self.flush_interval * 2))
+        self.flush(final=True)
+
+    def _write_batch(self, batches: List[_BufferData]):
+        """合并多个缓冲区并写入后端、检查告警、暂存ML指标"""
+        merged: Dict[MetricKey, MetricAggregate] = {}
+        events: List[EventRecord] = []
+        dropped_events = 0
+        for data in batches:
+            for key, aggregate in data.metrics.items():
+                existing = merged.get(key)
+                if existing is None:
+                    merged[key] = aggregate
+                else:
+                    existing.merge(aggregate)
+            events.extend(data.events)
+            dropped_events += data.dropped_events
+        if not merged and not events and not dropped_events:
+            return
 
-            # 存储到后端
-            if record_type == RecordType.EVENT:
-                self.backend.record_event(name, metadata, tags, timestamp)
+        aggregates = list(merged.values())
+        if not self.backend.record_batch(aggregates, events):
+            self.flush_stats["failed_batches"] += 1
+        self.flush_stats["batches"] += 1
+        self.flush_stats["metrics"] += sum(aggregate.count for aggregate in aggregates)
+        self.flush_stats["events"] += len(events)
+        self.flush_stats["dropped_events"] += dropped_events
+        if dropped_events:
+            logger.warning(f"监控事件缓冲已满，丢弃 {dropped_events} 条事件")
+
+        # 告警按周期内最差的值检查
+        for (_, _, _, metric_type), aggregate in merged.items():
+            if metric_type is None:
+                continue
+            if aggregate.kind == RecordType.COUNTER.value:
+                worst = aggregate.value
+            elif metric_type in self.LOWER_IS_BETTER_METRICS:
+                worst = aggregate.min
             else:
-                self.backend.record_metric(name, value, tags, timestamp)
+                worst = aggregate.max
+            try:
+                self._check_alerts(metric_type, worst)
+            except Exception as e:
+                logger.error(f"检查告警失败: {metric_type.value}, {e}")
+
+        if self.anomaly_detector is not None:
+            try:
+                anomalies = self.anomaly_detector.observe(aggregates, time.time())
+            except Exception as e:
+                logger.error(f"流式异常检测失败: {e}")
+                anomalies = []
+            for anomaly in anomalies:
+                self._create_anomaly_alert(anomaly)
+
+        # 暂存指标到聚合器（用于ML模块）
+        stage_metrics(
+            [
+                (aggregate.name, aggregate.value, aggregate.tags)
+                for aggregate in aggregates
+            ]
+        )
 
-            # 检查告警
-            if check_alerts and metric_type:
-                self._check_alerts(metric_type, value)
+    def get_histogram(self, name: str, tags: Dict[str, str] = None) -> Dict[str, Any]:
+        """
+        获取直方图指标的累计分位数
 
-            # 记录日志
-            logger.debug(f"记录 {record_type.value}: {name} = {value}")
+        Args:
+            name: 指标名称
+            tags: 标签组合（注册表过滤后保留的标签）
 
-            # 暂存指标到聚合器（用于ML模块）
-            if value is not None and record_type != RecordType.EVENT:
-                stage_metric(name, value, tags)
+        Returns:
+            Dict[str, Any]: {"count", "p50", "p90", "p99", "p999"}
+        """
+        return self.backend.get_histogram(name, tags)
 
     def record_cache_hit_rate(self, hit_rate: float, cache_level: str = "l1"):
         """记录缓存命中率"""
@@ -348,9 +582,7 @@ class PermissionMonitor:
     def _create_alert(
         self, metric_type: MetricType, value: float, threshold: float, level: AlertLevel
     ):
-        """创建告警"""
-        alert_id = f"{metric_type.value}_{level.value}_{int(time.time())}"
-
+        """创建告警，已有相同的未解决阈值告警时沿用其ID（后端更新而不是新增）"""
         # 从后端检查是否已有相同告警
         existing_alerts = self.backend.get_active_alerts()
         existing_alert = next(
@@ -359,10 +591,15 @@ class PermissionMonitor:
                 for alert in existing_alerts
                 if alert.metric_type == metric_type
                 and alert.level == level
+                and alert.source == "threshold"
                 and not alert.resolved
             ),
             None,
         )
+        if existing_alert is not None:
+            alert_id = existing_alert.id
+        else:
+            alert_id = f"{metric_type.value}_{level.value}_{int(time.time())}"
 
         if metric_type in self.LOWER_IS_BETTER_METRICS:
             comparison_op = "<"
@@ -400,6 +637,49 @@ class PermissionMonitor:
         else:
             logger.error(f"创建告警失败: {alert.message}")
 
+    def _create_anomaly_alert(self, anomaly: "Anomaly"):
+        """
+        根据流式异常检测结果创建告警，异常详情保存在 details 中
+
+        告警ID只由指标和标签组合决定，同一序列持续异常时后端更新同一条未解决告警
+        （级别随最新结果变化），不同序列互不覆盖，也不与阈值告警合并。
+        """
+        metric_type = self.ANOMALY_METRICS[anomaly.metric][1]
+        level = AlertLevel.ERROR if anomaly.severity == "high" else AlertLevel.WARNING
+        series = f"{{{anomaly.series}}}" if anomaly.series else ""
+        alert = Alert(
+            id=f"anomaly_{anomaly.metric}{series}",
+            level=level,
+            message=(
+                f"{anomaly.metric}{series} 偏离基线: 当前值 {anomaly.value:.4g}, "
+                f"基线 {anomaly.baseline:.4g}, 稳健z分数 {anomaly.score:.1f}"
+            ),
+            metric_type=metric_type,
+            current_value=anomaly.value,
+            threshold=anomaly.baseline,
+            timestamp=anomaly.timestamp,
+            details=anomaly.to_dict(),
+            source="anomaly",
+        )
+        if self.backend.create_alert(alert):
+            logger.warning(f"权限系统异常 [{level.name.upper()}]: {alert.message}")
+        else:
+            logger.error(f"创建异常告警失败: {alert.message}")
+
+    def get_anomalies(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        获取流式异常检测发现的最近异常
+
+        Args:
+            limit: 最多返回的数量
+
+        Returns:
+            List[Dict[str, Any]]: 异常详情，未启用异常检测时为空
+        """
+        if self.anomaly_detector is None:
+            return []
+        return self.anomaly_detector.get_recent(limit)
+
     def get_health_status(self) -> HealthStatus:
         """获取健康状态"""
         with self.lock:
@@ -648,6 +928,16 @@ class PermissionMonitor:
                 "performance": performance_report,
                 "events": events_summary,
                 "values": values_summary,
+                "buffer": {
+                    "flush_interval_ms": self.flush_interval * 1000,
+                    "active_buffers": len(self._buffers),
+                    **self.flush_stats,
+                },
+                "anomaly_detection": (
+                    self.anomaly_detector.get_stats()
+                    if self.anomaly_detector is not None
+                    else {"enabled": False}
+                ),
                 "timestamp": time.time(),
             }
 
@@ -679,7 +969,12 @@ def get_permission_monitor() -> PermissionMonitor:
     """获取权限系统监控器实例"""
     global _permission_monitor
     if _permission_monitor is None:
-        _permission_monitor = PermissionMonitor()
+        _permission_monitor = PermissionMonitor(
+            flush_interval_ms=int(os.getenv("MONITOR_FLUSH_INTERVAL_MS", "50")),
+            anomaly_detection=(
+                os.getenv("MONITOR_ANOMALY_DETECTION", "true").lower() == "true"
+            ),
+        )
     return _permission_monitor
 
 
@@ -777,6 +1072,18 @@ def get_stats() -> Dict[str, Any]:
     return monitor.get_stats()
 
 
+def get_anomalies(limit: int = 100) -> List[Dict[str, Any]]:
+    """获取流式异常检测发现的最近异常"""
+    monitor = get_permission_monitor()
+    return monitor.get_anomalies(limit)
+
+
+def get_histogram(name: str, tags: Dict[str, str] = None) -> Dict[str, Any]:
+    """获取直方图指标的累计分位数"""
+    monitor = get_permission_monitor()
+    return monitor.get_histogram(name, tags)
+
+
 def clear_alerts(level: Optional[AlertLevel] = None):
     """清除告警"""
     monitor = get_permission_monitor()
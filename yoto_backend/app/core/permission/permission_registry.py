@@ -18,6 +18,7 @@
 
 import time
 import logging
+import threading
 import warnings
 from typing import Dict, List, Optional, Set, Any
 from sqlalchemy import and_, or_, func
@@ -27,6 +28,7 @@ from flask import current_app
 from app.blueprints.roles.models import Permission, RolePermission
 from app.core.extensions import db
 from app.blueprints.roles.models import Role
+from .permission_bitset import get_permission_bit_index
 
 logger = logging.getLogger(__name__)
 
@@ -117,6 +119,9 @@ def register_permission(
                 "updated_at": new_permission.updated_at,
             }
 
+        # 登记权限位索引（即 Permission.id）
+        get_permission_bit_index().register(name, permission_info["id"])
+
         logger.info(f"权限注册成功: {name}")
         return permission_info
 
@@ -362,6 +367,12 @@ def batch_register_permissions(permissions_data: List[Dict]) -> List[Dict]:
             if name:
                 _permission_registry.add(name)
 
+        # 登记权限位索引；批量插入不回填主键，新权限需重新加载
+        bit_index = get_permission_bit_index()
+        bit_index.register_many((perm.name, perm.id) for perm in existing_permissions)
+        if to_insert:
+            bit_index.reload(db.session, force=True)
+
         logger.info(
             f"批量注册权限完成: 创建 {len(to_insert)} 个，更新 {len(to_update)} 个"
         )
@@ -911,10 +922,11 @@ def initialize_permission_registry():
     注意：这只是为了向后兼容，实际数据源是数据库和多级缓存系统
     """
     try:
-        # 从数据库加载所有权限名称到本地注册表
-        permissions = db.session.query(Permission.name).all()
+        # 从数据库加载所有权限名称到本地注册表，并登记权限位索引
+        permissions = db.session.query(Permission.name, Permission.id).all()
         for perm in permissions:
             _permission_registry.add(perm[0])
+        get_permission_bit_index().register_many(permissions)
 
         # 从数据库加载所有角色名称到本地注册表
         roles = db.session.query(Role.name, Role.server_id).all()
@@ -954,6 +966,199 @@ def get_local_registry_info() -> Dict:
     }
 
 
+# ==================== 权限清单 ====================
+
+
+class PermissionManifest:
+    """
+    进程级权限清单
+
+    权限装饰器在模块导入（即蓝图注册之前）时把声明的权限登记到清单，
+    应用启动时或通过 ``flask permissions-sync`` 与 permissions 表一次性对账：
+    一次 SELECT 找出缺失或描述变化的权限，再用一条批量 upsert 写入。
+    请求路径不再访问注册表。
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.last_sync: Optional[Dict[str, Any]] = None
+
+    def init_app(self, app):
+        """注册同步命令，并按配置在启动时同步一次"""
+        app.extensions["permission_manifest"] = self
+
+        @app.cli.command("permissions-sync")
+        def permissions_sync():
+            """将装饰器声明的权限同步到数据库"""
+            import click
+
+            result = self.sync()
+            click.echo(
+                f"权限清单同步完成: 声明 {result['declared']} 个，"
+                f"创建 {result['created']} 个，更新 {result['updated']} 个"
+            )
+
+        if app.config.get("PERMISSION_MANIFEST_SYNC_ON_STARTUP", True):
+            with app.app_context():
+                try:
+                    self.sync()
+                except Exception as e:
+                    # 数据库尚未就绪（如首次迁移前）时不阻止启动
+                    logger.warning(f"启动时同步权限清单失败: {e}")
+
+    def declare(
+        self, names: List[str], group: str = None, description: str = None
+    ) -> None:
+        """
+        登记权限声明（只修改内存，不访问数据库）
+
+        同一权限被多处声明时，保留第一个非空的分组和描述。
+        """
+        with self._lock:
+            for name in names:
+                if not name:
+                    continue
+                entry = self._entries.get(name)
+                if entry is None:
+                    self._entries[name] = {
+                        "name": name,
+                        "group": group,
+                        "description": description,
+                    }
+                else:
+                    entry["group"] = entry["group"] or group
+                    entry["description"] = entry["description"] or description
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """清单中的所有权限"""
+        with self._lock:
+            return [dict(entry) for entry in self._entries.values()]
+
+    def sync(self) -> Dict[str, Any]:
+        """
+        与 permissions 表对账
+
+        返回:
+            Dict: declared / created / updated 数量
+        """
+        entries = self.entries()
+        result = {"declared": len(entries), "created": 0, "updated": 0}
+        if not entries:
+            self.last_sync = result
+            return result
+
+        try:
+            existing = {
+                row.name: row
+                for row in db.session.query(
+                    Permission.id,
+                    Permission.name,
+                    Permission.group,
+                    Permission.description,
+                ).filter(Permission.name.in_([entry["name"] for entry in entries]))
+            }
+
+            changed = [
+                entry
+                for entry in entries
+                if entry["name"] not in existing
+                or _manifest_entry_differs(existing[entry["name"]], entry)
+            ]
+            result["created"] = sum(
+                1 for entry in changed if entry["name"] not in existing
+            )
+            result["updated"] = len(changed) - result["created"]
+
+            if changed:
+                statement = _permission_upsert_statement()
+                if statement is not None:
+                    db.session.execute(statement, changed)
+                    db.session.commit()
+                else:
+                    batch_register_permissions(changed)
+
+            _permission_registry.update(entry["name"] for entry in entries)
+            bit_index = get_permission_bit_index()
+            bit_index.register_many((row.name, row.id) for row in existing.values())
+            if result["created"]:
+                bit_index.reload(db.session, force=True)
+
+        except Exception:
+            db.session.rollback()
+            raise
+
+        self.last_sync = dict(result, synced_at=time.time())
+        logger.info(
+            f"权限清单同步完成: 声明 {result['declared']} 个，"
+            f"创建 {result['created']} 个，更新 {result['updated']} 个"
+        )
+        return result
+
+
+def _manifest_entry_differs(row, entry: Dict[str, Any]) -> bool:
+    """清单中非空的分组或描述与数据库不一致"""
+    return (entry["group"] is not None and entry["group"] != row.group) or (
+        entry["description"] is not None and entry["description"] != row.description
+    )
+
+
+def _permission_upsert_statement():
+    """
+    按数据库方言构造批量 upsert（按 name 去重，空值不覆盖已有分组和描述）
+
+    返回:
+        不支持的方言返回None，由调用方退化为 batch_register_permissions
+    """
+    table = Permission.__table__
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+
+        statement = insert(table)
+        return statement.on_duplicate_key_update(
+            group=func.coalesce(statement.inserted.group, table.c.group),
+            description=func.coalesce(
+                statement.inserted.description, table.c.description
+            ),
+        )
+
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+
+        statement = insert(table)
+        return statement.on_conflict_do_update(
+            index_elements=[table.c.name],
+            set_={
+                "group": func.coalesce(statement.excluded.group, table.c.group),
+                "description": func.coalesce(
+                    statement.excluded.description, table.c.description
+                ),
+            },
+        )
+
+    return None
+
+
+permission_manifest = PermissionManifest()
+
+
+def get_permission_manifest() -> PermissionManifest:
+    """获取全局权限清单"""
+    return permission_manifest
+
+
+def declare_permissions(
+    names: List[str], group: str = None, description: str = None
+) -> None:
+    """登记装饰器声明的权限（便捷函数）"""
+    permission_manifest.declare(names, group, description)
+
+
 # 在文件末尾添加权限组相关的方法
 
 
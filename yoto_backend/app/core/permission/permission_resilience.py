@@ -5,16 +5,23 @@
 支持动态配置，无需重启即可生效
 """
 
+import os
 import time
 import json
 import logging
 import threading
-from typing import Callable, Dict, Any, Optional, List, Union, TYPE_CHECKING
+import uuid
+from types import MappingProxyType
+from typing import Callable, Dict, Any, Mapping, Optional, List, Union, TYPE_CHECKING
 from functools import wraps
 from enum import Enum
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from collections import defaultdict, deque
-from .permission_events import RESILIENCE_EVENTS_CHANNEL, EventPublisher
+from .permission_events import (
+    RESILIENCE_EVENTS_CHANNEL,
+    EventPublisher,
+    EventSubscriber,
+)
 from app.core.common.distributed_lock import OptimizedDistributedLock
 
 # 导入Redis客户端
@@ -226,6 +233,9 @@ class CircuitBreakerConfig:
     expected_exception: str = "Exception"  # 预期异常类型
     monitor_interval: float = 10.0  # 监控间隔（秒）
     state: CircuitBreakerState = CircuitBreakerState.CLOSED
+    hybrid_enabled: bool = True  # 本地缓存CLOSED状态，调用结果批量提交
+    lease_ttl: float = 1.0  # CLOSED状态本地租约有效期（秒），也是批量提交周期
+    local_failure_threshold: int = 3  # 本地连续失败达到该值时立即提交
 
 
 @dataclass
@@ -247,6 +257,11 @@ class RateLimitConfig:
     ip_limit: int = 100  # IP地址维度限制
     combined_limit: int = 300  # 组合维度限制
 
+    # 令牌租约：每个进程一次从Redis领取一批令牌，在本地计数器中消耗
+    lease_enabled: bool = False
+    lease_ttl: float = 1.0  # 租约有效期（秒），过期未用完的令牌作废
+    lease_max_block: int = 0  # 单次最多领取的令牌数，0表示取最小限额的10%
+
 
 @dataclass
 class DegradationConfig:
@@ -259,6 +274,75 @@ class DegradationConfig:
     enabled: bool = False
 
 
+# ==================== 配置快照 ====================
+
+
+def _decode_hash(value: Dict[Any, Any]) -> Dict[str, str]:
+    """将 HGETALL 的结果统一解码为 str"""
+    return {
+        (k.decode("utf-8") if isinstance(k, bytes) else k): (
+            v.decode("utf-8") if isinstance(v, bytes) else v
+        )
+        for k, v in value.items()
+    }
+
+
+class ResilienceConfigSnapshot:
+    """
+    韧性配置快照（不可变）
+
+    包含全部配置哈希和已解析的配置覆盖。变更时生成新快照整体替换，
+    读取方拿到引用后不需要加锁；memo 缓存基于本快照解析出的配置对象，
+    快照替换后自然失效，因此返回的配置对象不能被原地修改。
+    """
+
+    __slots__ = ("version", "loaded_at", "hashes", "overrides", "memo")
+
+    def __init__(
+        self,
+        version: int = 0,
+        hashes: Optional[Mapping[str, Mapping[str, str]]] = None,
+        loaded_at: float = 0.0,
+        overrides_key: Optional[str] = None,
+    ):
+        self.version = version
+        self.loaded_at = loaded_at
+        self.hashes = MappingProxyType(
+            {
+                key: MappingProxyType(dict(value))
+                for key, value in (hashes or {}).items()
+            }
+        )
+        # 覆盖字段 -> (过期时间, 覆盖配置)
+        self.overrides: Dict[str, tuple] = {}
+        for field_name, raw in self.hashes.get(overrides_key, {}).items():
+            try:
+                info = json.loads(raw)
+                self.overrides[field_name] = (info.get("expires_at", 0), info["config"])
+            except (ValueError, KeyError, TypeError, AttributeError):
+                logger.warning(f"忽略无法解析的配置覆盖: {field_name}")
+        # (配置类型, 名称) -> (配置对象, 有效期截止时间)
+        self.memo: Dict[tuple, tuple] = {}
+
+    def with_change(
+        self,
+        key: str,
+        field_name: str,
+        value: Optional[str],
+        version: int,
+        overrides_key: Optional[str] = None,
+    ) -> "ResilienceConfigSnapshot":
+        """返回应用了单个字段变更的新快照，value 为 None 表示删除"""
+        hashes = dict(self.hashes)
+        fields = dict(hashes.get(key, {}))
+        if value is None:
+            fields.pop(field_name, None)
+        else:
+            fields[field_name] = value
+        hashes[key] = fields
+        return ResilienceConfigSnapshot(version, hashes, self.loaded_at, overrides_key)
+
+
 # ==================== 集中配置控制器 ====================
 
 
@@ -275,6 +359,20 @@ class ResilienceController:
     # 配置覆盖层键
     CONFIG_OVERRIDES_KEY = "resilience:{config_overrides}"
 
+    # 配置快照版本号，每次写入配置字段时递增
+    CONFIG_VERSION_KEY = "resilience:{config_version}"
+    CONFIG_UPDATED_CHANNEL = "resilience:config_updated"
+
+    # 快照包含的配置哈希
+    SNAPSHOT_KEYS = (
+        CIRCUIT_BREAKER_KEY,
+        RATE_LIMIT_KEY,
+        DEGRADATION_KEY,
+        BULKHEAD_KEY,
+        GLOBAL_SWITCH_KEY,
+        CONFIG_OVERRIDES_KEY,
+    )
+
     def __init__(self, config_source: Optional[redis.Redis] = None):
         """
         初始化韧性控制器
@@ -286,19 +384,24 @@ class ResilienceController:
         self.cache_ttl = 300  # 5分钟缓存
         self.lua_scripts = {}
         self.config_overrides = {}
-        self.local_cache = {}
 
-        # 缓存相关属性
-        self.cache_lock = threading.Lock()
-        self.last_cache_update = time.time()
+        # 配置快照：整体替换，读取方不加锁；锁只用于加载和应用变更
+        self._snapshot = ResilienceConfigSnapshot()
+        self._snapshot_lock = threading.Lock()
+        self._config_subscriber = None
+        self.origin = uuid.uuid4().hex
 
         # 配置热更新相关
         self.event_publisher = None
         if config_source:
             self.event_publisher = EventPublisher(config_source)
 
-        # 延迟启动配置热更新订阅者，避免初始化时的递归
-        # self._start_config_hot_reload_subscriber()
+        # 本进程的熔断器，接收其他进程推送的状态转换（首次登记时订阅）
+        self._circuit_breakers: Dict[str, "CircuitBreaker"] = {}
+        self._breaker_subscriber = None
+        self._breaker_lock = threading.Lock()
+
+        # 配置热更新订阅者在首次加载快照时启动，避免初始化时的递归
 
         # 注册Lua脚本
         self._register_lua_scripts()
@@ -326,6 +429,9 @@ class ResilienceController:
                 self.fixed_window_script = self.config_source.register_script(
                     RateLimiter.FIXED_WINDOW_ATOMIC_SCRIPT
                 )
+                self.multi_dimensional_script = self.config_source.register_script(
+                    RateLimiter.MULTI_DIMENSIONAL_ATOMIC_SCRIPT
+                )
 
                 # Bulkhead Lua脚本
                 self.bulkhead_script = self.config_source.register_script(
@@ -345,13 +451,27 @@ class ResilienceController:
         failure_threshold: int,
         recovery_timeout: float,
         current_time: float,
+        successes: int = 0,
+        failures: int = 0,
     ) -> tuple:
-        """执行熔断器原子操作"""
+        """
+        执行熔断器原子操作
+
+        successes / failures 只用于 "record" 操作：本地缓冲的成功次数，
+        以及最后一次成功之后的连续失败次数
+        """
         try:
             if self.config_source and REDIS_AVAILABLE:
                 result = self.circuit_breaker_execute_script(
                     keys=[name],
-                    args=[operation, failure_threshold, recovery_timeout, current_time],
+                    args=[
+                        operation,
+                        failure_threshold,
+                        recovery_timeout,
+                        current_time,
+                        successes,
+                        failures,
+                    ],
                 )
                 return result
             else:
@@ -361,6 +481,42 @@ class ResilienceController:
             logger.error(f"熔断器原子操作失败: {e}")
             return (1, b"closed", b"no_event")
 
+    def register_circuit_breaker(self, breaker: "CircuitBreaker"):
+        """
+        登记熔断器，接收其他进程通过 pub/sub 推送的状态转换
+
+        本地租约期间不访问Redis，OPEN 依靠推送才能在租约过期前传播到所有进程；
+        订阅失败时退化为租约过期后刷新。
+        """
+        with self._breaker_lock:
+            self._circuit_breakers[breaker.name] = breaker
+            if (
+                self._breaker_subscriber is not None
+                or not self.config_source
+                or not REDIS_AVAILABLE
+            ):
+                return
+            try:
+                subscriber = EventSubscriber(self.config_source)
+                subscriber.subscribe(
+                    RESILIENCE_EVENTS_CHANNEL, self._handle_breaker_event
+                )
+                subscriber.start()
+                self._breaker_subscriber = subscriber
+            except Exception as e:
+                logger.warning(f"订阅熔断器状态事件失败，仅依赖租约过期刷新: {e}")
+
+    def _handle_breaker_event(self, event: Dict[str, Any]):
+        """将其他进程发布的熔断器状态转换应用到本进程"""
+        if not str(event.get("event_name", "")).startswith(
+            "resilience.circuit_breaker."
+        ):
+            return
+        payload = event.get("payload") or {}
+        breaker = self._circuit_breakers.get(payload.get("name"))
+        if breaker is not None and payload.get("state"):
+            breaker.apply_remote_state(payload["state"])
+
     def get_circuit_breaker_state(self, name: str) -> CircuitBreakerState:
         """获取熔断器状态"""
         try:
@@ -476,24 +632,129 @@ class ResilienceController:
             logger.error(f"固定窗口检查失败: {e}")
             return False
 
+    def rate_limiter_acquire(
+        self,
+        name: str,
+        limit_type: RateLimitType,
+        key: str,
+        max_requests: int,
+        rate_or_window: float,
+        current_time: float,
+        requested: int = 1,
+    ) -> int:
+        """
+        一次领取多个令牌（令牌租约使用）
+
+        Args:
+            limit_type: 令牌桶时 rate_or_window 为每秒令牌数，窗口算法时为窗口长度
+            requested: 希望领取的令牌数
+
+        Returns:
+            int: 实际领取的令牌数，0表示被限流
+        """
+        scripts = {
+            RateLimitType.TOKEN_BUCKET: "token_bucket_script",
+            RateLimitType.SLIDING_WINDOW: "sliding_window_script",
+            RateLimitType.FIXED_WINDOW: "fixed_window_script",
+        }
+        try:
+            if self.config_source and REDIS_AVAILABLE:
+                script = getattr(self, scripts[limit_type])
+                result = script(
+                    keys=[name],
+                    args=[key, max_requests, rate_or_window, current_time, requested],
+                )
+                return int(result[0])
+            else:
+                logger.warning("Redis不可用，使用内存存储")
+                return requested
+        except Exception as e:
+            logger.error(f"领取限流令牌失败: {e}")
+            return 0
+
+    def rate_limiter_multi_dimensional_acquire(
+        self,
+        name: str,
+        dimensions: List[tuple],
+        time_window: float,
+        current_time: float,
+        requested: int = 1,
+    ) -> tuple:
+        """
+        多维滑动窗口检查：所有维度在一个Lua脚本中原子检查并计数
+
+        Args:
+            dimensions: [(维度键, 限额), ...]
+            requested: 希望领取的令牌数
+
+        Returns:
+            tuple: (实际领取的令牌数, 触发限流的维度键或None)
+        """
+        if not dimensions:
+            return requested, None
+        try:
+            if self.config_source and REDIS_AVAILABLE:
+                keys = [
+                    f"rate_limiter:{{{name}}}:sliding_window:{key}"
+                    for key, _ in dimensions
+                ]
+                member_prefix = f"{current_time}:{uuid.uuid4().hex[:12]}"
+                granted, failed_index = self.multi_dimensional_script(
+                    keys=keys,
+                    args=[time_window, current_time, requested, member_prefix]
+                    + [limit for _, limit in dimensions],
+                )
+                granted, failed_index = int(granted), int(failed_index)
+                if granted <= 0:
+                    return 0, dimensions[failed_index - 1][0]
+                return granted, None
+            else:
+                logger.warning("Redis不可用，使用内存存储")
+                return requested, None
+        except Exception as e:
+            logger.error(f"多维限流检查失败: {e}")
+            return 0, None
+
     # ==================== Bulkhead 原子操作 ====================
 
     def bulkhead_execute_atomic_operation(
-        self, name: str, operation: str, max_concurrent_calls: int, current_time: float
+        self,
+        name: str,
+        operation: str,
+        max_concurrent_calls: int,
+        current_time: float,
+        count: int = 1,
+        holder: str = "",
+        lease_ttl: float = 0,
     ) -> tuple:
-        """执行舱壁隔离器原子操作"""
+        """
+        执行舱壁隔离器原子操作
+
+        count 为一次预留/归还的并发数，或一次提交的调用数；
+        acquire 返回 (success, active_calls, granted)，可能只预留到一部分。
+        提供 holder 时预留记入该持有者的租约，租约在 lease_ttl 秒内未续期
+        （持有进程崩溃）时，下一次 acquire 回收其全部额度
+        """
         try:
             if self.config_source and REDIS_AVAILABLE:
                 result = self.bulkhead_script(
-                    keys=[name], args=[operation, max_concurrent_calls, current_time]
+                    keys=[name],
+                    args=[
+                        operation,
+                        max_concurrent_calls,
+                        current_time,
+                        count,
+                        holder,
+                        lease_ttl,
+                    ],
                 )
                 return result
             else:
                 logger.warning("Redis不可用，使用内存存储")
-                return (1, 0)
+                return (1, 0, count)
         except Exception as e:
             logger.error(f"舱壁隔离器原子操作失败: {e}")
-            return (0, 0)
+            return (0, 0, 0)
 
     def get_bulkhead_active_calls(self, name: str) -> int:
         """获取舱壁隔离器活跃调用数"""
@@ -540,79 +801,164 @@ class ResilienceController:
         return 0.0
 
     def _get_from_cache_or_source(self, key: str, default: Any = None) -> Any:
-        """从缓存或数据源获取配置"""
-        current_time = time.time()
+        """从配置快照获取配置哈希（只读映射）"""
+        return self._current_snapshot().hashes.get(key, default)
 
-        with self.cache_lock:
-            # 检查缓存是否已过期
-            if current_time - self.last_cache_update > self.cache_ttl:
-                logger.debug(f"缓存已过期，清空缓存")
-                self.local_cache.clear()
-                self.last_cache_update = current_time
+    def _current_snapshot(self) -> ResilienceConfigSnapshot:
+        """
+        当前配置快照
 
-            # 从缓存获取
-            if key in self.local_cache:
-                return self.local_cache[key]
+        快照超过 cache_ttl 时由一个线程重新加载，其余线程继续使用旧快照；
+        只有首次加载时读取方需要等待。
+        """
+        snapshot = self._snapshot
+        if time.time() - snapshot.loaded_at <= self.cache_ttl:
+            return snapshot
+        first_load = snapshot.loaded_at == 0
+        if self._snapshot_lock.acquire(blocking=first_load):
+            try:
+                if self._snapshot is snapshot:
+                    if first_load:
+                        self._start_config_hot_reload_subscriber()
+                    self._load_snapshot()
+            finally:
+                self._snapshot_lock.release()
+        return self._snapshot
 
-            # 从数据源获取
-            if self.config_source and REDIS_AVAILABLE:
-                try:
-                    value = self.config_source.hgetall(key)
-                    if value:
-                        # 将字节字符串转换为字符串
-                        decoded_value = {}
-                        for k, v in value.items():
-                            if isinstance(k, bytes):
-                                k = k.decode("utf-8")
-                            if isinstance(v, bytes):
-                                v = v.decode("utf-8")
-                            decoded_value[k] = v
-
-                        # 更新缓存和更新时间
-                        self.local_cache[key] = decoded_value
-                        self.last_cache_update = current_time
-                        logger.debug(f"从Redis获取并缓存配置: {key}")
-                        return decoded_value
-                    else:
-                        # Redis中没有数据，不缓存空值
-                        logger.debug(f"Redis中没有找到key: {key}")
-                        return default
-                except Exception as e:
-                    logger.error(f"从Redis获取配置失败: {e}")
+    def _load_snapshot(self):
+        """一次管道读取版本号和全部配置哈希，生成新快照整体替换（需持有快照锁）"""
+        current = self._snapshot
+        if not self.config_source or not REDIS_AVAILABLE:
+            self._snapshot = ResilienceConfigSnapshot(
+                current.version, current.hashes, time.time(), self.CONFIG_OVERRIDES_KEY
+            )
+            return
 
-            # 返回默认值
-            return default
+        try:
+            pipe = self.config_source.pipeline(transaction=False)
+            # 先读版本号：读取期间发生的写入会再以更高版本推送过来，重复应用无害
+            pipe.get(self.CONFIG_VERSION_KEY)
+            for key in self.SNAPSHOT_KEYS:
+                pipe.hgetall(key)
+            version, *values = pipe.execute()
+        except Exception as e:
+            logger.error(f"加载韧性配置快照失败，继续使用旧快照: {e}")
+            self._snapshot = ResilienceConfigSnapshot(
+                current.version, current.hashes, time.time(), self.CONFIG_OVERRIDES_KEY
+            )
+            return
 
-    def _set_to_source(self, key: str, field_name: str, value: str) -> bool:
-        """设置配置到数据源"""
-        current_time = time.time()
+        hashes = {
+            key: _decode_hash(value)
+            for key, value in zip(self.SNAPSHOT_KEYS, values)
+            if value
+        }
+        self._snapshot = ResilienceConfigSnapshot(
+            int(version or 0), hashes, time.time(), self.CONFIG_OVERRIDES_KEY
+        )
+        logger.debug(f"韧性配置快照已加载: version={self._snapshot.version}")
+
+    def _apply_config_change(
+        self, key: str, field_name: str, value: Optional[str], version: Optional[int]
+    ):
+        """
+        将单个字段变更应用到快照
 
+        version 为 None 表示没有Redis（本进程内递增）；版本不连续说明错过了
+        其他进程的变更，此时重新加载整个快照。
+        """
+        with self._snapshot_lock:
+            snapshot = self._snapshot
+            if version is None:
+                version = snapshot.version + 1
+            elif version <= snapshot.version:
+                return
+            elif version != snapshot.version + 1:
+                logger.info(
+                    f"韧性配置版本不连续: {snapshot.version} -> {version}，重新加载快照"
+                )
+                self._load_snapshot()
+                return
+            self._snapshot = snapshot.with_change(
+                key, field_name, value, version, self.CONFIG_OVERRIDES_KEY
+            )
+
+    def _write_config_field(
+        self, key: str, field_name: str, value: Optional[str]
+    ) -> Optional[int]:
+        """
+        写入一个配置字段（value 为 None 时删除）并递增快照版本
+
+        写入立即应用到本进程快照，并通过配置更新频道推送给其他进程。
+
+        Returns:
+            HSET/HDEL 的返回值，写入失败时返回None
+        """
+        result, version = 1, None
         if self.config_source and REDIS_AVAILABLE:
-            lock_key = f"lock:resilience:source:{key}:{field_name}"
-            lock = OptimizedDistributedLock(self.config_source, lock_key, timeout=2.0)
-            with lock:
-                try:
-                    self.config_source.hset(key, field_name, value)
-                    with self.cache_lock:
-                        if key not in self.local_cache:
-                            self.local_cache[key] = {}
-                        self.local_cache[key][field_name] = value
-                        self.last_cache_update = current_time
-                    logger.debug(f"设置Redis配置并更新缓存: {key}.{field_name}")
-                    return True
-                except Exception as e:
-                    logger.error(f"设置Redis配置失败: {e}")
-                    return False
-        else:
-            with self.cache_lock:
-                if key not in self.local_cache:
-                    self.local_cache[key] = {}
-                self.local_cache[key][field_name] = value
-                self.last_cache_update = current_time
-            return True
+            try:
+                pipe = self.config_source.pipeline(transaction=False)
+                if value is None:
+                    pipe.hdel(key, field_name)
+                else:
+                    pipe.hset(key, field_name, value)
+                pipe.incr(self.CONFIG_VERSION_KEY)
+                result, version = pipe.execute()
+            except Exception as e:
+                logger.error(f"写入韧性配置失败: {key}.{field_name}, error: {e}")
+                return None
+
+        self._apply_config_change(key, field_name, value, version)
+        if version is not None and self.event_publisher:
+            self.event_publisher.publish(
+                channel=self.CONFIG_UPDATED_CHANNEL,
+                event_name="config_changed",
+                payload={
+                    "origin": self.origin,
+                    "version": version,
+                    "key": key,
+                    "field": field_name,
+                    "value": value,
+                },
+                source_module="resilience_controller",
+            )
+        logger.debug(f"韧性配置已写入: {key}.{field_name}, version={version}")
+        return result
+
+    def _set_to_source(self, key: str, field_name: str, value: str) -> bool:
+        """设置配置到数据源（HSET 本身是原子的，不再需要分布式锁）"""
+        return self._write_config_field(key, field_name, value) is not None
+
+    def _snapshot_config(self, config_type: str, name: str, build: Callable):
+        """
+        按快照缓存解析后的配置对象
+
+        生效中的配置覆盖到期后重新解析；其余情况下配置对象
+        一直有效，直到快照被替换。
+        """
+        snapshot = self._current_snapshot()
+        now = time.time()
+        cached = snapshot.memo.get((config_type, name))
+        if cached is not None and now < cached[1]:
+            return cached[0]
+        config = build(name)
+        override = snapshot.overrides.get(f"{config_type}:{name}")
+        valid_until = (
+            override[0] if override is not None and override[0] >= now else float("inf")
+        )
+        snapshot.memo[(config_type, name)] = (config, valid_until)
+        return config
 
     def get_circuit_breaker_config(self, name: str) -> Optional[CircuitBreakerConfig]:
-        """获取熔断器配置"""
+        """获取熔断器配置（按配置快照缓存，返回的对象不能原地修改）"""
+        return self._snapshot_config(
+            "circuit_breaker", name, self._build_circuit_breaker_config
+        )
+
+    def _build_circuit_breaker_config(
+        self, name: str
+    ) -> Optional[CircuitBreakerConfig]:
+        """从配置快照解析熔断器配置"""
         # 首先检查是否存在有效的配置覆盖
         override_config = self._check_config_override("circuit_breaker", name)
 
@@ -628,6 +974,11 @@ class ResilienceController:
                     ),
                     monitor_interval=override_config.get("monitor_interval", 10.0),
                     state=CircuitBreakerState(override_config.get("state", "closed")),
+                    hybrid_enabled=override_config.get("hybrid_enabled", True),
+                    lease_ttl=override_config.get("lease_ttl", 1.0),
+                    local_failure_threshold=override_config.get(
+                        "local_failure_threshold", 3
+                    ),
                 )
             except Exception as e:
                 logger.error(f"解析熔断器覆盖配置失败: {e}")
@@ -645,6 +996,9 @@ class ResilienceController:
                     expected_exception=data.get("expected_exception", "Exception"),
                     monitor_interval=data.get("monitor_interval", 10.0),
                     state=CircuitBreakerState(data.get("state", "closed")),
+                    hybrid_enabled=data.get("hybrid_enabled", True),
+                    lease_ttl=data.get("lease_ttl", 1.0),
+                    local_failure_threshold=data.get("local_failure_threshold", 3),
                 )
             except Exception as e:
                 logger.error(f"解析熔断器配置失败: {e}")
@@ -673,6 +1027,11 @@ class ResilienceController:
                     "expected_exception": config.get("expected_exception", "Exception"),
                     "monitor_interval": config.get("monitor_interval", 10.0),
                     "state": config.get("state", "closed"),
+                    "hybrid_enabled": config.get("hybrid_enabled", True),
+                    "lease_ttl": config.get("lease_ttl", 1.0),
+                    "local_failure_threshold": config.get(
+                        "local_failure_threshold", 3
+                    ),
                 }
             else:
                 # 配置对象格式
@@ -684,6 +1043,9 @@ class ResilienceController:
                         "expected_exception": config.expected_exception,
                         "monitor_interval": config.monitor_interval,
                         "state": config.state.value,
+                        "hybrid_enabled": config.hybrid_enabled,
+                        "lease_ttl": config.lease_ttl,
+                        "local_failure_threshold": config.local_failure_threshold,
                     }
                 except AttributeError as e:
                     # 如果无法访问对象属性，使用默认值
@@ -695,6 +1057,9 @@ class ResilienceController:
                         "expected_exception": "Exception",
                         "monitor_interval": 10.0,
                         "state": "closed",
+                        "hybrid_enabled": True,
+                        "lease_ttl": 1.0,
+                        "local_failure_threshold": 3,
                     }
 
             if use_override:
@@ -723,7 +1088,13 @@ class ResilienceController:
             return False
 
     def get_rate_limit_config(self, name: str) -> Optional[RateLimitConfig]:
-        """获取限流器配置"""
+        """获取限流器配置（按配置快照缓存，返回的对象不能原地修改）"""
+        return self._snapshot_config(
+            "rate_limiter", name, self._build_rate_limit_config
+        )
+
+    def _build_rate_limit_config(self, name: str) -> Optional[RateLimitConfig]:
+        """从配置快照解析限流器配置"""
         # 首先检查是否存在有效的配置覆盖
         override_config = self._check_config_override("rate_limiter", name)
 
@@ -745,6 +1116,9 @@ class ResilienceController:
                     server_id_limit=override_config.get("server_id_limit", 200),
                     ip_limit=override_config.get("ip_limit", 100),
                     combined_limit=override_config.get("combined_limit", 300),
+                    lease_enabled=override_config.get("lease_enabled", False),
+                    lease_ttl=override_config.get("lease_ttl", 1.0),
+                    lease_max_block=override_config.get("lease_max_block", 0),
                 )
             except Exception as e:
                 logger.error(f"解析限流器覆盖配置失败: {e}")
@@ -768,6 +1142,9 @@ class ResilienceController:
                     server_id_limit=data.get("server_id_limit", 200),
                     ip_limit=data.get("ip_limit", 100),
                     combined_limit=data.get("combined_limit", 300),
+                    lease_enabled=data.get("lease_enabled", False),
+                    lease_ttl=data.get("lease_ttl", 1.0),
+                    lease_max_block=data.get("lease_max_block", 0),
                 )
             except Exception as e:
                 logger.error(f"解析限流器配置失败: {e}")
@@ -806,6 +1183,9 @@ class ResilienceController:
                     "server_id_limit": config.get("server_id_limit", 200),
                     "ip_limit": config.get("ip_limit", 100),
                     "combined_limit": config.get("combined_limit", 300),
+                    "lease_enabled": config.get("lease_enabled", False),
+                    "lease_ttl": config.get("lease_ttl", 1.0),
+                    "lease_max_block": config.get("lease_max_block", 0),
                 }
             else:
                 # 配置对象格式
@@ -823,6 +1203,9 @@ class ResilienceController:
                         "server_id_limit": config.server_id_limit,
                         "ip_limit": config.ip_limit,
                         "combined_limit": config.combined_limit,
+                        "lease_enabled": config.lease_enabled,
+                        "lease_ttl": config.lease_ttl,
+                        "lease_max_block": config.lease_max_block,
                     }
                 except AttributeError as e:
                     # 如果无法访问对象属性，使用默认值
@@ -840,6 +1223,9 @@ class ResilienceController:
                         "server_id_limit": 200,
                         "ip_limit": 100,
                         "combined_limit": 300,
+                        "lease_enabled": False,
+                        "lease_ttl": 1.0,
+                        "lease_max_block": 0,
                     }
 
             if use_override:
@@ -884,6 +1270,12 @@ class ResilienceController:
             logger.error("tokens_per_second 不能为负数")
             return False
 
+        if config.lease_enabled and (
+            config.lease_ttl <= 0 or config.lease_max_block < 0
+        ):
+            logger.error("lease_ttl 必须大于0，lease_max_block 不能为负数")
+            return False
+
         # 多维限流配置验证
         if config.multi_dimensional:
             if config.user_id_limit < 0:
@@ -915,7 +1307,13 @@ class ResilienceController:
         return True
 
     def get_degradation_config(self, name: str) -> Optional[DegradationConfig]:
-        """获取降级配置"""
+        """获取降级配置（按配置快照缓存，返回的对象不能原地修改）"""
+        return self._snapshot_config(
+            "degradation", name, self._build_degradation_config
+        )
+
+    def _build_degradation_config(self, name: str) -> Optional[DegradationConfig]:
+        """从配置快照解析降级配置"""
         # 首先检查是否存在有效的配置覆盖
         override_config = self._check_config_override("degradation", name)
 
@@ -1040,7 +1438,13 @@ class ResilienceController:
             return False
 
     def get_bulkhead_config(self, name: str) -> Optional["BulkheadConfig"]:
-        """获取舱壁隔离配置"""
+        """获取舱壁隔离配置（按配置快照缓存，返回的对象不能原地修改）"""
+        return self._snapshot_config(
+            "bulkhead", name, self._build_bulkhead_config
+        )
+
+    def _build_bulkhead_config(self, name: str) -> Optional["BulkheadConfig"]:
+        """从配置快照解析舱壁隔离配置"""
         # 首先检查是否存在有效的配置覆盖
         override_config = self._check_config_override("bulkhead", name)
 
@@ -1058,6 +1462,11 @@ class ResilienceController:
                     enabled=override_config.get("enabled", True),
                     monitor_interval=override_config.get("monitor_interval", 10.0),
                     alert_threshold=override_config.get("alert_threshold", 0.8),
+                    max_queue_size=override_config.get("max_queue_size", 0),
+                    global_max_concurrent_calls=override_config.get(
+                        "global_max_concurrent_calls"
+                    ),
+                    reservation_chunk=override_config.get("reservation_chunk", 0),
                 )
             except Exception as e:
                 logger.error(f"解析舱壁隔离覆盖配置失败: {e}")
@@ -1077,6 +1486,9 @@ class ResilienceController:
                     enabled=data.get("enabled", True),
                     monitor_interval=data.get("monitor_interval", 10.0),
                     alert_threshold=data.get("alert_threshold", 0.8),
+                    max_queue_size=data.get("max_queue_size", 0),
+                    global_max_concurrent_calls=data.get("global_max_concurrent_calls"),
+                    reservation_chunk=data.get("reservation_chunk", 0),
                 )
             except Exception as e:
                 logger.error(f"解析舱壁隔离配置失败: {e}")
@@ -1107,6 +1519,11 @@ class ResilienceController:
                     "enabled": config.get("enabled", True),
                     "monitor_interval": config.get("monitor_interval", 10.0),
                     "alert_threshold": config.get("alert_threshold", 0.8),
+                    "max_queue_size": config.get("max_queue_size", 0),
+                    "global_max_concurrent_calls": config.get(
+                        "global_max_concurrent_calls"
+                    ),
+                    "reservation_chunk": config.get("reservation_chunk", 0),
                 }
             else:
                 # 配置对象格式
@@ -1120,6 +1537,11 @@ class ResilienceController:
                         "enabled": config.enabled,
                         "monitor_interval": config.monitor_interval,
                         "alert_threshold": config.alert_threshold,
+                        "max_queue_size": config.max_queue_size,
+                        "global_max_concurrent_calls": (
+                            config.global_max_concurrent_calls
+                        ),
+                        "reservation_chunk": config.reservation_chunk,
                     }
                 except AttributeError as e:
                     # 如果无法访问对象属性，使用默认值
@@ -1133,6 +1555,9 @@ class ResilienceController:
                         "enabled": True,
                         "monitor_interval": 10.0,
                         "alert_threshold": 0.8,
+                        "max_queue_size": 0,
+                        "global_max_concurrent_calls": None,
+                        "reservation_chunk": 0,
                     }
 
             if use_override:
@@ -1160,130 +1585,86 @@ class ResilienceController:
 
     def get_all_configs(self) -> Dict[str, Any]:
         """获取所有配置"""
+        snapshot = self._current_snapshot()
         return {
-            "circuit_breakers": self._get_from_cache_or_source(
-                self.CIRCUIT_BREAKER_KEY, {}
-            ),
-            "rate_limits": self._get_from_cache_or_source(self.RATE_LIMIT_KEY, {}),
-            "degradations": self._get_from_cache_or_source(self.DEGRADATION_KEY, {}),
-            "bulkheads": self._get_from_cache_or_source(self.BULKHEAD_KEY, {}),
-            "global_switches": self._get_from_cache_or_source(
-                self.GLOBAL_SWITCH_KEY, {}
-            ),
+            "circuit_breakers": dict(snapshot.hashes.get(self.CIRCUIT_BREAKER_KEY, {})),
+            "rate_limits": dict(snapshot.hashes.get(self.RATE_LIMIT_KEY, {})),
+            "degradations": dict(snapshot.hashes.get(self.DEGRADATION_KEY, {})),
+            "bulkheads": dict(snapshot.hashes.get(self.BULKHEAD_KEY, {})),
+            "global_switches": dict(snapshot.hashes.get(self.GLOBAL_SWITCH_KEY, {})),
         }
 
     def clear_cache(self):
-        """清除本地缓存"""
-        with self.cache_lock:
-            self.local_cache.clear()
-        self.last_cache_update = 0
+        """清除本地配置快照，下次读取时重新加载"""
+        with self._snapshot_lock:
+            self._snapshot = ResilienceConfigSnapshot()
         logger.info("韧性控制器缓存已清除")
 
     def set_cache_ttl(self, ttl_seconds: float):
-        """设置缓存TTL（秒）"""
-        with self.cache_lock:
-            self.cache_ttl = ttl_seconds
+        """设置快照最大存活时间（秒），超时后整体重新加载"""
+        self.cache_ttl = ttl_seconds
         logger.info(f"缓存TTL已设置为 {ttl_seconds} 秒")
 
     def get_cache_info(self) -> Dict[str, Any]:
         """获取缓存信息"""
-        with self.cache_lock:
-            return {
-                "cache_size": len(self.local_cache),
-                "cache_ttl": self.cache_ttl,
-                "cached_keys": list(self.local_cache.keys()),
-                "last_cache_update": self.last_cache_update,
-            }
+        snapshot = self._snapshot
+        return {
+            "cache_size": len(snapshot.hashes),
+            "cache_ttl": self.cache_ttl,
+            "cached_keys": list(snapshot.hashes.keys()),
+            "last_cache_update": snapshot.loaded_at,
+            "version": snapshot.version,
+            "parsed_configs": len(snapshot.memo),
+            "subscribed": self._config_subscriber is not None,
+        }
 
     def refresh_cache_for_key(self, key: str) -> bool:
-        """强制刷新特定key的缓存"""
+        """强制刷新缓存（整个快照一次管道读取重新加载）"""
         try:
-            with self.cache_lock:
-                # 从缓存中移除该key
-                if key in self.local_cache:
-                    del self.local_cache[key]
-                    logger.debug(f"已从缓存中移除key: {key}")
-
-                # 强制从数据源重新获取
-                if self.config_source and REDIS_AVAILABLE:
-                    value = self.config_source.hgetall(key)
-                    if value:
-                        # 将字节字符串转换为字符串
-                        decoded_value = {}
-                        for k, v in value.items():
-                            if isinstance(k, bytes):
-                                k = k.decode("utf-8")
-                            if isinstance(v, bytes):
-                                v = v.decode("utf-8")
-                            decoded_value[k] = v
-
-                        # 更新缓存
-                        self.local_cache[key] = decoded_value
-                        logger.debug(f"已刷新缓存key: {key}")
-                        return True
-                return False
+            with self._snapshot_lock:
+                self._load_snapshot()
+            return key in self._snapshot.hashes
         except Exception as e:
             logger.error(f"刷新缓存失败: {e}")
             return False
 
     def invalidate_cache(self):
         """使缓存失效 - 下次获取时会重新从数据源加载"""
-        with self.cache_lock:
-            self.local_cache.clear()
-            self.last_cache_update = 0
-            logger.info("缓存已失效")
+        self.clear_cache()
 
     def _start_config_hot_reload_subscriber(self):
-        """启动配置热更新订阅者"""
-        if not self.config_source or not REDIS_AVAILABLE:
+        """订阅配置更新频道，增量应用其他进程写入的配置字段"""
+        if (
+            self._config_subscriber is not None
+            or not self.config_source
+            or not REDIS_AVAILABLE
+        ):
             return
+        try:
+            subscriber = EventSubscriber(self.config_source)
+            subscriber.subscribe(self.CONFIG_UPDATED_CHANNEL, self._handle_config_event)
+            subscriber.start()
+            self._config_subscriber = subscriber
+            logger.info("配置热更新订阅者已启动")
+        except Exception as e:
+            logger.warning(f"配置热更新订阅失败，仅依赖快照过期刷新: {e}")
 
-        def config_subscriber():
-            """配置订阅者线程"""
-            try:
-                pubsub = self.config_source.pubsub()
-                pubsub.subscribe("resilience:config_updated")
-
-                logger.info("配置热更新订阅者已启动")
-
-                for message in pubsub.listen():
-                    if message["type"] == "message":
-                        try:
-                            # 解析配置更新消息
-                            config_data = json.loads(message["data"])
-                            config_type = config_data.get("type")
-                            config_name = config_data.get("name")
-
-                            logger.info(
-                                f"收到配置更新通知: {config_type} - {config_name}"
-                            )
-
-                            # 立即清除本地缓存
-                            self.invalidate_cache()
-
-                            # 发布缓存失效事件
-                            if self.event_publisher:
-                                self.event_publisher.publish(
-                                    channel="resilience:cache_invalidated",
-                                    event_name="cache_invalidated",
-                                    payload={
-                                        "config_type": config_type,
-                                        "config_name": config_name,
-                                        "timestamp": time.time(),
-                                    },
-                                    source_module="resilience_controller",
-                                )
-
-                        except Exception as e:
-                            logger.error(f"处理配置更新消息失败: {e}")
-
-            except Exception as e:
-                logger.error(f"配置订阅者错误: {e}")
-
-        # 启动订阅者线程
-        subscriber_thread = threading.Thread(target=config_subscriber, daemon=True)
-        subscriber_thread.start()
-        logger.info("配置热更新订阅者线程已启动")
+    def _handle_config_event(self, event: Dict[str, Any]):
+        """应用其他进程推送的配置字段变更"""
+        if event.get("event_name") != "config_changed":
+            return
+        payload = event.get("payload") or {}
+        if payload.get("origin") == self.origin:
+            return
+        try:
+            version = int(payload["version"])
+            self._apply_config_change(
+                payload["key"], payload["field"], payload.get("value"), version
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            logger.warning(f"无法解析配置变更消息，重新加载快照: {e}")
+            with self._snapshot_lock:
+                self._load_snapshot()
 
     def _publish_config_update(self, config_type: str, config_name: str):
         """发布配置更新消息"""
@@ -1310,41 +1691,22 @@ class ResilienceController:
         self, config_type: str, config_name: str
     ) -> Optional[Dict[str, Any]]:
         """
-        检查是否存在有效的配置覆盖
+        检查是否存在有效的配置覆盖（读取配置快照中已解析的覆盖）
 
         Args:
-            config_type: 配置类型 (circuit_breaker, rate_limit, degradation, bulkhead)
+            config_type: 配置类型 (circuit_breaker, rate_limiter, degradation, bulkhead)
             config_name: 配置名称
 
         Returns:
             覆盖配置字典，如果不存在或已过期则返回None
         """
-        if not self.config_source or not REDIS_AVAILABLE:
-            return None
-
-        try:
-            override_key = f"{config_type}:{config_name}"
-            override_data = self.config_source.hget(
-                self.CONFIG_OVERRIDES_KEY, override_key
-            )
-
-            if not override_data:
-                return None
-
-            override_info = json.loads(override_data)
-            current_time = time.time()
-
-            # 检查是否过期
-            if current_time > override_info.get("expires_at", 0):
-                # 删除过期覆盖
-                self.config_source.hdel(self.CONFIG_OVERRIDES_KEY, override_key)
-                return None
-
-            return override_info.get("config", None)
-
-        except Exception as e:
-            logger.error(f"检查配置覆盖失败: {config_type}:{config_name}, error: {e}")
+        override = self._current_snapshot().overrides.get(
+            f"{config_type}:{config_name}"
+        )
+        if override is None or time.time() > override[0]:
+            # 过期覆盖由 clear_expired_overrides 清理
             return None
+        return override[1]
 
     def _set_config_override(
         self,
@@ -1380,11 +1742,11 @@ class ResilienceController:
                     "source": "manual_override",
                 }
 
-                result = self.config_source.hset(
+                result = self._write_config_field(
                     self.CONFIG_OVERRIDES_KEY, override_key, json.dumps(override_info)
                 )
 
-                success = result == 1
+                success = result is not None
 
                 if success:
                     logger.info(
@@ -1419,11 +1781,11 @@ class ResilienceController:
         with lock:
             try:
                 override_key = f"{config_type}:{config_name}"
-                result = self.config_source.hdel(
-                    self.CONFIG_OVERRIDES_KEY, override_key
+                result = self._write_config_field(
+                    self.CONFIG_OVERRIDES_KEY, override_key, None
                 )
 
-                success = result > 0
+                success = bool(result)
 
                 if success:
                     logger.info(f"配置覆盖已清除: {config_type}:{config_name}")
@@ -1442,35 +1804,20 @@ class ResilienceController:
         获取所有配置覆盖
 
         Returns:
-            配置覆盖字典
+            配置覆盖字典（不含已过期的覆盖）
         """
-        if not self.config_source or not REDIS_AVAILABLE:
-            return {}
-
-        try:
-            overrides = self.config_source.hgetall(self.CONFIG_OVERRIDES_KEY)
-            result = {}
-
-            for key, value in overrides.items():
-                try:
-                    override_info = json.loads(value)
-                    current_time = time.time()
-
-                    # 过滤过期覆盖
-                    if current_time <= override_info.get("expires_at", 0):
-                        result[key] = override_info
-                    else:
-                        # 删除过期覆盖
-                        self.config_source.hdel(self.CONFIG_OVERRIDES_KEY, key)
-
-                except json.JSONDecodeError:
-                    continue
-
-            return result
-
-        except Exception as e:
-            logger.error(f"获取配置覆盖失败: {e}")
-            return {}
+        current_time = time.time()
+        result = {}
+        for key, value in (
+            self._current_snapshot().hashes.get(self.CONFIG_OVERRIDES_KEY, {}).items()
+        ):
+            try:
+                override_info = json.loads(value)
+            except json.JSONDecodeError:
+                continue
+            if current_time <= override_info.get("expires_at", 0):
+                result[key] = override_info
+        return result
 
     def clear_expired_overrides(self) -> int:
         """
@@ -1486,7 +1833,9 @@ class ResilienceController:
         lock = OptimizedDistributedLock(self.config_source, lock_key, timeout=2.0)
         with lock:
             try:
-                overrides = self.config_source.hgetall(self.CONFIG_OVERRIDES_KEY)
+                overrides = _decode_hash(
+                    self.config_source.hgetall(self.CONFIG_OVERRIDES_KEY)
+                )
                 expired_count = 0
                 current_time = time.time()
 
@@ -1494,11 +1843,13 @@ class ResilienceController:
                     try:
                         override_info = json.loads(value)
                         if current_time > override_info.get("expires_at", 0):
-                            self.config_source.hdel(self.CONFIG_OVERRIDES_KEY, key)
+                            self._write_config_field(
+                                self.CONFIG_OVERRIDES_KEY, key, None
+                            )
                             expired_count += 1
 
                     except json.JSONDecodeError:
-                        self.config_source.hdel(self.CONFIG_OVERRIDES_KEY, key)
+                        self._write_config_field(self.CONFIG_OVERRIDES_KEY, key, None)
                         expired_count += 1
 
                 if expired_count > 0:
@@ -1520,7 +1871,7 @@ class CircuitBreaker:
     # Lua脚本：完整的熔断器业务流程 - 原子性执行
     EXECUTE_OR_RECORD_FAILURE_SCRIPT = """
     local name = KEYS[1]
-    local operation = ARGV[1]  -- "check", "success", "failure"
+    local operation = ARGV[1]  -- "check", "success", "failure", "record"
     local failure_threshold = tonumber(ARGV[2])
     local recovery_timeout = tonumber(ARGV[3])
     local current_time = tonumber(ARGV[4])
@@ -1613,24 +1964,90 @@ class CircuitBreaker:
         end
         
         return {0, current_state, event_to_publish}
+    elseif operation == "record" then
+        -- 批量提交本地缓冲的结果：successes 为成功次数，
+        -- failures 为最后一次成功之后的连续失败次数，与逐次提交的结果一致
+        local successes = tonumber(ARGV[5]) or 0
+        local failures = tonumber(ARGV[6]) or 0
+
+        if current_state == "open" then
+            if failures > 0 then
+                redis.call("SET", last_failure_time_key, current_time)
+            end
+            return {0, current_state, event_to_publish}
+        elseif current_state == "half_open" then
+            if failures > 0 then
+                redis.call("SET", state_key, "open")
+                redis.call("SET", last_failure_time_key, current_time)
+                return {0, "open", "state_changed_to_open"}
+            elseif successes > 0 then
+                redis.call("SET", state_key, "closed")
+                redis.call("SET", failure_count_key, 0)
+                redis.call("SET", half_open_calls_key, 0)
+                return {1, "closed", "state_changed_to_closed"}
+            end
+            return {1, current_state, event_to_publish}
+        end
+
+        if successes > 0 or failures > 0 then
+            local failure_count = 0
+            if successes == 0 then
+                failure_count = tonumber(redis.call("GET", failure_count_key)) or 0
+            end
+            failure_count = failure_count + failures
+            redis.call("SET", failure_count_key, failure_count)
+            if failures > 0 then
+                redis.call("SET", last_failure_time_key, current_time)
+                if failure_count >= failure_threshold then
+                    redis.call("SET", state_key, "open")
+                    return {0, "open", "state_changed_to_open"}
+                end
+            end
+        end
+        return {1, current_state, event_to_publish}
     end
     
     return {0, current_state, event_to_publish}
     """
 
-    def __init__(self, name: str, controller: ResilienceController):
+    def __init__(
+        self,
+        name: str,
+        controller: ResilienceController,
+        config: Optional[CircuitBreakerConfig] = None,
+    ):
         self.name = name
         self.controller = controller
+        self._config = config
+        # 本地状态和CLOSED租约：租约有效期内不访问Redis
+        self._local_state = CircuitBreakerState.CLOSED
+        self._lease_expires_at = 0.0
+        # 本地缓冲：成功次数、最后一次成功之后的连续失败次数
+        self._pending_successes = 0
+        self._pending_failures = 0
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.hybrid_stats = defaultdict(int)
+        controller.register_circuit_breaker(self)
         logger.info(f"熔断器 '{name}' 已初始化")
 
     def get_config(self) -> CircuitBreakerConfig:
-        # 避免递归调用，直接返回默认配置
-        return CircuitBreakerConfig(name=self.name)
+        # 未显式配置时读取控制器的配置快照（无锁，解析结果已缓存）
+        if self._config is not None:
+            return self._config
+        return self.controller.get_circuit_breaker_config(self.name)
+
+    def configure(self, config: CircuitBreakerConfig):
+        """设置本实例使用的配置，本地租约随之作废"""
+        self._config = config
+        self._lease_expires_at = 0.0
 
     def get_state(self) -> CircuitBreakerState:
         return self.controller.get_circuit_breaker_state(self.name)
 
-    def execute_atomic_operation(self, operation: str) -> tuple:
+    def execute_atomic_operation(
+        self, operation: str, successes: int = 0, failures: int = 0
+    ) -> tuple:
         """执行原子操作 - 统一的入口点，与EXECUTE_OR_RECORD_FAILURE_SCRIPT交互"""
         config = self.get_config()
         current_time = time.time()
@@ -1641,6 +2058,8 @@ class CircuitBreaker:
             config.failure_threshold,
             config.recovery_timeout,
             current_time,
+            successes,
+            failures,
         )
 
         # Lua脚本返回的是一个列表，我们需要处理它
@@ -1670,6 +2089,116 @@ class CircuitBreaker:
         else:
             return False
 
+    # ==================== 混合模式：本地租约 + 批量提交 ====================
+
+    def allow_request(self) -> tuple:
+        """
+        判断本次调用是否可以执行
+
+        CLOSED 租约有效时直接放行；租约过期或本地状态不是 CLOSED 时，
+        提交缓冲的结果并在同一次脚本调用中读取最新状态。
+
+        返回:
+            tuple: (can_execute, state, event_intent)
+        """
+        config = self.get_config()
+        if not config.hybrid_enabled:
+            return self.execute_atomic_operation("check")
+
+        if (
+            self._local_state is CircuitBreakerState.CLOSED
+            and time.time() < self._lease_expires_at
+        ):
+            self.hybrid_stats["local_checks"] += 1
+            return True, "closed", "no_event"
+
+        if not self._flush_lock.acquire(blocking=False):
+            # 其他线程正在刷新，CLOSED 状态下沿用刚过期的租约
+            if self._local_state is CircuitBreakerState.CLOSED:
+                self.hybrid_stats["local_checks"] += 1
+                return True, "closed", "no_event"
+            self._flush_lock.acquire()
+        try:
+            return self._flush_locked()
+        finally:
+            self._flush_lock.release()
+
+    def record_success(self) -> tuple:
+        """记录一次成功调用；CLOSED 租约期间只写本地缓冲"""
+        if not self._buffering():
+            return self._record_sync("success")
+        with self._pending_lock:
+            self._pending_successes += 1
+            self._pending_failures = 0
+        return True, "closed", "no_event"
+
+    def record_failure(self) -> tuple:
+        """记录一次失败调用；本地连续失败达到阈值时立即提交"""
+        if not self._buffering():
+            return self._record_sync("failure")
+        config = self.get_config()
+        threshold = max(
+            1, min(config.local_failure_threshold, config.failure_threshold)
+        )
+        with self._pending_lock:
+            self._pending_failures += 1
+            pending = self._pending_failures
+        if pending < threshold:
+            return True, "closed", "no_event"
+        self.hybrid_stats["threshold_flushes"] += 1
+        return self.flush()
+
+    def flush(self) -> tuple:
+        """立即提交本地缓冲的结果并刷新状态"""
+        with self._flush_lock:
+            return self._flush_locked()
+
+    def apply_remote_state(self, state: str):
+        """应用其他进程推送的状态转换：非 CLOSED 时立即作废本地租约"""
+        try:
+            new_state = CircuitBreakerState(state)
+        except ValueError:
+            return
+        self.hybrid_stats["remote_updates"] += 1
+        self._apply_state(new_state, time.time())
+
+    def get_hybrid_stats(self) -> Dict[str, Any]:
+        """混合模式统计"""
+        return {
+            "local_state": self._local_state.value,
+            "lease_remaining": max(0.0, self._lease_expires_at - time.time()),
+            "pending_successes": self._pending_successes,
+            "pending_failures": self._pending_failures,
+            **self.hybrid_stats,
+        }
+
+    def _buffering(self) -> bool:
+        return (
+            self.get_config().hybrid_enabled
+            and self._local_state is CircuitBreakerState.CLOSED
+        )
+
+    def _record_sync(self, operation: str) -> tuple:
+        result = self.execute_atomic_operation(operation)
+        self._apply_state(CircuitBreakerState(result[1]), time.time())
+        return result
+
+    def _flush_locked(self) -> tuple:
+        with self._pending_lock:
+            successes, failures = self._pending_successes, self._pending_failures
+            self._pending_successes = self._pending_failures = 0
+        result = self.execute_atomic_operation("record", successes, failures)
+        self.hybrid_stats["flushes"] += 1
+        self._apply_state(CircuitBreakerState(result[1]), time.time())
+        return result
+
+    def _apply_state(self, state: CircuitBreakerState, now: float):
+        self._local_state = state
+        if state is CircuitBreakerState.CLOSED:
+            self._lease_expires_at = now + self.get_config().lease_ttl
+        else:
+            self._lease_expires_at = 0.0
+
     def get_failure_count(self) -> int:
         """从Redis获取失败计数"""
         return self.controller.get_circuit_breaker_failure_count(self.name)
@@ -1696,6 +2225,7 @@ class RateLimiter:
     local max_requests = tonumber(ARGV[2])
     local tokens_per_second = tonumber(ARGV[3])
     local current_time = tonumber(ARGV[4])
+    local requested = tonumber(ARGV[5]) or 1
     
     local tokens_key = "rate_limiter:{" .. name .. "}:tokens:" .. key
     local last_update_key = "rate_limiter:{" .. name .. "}:last_update:" .. key
@@ -1726,12 +2256,13 @@ class RateLimiter:
         current_tokens = max_requests
     end
     
-    -- 检查是否有可用令牌
+    -- 检查是否有可用令牌（租约模式下一次最多领取 requested 个）
     if current_tokens >= 1 then
-        current_tokens = current_tokens - 1
+        local granted = math.min(requested, math.floor(current_tokens))
+        current_tokens = current_tokens - granted
         redis.call("SET", tokens_key, current_tokens)
         redis.call("SET", last_update_key, current_time)
-        return {1}  -- 允许
+        return {granted}  -- 允许
     else
         redis.call("SET", last_update_key, current_time)
         return {0}  -- 拒绝
@@ -1745,6 +2276,7 @@ class RateLimiter:
     local max_requests = tonumber(ARGV[2])
     local time_window = tonumber(ARGV[3])
     local current_time = tonumber(ARGV[4])
+    local requested = tonumber(ARGV[5]) or 1
     
     local zset_key = "rate_limiter:{" .. name .. "}:sliding_window:" .. key
     
@@ -1757,9 +2289,13 @@ class RateLimiter:
     
     -- 检查是否超过限制
     if current_count < max_requests then
-        -- 添加当前请求记录 (O(log(N)))
-        redis.call("ZADD", zset_key, current_time, current_time .. ":" .. math.random())
-        return {1}  -- 允许
+        -- 添加当前请求记录 (O(log(N)))，租约模式下一次记录 granted 条
+        local granted = math.min(requested, max_requests - current_count)
+        local member = current_time .. ":" .. math.random()
+        for i = 1, granted do
+            redis.call("ZADD", zset_key, current_time, member .. ":" .. i)
+        end
+        return {granted}  -- 允许
     else
         return {0}  -- 拒绝
     end
@@ -1772,6 +2308,7 @@ class RateLimiter:
     local max_requests = tonumber(ARGV[2])
     local time_window = tonumber(ARGV[3])
     local current_time = tonumber(ARGV[4])
+    local requested = tonumber(ARGV[5]) or 1
     
     local window_key = "rate_limiter:{" .. name .. "}:fixed_window:" .. key
     local counter_key = "rate_limiter:{" .. name .. "}:counter:" .. key
@@ -1798,29 +2335,84 @@ class RateLimiter:
     -- 检查是否是新窗口
     if window_start > current_window then
         -- 新窗口，重置计数器
+        local granted = math.min(requested, max_requests)
         redis.call("SET", window_key, window_start)
-        redis.call("SET", counter_key, 1)
-        return {1}  -- 允许
+        redis.call("SET", counter_key, granted)
+        return {granted}  -- 允许
     else
         -- 当前窗口，检查并递增计数器
         if current_count < max_requests then
-            redis.call("INCR", counter_key)
-            return {1}  -- 允许
+            local granted = math.min(requested, max_requests - current_count)
+            redis.call("INCRBY", counter_key, granted)
+            return {granted}  -- 允许
         else
             return {0}  -- 拒绝
         end
     end
     """
 
-    def __init__(self, name: str, controller: ResilienceController):
+    # Lua脚本：多维滑动窗口原子检查 - 所有维度一次往返
+    # KEYS: 各维度的ZSET（同一哈希标签）
+    # ARGV: time_window, current_time, requested, member_prefix, 各维度限额...
+    MULTI_DIMENSIONAL_ATOMIC_SCRIPT = """
+    local time_window = tonumber(ARGV[1])
+    local current_time = tonumber(ARGV[2])
+    local granted = tonumber(ARGV[3])
+    local member_prefix = ARGV[4]
+    local window_start = current_time - time_window
+
+    -- 先检查所有维度，取各维度剩余额度的最小值
+    for i, zset_key in ipairs(KEYS) do
+        redis.call("ZREMRANGEBYSCORE", zset_key, "-inf", window_start)
+        local available = tonumber(ARGV[4 + i]) - redis.call("ZCARD", zset_key)
+        if available < granted then
+            granted = available
+        end
+        if granted <= 0 then
+            return {0, i}  -- 拒绝，返回触发限流的维度
+        end
+    end
+
+    -- 全部通过后再计数，任一维度拒绝时不会留下部分记录
+    local ttl = math.ceil(time_window * 1000)
+    for _, zset_key in ipairs(KEYS) do
+        for i = 1, granted do
+            redis.call("ZADD", zset_key, current_time, member_prefix .. ":" .. i)
+        end
+        redis.call("PEXPIRE", zset_key, ttl)
+    end
+    return {granted, 0}
+    """
+
+    # 租约表超过该大小时清理过期租约
+    MAX_LEASES = 10000
+
+    def __init__(
+        self,
+        name: str,
+        controller: ResilienceController,
+        config: Optional[RateLimitConfig] = None,
+    ):
         self.name = name
         self.controller = controller
+        self._config = config
+        self._leases: Dict[tuple, "_TokenLease"] = {}
+        self._lease_lock = threading.Lock()
+        self.lease_stats = defaultdict(int)
         logger.info(f"限流器 '{name}' 已初始化")
 
     def get_config(self) -> RateLimitConfig:
         """获取当前配置"""
-        # 避免递归调用，直接返回默认配置
-        return RateLimitConfig(name=self.name)
+        # 未显式配置时读取控制器的配置快照（无锁，解析结果已缓存）
+        if self._config is not None:
+            return self._config
+        return self.controller.get_rate_limit_config(self.name)
+
+    def configure(self, config: RateLimitConfig):
+        """设置本实例使用的配置，已领取的租约随之作废"""
+        self._config = config
+        with self._lease_lock:
+            self._leases.clear()
 
     def get_tokens(self, key: str) -> float:
         """获取令牌数 - 从Redis获取"""
@@ -1896,7 +2488,13 @@ class RateLimiter:
 
         # 单维限流检查（仅在非多维限流时执行）
         # 使用精确的类型分发逻辑
-        if config.limit_type == RateLimitType.TOKEN_BUCKET:
+        if config.lease_enabled and config.limit_type in (
+            RateLimitType.TOKEN_BUCKET,
+            RateLimitType.SLIDING_WINDOW,
+            RateLimitType.FIXED_WINDOW,
+        ):
+            return self._leased_check(key, config)
+        elif config.limit_type == RateLimitType.TOKEN_BUCKET:
             return self._token_bucket_atomic_check(key, config)
         elif config.limit_type == RateLimitType.SLIDING_WINDOW:
             return self._sliding_window_atomic_check(key, config)
@@ -1942,65 +2540,166 @@ class RateLimiter:
             self.name, key, config.max_requests, config.time_window, current_time
         )
 
+    def _leased_check(self, key: str, config: RateLimitConfig) -> bool:
+        """租约模式的单维限流检查"""
+        if config.limit_type == RateLimitType.TOKEN_BUCKET:
+            rate_or_window = config.tokens_per_second
+        else:
+            rate_or_window = config.time_window
+
+        def fetch(requested: int) -> int:
+            return self.controller.rate_limiter_acquire(
+                self.name,
+                config.limit_type,
+                key,
+                config.max_requests,
+                rate_or_window,
+                time.time(),
+                requested,
+            )
+
+        return self._consume_lease(("key", key), config, config.max_requests, fetch)
+
     def _check_multi_dimensional_limits(
         self, multi_key: MultiDimensionalKey, config: RateLimitConfig
     ) -> bool:
-        """检查多维限流限制 - 使用控制器原子操作"""
-        current_time = time.time()
-
-        # 检查用户ID维度
+        """检查多维限流限制 - 所有维度在一个Lua脚本中原子检查"""
+        dimensions = []
         if multi_key.user_id and config.user_id_limit > 0:
-            user_key = f"user_{multi_key.user_id}"
-            if not self.controller.rate_limiter_sliding_window_check(
-                self.name,
-                user_key,
-                config.user_id_limit,
-                config.time_window,
-                current_time,
-            ):
-                logger.warning(f"用户ID {multi_key.user_id} 超过限流限制")
-                return False
-
-        # 检查服务器ID维度
+            dimensions.append((f"user_{multi_key.user_id}", config.user_id_limit))
         if multi_key.server_id and config.server_id_limit > 0:
-            server_key = f"server_{multi_key.server_id}"
-            if not self.controller.rate_limiter_sliding_window_check(
-                self.name,
-                server_key,
-                config.server_id_limit,
-                config.time_window,
-                current_time,
-            ):
-                logger.warning(f"服务器ID {multi_key.server_id} 超过限流限制")
-                return False
-
-        # 检查IP地址维度
+            dimensions.append((f"server_{multi_key.server_id}", config.server_id_limit))
         if multi_key.ip_address and config.ip_limit > 0:
-            ip_key = f"ip_{multi_key.ip_address}"
-            if not self.controller.rate_limiter_sliding_window_check(
-                self.name, ip_key, config.ip_limit, config.time_window, current_time
-            ):
-                logger.warning(f"IP地址 {multi_key.ip_address} 超过限流限制")
-                return False
-
-        # 检查组合维度
+            dimensions.append((f"ip_{multi_key.ip_address}", config.ip_limit))
         if config.combined_limit > 0:
             # 构建组合键，处理None值
             user_part = multi_key.user_id or "none"
             server_part = multi_key.server_id or "none"
             ip_part = multi_key.ip_address or "none"
             combined_key = f"combined_{user_part}_{server_part}_{ip_part}"
-            if not self.controller.rate_limiter_sliding_window_check(
-                self.name,
-                combined_key,
-                config.combined_limit,
-                config.time_window,
-                current_time,
-            ):
-                logger.warning(f"组合维度 {combined_key} 超过限流限制")
+            dimensions.append((combined_key, config.combined_limit))
+        if not dimensions:
+            return True
+
+        def fetch(requested: int) -> int:
+            acquire = self.controller.rate_limiter_multi_dimensional_acquire
+            granted, failed_key = acquire(
+                self.name, dimensions, config.time_window, time.time(), requested
+            )
+            if failed_key is not None:
+                logger.warning(f"多维限流维度 {failed_key} 超过限流限制")
+            return granted
+
+        if not config.lease_enabled:
+            return fetch(1) > 0
+        lease_key = (
+            "multi",
+            multi_key.user_id,
+            multi_key.server_id,
+            multi_key.ip_address,
+        )
+        smallest_limit = min(limit for _, limit in dimensions)
+        return self._consume_lease(lease_key, config, smallest_limit, fetch)
+
+    def _consume_lease(
+        self,
+        lease_key: tuple,
+        config: RateLimitConfig,
+        limit: int,
+        fetch: Callable[[int], int],
+    ) -> bool:
+        """
+        从本地租约消耗一个令牌，租约用完或过期时向Redis领取新的一批
+
+        Args:
+            lease_key: 租约键
+            limit: 该租约对应的最小限额，用于限制单次领取的数量
+            fetch: 领取函数，参数为希望领取的数量，返回实际领取的数量
+        """
+        now = time.time()
+        with self._lease_lock:
+            lease = self._leases.get(lease_key)
+            if lease is None:
+                if len(self._leases) >= self.MAX_LEASES:
+                    self._prune_leases(now)
+                lease = self._leases[lease_key] = _TokenLease(now)
+            lease.observe()
+            if lease.expires_at > now:
+                if lease.tokens > 0:
+                    lease.tokens -= 1
+                    self.lease_stats["local_grants"] += 1
+                    return True
+                if lease.denied:
+                    # 刚被拒绝的租约在有效期内直接拒绝，不再访问Redis
+                    self.lease_stats["local_denials"] += 1
+                    return False
+            max_block = config.lease_max_block or max(1, limit // 10)
+            requested = lease.next_block(now, config.lease_ttl, max_block)
+
+        granted = fetch(requested)
+        self.lease_stats["remote_fetches"] += 1
+
+        with self._lease_lock:
+            now = time.time()
+            if granted <= 0:
+                # 拒绝结果只缓存租约有效期的十分之一，避免长时间误拒
+                lease.tokens = 0
+                lease.denied = True
+                lease.expires_at = now + config.lease_ttl * 0.1
                 return False
+            if lease.expires_at <= now or lease.denied:
+                lease.tokens = 0
+            lease.tokens += granted - 1
+            lease.denied = False
+            lease.expires_at = now + config.lease_ttl
+            return True
+
+    def _prune_leases(self, now: float):
+        """清理过期租约（调用方持有锁）"""
+        expired = [k for k, lease in self._leases.items() if lease.expires_at <= now]
+        for lease_key in expired:
+            del self._leases[lease_key]
+
+    def get_lease_stats(self) -> Dict[str, Any]:
+        """租约统计"""
+        with self._lease_lock:
+            return {"active_leases": len(self._leases), **self.lease_stats}
 
-        return True
+
+class _TokenLease:
+    """
+    本地令牌租约
+
+    记录上次领取以来的请求数，按观测到的请求速率决定下次领取的数量：
+    速率 × 租约有效期，限制在 [1, max_block] 内。
+    """
+
+    __slots__ = ("tokens", "expires_at", "denied", "rate", "requests", "since")
+
+    def __init__(self, now: float):
+        self.tokens = 0
+        self.expires_at = 0.0
+        self.denied = False
+        self.rate = 0.0
+        self.requests = 0
+        self.since = now
+
+    def observe(self):
+        self.requests += 1
+
+    def next_block(self, now: float, lease_ttl: float, max_block: int) -> int:
+        """根据上一个周期的请求速率（指数平滑）计算本次领取数量"""
+        if self.expires_at == 0.0:
+            # 新租约的第一次领取尚无速率观测：只领取一个，从现在开始计量
+            self.requests = 0
+            self.since = now
+            return 1
+        elapsed = max(now - self.since, 1e-3)
+        observed = self.requests / elapsed
+        self.rate = observed if self.rate == 0.0 else 0.5 * self.rate + 0.5 * observed
+        self.requests = 0
+        self.since = now
+        return max(1, min(max_block, int(self.rate * lease_ttl + 0.5)))
 
 
 # ==================== 全局韧性组件注册表 ====================
@@ -2071,10 +2770,19 @@ def get_resilience_instances_info() -> Dict[str, str]:
 
 
 # 创建一个辅助函数来处理事件发布，保持装饰器代码的整洁
+# 状态转换意图 -> 事件名后缀
+_BREAKER_EVENT_SUFFIXES = {
+    "state_changed_to_open": "opened",
+    "state_changed_to_half_open": "half_opened",
+    "state_changed_to_closed": "closed",
+}
+
+
 def _publish_breaker_event(breaker: CircuitBreaker, event_intent: str, state: str):
-    """根据意图发布熔断器事件。"""
-    # "event_opened" -> "resilience.circuit_breaker.opened"
-    event_name = f"resilience.circuit_breaker.{event_intent.split('_')[1]}"
+    """根据意图发布熔断器事件，其他进程据此同步本地状态。"""
+    # "state_changed_to_open" -> "resilience.circuit_breaker.opened"
+    suffix = _BREAKER_EVENT_SUFFIXES.get(event_intent, event_intent)
+    event_name = f"resilience.circuit_breaker.{suffix}"
 
     if breaker.controller.event_publisher:
         breaker.controller.event_publisher.publish(
@@ -2102,8 +2810,8 @@ def circuit_breaker(name: str, fallback_function: Optional[Callable] = None):
         def wrapper(*args, **kwargs):
             breaker = get_or_create_circuit_breaker(name)
 
-            # 步骤1: 原子性地检查是否可以执行
-            can_execute, state, event_intent = breaker.execute_atomic_operation("check")
+            # 步骤1: 检查是否可以执行（CLOSED 租约有效时不访问Redis）
+            can_execute, state, event_intent = breaker.allow_request()
 
             # 步骤2: 在任何业务逻辑之前，处理状态转换事件
             # 这一步是安全的，因为它只发布消息，不影响核心流程
@@ -2128,10 +2836,10 @@ def circuit_breaker(name: str, fallback_function: Optional[Callable] = None):
                 # 只有 func 的调用在这个 try 块中
                 result = func(*args, **kwargs)
 
-                # 步骤4: 原子性地记录成功
+                # 步骤4: 记录成功（CLOSED 租约期间写入本地缓冲，批量提交）
                 # 这个操作本身也可能失败，但不应影响到已经成功的业务结果
                 try:
-                    _, state, event_intent = breaker.execute_atomic_operation("success")
+                    _, state, event_intent = breaker.record_success()
                     if event_intent != "no_event":
                         try:
                             _publish_breaker_event(breaker, event_intent, state)
@@ -2144,9 +2852,9 @@ def circuit_breaker(name: str, fallback_function: Optional[Callable] = None):
                 return result
 
             except Exception as e:
-                # 步骤5: 原子性地记录失败
+                # 步骤5: 记录失败（本地连续失败达到阈值时立即提交）
                 try:
-                    _, state, event_intent = breaker.execute_atomic_operation("failure")
+                    _, state, event_intent = breaker.record_failure()
                     if event_intent != "no_event":
                         try:
                             _publish_breaker_event(breaker, event_intent, state)
@@ -2276,11 +2984,15 @@ def get_circuit_breaker_state(name: str) -> Dict[str, Any]:
         "failure_count": breaker.get_failure_count(),
         "last_failure_time": breaker.get_last_failure_time(),
         "half_open_calls": breaker.get_half_open_calls(),
+        "hybrid": breaker.get_hybrid_stats(),
         "config": {
             "failure_threshold": config.failure_threshold,
             "recovery_timeout": config.recovery_timeout,
             "expected_exception": config.expected_exception,
             "monitor_interval": config.monitor_interval,
+            "hybrid_enabled": config.hybrid_enabled,
+            "lease_ttl": config.lease_ttl,
+            "local_failure_threshold": config.local_failure_threshold,
         },
     }
 
@@ -2303,6 +3015,8 @@ def get_rate_limit_status(name: str) -> Dict[str, Any]:
         "server_id_limit": config.server_id_limit,
         "ip_limit": config.ip_limit,
         "combined_limit": config.combined_limit,
+        "lease_enabled": config.lease_enabled,
+        "lease": limiter.get_lease_stats(),
     }
 
 
@@ -2322,10 +3036,10 @@ def set_circuit_breaker_config(name: str, use_override: bool = True, **kwargs) -
         # 如果配置不存在，创建默认配置
         config = CircuitBreakerConfig(name=name)
 
-    # 更新配置
-    for key, value in kwargs.items():
-        if hasattr(config, key):
-            setattr(config, key, value)
+    # 更新配置（配置对象由快照共享，生成副本而不是原地修改）
+    config = replace(
+        config, **{key: value for key, value in kwargs.items() if hasattr(config, key)}
+    )
 
     return controller.set_circuit_breaker_config(name, config, use_override)
 
@@ -2346,10 +3060,10 @@ def set_rate_limit_config(name: str, use_override: bool = True, **kwargs) -> boo
         # 如果配置不存在，创建默认配置
         config = RateLimitConfig(name=name)
 
-    # 更新配置
-    for key, value in kwargs.items():
-        if hasattr(config, key):
-            setattr(config, key, value)
+    # 更新配置（配置对象由快照共享，生成副本而不是原地修改）
+    config = replace(
+        config, **{key: value for key, value in kwargs.items() if hasattr(config, key)}
+    )
 
     return controller.set_rate_limit_config(name, config, use_override)
 
@@ -2370,10 +3084,10 @@ def set_degradation_config(name: str, use_override: bool = True, **kwargs) -> bo
         # 如果配置不存在，创建默认配置
         config = DegradationConfig(name=name)
 
-    # 更新配置
-    for key, value in kwargs.items():
-        if hasattr(config, key):
-            setattr(config, key, value)
+    # 更新配置（配置对象由快照共享，生成副本而不是原地修改）
+    config = replace(
+        config, **{key: value for key, value in kwargs.items() if hasattr(config, key)}
+    )
 
     return controller.set_degradation_config(name, config, use_override)
 
@@ -2411,15 +3125,28 @@ class BulkheadConfig:
 
     name: str
     strategy: IsolationStrategy = IsolationStrategy.USER
-    max_concurrent_calls: int = 10  # 最大并发调用数
+    # 每个进程、每个隔离键的最大并发调用数；
+    # 未设置 global_max_concurrent_calls 时同时作为所有进程合计的上限
+    max_concurrent_calls: int = 10
     max_wait_time: float = 5.0  # 最大等待时间（秒）
     timeout: float = 30.0  # 超时时间（秒）
     enabled: bool = True
+    max_queue_size: int = 0  # 每个隔离键最多排队等待的调用数，0表示不排队
+    # 所有进程合计的并发上限，None表示与 max_concurrent_calls 相同，0表示不限制
+    global_max_concurrent_calls: Optional[int] = None
+    reservation_chunk: int = 0  # 每次从全局上限预留的数量，0表示取上限的10%
 
     # 监控配置
     monitor_interval: float = 10.0  # 监控间隔（秒）
     alert_threshold: float = 0.8  # 告警阈值（资源使用率）
 
+    @property
+    def global_limit(self) -> int:
+        """所有进程合计的并发上限，0表示不限制"""
+        if self.global_max_concurrent_calls is None:
+            return self.max_concurrent_calls
+        return self.global_max_concurrent_calls
+
 
 class Bulkhead:
     """舱壁隔离器 - 使用Redis状态管理解决多进程问题"""
@@ -2430,11 +3157,34 @@ class Bulkhead:
     local operation = ARGV[1]  -- "check", "acquire", "release", "success", "failure"
     local max_concurrent_calls = tonumber(ARGV[2])
     local current_time = tonumber(ARGV[3])
+    local count = tonumber(ARGV[4]) or 1  -- 预留/归还的并发数或提交的调用数
+    local holder = ARGV[5] or ""  -- 租约持有者，为空时不记录租约
+    local lease_ttl = tonumber(ARGV[6]) or 0
     
     local active_calls_key = "bulkhead:{" .. name .. "}:active_calls"
     local total_calls_key = "bulkhead:{" .. name .. "}:total_calls"
     local failed_calls_key = "bulkhead:{" .. name .. "}:failed_calls"
     local last_call_time_key = "bulkhead:{" .. name .. "}:last_call_time"
+    -- 租约：有序集合保存各持有者的到期时间，哈希保存各持有者预留的数量
+    local leases_key = "bulkhead:{" .. name .. "}:leases"
+    local lease_counts_key = "bulkhead:{" .. name .. "}:lease_counts"
+    
+    -- 回收已到期租约（持有进程已崩溃）的全部额度
+    local function reclaim_expired()
+        local expired = redis.call("ZRANGEBYSCORE", leases_key, "-inf", current_time)
+        if #expired == 0 then
+            return
+        end
+        local reclaimed = 0
+        for _, member in ipairs(expired) do
+            local held = redis.call("HGET", lease_counts_key, member)
+            reclaimed = reclaimed + (tonumber(held) or 0)
+            redis.call("HDEL", lease_counts_key, member)
+            redis.call("ZREM", leases_key, member)
+        end
+        local active_calls = tonumber(redis.call("GET", active_calls_key)) or 0
+        redis.call("SET", active_calls_key, math.max(0, active_calls - reclaimed))
+    end
     
     if operation == "check" then
         -- 检查是否可以执行
@@ -2453,6 +3203,9 @@ class Bulkhead:
         
     elseif operation == "acquire" then
         -- 获取资源
+        if holder ~= "" then
+            reclaim_expired()
+        end
         local active_calls = redis.call("GET", active_calls_key)
         if not active_calls then
             active_calls = 0
@@ -2460,17 +3213,34 @@ class Bulkhead:
             active_calls = tonumber(active_calls)
         end
         
-        if active_calls < max_concurrent_calls then
-            active_calls = active_calls + 1
+        -- 剩余额度不足 count 时只预留剩余部分
+        local granted = math.min(count, max_concurrent_calls - active_calls)
+        if granted > 0 then
+            active_calls = active_calls + granted
             redis.call("SET", active_calls_key, active_calls)
             redis.call("SET", last_call_time_key, current_time)
-            return {1, active_calls}  -- 成功获取
+            if holder ~= "" then
+                redis.call("HINCRBY", lease_counts_key, holder, granted)
+                redis.call("ZADD", leases_key, current_time + lease_ttl, holder)
+            end
+            return {1, active_calls, granted}  -- 成功获取
         else
-            return {0, active_calls}  -- 无法获取
+            return {0, active_calls, 0}  -- 无法获取
         end
         
     elseif operation == "release" then
-        -- 释放资源
+        -- 释放资源；租约已被回收的部分不再重复扣减
+        if holder ~= "" then
+            local held = tonumber(redis.call("HGET", lease_counts_key, holder)) or 0
+            count = math.min(count, held)
+            if held - count <= 0 then
+                redis.call("HDEL", lease_counts_key, holder)
+                redis.call("ZREM", leases_key, holder)
+            else
+                redis.call("HSET", lease_counts_key, holder, held - count)
+                redis.call("ZADD", leases_key, current_time + lease_ttl, holder)
+            end
+        end
         local active_calls = redis.call("GET", active_calls_key)
         if not active_calls then
             active_calls = 0
@@ -2479,12 +3249,20 @@ class Bulkhead:
         end
         
         if active_calls > 0 then
-            active_calls = active_calls - 1
+            active_calls = math.max(0, active_calls - count)
             redis.call("SET", active_calls_key, active_calls)
         end
         
         return {1, active_calls}
         
+    elseif operation == "renew" then
+        -- 续期租约，租约已被回收时返回0
+        if redis.call("HEXISTS", lease_counts_key, holder) == 1 then
+            redis.call("ZADD", leases_key, current_time + lease_ttl, holder)
+            return {1}
+        end
+        return {0}
+        
     elseif operation == "success" then
         -- 记录成功调用
         local total_calls = redis.call("GET", total_calls_key)
@@ -2494,7 +3272,7 @@ class Bulkhead:
             total_calls = tonumber(total_calls)
         end
         
-        total_calls = total_calls + 1
+        total_calls = total_calls + count
         redis.call("SET", total_calls_key, total_calls)
         
         return {1, total_calls}
@@ -2516,8 +3294,8 @@ class Bulkhead:
             failed_calls = tonumber(failed_calls)
         end
         
-        total_calls = total_calls + 1
-        failed_calls = failed_calls + 1
+        total_calls = total_calls + count
+        failed_calls = failed_calls + count
         
         redis.call("SET", total_calls_key, total_calls)
         redis.call("SET", failed_calls_key, failed_calls)
@@ -2528,70 +3306,263 @@ class Bulkhead:
     return {0}
     """
 
-    def __init__(self, name: str, controller: ResilienceController):
+    # 隔离键数量超过该值时清理空闲槽位
+    MAX_SLOTS = 10000
+    # 全局预留租约的最短时长（秒），持有期间随监控周期续期
+    LEASE_TTL = 60.0
+
+    def __init__(
+        self,
+        name: str,
+        controller: ResilienceController,
+        config: Optional[BulkheadConfig] = None,
+    ):
         self.name = name
         self.controller = controller
+        self._config = config
+        # 本地层：每个隔离键一个信号量（eventlet 打补丁后为协程信号量）
+        self._slots: Dict[str, "_IsolationSlot"] = {}
+        self._slots_lock = threading.Lock()
+        # 全局层：本进程从Redis全局上限中预留、已使用的并发数；
+        # 预留记在本进程的租约下，进程崩溃后由其他进程回收
+        self._global_reserved = 0
+        self._global_in_use = 0
+        self._global_lock = threading.Lock()
+        self._lease_holder = f"{os.getpid()}:{uuid.uuid4().hex}"
+        # 待提交的调用统计和待上报的拒绝数
+        self._stats_lock = threading.Lock()
+        self._pending_calls = 0
+        self._pending_failures = 0
+        self._rejected = 0
+        self._next_report = time.time()
+        self.local_stats = defaultdict(int)
         logger.info(f"舱壁隔离器 '{name}' 已初始化")
 
     def get_config(self) -> BulkheadConfig:
         """获取当前配置"""
-        # 避免递归调用，直接返回默认配置
-        return BulkheadConfig(name=self.name)
+        # 未显式配置时读取控制器的配置快照（无锁，解析结果已缓存）
+        if self._config is not None:
+            return self._config
+        return self.controller.get_bulkhead_config(self.name)
+
+    def configure(self, config: BulkheadConfig):
+        """设置本实例使用的配置，新的并发上限对之后创建的槽位生效"""
+        self._config = config
+        with self._slots_lock:
+            self._slots = {
+                key: slot for key, slot in self._slots.items() if not slot.idle()
+            }
 
     def set_config(self, config: BulkheadConfig) -> bool:
         """设置配置"""
         return self.controller.set_bulkhead_config(self.name, config)
 
-    def acquire_resource(self) -> bool:
-        """获取资源 - 原子操作，专注于并发请求数限制"""
-        config = self.get_config()
-        current_time = time.time()
+    def acquire_resource(self, key: str = "default") -> bool:
+        """
+        获取资源：先占用本地信号量，再占用全局预留额度
 
-        result = self.controller.bulkhead_execute_atomic_operation(
-            self.name, "acquire", config.max_concurrent_calls, current_time
-        )
+        本地并发已满时按 max_queue_size 排队，最多等待 max_wait_time 秒，
+        队列已满直接拒绝；只有本地预留用完时才访问Redis。
 
-        success, active_calls = result
+        参数:
+            key: 隔离键（按 IsolationStrategy 生成，如用户ID）
 
-        if success == 1:
-            logger.debug(
-                f"舱壁隔离器 '{self.name}' 获取资源成功，当前活跃调用: {active_calls}"
-            )
-            return True
-        else:
+        返回:
+            bool: 是否获取成功，成功后必须调用 release_resource(key)
+        """
+        config = self.get_config()
+        slot = self._get_slot(key, config.max_concurrent_calls)
+
+        if not slot.acquire(config.max_queue_size, config.max_wait_time):
+            self._reject("local")
+            return False
+
+        if not self._acquire_global(config):
+            slot.release()
+            self._reject("global")
             logger.warning(
-                f"舱壁隔离器 '{self.name}' 获取资源失败，当前活跃调用: {active_calls}/{config.max_concurrent_calls}"
+                f"舱壁隔离器 '{self.name}' 已达到全局并发上限: {config.global_limit}"
             )
             return False
+        return True
 
-    def release_resource(self):
-        """释放资源 - 原子操作"""
-        result = self.controller.bulkhead_execute_atomic_operation(
-            self.name, "release", 0, time.time()
-        )
-
-        success, active_calls = result
-        logger.debug(f"舱壁隔离器 '{self.name}' 释放资源，当前活跃调用: {active_calls}")
+    def release_resource(self, key: str = "default"):
+        """释放资源，多余的空闲全局额度归还Redis"""
+        with self._slots_lock:
+            slot = self._slots.get(key)
+        if slot is not None:
+            slot.release()
+        self._release_global(self.get_config())
+        self._maybe_report()
 
     def record_success(self):
-        """记录成功调用 - 原子操作"""
-        result = self.controller.bulkhead_execute_atomic_operation(
-            self.name, "success", 0, time.time()
+        """记录成功调用，随监控周期批量提交"""
+        with self._stats_lock:
+            self._pending_calls += 1
+        self._maybe_report()
+
+    def record_failure(self):
+        """记录失败调用，随监控周期批量提交"""
+        with self._stats_lock:
+            self._pending_calls += 1
+            self._pending_failures += 1
+        self._maybe_report()
+
+    def _get_slot(self, key: str, limit: int) -> "_IsolationSlot":
+        slot = self._slots.get(key)
+        if slot is not None and slot.limit == limit:
+            return slot
+        with self._slots_lock:
+            slot = self._slots.get(key)
+            if slot is not None and slot.limit != limit and slot.idle():
+                # 并发上限已变更，空闲槽位按新上限重建
+                slot = None
+            if slot is None:
+                if len(self._slots) >= self.MAX_SLOTS:
+                    self._slots = {
+                        k: s for k, s in self._slots.items() if not s.idle()
+                    }
+                slot = self._slots[key] = _IsolationSlot(limit)
+            return slot
+
+    def _reject(self, tier: str):
+        with self._stats_lock:
+            self._rejected += 1
+            self.local_stats[f"{tier}_rejections"] += 1
+
+    def _chunk_size(self, config: BulkheadConfig) -> int:
+        return config.reservation_chunk or max(1, config.global_limit // 10)
+
+    def _lease_ttl(self, config: BulkheadConfig) -> float:
+        # 超过两倍调用超时仍未续期的租约视为持有进程已崩溃
+        return max(self.LEASE_TTL, 2 * config.timeout)
+
+    def _acquire_global(self, config: BulkheadConfig) -> bool:
+        """占用一个全局并发额度，本地预留不足时从Redis预留一块"""
+        if config.global_limit <= 0:
+            return True
+        with self._global_lock:
+            if self._global_in_use >= self._global_reserved:
+                result = self.controller.bulkhead_execute_atomic_operation(
+                    self.name,
+                    "acquire",
+                    config.global_limit,
+                    time.time(),
+                    self._chunk_size(config),
+                    self._lease_holder,
+                    self._lease_ttl(config),
+                )
+                self.local_stats["global_reservations"] += 1
+                granted = int(result[2]) if len(result) > 2 and result[0] else 0
+                if granted <= 0:
+                    return False
+                self._global_reserved += granted
+            self._global_in_use += 1
+            return True
+
+    def _release_global(self, config: BulkheadConfig):
+        """
+        归还一个全局并发额度
+
+        本进程没有进行中的调用时归还全部预留，空闲进程不占用全局上限；
+        否则最多保留一个预留块供后续调用使用。
+        """
+        if config.global_limit <= 0 and not self._global_reserved:
+            return
+        with self._global_lock:
+            if self._global_in_use > 0:
+                self._global_in_use -= 1
+            surplus = self._global_reserved - self._global_in_use
+            if self._global_in_use > 0:
+                surplus -= self._chunk_size(config)
+            if surplus <= 0:
+                return
+            self._global_reserved -= surplus
+        self.controller.bulkhead_execute_atomic_operation(
+            self.name,
+            "release",
+            0,
+            time.time(),
+            surplus,
+            self._lease_holder,
+            self._lease_ttl(config),
         )
 
-        success, total_calls = result
-        logger.debug(f"舱壁隔离器 '{self.name}' 记录成功调用，总调用数: {total_calls}")
+    def release_reservations(self):
+        """归还全部空闲的全局预留额度（进程退出前调用）"""
+        with self._global_lock:
+            surplus = self._global_reserved - self._global_in_use
+            self._global_reserved = self._global_in_use
+        if surplus > 0:
+            self.controller.bulkhead_execute_atomic_operation(
+                self.name,
+                "release",
+                0,
+                time.time(),
+                surplus,
+                self._lease_holder,
+                self._lease_ttl(self.get_config()),
+            )
 
-    def record_failure(self):
-        """记录失败调用 - 原子操作"""
+    def _renew_lease(self, config: BulkheadConfig):
+        """续期全局预留租约；租约已被回收时放弃本地预留，之后重新预留"""
+        if not self._global_reserved:
+            return
         result = self.controller.bulkhead_execute_atomic_operation(
-            self.name, "failure", 0, time.time()
+            self.name,
+            "renew",
+            0,
+            time.time(),
+            0,
+            self._lease_holder,
+            self._lease_ttl(config),
         )
+        # 脚本返回 {0} 表示租约已被回收；Redis异常时返回的三元组不视为回收
+        if result is not None and len(result) == 1 and not result[0]:
+            with self._global_lock:
+                self._global_reserved = 0
+            self.local_stats["lease_lost"] += 1
+            logger.warning(f"舱壁隔离器 '{self.name}' 的全局预留租约已过期被回收")
+
+    def _maybe_report(self):
+        now = time.time()
+        if now >= self._next_report:
+            config = self.get_config()
+            self._next_report = now + config.monitor_interval
+            self._renew_lease(config)
+            self.flush_metrics()
+
+    def flush_metrics(self):
+        """提交调用统计到Redis，并向权限监控上报活跃、排队和拒绝数"""
+        with self._stats_lock:
+            calls, self._pending_calls = self._pending_calls, 0
+            failures, self._pending_failures = self._pending_failures, 0
+            rejected, self._rejected = self._rejected, 0
+        now = time.time()
+        if calls - failures > 0:
+            self.controller.bulkhead_execute_atomic_operation(
+                self.name, "success", 0, now, calls - failures
+            )
+        if failures > 0:
+            self.controller.bulkhead_execute_atomic_operation(
+                self.name, "failure", 0, now, failures
+            )
 
-        success, total_calls, failed_calls = result
-        logger.debug(
-            f"舱壁隔离器 '{self.name}' 记录失败调用，总调用数: {total_calls}，失败调用数: {failed_calls}"
-        )
+        active, queued = self.get_local_gauges()
+        try:
+            from .permission_monitor import record_counter, record_gauge
+
+            tags = {"bulkhead": self.name}
+            record_gauge("bulkhead.active_calls", active, tags)
+            record_gauge("bulkhead.queued_calls", queued, tags)
+            record_counter("bulkhead.rejected_calls", rejected, tags)
+        except Exception as e:
+            logger.warning(f"上报舱壁隔离器 '{self.name}' 指标失败: {e}")
+
+    def get_local_gauges(self) -> tuple:
+        """本进程的 (活跃调用数, 排队调用数)"""
+        slots = list(self._slots.values())
+        return sum(s.active for s in slots), sum(s.queued for s in slots)
 
     def get_active_calls(self) -> int:
         """从Redis获取活跃调用数"""
@@ -2613,35 +3584,88 @@ class Bulkhead:
         """获取统计信息 - 专注于并发请求数统计"""
         config = self.get_config()
 
-        active_calls = self.get_active_calls()
-        total_calls = self.get_total_calls()
-        failed_calls = self.get_failed_calls()
+        active_calls, queued_calls = self.get_local_gauges()
+        total_calls = self.get_total_calls() + self._pending_calls
+        failed_calls = self.get_failed_calls() + self._pending_failures
         last_call_time = self.get_last_call_time()
+        busiest = max((s.active for s in list(self._slots.values())), default=0)
 
         return {
             "name": self.name,
             "strategy": config.strategy.value,
             "enabled": config.enabled,
             "active_calls": active_calls,
+            "queued_calls": queued_calls,
+            "isolation_keys": len(self._slots),
+            "global_active_calls": self.get_active_calls(),
+            "global_reserved": self._global_reserved,
+            "global_max_concurrent_calls": config.global_limit,
             "total_calls": total_calls,
             "failed_calls": failed_calls,
             "max_concurrent_calls": config.max_concurrent_calls,
             "last_call_time": last_call_time,
             "failure_rate": failed_calls / max(total_calls, 1),
-            "utilization_rate": active_calls / max(config.max_concurrent_calls, 1),
+            "utilization_rate": busiest / max(config.max_concurrent_calls, 1),
+            **self.local_stats,
         }
 
 
+class _IsolationSlot:
+    """单个隔离键的本地并发槽位：信号量 + 活跃/排队计数"""
+
+    __slots__ = ("semaphore", "limit", "active", "queued", "_lock")
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = threading.Semaphore(max(1, limit))
+        self.active = 0
+        self.queued = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, max_queue_size: int, max_wait_time: float) -> bool:
+        if not self.semaphore.acquire(blocking=False):
+            if max_queue_size <= 0 or max_wait_time <= 0:
+                return False
+            with self._lock:
+                if self.queued >= max_queue_size:
+                    return False
+                self.queued += 1
+            try:
+                if not self.semaphore.acquire(timeout=max_wait_time):
+                    return False
+            finally:
+                with self._lock:
+                    self.queued -= 1
+        with self._lock:
+            self.active += 1
+        return True
+
+    def release(self):
+        with self._lock:
+            if self.active <= 0:
+                return
+            self.active -= 1
+        self.semaphore.release()
+
+    def idle(self) -> bool:
+        return self.active == 0 and self.queued == 0
+
+
 # ==================== 舱壁隔离装饰器 ====================
 
 
-def bulkhead(name: str, strategy: IsolationStrategy = IsolationStrategy.USER):
+def bulkhead(
+    name: str,
+    strategy: IsolationStrategy = IsolationStrategy.USER,
+    key_func: Optional[Callable] = None,
+):
     """
-    舱壁隔离装饰器 - 使用原子操作解决多进程问题
+    舱壁隔离装饰器 - 本地信号量快速路径，Redis 只作为全局上限
 
     Args:
         name: 舱壁隔离器名称
         strategy: 隔离策略
+        key_func: 按隔离策略生成隔离键的函数（如返回用户ID），默认所有调用共用一个键
     """
 
     def decorator(func: Callable) -> Callable:
@@ -2659,10 +3683,12 @@ def bulkhead(name: str, strategy: IsolationStrategy = IsolationStrategy.USER):
                     logger.error(f"记录舱壁隔离器 '{name}' 成功状态失败: {e}")
                 return func(*args, **kwargs)
 
-            start_time = time.time()
+            isolation_key = (
+                str(key_func(*args, **kwargs)) if key_func else "default"
+            )
 
-            # 原子性获取资源
-            if not bulkhead_instance.acquire_resource():
+            # 获取资源：本地并发已满时按配置排队或立即拒绝
+            if not bulkhead_instance.acquire_resource(isolation_key):
                 raise Exception(f"舱壁隔离器 '{name}' 无法获取资源，已达到最大并发限制")
 
             try:
@@ -2685,7 +3711,7 @@ def bulkhead(name: str, strategy: IsolationStrategy = IsolationStrategy.USER):
             finally:
                 # 释放资源 - 使用异常保护
                 try:
-                    bulkhead_instance.release_resource()
+                    bulkhead_instance.release_resource(isolation_key)
                 except Exception as e:
                     logger.error(f"释放舱壁隔离器 '{name}' 资源失败: {e}")
 
@@ -2713,10 +3739,10 @@ def set_bulkhead_config(name: str, **kwargs) -> bool:
     if config is None:
         config = BulkheadConfig(name=name)
 
-    # 更新配置
-    for key, value in kwargs.items():
-        if hasattr(config, key):
-            setattr(config, key, value)
+    # 更新配置（配置对象由快照共享，生成副本而不是原地修改）
+    config = replace(
+        config, **{key: value for key, value in kwargs.items() if hasattr(config, key)}
+    )
 
     # 使用控制器的set_bulkhead_config方法
     return controller.set_bulkhead_config(name, config)
@@ -0,0 +1,664 @@
+"""
+权限解析器模块
+
+将 UserRole / RolePermission / Role.parent_id / PermissionGroup 预编译为进程内不可变快照：
+- 每个角色的有效权限（含父角色继承、权限组展开）按作用域编译为权限位图
+- 角色属于某个服务器（Role.server_id），只在该服务器及其频道上生效；
+  server_id 为空或0的角色为全局角色，在所有作用域生效
+- 用户权限检查只需对其有效角色的几个位图做按位或，不访问数据库
+- 角色或用户变更时按版本号增量重建受影响的部分，整体替换快照引用
+- 快照过期后在后台线程重建，期间继续使用旧快照
+"""
+
+import calendar
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from .permission_bitset import EMPTY_BITS, PermissionBits, get_permission_bit_index
+
+logger = logging.getLogger(__name__)
+
+# 作用域键：("global", None) / ("server", 1) / ("channel", 2) ...
+ScopeKey = Tuple[str, Optional[int]]
+GLOBAL_SCOPE: ScopeKey = ("global", None)
+
+# 用户角色分配：(role_id, valid_from, valid_until)，时间为UTC时间戳，None表示不限
+UserRoleGrant = Tuple[int, Optional[float], Optional[float]]
+
+# 作用域所属服务器无法确定（如 resource 作用域、不存在的频道）
+_UNKNOWN_SERVER = object()
+
+
+def _to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    """将数据库中的UTC时间（naive datetime）转换为时间戳"""
+    if value is None:
+        return None
+    return calendar.timegm(value.utctimetuple()) + value.microsecond / 1e6
+
+
+def _scope_key(scope: Optional[str], scope_id: Optional[int]) -> ScopeKey:
+    """规范化作用域键"""
+    if not scope or scope == "global":
+        return GLOBAL_SCOPE
+    return (scope, int(scope_id) if scope_id is not None else None)
+
+
+@dataclass(frozen=True)
+class PermissionSnapshot:
+    """
+    不可变权限快照
+
+    发布后不再修改；增量重建会复制需要变化的映射并生成新快照。
+    """
+
+    version: int
+    built_at: float
+    # 角色 -> 作用域 -> 有效权限位图（已合并继承和权限组）
+    role_grants: Dict[int, Dict[ScopeKey, int]]
+    # 用户 -> 角色分配
+    user_roles: Dict[int, Tuple[UserRoleGrant, ...]]
+    # 以下为增量编译所需的原始数据
+    role_parents: Dict[int, Optional[int]] = field(default_factory=dict)
+    role_direct: Dict[int, Dict[ScopeKey, int]] = field(default_factory=dict)
+    active_roles: FrozenSet[int] = frozenset()
+    # 角色 -> 所属服务器，None表示全局角色
+    role_servers: Dict[int, Optional[int]] = field(default_factory=dict)
+    # 频道 -> 所属服务器，None表示频道不存在
+    channel_servers: Dict[int, Optional[int]] = field(default_factory=dict)
+
+    def scope_server(self, key: ScopeKey):
+        """作用域所属的服务器，无法确定时返回 _UNKNOWN_SERVER"""
+        scope, scope_id = key
+        if scope == "server" and scope_id is not None:
+            return scope_id
+        if scope == "channel" and scope_id is not None:
+            server_id = self.channel_servers.get(scope_id)
+            if server_id is not None:
+                return server_id
+        return _UNKNOWN_SERVER
+
+    def resolve(
+        self,
+        user_id: int,
+        scope: Optional[str] = None,
+        scope_id: Optional[int] = None,
+        now: Optional[float] = None,
+    ) -> PermissionBits:
+        """
+        按位合并用户有效角色在全局和指定作用域上的权限
+
+        不指定作用域时合并所有角色的全局权限；指定作用域时，服务器角色只在
+        作用域属于该服务器时生效，所属服务器无法确定时只采用显式授予到
+        该作用域的权限。
+        """
+        grants = self.user_roles.get(user_id)
+        if not grants:
+            return EMPTY_BITS
+
+        key = _scope_key(scope, scope_id)
+        scoped = key if key != GLOBAL_SCOPE else None
+        server = self.scope_server(key) if scoped else None
+        role_servers = self.role_servers
+        if now is None:
+            now = time.time()
+
+        result = 0
+        for role_id, valid_from, valid_until in grants:
+            if valid_from is not None and now < valid_from:
+                continue
+            if valid_until is not None and now >= valid_until:
+                continue
+            compiled = self.role_grants.get(role_id)
+            if not compiled:
+                continue
+            if scoped:
+                role_server = role_servers.get(role_id)
+                if role_server is not None and role_server != server:
+                    if server is _UNKNOWN_SERVER:
+                        result |= compiled.get(scoped, 0)
+                    continue
+                result |= compiled.get(scoped, 0)
+            result |= compiled.get(GLOBAL_SCOPE, 0)
+        return PermissionBits(result) if result else EMPTY_BITS
+
+
+def compile_role_grants(
+    role_ids: Iterable[int],
+    role_parents: Dict[int, Optional[int]],
+    role_direct: Dict[int, Dict[ScopeKey, int]],
+    active_roles: FrozenSet[int],
+) -> Dict[int, Dict[ScopeKey, int]]:
+    """
+    编译角色有效权限
+
+    沿 parent_id 向上合并直接权限；停用/删除的角色不产生权限，也会截断继承链。
+    继承环只会合并一次，不会无限递归。
+
+    参数:
+        role_ids: 需要编译的角色ID
+        role_parents: 角色 -> 父角色
+        role_direct: 角色 -> 作用域 -> 直接权限位图（含权限组展开）
+        active_roles: 有效角色集合
+
+    返回:
+        Dict[int, Dict[ScopeKey, int]]: 角色 -> 作用域 -> 有效权限位图
+    """
+    compiled = {}
+    for role_id in role_ids:
+        if role_id not in active_roles:
+            continue
+        merged: Dict[ScopeKey, int] = defaultdict(int)
+        visited = set()
+        current = role_id
+        while current is not None and current not in visited:
+            if current not in active_roles:
+                break
+            visited.add(current)
+            for key, bits in role_direct.get(current, {}).items():
+                merged[key] |= bits
+            current = role_parents.get(current)
+        if merged:
+            compiled[role_id] = dict(merged)
+    return compiled
+
+
+def descendant_roles(
+    role_parents: Dict[int, Optional[int]], role_ids: Iterable[int]
+) -> Set[int]:
+    """指定角色及其全部子孙角色"""
+    children = defaultdict(list)
+    for role_id, parent_id in role_parents.items():
+        if parent_id is not None:
+            children[parent_id].append(role_id)
+    result = set()
+    stack = list(role_ids)
+    while stack:
+        role_id = stack.pop()
+        if role_id in result:
+            continue
+        result.add(role_id)
+        stack.extend(children.get(role_id, ()))
+    return result
+
+
+class PermissionResolver:
+    """
+    编译型RBAC解析器
+
+    数据库只在快照构建/增量重建时访问，权限检查为纯内存操作。
+    """
+
+    def __init__(self, max_age: float = 300.0, retry_interval: float = 5.0):
+        """
+        参数:
+            max_age: 快照最大存活时间（秒），超过后在后台重建
+            retry_interval: 构建失败后的重试间隔（秒）
+        """
+        self.max_age = max_age
+        self.retry_interval = retry_interval
+        self._snapshot: Optional[PermissionSnapshot] = None
+        self._build_lock = threading.Lock()
+        self._refreshing = False
+        self._last_failure = 0.0
+        self._version = 0
+        self._app = None
+        self.stats = {"full_builds": 0, "incremental_builds": 0, "build_failures": 0}
+
+    def init_app(self, app):
+        """绑定Flask应用，供后台重建线程使用"""
+        self._app = app
+        self.max_age = app.config.get("PERMISSION_SNAPSHOT_MAX_AGE", self.max_age)
+        app.extensions["permission_resolver"] = self
+
+    # ==================== 查询 ====================
+
+    @property
+    def snapshot(self) -> Optional[PermissionSnapshot]:
+        """当前快照（可能为None）"""
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        """当前快照版本"""
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else 0
+
+    def resolve(
+        self, user_id: int, scope: str = None, scope_id: int = None
+    ) -> PermissionBits:
+        """
+        获取用户有效权限
+
+        参数:
+            user_id: 用户ID
+            scope: 权限作用域（server/channel/resource，None为全局）
+            scope_id: 作用域ID
+
+        返回:
+            PermissionBits: 用户权限集合（位图）
+        """
+        snapshot = self._ensure_snapshot()
+        if snapshot is None:
+            return EMPTY_BITS
+        snapshot = self._with_channel(snapshot, scope, scope_id)
+        return snapshot.resolve(int(user_id), scope, scope_id)
+
+    def resolve_many(
+        self, user_ids: Iterable[int], scope: str = None, scope_id: int = None
+    ) -> Dict[int, PermissionBits]:
+        """批量获取用户有效权限，所有用户使用同一份快照"""
+        snapshot = self._ensure_snapshot()
+        if snapshot is None:
+            return {user_id: EMPTY_BITS for user_id in user_ids}
+        snapshot = self._with_channel(snapshot, scope, scope_id)
+        now = time.time()
+        return {
+            user_id: snapshot.resolve(int(user_id), scope, scope_id, now)
+            for user_id in user_ids
+        }
+
+    def user_role_ids(self, user_id: int) -> Tuple[int, ...]:
+        """用户持有的角色ID（不检查有效期，不触发构建）"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return ()
+        return tuple(grant[0] for grant in snapshot.user_roles.get(user_id, ()))
+
+    def affected_roles(self, role_ids: Iterable[int]) -> Set[int]:
+        """角色变更影响的角色：自身及全部子孙角色（继承其权限）"""
+        role_ids = {int(role_id) for role_id in role_ids}
+        snapshot = self._snapshot
+        if snapshot is None:
+            return role_ids
+        return descendant_roles(snapshot.role_parents, role_ids)
+
+    def _with_channel(
+        self, snapshot: PermissionSnapshot, scope: Optional[str], scope_id
+    ) -> PermissionSnapshot:
+        """快照构建后新建的频道：加载其所属服务器（每个频道只查询一次）"""
+        if scope != "channel" or scope_id is None:
+            return snapshot
+        if int(scope_id) in snapshot.channel_servers:
+            return snapshot
+        return self.refresh_channels([scope_id]) or snapshot
+
+    def _ensure_snapshot(self) -> Optional[PermissionSnapshot]:
+        """首次使用时同步构建；过期时触发后台重建并返回旧快照"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            if time.time() - self._last_failure < self.retry_interval:
+                return None
+            return self.rebuild()
+        if self.max_age and time.time() - snapshot.built_at > self.max_age:
+            self._schedule_refresh()
+        return snapshot
+
+    def _schedule_refresh(self):
+        """在后台线程中重建过期快照"""
+        if self._refreshing:
+            return
+        app = self._app
+        if app is None:
+            try:
+                from flask import current_app
+
+                app = current_app._get_current_object()
+            except RuntimeError:
+                return
+        self._refreshing = True
+
+        def refresh():
+            try:
+                with app.app_context():
+                    self.rebuild()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(
+            target=refresh, name="permission-snapshot-refresh", daemon=True
+        ).start()
+
+    # ==================== 构建 ====================
+
+    def rebuild(self, db_session=None) -> Optional[PermissionSnapshot]:
+        """
+        全量构建快照
+
+        固定六次查询：权限位索引、角色、角色权限、角色权限组、用户角色、频道。
+
+        返回:
+            PermissionSnapshot: 新快照；失败时返回旧快照（可能为None）
+        """
+        with self._build_lock:
+            try:
+                session = db_session or self._get_session()
+                get_permission_bit_index().reload(session, force=True)
+                role_parents, active_roles, role_servers = self._load_roles(session)
+                role_direct = self._load_direct_grants(session)
+                user_roles = self._load_user_roles(session)
+                channel_servers = self._load_channel_servers(session)
+            except (SQLAlchemyError, RuntimeError) as e:
+                self._last_failure = time.time()
+                self.stats["build_failures"] += 1
+                logger.error(f"权限快照构建失败: {e}")
+                return self._snapshot
+
+            role_grants = compile_role_grants(
+                role_parents.keys(), role_parents, role_direct, active_roles
+            )
+            self._version += 1
+            snapshot = PermissionSnapshot(
+                version=self._version,
+                built_at=time.time(),
+                role_grants=role_grants,
+                user_roles=user_roles,
+                role_parents=role_parents,
+                role_direct=role_direct,
+                active_roles=active_roles,
+                role_servers=role_servers,
+                channel_servers=channel_servers,
+            )
+            self._snapshot = snapshot
+            self.stats["full_builds"] += 1
+            logger.debug(
+                f"权限快照构建完成: 版本 {snapshot.version}, "
+                f"{len(role_grants)} 个角色, {len(user_roles)} 个用户"
+            )
+            return snapshot
+
+    def refresh_roles(self, role_ids: Iterable[int], db_session=None):
+        """
+        增量重建角色
+
+        重新加载指定角色的定义和直接权限，并重新编译这些角色及其所有子角色。
+
+        参数:
+            role_ids: 发生变化的角色ID
+        """
+        role_ids = {int(role_id) for role_id in role_ids}
+        if not role_ids:
+            return
+        with self._build_lock:
+            base = self._snapshot
+            if base is None:
+                return
+            try:
+                session = db_session or self._get_session()
+                parents, active, servers = self._load_roles(session, role_ids)
+                direct = self._load_direct_grants(session, role_ids)
+            except (SQLAlchemyError, RuntimeError) as e:
+                self.stats["build_failures"] += 1
+                logger.error(f"角色 {sorted(role_ids)} 增量重建失败: {e}")
+                return
+
+            role_parents = dict(base.role_parents)
+            role_direct = dict(base.role_direct)
+            role_servers = dict(base.role_servers)
+            for role_id in role_ids:
+                # 查询不到的角色视为已删除
+                role_parents.pop(role_id, None)
+                role_direct.pop(role_id, None)
+                role_servers.pop(role_id, None)
+            role_parents.update(parents)
+            role_direct.update(direct)
+            role_servers.update(servers)
+            active_roles = (base.active_roles - role_ids) | active
+
+            # 受影响范围：变化的角色及其全部子孙角色
+            affected = descendant_roles(role_parents, role_ids)
+
+            role_grants = dict(base.role_grants)
+            for role_id in affected:
+                role_grants.pop(role_id, None)
+            role_grants.update(
+                compile_role_grants(affected, role_parents, role_direct, active_roles)
+            )
+            self._publish(
+                base,
+                role_grants=role_grants,
+                role_parents=role_parents,
+                role_direct=role_direct,
+                active_roles=active_roles,
+                role_servers=role_servers,
+            )
+            logger.debug(
+                f"角色增量重建完成: {sorted(role_ids)}, 影响 {len(affected)} 个角色"
+            )
+
+    def refresh_users(self, user_ids: Iterable[int], db_session=None):
+        """
+        增量重建用户角色分配
+
+        参数:
+            user_ids: 角色分配发生变化的用户ID
+        """
+        user_ids = {int(user_id) for user_id in user_ids}
+        if not user_ids:
+            return
+        with self._build_lock:
+            base = self._snapshot
+            if base is None:
+                return
+            try:
+                session = db_session or self._get_session()
+                loaded = self._load_user_roles(session, user_ids)
+            except (SQLAlchemyError, RuntimeError) as e:
+                self.stats["build_failures"] += 1
+                logger.error(f"用户 {sorted(user_ids)} 增量重建失败: {e}")
+                return
+
+            user_roles = dict(base.user_roles)
+            for user_id in user_ids:
+                user_roles.pop(user_id, None)
+            user_roles.update(loaded)
+            self._publish(base, user_roles=user_roles)
+
+    def refresh_channels(
+        self, channel_ids: Iterable[int], db_session=None
+    ) -> Optional[PermissionSnapshot]:
+        """
+        加载频道所属服务器
+
+        参数:
+            channel_ids: 频道ID
+
+        返回:
+            PermissionSnapshot: 新快照；失败或没有快照时返回None
+        """
+        channel_ids = {int(channel_id) for channel_id in channel_ids}
+        if not channel_ids:
+            return None
+        with self._build_lock:
+            base = self._snapshot
+            if base is None:
+                return None
+            try:
+                session = db_session or self._get_session()
+                loaded = self._load_channel_servers(session, channel_ids)
+            except (SQLAlchemyError, RuntimeError) as e:
+                self.stats["build_failures"] += 1
+                logger.error(f"频道 {sorted(channel_ids)} 所属服务器加载失败: {e}")
+                return None
+
+            channel_servers = dict(base.channel_servers)
+            for channel_id in channel_ids:
+                # 不存在的频道也记录下来，避免每次检查都查询数据库
+                channel_servers[channel_id] = loaded.get(channel_id)
+            self._publish(base, channel_servers=channel_servers)
+            return self._snapshot
+
+    def _publish(self, base: PermissionSnapshot, **changes):
+        """基于旧快照生成新版本并替换（调用方持有构建锁）"""
+        self._version += 1
+        values = {
+            "role_grants": base.role_grants,
+            "user_roles": base.user_roles,
+            "role_parents": base.role_parents,
+            "role_direct": base.role_direct,
+            "active_roles": base.active_roles,
+            "role_servers": base.role_servers,
+            "channel_servers": base.channel_servers,
+        }
+        values.update(changes)
+        # 增量重建不刷新 built_at，全量过期重建仍按原周期进行
+        self._snapshot = PermissionSnapshot(
+            version=self._version, built_at=base.built_at, **values
+        )
+        self.stats["incremental_builds"] += 1
+
+    def clear(self):
+        """丢弃当前快照，下次使用时重新构建"""
+        with self._build_lock:
+            self._snapshot = None
+            self._last_failure = 0.0
+
+    def get_stats(self) -> Dict[str, object]:
+        """解析器统计"""
+        snapshot = self._snapshot
+        return {
+            **self.stats,
+            "version": self.version,
+            "age": time.time() - snapshot.built_at if snapshot else None,
+            "roles": len(snapshot.role_grants) if snapshot else 0,
+            "users": len(snapshot.user_roles) if snapshot else 0,
+        }
+
+    # ==================== 数据加载 ====================
+
+    @staticmethod
+    def _get_session():
+        from app.core.extensions import db
+
+        return db.session
+
+    @staticmethod
+    def _load_roles(
+        session, role_ids: Set[int] = None
+    ) -> Tuple[Dict[int, Optional[int]], FrozenSet[int], Dict[int, Optional[int]]]:
+        """加载角色继承关系、有效状态和所属服务器"""
+        from app.blueprints.roles.models import Role
+
+        query = session.query(
+            Role.id, Role.parent_id, Role.is_active, Role.deleted_at, Role.server_id
+        )
+        if role_ids is not None:
+            query = query.filter(Role.id.in_(role_ids))
+        parents = {}
+        active = set()
+        servers = {}
+        for role_id, parent_id, is_active, deleted_at, server_id in query.all():
+            parents[role_id] = parent_id
+            # server_id 为空或0的角色不属于任何服务器，即全局角色
+            servers[role_id] = server_id or None
+            if is_active and deleted_at is None:
+                active.add(role_id)
+        return parents, frozenset(active), servers
+
+    @staticmethod
+    def _load_channel_servers(
+        session, channel_ids: Set[int] = None
+    ) -> Dict[int, Optional[int]]:
+        """加载频道所属服务器"""
+        from app.blueprints.channels.models import Channel
+
+        query = session.query(Channel.id, Channel.server_id)
+        if channel_ids is not None:
+            query = query.filter(Channel.id.in_(channel_ids))
+        return {channel_id: server_id for channel_id, server_id in query.all()}
+
+    @staticmethod
+    def _load_direct_grants(
+        session, role_ids: Set[int] = None
+    ) -> Dict[int, Dict[ScopeKey, int]]:
+        """加载角色直接权限（编码为位图），并展开角色绑定的有效权限组"""
+        from app.blueprints.roles.models import (
+            GroupToPermissionMapping,
+            Permission,
+            PermissionGroup,
+            RolePermission,
+            RoleToGroupMapping,
+        )
+
+        direct: Dict[int, Dict[ScopeKey, int]] = defaultdict(lambda: defaultdict(int))
+        seen: Dict[str, int] = {}
+
+        query = session.query(
+            RolePermission.role_id,
+            RolePermission.scope_type,
+            RolePermission.scope_id,
+            Permission.name,
+            Permission.id,
+        ).join(Permission, Permission.id == RolePermission.permission_id)
+        if role_ids is not None:
+            query = query.filter(RolePermission.role_id.in_(role_ids))
+        for role_id, scope_type, scope_id, name, permission_id in query.all():
+            direct[role_id][_scope_key(scope_type, scope_id)] |= 1 << permission_id
+            seen[name] = permission_id
+
+        query = (
+            session.query(
+                RoleToGroupMapping.role_id,
+                RoleToGroupMapping.scope_type,
+                RoleToGroupMapping.scope_id,
+                Permission.name,
+                Permission.id,
+            )
+            .join(
+                PermissionGroup,
+                PermissionGroup.id == RoleToGroupMapping.group_id,
+            )
+            .join(
+                GroupToPermissionMapping,
+                GroupToPermissionMapping.group_id == RoleToGroupMapping.group_id,
+            )
+            .join(Permission, Permission.id == GroupToPermissionMapping.permission_id)
+            .filter(PermissionGroup.is_active == True)
+        )
+        if role_ids is not None:
+            query = query.filter(RoleToGroupMapping.role_id.in_(role_ids))
+        for role_id, scope_type, scope_id, name, permission_id in query.all():
+            direct[role_id][_scope_key(scope_type, scope_id)] |= 1 << permission_id
+            seen[name] = permission_id
+
+        # 位索引即 Permission.id，确保快照中出现的位都可以解码
+        get_permission_bit_index().register_many(seen.items())
+        return {role_id: dict(scopes) for role_id, scopes in direct.items()}
+
+    @staticmethod
+    def _load_user_roles(
+        session, user_ids: Set[int] = None
+    ) -> Dict[int, Tuple[UserRoleGrant, ...]]:
+        """加载用户角色分配（含有效期）"""
+        from app.blueprints.roles.models import UserRole
+
+        query = session.query(
+            UserRole.user_id,
+            UserRole.role_id,
+            UserRole.valid_from,
+            UserRole.valid_until,
+        )
+        if user_ids is not None:
+            query = query.filter(UserRole.user_id.in_(user_ids))
+        grants: Dict[int, List[UserRoleGrant]] = defaultdict(list)
+        for user_id, role_id, valid_from, valid_until in query.all():
+            grants[user_id].append(
+                (role_id, _to_timestamp(valid_from), _to_timestamp(valid_until))
+            )
+        return {user_id: tuple(items) for user_id, items in grants.items()}
+
+
+# ==================== 全局实例 ====================
+
+permission_resolver = PermissionResolver()
+
+
+def get_permission_resolver() -> PermissionResolver:
+    """获取权限解析器实例"""
+    return permission_resolver
@@ -7,6 +7,7 @@
 import time
 import logging
 import json
+from collections.abc import Set as AbstractSet
 from typing import Dict, List, Optional, Set, Any, Callable
 from functools import wraps
 
@@ -231,7 +232,7 @@ class PermissionSystem:
             # 如果RBAC检查失败，直接返回False
             if isinstance(rbac_result, bool) and not rbac_result:
                 return False
-            elif isinstance(rbac_result, set) and permission not in rbac_result:
+            elif isinstance(rbac_result, AbstractSet) and permission not in rbac_result:
                 return False
 
             # 第二步：如果RBAC检查通过，进行ABAC策略检查
@@ -276,7 +277,7 @@ class PermissionSystem:
             # 根据返回类型处理结果
             if isinstance(rbac_result, bool):
                 return rbac_result
-            elif isinstance(rbac_result, set):
+            elif isinstance(rbac_result, AbstractSet):
                 return permission in rbac_result
             else:
                 return False
@@ -399,7 +400,7 @@ class PermissionSystem:
             for user_id, permissions in permissions_map.items():
                 if isinstance(permissions, bool):
                     results[user_id] = permissions
-                elif isinstance(permissions, set):
+                elif isinstance(permissions, AbstractSet):
                     results[user_id] = permission in permissions
                 else:
                     results[user_id] = False
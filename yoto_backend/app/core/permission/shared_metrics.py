@@ -0,0 +1,312 @@
+"""
+主机级共享内存指标表
+
+同一主机上的worker进程共享一块 multiprocessing.shared_memory，用于本地预聚合：
+- 每个进程占用一行（槽位）且只写自己的行，不需要跨进程原子操作或锁；
+  槽位记录进程ID和启动时间，进程ID被复用时不会误判槽位仍被占用
+- 行内每个指标保存累计的 sum / count，只增不减；进程退出后槽位由新进程接管并继续累加
+- 持有代理文件锁的进程（主机代理）按间隔读取所有行，计算增量后一次写入Redis，
+  聚合流量与主机数量成正比，而不是与请求数量成正比；新代理以接管时的累计值为基线
+
+依赖 fcntl 文件锁，仅支持POSIX系统。
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TABLE_MAGIC = 0x59544D32
+# 表头（int64）：magic, 槽位数, 指标数, 指标名称校验和
+HEADER_FIELDS = 4
+# 每个槽位的所属进程字段（int64）：进程ID, 进程启动时间
+OWNER_FIELDS = 2
+# 每个指标的字段（float64）：sum, count
+FIELDS_PER_METRIC = 2
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _process_start_time(pid: int) -> int:
+    """进程启动时间（系统启动后的时钟滴答数），无法读取 /proc 时返回0"""
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            stat = f.read()
+        # 进程名可能包含空格和括号，从最后一个 ")" 之后解析，starttime 是第22个字段
+        return int(stat[stat.rindex(b")") + 2 :].split()[19])
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _owner_alive(pid: int, start_time: int) -> bool:
+    """槽位的所属进程是否仍在运行（进程ID相同但启动时间不同说明已被复用）"""
+    if not _pid_alive(pid):
+        return False
+    if start_time == 0:
+        return True
+    current = _process_start_time(pid)
+    return current == 0 or current == start_time
+
+
+def _untrack(shm: shared_memory.SharedMemory):
+    """
+    取消 resource_tracker 对共享内存的跟踪
+
+    Python 3.13 之前附加到已有共享内存的进程也会被跟踪，
+    任一worker退出时都会删除整个共享内存，表由所有进程共同维护，不能这样清理。
+    """
+    try:
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception as e:
+        logger.debug(f"取消共享内存跟踪失败: {e}")
+
+
+class SharedMetricsTable:
+    """
+    共享内存指标表
+
+    布局：表头 | 槽位所属进程ID和启动时间（int64 × slots × 2）|
+    指标累计值（float64 × slots × 指标数 × 2）
+    """
+
+    def __init__(
+        self, metric_names: Sequence[str], name: str = "yoto_metrics", slots: int = 64
+    ):
+        """
+        创建或附加到主机上的指标表
+
+        参数:
+            metric_names: 表中的指标名称（所有进程必须一致）
+            name: 共享内存名称
+            slots: 槽位数（同一主机上的最大进程数）
+
+        异常:
+            RuntimeError: 系统不支持fcntl
+            ValueError: 已存在的共享内存布局与本进程不一致
+        """
+        if not FCNTL_AVAILABLE:
+            raise RuntimeError("共享内存指标表需要fcntl文件锁")
+        self.name = name
+        self.slots = slots
+        self.metric_names: Tuple[str, ...] = tuple(metric_names)
+        self._index = {metric: i for i, metric in enumerate(self.metric_names)}
+        self._row_width = len(self.metric_names) * FIELDS_PER_METRIC
+        self._checksum = zlib.crc32(",".join(self.metric_names).encode())
+        self._lock_dir = tempfile.gettempdir()
+
+        values_offset = 8 * (HEADER_FIELDS + slots * OWNER_FIELDS)
+        self._size = values_offset + 8 * slots * self._row_width
+        self._shm = self._open()
+        buf = self._shm.buf
+        self._owners = buf[8 * HEADER_FIELDS : values_offset].cast("q")
+        self._values = buf[values_offset : self._size].cast("d")
+
+        # 本进程内多个线程写同一行
+        self._lock = threading.Lock()
+        self._slot: Optional[int] = None
+        self._slot_pid: Optional[int] = None
+
+        # 主机代理状态
+        self._agent_fd: Optional[int] = None
+        self._agent_pid: Optional[int] = None
+        self._baseline: List[float] = [0.0] * (slots * self._row_width)
+        self._pending: Optional[List[float]] = None
+
+    @contextmanager
+    def _file_lock(self, suffix: str = "lock"):
+        path = os.path.join(self._lock_dir, f"{self.name}.{suffix}")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _open(self) -> shared_memory.SharedMemory:
+        """创建或附加共享内存，并校验表头"""
+        expected = (TABLE_MAGIC, self.slots, len(self.metric_names), self._checksum)
+        with self._file_lock():
+            try:
+                shm = shared_memory.SharedMemory(
+                    name=self.name, create=True, size=self._size
+                )
+                created = True
+            except FileExistsError:
+                shm = shared_memory.SharedMemory(name=self.name)
+                created = False
+            _untrack(shm)
+
+            header = shm.buf[: 8 * HEADER_FIELDS].cast("q")
+            try:
+                if created:
+                    for i, value in enumerate(expected):
+                        header[i] = value
+                elif shm.size < self._size or tuple(header) != expected:
+                    raise ValueError(
+                        f"共享内存 {self.name} 的布局与当前进程不一致，"
+                        f"请确认同一主机上的worker使用相同版本"
+                    )
+            except ValueError:
+                header.release()
+                shm.close()
+                raise
+            header.release()
+        logger.info(
+            f"共享内存指标表已{'创建' if created else '附加'}: {self.name}, "
+            f"槽位: {self.slots}, 指标: {len(self.metric_names)}"
+        )
+        return shm
+
+    def _claim_slot(self) -> Optional[int]:
+        """占用一个空闲槽位（或进程已退出的槽位），fork后的子进程重新占用"""
+        pid = os.getpid()
+        if self._slot_pid == pid:
+            return self._slot
+        start_time = _process_start_time(pid)
+        owners = self._owners
+        with self._file_lock():
+            for slot in range(self.slots):
+                field = slot * OWNER_FIELDS
+                owner, owner_start = owners[field], owners[field + 1]
+                if (
+                    owner == 0
+                    or (owner == pid and owner_start in (start_time, 0))
+                    or not _owner_alive(owner, owner_start)
+                ):
+                    # 接管槽位时保留累计值，代理按增量读取，不会重复计算
+                    owners[field], owners[field + 1] = pid, start_time
+                    self._slot, self._slot_pid = slot, pid
+                    return slot
+        logger.warning(f"共享内存指标表槽位已满: {self.name}, 槽位数: {self.slots}")
+        self._slot, self._slot_pid = None, pid
+        return None
+
+    def add(self, metric: str, value: float) -> bool:
+        """
+        累加一次观测到本进程的行
+
+        返回:
+            bool: 指标不在表中或没有可用槽位时返回False
+        """
+        index = self._index.get(metric)
+        if index is None:
+            return False
+        values = self._values
+        with self._lock:
+            slot = self._claim_slot()
+            if slot is None:
+                return False
+            base = slot * self._row_width + index * FIELDS_PER_METRIC
+            values[base] += value
+            values[base + 1] += 1
+        return True
+
+    def try_become_agent(self) -> bool:
+        """
+        尝试成为主机代理（非阻塞文件锁，代理进程退出后由内核释放）
+
+        成为代理时以当前累计值为基线：此前的增量已由上一个代理写入，
+        只丢失上一个代理最后一次写入之后的少量增量，而不是重复写入全部累计值。
+        """
+        pid = os.getpid()
+        if self._agent_fd is not None:
+            if self._agent_pid == pid:
+                return True
+            # fork继承的描述符与父进程共享同一把锁，子进程需要重新竞争
+            os.close(self._agent_fd)
+            self._agent_fd = None
+        path = os.path.join(self._lock_dir, f"{self.name}.agent")
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._agent_fd, self._agent_pid = fd, pid
+        self._baseline = self._values.tolist()
+        self._pending = None
+        logger.info(f"本进程成为共享内存指标表的主机代理: {self.name}")
+        return True
+
+    def collect(self) -> Dict[str, Tuple[float, float]]:
+        """
+        读取自上次确认以来的增量（仅主机代理调用）
+
+        写入成功后调用 acknowledge() 推进基线，失败时下次重新读取同一段增量。
+
+        返回:
+            Dict[str, Tuple[float, float]]: 指标 -> (sum增量, count增量)，
+                无增量的指标不返回
+        """
+        current = self._values.tolist()
+        deltas = [0.0] * self._row_width
+        for offset, (value, previous) in enumerate(zip(current, self._baseline)):
+            # 累计值变小说明共享内存被重建，从0重新计算
+            delta = value - previous if value >= previous else value
+            deltas[offset % self._row_width] += delta
+        self._pending = current
+
+        result = {}
+        for metric, index in self._index.items():
+            base = index * FIELDS_PER_METRIC
+            total, count = deltas[base], deltas[base + 1]
+            if count > 0:
+                result[metric] = (total, count)
+        return result
+
+    def acknowledge(self):
+        """确认上次 collect 的增量已写入"""
+        if self._pending is not None:
+            self._baseline = self._pending
+            self._pending = None
+
+    def get_stats(self) -> Dict[str, object]:
+        """指标表状态"""
+        return {
+            "name": self.name,
+            "slots": self.slots,
+            "used_slots": sum(1 for pid in self._owners[::OWNER_FIELDS] if pid),
+            "slot": self._slot,
+            "agent": self._agent_fd is not None and self._agent_pid == os.getpid(),
+            "metrics": list(self.metric_names),
+        }
+
+    def close(self):
+        """释放本进程的槽位和代理锁，共享内存保留给其他进程"""
+        pid = os.getpid()
+        if self._slot is not None and self._slot_pid == pid:
+            field = self._slot * OWNER_FIELDS
+            with self._file_lock():
+                if self._owners[field] == pid:
+                    self._owners[field] = self._owners[field + 1] = 0
+            self._slot = None
+        if self._agent_fd is not None:
+            os.close(self._agent_fd)
+            self._agent_fd = None
+        self._owners.release()
+        self._values.release()
+        self._shm.close()
@@ -0,0 +1,33 @@
+"""
+消息检索模块
+
+提供可插拔的倒排索引后端（内存 / SQLite FTS5 / Redis），支持中日韩 n-gram 分词与 BM25 排序。
+"""
+
+from .message_index import MessageSearchIndex, get_message_search, message_search
+from .search_backends import (
+    MemorySearchBackend,
+    RedisSearchBackend,
+    SearchBackend,
+    SearchBackendFactory,
+    SearchBackendType,
+    SearchResult,
+    SQLiteSearchBackend,
+)
+from .tokenizer import tokenize, tokenize_document, tokenize_query
+
+__all__ = [
+    "MessageSearchIndex",
+    "get_message_search",
+    "message_search",
+    "MemorySearchBackend",
+    "RedisSearchBackend",
+    "SearchBackend",
+    "SearchBackendFactory",
+    "SearchBackendType",
+    "SearchResult",
+    "SQLiteSearchBackend",
+    "tokenize",
+    "tokenize_document",
+    "tokenize_query",
+]
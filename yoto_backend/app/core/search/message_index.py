@@ -0,0 +1,325 @@
+"""
+消息全文检索
+
+封装搜索后端，负责：
+- 发送/编辑/删除消息时增量维护索引
+- 按频道、服务器、用户、类型、时间范围检索并按 BM25 排序
+- 从数据库全量重建索引（flask search-reindex / 启动时后台回填）
+- 索引未完整构建时退回数据库检索
+
+多主机部署应使用 Redis 后端；SQLite 索引文件只在本机可见，只能用于单主机部署。
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from .search_backends import (
+    IndexedDocument,
+    SearchBackend,
+    SearchBackendFactory,
+    SearchBackendType,
+    SearchQuery,
+    SearchResult,
+    SearchSort,
+)
+from .tokenizer import tokenize_document, tokenize_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_PATH = os.path.join(tempfile.gettempdir(), "yoto_message_search.db")
+READY_CHECK_INTERVAL = 30.0  # 完整构建标记的本地缓存时间（秒）
+REBUILD_LEASE_TTL = 3600  # 重建租约有效期（秒）
+
+
+def _to_timestamp(value: Optional[datetime]) -> Optional[float]:
+    """数据库中的时间均为无时区UTC时间，统一转换为时间戳"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class MessageSearchIndex:
+    """消息检索门面，作为Flask扩展使用"""
+
+    def __init__(self, backend: Optional[SearchBackend] = None):
+        self._backend = backend
+        self._ready = False
+        self._ready_checked_at = 0.0
+
+    def init_app(self, app):
+        """根据配置创建搜索后端，注册重建索引命令，并在需要时后台回填索引"""
+        if self._backend is None:
+            self._backend = self._create_backend(app)
+
+        if "message_search" not in app.extensions:
+            app.extensions["message_search"] = self
+
+        @app.cli.command("search-reindex")
+        def search_reindex():
+            """从数据库重建消息检索索引"""
+            import click
+
+            count = self.rebuild()
+            click.echo(f"已重建消息索引，共 {count} 条消息")
+
+        if app.config.get("SEARCH_BACKFILL_ON_STARTUP", True):
+            self._start_backfill(app)
+
+    @staticmethod
+    def _create_backend(app) -> SearchBackend:
+        backend_type = app.config.get("SEARCH_BACKEND", "redis")
+        if backend_type == SearchBackendType.MEMORY.value:
+            return SearchBackendFactory.create_backend(SearchBackendType.MEMORY)
+        if backend_type == SearchBackendType.REDIS.value:
+            redis_client = app.extensions.get("redis_client")
+            if redis_client is not None:
+                return SearchBackendFactory.create_backend(
+                    SearchBackendType.REDIS, redis_client=redis_client
+                )
+            logger.warning("Redis不可用，消息检索退回SQLite索引（仅当前主机可见）")
+        else:
+            logger.warning("消息检索使用SQLite索引，只适用于单主机部署")
+        path = app.config.get("SEARCH_INDEX_PATH", DEFAULT_INDEX_PATH)
+        return SearchBackendFactory.create_backend(SearchBackendType.SQLITE, path=path)
+
+    def _start_backfill(self, app) -> None:
+        """索引尚未完整构建时，在后台线程中从数据库回填"""
+        try:
+            if self.backend.is_ready():
+                return
+        except Exception as e:
+            logger.warning(f"读取消息索引状态失败: {e}")
+            return
+
+        def backfill():
+            try:
+                if not self.backend.claim_rebuild(REBUILD_LEASE_TTL):
+                    return  # 其他进程正在回填
+                try:
+                    with app.app_context():
+                        self.rebuild()
+                finally:
+                    self.backend.release_rebuild()
+            except Exception as e:
+                logger.error(f"消息索引回填失败: {e}")
+
+        thread = threading.Thread(
+            target=backfill, name="message-search-backfill", daemon=True
+        )
+        thread.start()
+
+    @property
+    def backend(self) -> SearchBackend:
+        if self._backend is None:
+            self._backend = SearchBackendFactory.create_backend(SearchBackendType.MEMORY)
+        return self._backend
+
+    # ==================== 索引维护 ====================
+
+    @staticmethod
+    def _document(message, server_id: Optional[int]) -> IndexedDocument:
+        return IndexedDocument(
+            doc_id=message.id,
+            tokens=tokenize_document(message.content),
+            channel_id=message.channel_id,
+            server_id=server_id,
+            user_id=int(message.user_id),
+            message_type=message.type,
+            created_at=_to_timestamp(message.created_at) or 0.0,
+        )
+
+    def index_message(self, message, server_id: Optional[int] = None) -> None:
+        """写入或更新单条消息；索引失败不影响业务请求"""
+        try:
+            if message.is_deleted:
+                self.backend.remove(message.id)
+            else:
+                self.backend.index(self._document(message, server_id))
+        except Exception as e:
+            logger.warning(f"更新消息索引失败: message_id={message.id}, error={e}")
+
+    def remove_message(self, message_id: int) -> None:
+        """从索引中删除消息"""
+        try:
+            self.backend.remove(message_id)
+        except Exception as e:
+            logger.warning(f"删除消息索引失败: message_id={message_id}, error={e}")
+
+    def rebuild(self, batch_size: int = 1000) -> int:
+        """
+        从数据库全量重建索引
+
+        按消息ID分批读取，避免一次性加载全部消息。重建期间清除完整构建标记，
+        检索退回数据库，完成后再设置标记。
+        """
+        from app.blueprints.channels.models import Channel, Message
+        from app.core.extensions import db
+
+        self._set_ready(False)
+        self.backend.clear()
+        total = 0
+        last_id = 0
+        while True:
+            rows = (
+                db.session.query(Message, Channel.server_id)
+                .join(Channel, Channel.id == Message.channel_id)
+                .filter(Message.id > last_id, Message.is_deleted == False)
+                .order_by(Message.id.asc())
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                break
+            total += self.backend.index_many(
+                self._document(message, server_id) for message, server_id in rows
+            )
+            last_id = rows[-1][0].id
+            db.session.expunge_all()
+        self._set_ready(True)
+        logger.info(f"消息索引重建完成，共 {total} 条")
+        return total
+
+    def _set_ready(self, ready: bool) -> None:
+        self.backend.set_ready(ready)
+        self._ready = ready
+        self._ready_checked_at = time.monotonic()
+
+    def is_ready(self) -> bool:
+        """索引是否已完整构建；结果在本地缓存 READY_CHECK_INTERVAL 秒"""
+        now = time.monotonic()
+        if now - self._ready_checked_at >= READY_CHECK_INTERVAL:
+            try:
+                self._ready = self.backend.is_ready()
+            except Exception as e:
+                logger.warning(f"读取消息索引状态失败: {e}")
+                self._ready = False
+            self._ready_checked_at = now
+        return self._ready
+
+    # ==================== 检索 ====================
+
+    def search(
+        self,
+        text: str,
+        channel_id: Optional[int] = None,
+        server_ids: Optional[Iterable[int]] = None,
+        user_id: Optional[int] = None,
+        message_type: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        sort: str = "relevance",
+        page: int = 1,
+        per_page: int = 20,
+    ) -> SearchResult:
+        """
+        检索消息
+
+        Args:
+            text: 搜索关键词，分词后所有词项需同时命中
+            channel_id: 频道过滤
+            server_ids: 服务器过滤（可访问的服务器集合）
+            user_id: 发送者过滤
+            message_type: 消息类型过滤
+            start: 起始时间（含）
+            end: 结束时间（含）
+            sort: relevance / date_asc / date_desc
+            page: 页码
+            per_page: 每页数量
+
+        Returns:
+            SearchResult: 当前页消息ID及命中总数
+        """
+        tokens = tokenize_query(text)
+        if not tokens:
+            return SearchResult()
+        try:
+            sort_mode = SearchSort(sort)
+        except ValueError:
+            sort_mode = SearchSort.RELEVANCE
+        page = max(page, 1)
+        per_page = max(per_page, 1)
+        if not self.is_ready():
+            return self._search_database(
+                text,
+                channel_id=channel_id,
+                server_ids=server_ids,
+                user_id=user_id,
+                message_type=message_type,
+                start=start,
+                end=end,
+                sort=sort_mode,
+                page=page,
+                per_page=per_page,
+            )
+        query = SearchQuery(
+            tokens=tokens,
+            channel_id=channel_id,
+            server_ids=list(server_ids) if server_ids is not None else None,
+            user_id=user_id,
+            message_type=message_type,
+            start_ts=_to_timestamp(start),
+            end_ts=_to_timestamp(end),
+            sort=sort_mode,
+            limit=per_page,
+            offset=(page - 1) * per_page,
+        )
+        return self.backend.search(query)
+
+    @staticmethod
+    def _search_database(
+        text: str,
+        channel_id: Optional[int],
+        server_ids: Optional[Iterable[int]],
+        user_id: Optional[int],
+        message_type: Optional[str],
+        start: Optional[datetime],
+        end: Optional[datetime],
+        sort: SearchSort,
+        page: int,
+        per_page: int,
+    ) -> SearchResult:
+        """索引未完整构建时的数据库检索（子串匹配，按时间排序）"""
+        from app.blueprints.channels.models import Channel, Message
+        from app.core.extensions import db
+
+        query = db.session.query(Message.id).filter(
+            Message.is_deleted == False, Message.content.ilike(f"%{text.strip()}%")
+        )
+        if channel_id is not None:
+            query = query.filter(Message.channel_id == channel_id)
+        if server_ids is not None:
+            query = query.join(Channel, Channel.id == Message.channel_id).filter(
+                Channel.server_id.in_(list(server_ids))
+            )
+        if user_id is not None:
+            query = query.filter(Message.user_id == user_id)
+        if message_type:
+            query = query.filter(Message.type == message_type)
+        if start is not None:
+            query = query.filter(Message.created_at >= start)
+        if end is not None:
+            query = query.filter(Message.created_at <= end)
+
+        total = query.count()
+        if sort == SearchSort.DATE_ASC:
+            order = (Message.created_at.asc(), Message.id.asc())
+        else:
+            order = (Message.created_at.desc(), Message.id.desc())
+        rows = query.order_by(*order).offset((page - 1) * per_page).limit(per_page)
+        return SearchResult(doc_ids=[row.id for row in rows], total=total)
+
+
+# 全局实例
+message_search = MessageSearchIndex()
+
+
+def get_message_search() -> MessageSearchIndex:
+    """获取消息检索实例"""
+    return message_search
@@ -0,0 +1,682 @@
+"""
+搜索后端模块
+
+支持多种倒排索引实现：
+- 内存倒排索引（开发/测试环境，每个进程一份）
+- SQLite FTS5（仅限单主机部署，同主机多个worker共享索引文件）
+- Redis 倒排索引（多主机部署，所有主机共享同一份索引）
+
+所有后端均按 BM25 计算相关度，检索开销与命中数量相关，与频道消息总量无关。
+索引保存"已完整构建"标记，未构建完成时由调用方退回数据库检索。
+"""
+
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+# ==================== 数据结构 ====================
+
+
+class SearchBackendType(Enum):
+    """搜索后端类型"""
+
+    MEMORY = "memory"  # 内存倒排索引（开发/测试环境）
+    SQLITE = "sqlite"  # SQLite FTS5（单主机环境）
+    REDIS = "redis"  # Redis 倒排索引（多主机环境）
+
+
+class SearchSort(Enum):
+    """结果排序方式"""
+
+    RELEVANCE = "relevance"
+    DATE_ASC = "date_asc"
+    DATE_DESC = "date_desc"
+
+
+@dataclass
+class IndexedDocument:
+    """待索引文档"""
+
+    doc_id: int
+    tokens: List[str]
+    channel_id: int
+    server_id: Optional[int]
+    user_id: int
+    message_type: str
+    created_at: float
+
+
+@dataclass
+class SearchQuery:
+    """检索条件，tokens 需全部命中"""
+
+    tokens: List[str]
+    channel_id: Optional[int] = None
+    server_ids: Optional[List[int]] = None
+    user_id: Optional[int] = None
+    message_type: Optional[str] = None
+    start_ts: Optional[float] = None
+    end_ts: Optional[float] = None
+    sort: SearchSort = SearchSort.RELEVANCE
+    limit: int = 20
+    offset: int = 0
+
+
+@dataclass
+class SearchResult:
+    """检索结果：当前页文档ID（已排序）、相关度和命中总数"""
+
+    doc_ids: List[int] = field(default_factory=list)
+    scores: Dict[int, float] = field(default_factory=dict)
+    total: int = 0
+
+
+# ==================== 基础后端接口 ====================
+
+
+class SearchBackend(ABC):
+    """搜索后端基础接口"""
+
+    @abstractmethod
+    def index(self, document: IndexedDocument) -> None:
+        """写入或覆盖文档"""
+        pass
+
+    @abstractmethod
+    def remove(self, doc_id: int) -> None:
+        """删除文档"""
+        pass
+
+    @abstractmethod
+    def search(self, query: SearchQuery) -> SearchResult:
+        """检索文档"""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """清空索引"""
+        pass
+
+    @abstractmethod
+    def count(self) -> int:
+        """索引文档数量"""
+        pass
+
+    @abstractmethod
+    def is_ready(self) -> bool:
+        """索引是否已从数据库完整构建"""
+        pass
+
+    @abstractmethod
+    def set_ready(self, ready: bool) -> None:
+        """设置完整构建标记（重建开始时清除，完成后设置）"""
+        pass
+
+    def claim_rebuild(self, ttl: int) -> bool:
+        """
+        获取重建租约，避免多个进程同时从数据库重建同一份索引
+
+        Args:
+            ttl: 租约有效期（秒），持有进程崩溃后到期自动释放
+
+        Returns:
+            bool: 是否获得租约；单进程后端总是返回True
+        """
+        return True
+
+    def release_rebuild(self) -> None:
+        """释放重建租约"""
+        pass
+
+    def index_many(self, documents: Iterable[IndexedDocument]) -> int:
+        """批量写入文档"""
+        n = 0
+        for document in documents:
+            self.index(document)
+            n += 1
+        return n
+
+
+def _document_matches(
+    document: IndexedDocument, query: SearchQuery, server_ids: Optional[set]
+) -> bool:
+    """文档是否满足检索条件中的过滤字段"""
+    if query.channel_id is not None and document.channel_id != query.channel_id:
+        return False
+    if server_ids is not None and document.server_id not in server_ids:
+        return False
+    if query.user_id is not None and document.user_id != query.user_id:
+        return False
+    if query.message_type and document.message_type != query.message_type:
+        return False
+    if query.start_ts is not None and document.created_at < query.start_ts:
+        return False
+    if query.end_ts is not None and document.created_at > query.end_ts:
+        return False
+    return True
+
+
+def _page(scored: List[Tuple[float, float, int]], query: SearchQuery) -> SearchResult:
+    """按排序方式排列 (相关度, 创建时间, 文档ID) 并取出当前页"""
+    if query.sort == SearchSort.DATE_ASC:
+        scored.sort(key=lambda item: (item[1], item[2]))
+    elif query.sort == SearchSort.DATE_DESC:
+        scored.sort(key=lambda item: (item[1], item[2]), reverse=True)
+    else:
+        scored.sort(key=lambda item: (item[0], item[1], item[2]), reverse=True)
+
+    page = scored[query.offset : query.offset + query.limit]
+    return SearchResult(
+        doc_ids=[doc_id for _, _, doc_id in page],
+        scores={doc_id: score for score, _, doc_id in page},
+        total=len(scored),
+    )
+
+
+def _bm25(tf: int, df: int, n_docs: int, doc_len: int, avg_len: float) -> float:
+    """单个词项的 BM25 得分"""
+    idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / (avg_len or 1.0))
+    return idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+
+# ==================== 内存倒排索引 ====================
+
+
+class MemorySearchBackend(SearchBackend):
+    """
+    纯Python倒排索引
+
+    posting 表为 token -> {doc_id: tf}，检索时从最短的 posting 开始求交集，
+    仅对候选文档做过滤和打分。
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._docs: Dict[int, IndexedDocument] = {}
+        self._doc_lengths: Dict[int, int] = {}
+        self._total_length = 0
+        self._ready = False
+        self._lock = threading.RLock()
+
+    def index(self, document: IndexedDocument) -> None:
+        with self._lock:
+            self._remove_locked(document.doc_id)
+            tf = Counter(document.tokens)
+            for token, count in tf.items():
+                self._postings.setdefault(token, {})[document.doc_id] = count
+            self._docs[document.doc_id] = document
+            self._doc_lengths[document.doc_id] = len(document.tokens)
+            self._total_length += len(document.tokens)
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: int) -> None:
+        document = self._docs.pop(doc_id, None)
+        if document is None:
+            return
+        for token in set(document.tokens):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[token]
+        self._total_length -= self._doc_lengths.pop(doc_id, 0)
+
+    def search(self, query: SearchQuery) -> SearchResult:
+        if not query.tokens:
+            return SearchResult()
+        server_ids = set(query.server_ids) if query.server_ids is not None else None
+
+        with self._lock:
+            postings = [self._postings.get(token) for token in query.tokens]
+            if any(not posting for posting in postings):
+                return SearchResult()
+            postings.sort(key=len)
+
+            n_docs = len(self._docs)
+            avg_len = self._total_length / n_docs if n_docs else 0.0
+            scored: List[Tuple[float, float, int]] = []
+            for doc_id in postings[0]:
+                if not all(doc_id in posting for posting in postings[1:]):
+                    continue
+                document = self._docs[doc_id]
+                if not _document_matches(document, query, server_ids):
+                    continue
+                doc_len = self._doc_lengths[doc_id]
+                score = sum(
+                    _bm25(posting[doc_id], len(posting), n_docs, doc_len, avg_len)
+                    for posting in postings
+                )
+                scored.append((score, document.created_at, doc_id))
+
+        return _page(scored, query)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._postings.clear()
+            self._docs.clear()
+            self._doc_lengths.clear()
+            self._total_length = 0
+
+    def count(self) -> int:
+        return len(self._docs)
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+    def set_ready(self, ready: bool) -> None:
+        self._ready = ready
+
+
+# ==================== SQLite FTS5 ====================
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    基于 SQLite FTS5 的倒排索引
+
+    文档以预分词后的词项（空格分隔）写入，rowid 即消息ID，
+    过滤字段为 UNINDEXED 列，只在 MATCH 命中的行上求值。
+    索引文件只在本机可见，多主机部署时各主机的索引互不同步，应使用 Redis 后端。
+    """
+
+    TABLE = "message_search"
+    META_TABLE = "message_search_meta"
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._lock = threading.RLock()
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.TABLE} USING fts5("
+            "tokens, channel_id UNINDEXED, server_id UNINDEXED, user_id UNINDEXED, "
+            "message_type UNINDEXED, created_at UNINDEXED, "
+            "tokenize = 'unicode61 remove_diacritics 0')"
+        )
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.META_TABLE} "
+            "(key TEXT PRIMARY KEY, value REAL)"
+        )
+        self._conn.commit()
+
+    def _get_meta(self, key: str) -> Optional[float]:
+        row = self._conn.execute(
+            f"SELECT value FROM {self.META_TABLE} WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: Optional[float]) -> None:
+        if value is None:
+            self._conn.execute(f"DELETE FROM {self.META_TABLE} WHERE key = ?", (key,))
+        else:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.META_TABLE}(key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+    @staticmethod
+    def _row(document: IndexedDocument) -> tuple:
+        return (
+            document.doc_id,
+            " ".join(document.tokens),
+            document.channel_id,
+            document.server_id,
+            document.user_id,
+            document.message_type,
+            document.created_at,
+        )
+
+    def index(self, document: IndexedDocument) -> None:
+        self.index_many([document])
+
+    def index_many(self, documents: Iterable[IndexedDocument]) -> int:
+        rows = [self._row(document) for document in documents]
+        if not rows:
+            return 0
+        with self._lock:
+            self._conn.executemany(
+                f"DELETE FROM {self.TABLE} WHERE rowid = ?", [(r[0],) for r in rows]
+            )
+            self._conn.executemany(
+                f"INSERT INTO {self.TABLE}(rowid, tokens, channel_id, server_id, "
+                "user_id, message_type, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+        return len(rows)
+
+    def remove(self, doc_id: int) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.TABLE} WHERE rowid = ?", (doc_id,))
+            self._conn.commit()
+
+    def search(self, query: SearchQuery) -> SearchResult:
+        if not query.tokens:
+            return SearchResult()
+
+        match = " ".join('"{}"'.format(t.replace('"', '""')) for t in query.tokens)
+        where = [f"{self.TABLE} MATCH ?"]
+        params: list = [match]
+        if query.channel_id is not None:
+            where.append("channel_id = ?")
+            params.append(query.channel_id)
+        if query.server_ids is not None:
+            server_ids = list(query.server_ids)
+            if not server_ids:
+                return SearchResult()
+            where.append(f"server_id IN ({','.join('?' * len(server_ids))})")
+            params.extend(server_ids)
+        if query.user_id is not None:
+            where.append("user_id = ?")
+            params.append(query.user_id)
+        if query.message_type:
+            where.append("message_type = ?")
+            params.append(query.message_type)
+        if query.start_ts is not None:
+            where.append("created_at >= ?")
+            params.append(query.start_ts)
+        if query.end_ts is not None:
+            where.append("created_at <= ?")
+            params.append(query.end_ts)
+        where_sql = " AND ".join(where)
+
+        # FTS5 的 bm25() 越小越相关，取负值与内存后端保持一致
+        if query.sort == SearchSort.DATE_ASC:
+            order = "created_at ASC, rowid ASC"
+        elif query.sort == SearchSort.DATE_DESC:
+            order = "created_at DESC, rowid DESC"
+        else:
+            order = "score ASC, created_at DESC, rowid DESC"
+
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM {self.TABLE} WHERE {where_sql}", params
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT rowid, bm25({self.TABLE}) AS score FROM {self.TABLE} "
+                f"WHERE {where_sql} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [query.limit, query.offset],
+            ).fetchall()
+
+        return SearchResult(
+            doc_ids=[row[0] for row in rows],
+            scores={row[0]: -row[1] for row in rows},
+            total=total,
+        )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.TABLE}")
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.TABLE}").fetchone()[0]
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return bool(self._get_meta("ready"))
+
+    def set_ready(self, ready: bool) -> None:
+        with self._lock:
+            self._set_meta("ready", 1.0 if ready else None)
+            self._conn.commit()
+
+    def claim_rebuild(self, ttl: int) -> bool:
+        # 同主机的worker共享索引文件，用 BEGIN IMMEDIATE 串行化租约检查
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                until = self._get_meta("rebuild_until")
+                if until is not None and until > now:
+                    self._conn.rollback()
+                    return False
+                self._set_meta("rebuild_until", now + ttl)
+                self._conn.commit()
+                return True
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                logger.warning(f"获取索引重建租约失败: {e}")
+                return False
+
+    def release_rebuild(self) -> None:
+        with self._lock:
+            self._set_meta("rebuild_until", None)
+            self._conn.commit()
+
+
+# ==================== Redis 倒排索引 ====================
+
+
+def _text(value) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+class RedisSearchBackend(SearchBackend):
+    """
+    基于 Redis 的共享倒排索引
+
+    键布局（均带 key_prefix）：
+    - tok:{词项}: HASH，文档ID -> 词频（posting）
+    - doc:{文档ID}: HASH，过滤字段和词项列表
+    - stats: HASH，docs（文档数）/ length（总词项数），用于 BM25
+    - ready / rebuild: 完整构建标记和重建租约
+
+    检索时读取最短的 posting，其余词项只对候选文档 HMGET，再批量读取候选文档。
+    写入不是原子的，检索时以文档自身的词项为准校验候选，残留的 posting 不影响结果。
+    """
+
+    def __init__(self, redis_client, key_prefix: str = "search:"):
+        self.redis = redis_client
+        self.key_prefix = key_prefix
+
+    def _tok_key(self, token: str) -> str:
+        return f"{self.key_prefix}tok:{token}"
+
+    def _doc_key(self, doc_id: int) -> str:
+        return f"{self.key_prefix}doc:{doc_id}"
+
+    @property
+    def _stats_key(self) -> str:
+        return f"{self.key_prefix}stats"
+
+    def index(self, document: IndexedDocument) -> None:
+        self.index_many([document])
+
+    def index_many(self, documents: Iterable[IndexedDocument]) -> int:
+        documents = list(documents)
+        if not documents:
+            return 0
+        self._remove_many([document.doc_id for document in documents])
+        pipe = self.redis.pipeline(transaction=False)
+        for document in documents:
+            server_id = document.server_id
+            pipe.hset(
+                self._doc_key(document.doc_id),
+                mapping={
+                    "tokens": " ".join(document.tokens),
+                    "channel_id": document.channel_id,
+                    "server_id": "" if server_id is None else server_id,
+                    "user_id": document.user_id,
+                    "message_type": document.message_type or "",
+                    "created_at": document.created_at,
+                },
+            )
+            for token, count in Counter(document.tokens).items():
+                pipe.hset(self._tok_key(token), document.doc_id, count)
+            pipe.hincrby(self._stats_key, "docs", 1)
+            pipe.hincrby(self._stats_key, "length", len(document.tokens))
+        pipe.execute()
+        return len(documents)
+
+    def remove(self, doc_id: int) -> None:
+        self._remove_many([doc_id])
+
+    def _remove_many(self, doc_ids: List[int]) -> None:
+        pipe = self.redis.pipeline(transaction=False)
+        for doc_id in doc_ids:
+            pipe.hget(self._doc_key(doc_id), "tokens")
+        existing = [
+            (doc_id, _text(tokens).split())
+            for doc_id, tokens in zip(doc_ids, pipe.execute())
+            if tokens is not None
+        ]
+        if not existing:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for doc_id, tokens in existing:
+            for token in set(tokens):
+                pipe.hdel(self._tok_key(token), doc_id)
+            pipe.delete(self._doc_key(doc_id))
+            pipe.hincrby(self._stats_key, "docs", -1)
+            pipe.hincrby(self._stats_key, "length", -len(tokens))
+        pipe.execute()
+
+    def search(self, query: SearchQuery) -> SearchResult:
+        if not query.tokens:
+            return SearchResult()
+        tokens = list(dict.fromkeys(query.tokens))
+
+        pipe = self.redis.pipeline(transaction=False)
+        for token in tokens:
+            pipe.hlen(self._tok_key(token))
+        pipe.hmget(self._stats_key, "docs", "length")
+        *lengths, stats = pipe.execute()
+        if not all(lengths):
+            return SearchResult()
+        n_docs = int(stats[0] or 0)
+        avg_len = int(stats[1] or 0) / n_docs if n_docs else 0.0
+        df = dict(zip(tokens, lengths))
+        tokens.sort(key=df.get)
+
+        # 从最短的 posting 开始求交集
+        candidates = {
+            int(doc_id): {tokens[0]: int(tf)}
+            for doc_id, tf in self.redis.hgetall(self._tok_key(tokens[0])).items()
+        }
+        for token in tokens[1:]:
+            if not candidates:
+                return SearchResult()
+            doc_ids = list(candidates)
+            tfs = self.redis.hmget(self._tok_key(token), doc_ids)
+            candidates = {
+                doc_id: {**candidates[doc_id], token: int(tf)}
+                for doc_id, tf in zip(doc_ids, tfs)
+                if tf is not None
+            }
+        if not candidates:
+            return SearchResult()
+
+        pipe = self.redis.pipeline(transaction=False)
+        doc_ids = list(candidates)
+        for doc_id in doc_ids:
+            pipe.hgetall(self._doc_key(doc_id))
+        server_ids = set(query.server_ids) if query.server_ids is not None else None
+        scored: List[Tuple[float, float, int]] = []
+        for doc_id, fields in zip(doc_ids, pipe.execute()):
+            if not fields:
+                continue
+            fields = {_text(key): _text(value) for key, value in fields.items()}
+            doc_tokens = fields["tokens"].split()
+            if not set(tokens).issubset(doc_tokens):
+                continue
+            document = IndexedDocument(
+                doc_id=doc_id,
+                tokens=doc_tokens,
+                channel_id=int(fields["channel_id"]),
+                server_id=int(fields["server_id"]) if fields["server_id"] else None,
+                user_id=int(fields["user_id"]),
+                message_type=fields["message_type"],
+                created_at=float(fields["created_at"]),
+            )
+            if not _document_matches(document, query, server_ids):
+                continue
+            score = sum(
+                _bm25(tf, df[token], n_docs, len(doc_tokens), avg_len)
+                for token, tf in candidates[doc_id].items()
+            )
+            scored.append((score, document.created_at, doc_id))
+
+        return _page(scored, query)
+
+    def clear(self) -> None:
+        batch = []
+        for key in self.redis.scan_iter(match=f"{self.key_prefix}*", count=1000):
+            if _text(key) in (self._ready_key, self._rebuild_key):
+                continue
+            batch.append(key)
+            if len(batch) >= 1000:
+                self.redis.delete(*batch)
+                batch = []
+        if batch:
+            self.redis.delete(*batch)
+
+    def count(self) -> int:
+        return int(self.redis.hget(self._stats_key, "docs") or 0)
+
+    @property
+    def _ready_key(self) -> str:
+        return f"{self.key_prefix}ready"
+
+    @property
+    def _rebuild_key(self) -> str:
+        return f"{self.key_prefix}rebuild"
+
+    def is_ready(self) -> bool:
+        return bool(self.redis.exists(self._ready_key))
+
+    def set_ready(self, ready: bool) -> None:
+        if ready:
+            self.redis.set(self._ready_key, 1)
+        else:
+            self.redis.delete(self._ready_key)
+
+    def claim_rebuild(self, ttl: int) -> bool:
+        return bool(self.redis.set(self._rebuild_key, 1, nx=True, ex=ttl))
+
+    def release_rebuild(self) -> None:
+        self.redis.delete(self._rebuild_key)
+
+
+# ==================== 后端工厂 ====================
+
+
+class SearchBackendFactory:
+    """搜索后端工厂"""
+
+    @staticmethod
+    def create_backend(backend_type: SearchBackendType, **kwargs) -> SearchBackend:
+        """创建搜索后端"""
+        if backend_type == SearchBackendType.MEMORY:
+            return MemorySearchBackend()
+        elif backend_type == SearchBackendType.SQLITE:
+            return SQLiteSearchBackend(kwargs.get("path", ":memory:"))
+        elif backend_type == SearchBackendType.REDIS:
+            return RedisSearchBackend(
+                kwargs["redis_client"], kwargs.get("key_prefix", "search:")
+            )
+        else:
+            raise ValueError(f"不支持的搜索后端类型: {backend_type}")
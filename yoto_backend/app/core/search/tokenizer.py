@@ -0,0 +1,65 @@
+"""
+搜索分词器
+
+- 拉丁字母/数字按词切分并统一小写
+- 中日韩文字按重叠二元组（bigram）切分，单字片段保留为一元词
+- 建索引时额外写入中日韩单字，使单字查询同样可以命中
+"""
+
+import re
+from typing import List
+
+# 中日韩统一表意文字、平假名、片假名、韩文音节
+_CJK_RANGES = (
+    "\u3040-\u30ff"
+    "\u3400-\u4dbf"
+    "\u4e00-\u9fff"
+    "\uf900-\ufaff"
+    "\uac00-\ud7af"
+)
+_TOKEN_PATTERN = re.compile(rf"([{_CJK_RANGES}]+)|([^\W_{_CJK_RANGES}]+)")
+
+NGRAM_SIZE = 2
+
+
+def _cjk_ngrams(segment: str, n: int = NGRAM_SIZE) -> List[str]:
+    """将连续的CJK片段切分为重叠n元组"""
+    if len(segment) <= n:
+        return [segment]
+    return [segment[i : i + n] for i in range(len(segment) - n + 1)]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    文本分词
+
+    Args:
+        text: 原始文本
+
+    Returns:
+        List[str]: 按出现顺序排列的词项（可重复，用于词频统计）
+    """
+    if not text:
+        return []
+    tokens = []
+    for cjk, word in _TOKEN_PATTERN.findall(text.lower()):
+        if cjk:
+            tokens.extend(_cjk_ngrams(cjk))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def tokenize_document(text: str) -> List[str]:
+    """建索引分词：在 tokenize 的基础上追加中日韩单字词项"""
+    tokens = tokenize(text)
+    if text:
+        for cjk, _ in _TOKEN_PATTERN.findall(text.lower()):
+            if len(cjk) > 1:
+                tokens.extend(cjk)
+    return tokens
+
+
+def tokenize_query(text: str) -> List[str]:
+    """查询分词：去重并保持顺序，所有词项需同时命中"""
+    return list(dict.fromkeys(tokenize(text)))
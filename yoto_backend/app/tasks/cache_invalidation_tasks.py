@@ -7,7 +7,7 @@
 import time
 import logging
 from celery import current_task, shared_task
-from app.core.permission_invalidation import (
+from app.core.permission.permission_invalidation import (
     _process_delayed_invalidations_internal,
     get_delayed_invalidation_stats,
     cleanup_expired_invalidations,
@@ -229,7 +229,7 @@ def execute_global_smart_batch_invalidation_task():
         Dict[str, Any]: 执行结果
     """
     try:
-        from app.core.permission_invalidation import (
+        from app.core.permission.permission_invalidation import (
             execute_global_smart_batch_invalidation,
         )
 
@@ -30,6 +30,59 @@ class Config:
         "decode_responses": True,
     }
 
+    # 消息检索配置：redis（所有主机共享索引）、sqlite（FTS5索引文件，仅限单主机部署）
+    # 或 memory（每个进程一份，仅用于开发测试）
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "redis")
+    SEARCH_INDEX_PATH = os.getenv(
+        "SEARCH_INDEX_PATH",
+        os.path.join(os.path.dirname(__file__), "instance", "message_search.db"),
+    )
+    # 启动时若索引尚未完整构建，在后台从数据库回填（多进程通过租约只回填一次）
+    SEARCH_BACKFILL_ON_STARTUP = (
+        os.getenv("SEARCH_BACKFILL_ON_STARTUP", "true").lower() == "true"
+    )
+
+    # 权限快照最大存活时间（秒），超时后在后台全量重建
+    PERMISSION_SNAPSHOT_MAX_AGE = int(os.getenv("PERMISSION_SNAPSHOT_MAX_AGE", 300))
+
+    # 权限缓存未命中合并：开启后跨进程只有租约持有者加载，其余进程等待L2回填
+    PERMISSION_SINGLE_FLIGHT_LEASE = (
+        os.getenv("PERMISSION_SINGLE_FLIGHT_LEASE", "false").lower() == "true"
+    )
+    PERMISSION_SINGLE_FLIGHT_LEASE_TTL = float(
+        os.getenv("PERMISSION_SINGLE_FLIGHT_LEASE_TTL", 2.0)
+    )
+
+    # 权限L1缓存淘汰策略覆盖：{缓存策略名: "lru" | "w_tinylfu" | "arc"}
+    PERMISSION_CACHE_EVICTION_POLICIES = {}
+
+    # 跨进程L1失效广播（Redis pub/sub），发送端按毫秒窗口合并
+    PERMISSION_INVALIDATION_BUS = (
+        os.getenv("PERMISSION_INVALIDATION_BUS", "true").lower() == "true"
+    )
+    PERMISSION_INVALIDATION_BUS_FLUSH_MS = int(
+        os.getenv("PERMISSION_INVALIDATION_BUS_FLUSH_MS", 5)
+    )
+
+    # 延迟失效队列分片数（按哈希标签分布到多个ZSET，修改前需先处理完队列）
+    PERMISSION_INVALIDATION_QUEUE_SHARDS = int(
+        os.getenv("PERMISSION_INVALIDATION_QUEUE_SHARDS", 16)
+    )
+
+    # 权限缓存代数在本进程缓存的时间（秒），超时后用一次MGET批量校验
+    PERMISSION_GENERATION_CACHE_TTL = float(
+        os.getenv("PERMISSION_GENERATION_CACHE_TTL", 1.0)
+    )
+    # 本进程最多缓存的代数引用数量，超出后淘汰最久未刷新的引用
+    PERMISSION_GENERATION_CACHE_SIZE = int(
+        os.getenv("PERMISSION_GENERATION_CACHE_SIZE", 100000)
+    )
+
+    # 启动时将权限装饰器声明的权限批量同步到数据库（也可执行 flask permissions-sync）
+    PERMISSION_MANIFEST_SYNC_ON_STARTUP = (
+        os.getenv("PERMISSION_MANIFEST_SYNC_ON_STARTUP", "true").lower() == "true"
+    )
+
     # WebSocket配置
     WEBSOCKET_CONFIG = {
         "cors_allowed_origins": "*",
@@ -145,6 +198,10 @@ class TestingConfig(Config):
     JWT_SECRET_KEY = "test-jwt-secret"
     JWT_ACCESS_TOKEN_EXPIRES = False  # 测试环境下token永不过期
     JWT_REFRESH_TOKEN_EXPIRES = False
+    SEARCH_BACKEND = "memory"
+    SEARCH_BACKFILL_ON_STARTUP = False
+    PERMISSION_INVALIDATION_BUS = False
+    PERMISSION_MANIFEST_SYNC_ON_STARTUP = False
 
     # MySQL特定配置
     SQLALCHEMY_ENGINE_OPTIONS = {
@@ -0,0 +1,23 @@
+"""添加消息历史游标分页索引
+
+Revision ID: add_message_history_index
+Revises: add_search_history_table
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_message_history_index'
+down_revision = 'add_search_history_table'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_messages_channel_created_id', 'messages', ['channel_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_messages_channel_created_id', table_name='messages')
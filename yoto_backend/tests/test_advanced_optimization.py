@@ -0,0 +1,89 @@
+"""高级优化测试：批量写入L2的数据与分布式缓存读取格式一致"""
+
+import threading
+
+import pytest
+
+from app.core.permission import advanced_optimization
+from app.core.permission.advanced_optimization import advanced_batch_set_permissions
+from app.core.permission.hybrid_permission_cache import get_hybrid_cache
+from app.core.permission.permission_bitset import (
+    get_permission_bit_index,
+    is_serialized_bits,
+)
+from app.core.permission.permission_keys import encode_perm_key, user_index_key
+
+
+@pytest.fixture(autouse=True)
+def bit_index():
+    index = get_permission_bit_index()
+    index.clear()
+    # 阻止未知名称触发数据库加载
+    index._last_reload = float("inf")
+    index.register_many([("read_channel", 1), ("send_message", 2)])
+    yield index
+    index.clear()
+
+
+class RecordingRedis:
+    """记录管道命令的二进制客户端替身"""
+
+    def __init__(self):
+        self.values = {}
+        self.indexes = {}
+        self.lock = threading.Lock()
+
+    def pipeline(self, transaction=True):
+        return RecordingPipeline(self)
+
+
+class RecordingPipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def set(self, key, value, ex=None):
+        self.commands.append(lambda: self.redis.values.__setitem__(key, (value, ex)))
+
+    def sadd(self, key, *members):
+        self.commands.append(
+            lambda: self.redis.indexes.setdefault(key, set()).update(members)
+        )
+
+    def expire(self, key, ttl):
+        pass
+
+    def execute(self):
+        with self.redis.lock:
+            for command in self.commands:
+                command()
+
+
+class FakeOptimizer:
+    def __init__(self):
+        self.config = {"batch_size": 2}
+        self.binary_redis_client = RecordingRedis()
+
+
+@pytest.fixture
+def optimizer(monkeypatch):
+    fake = FakeOptimizer()
+    monkeypatch.setattr(advanced_optimization, "get_advanced_optimizer", lambda: fake)
+    return fake
+
+
+def test_batch_set_writes_serialized_bitmaps(optimizer):
+    keys = [encode_perm_key(user_id, "server", 1) for user_id in range(1, 6)]
+    # 批量操作队列中的数据经过JSON，权限为列表
+    cache_data = {key: ["read_channel", "send_message"] for key in keys}
+    advanced_batch_set_permissions(cache_data, ttl=120)
+
+    redis = optimizer.binary_redis_client
+    assert set(redis.values) == set(keys)
+    deserialize = get_hybrid_cache().distributed_cache._deserialize_permissions
+    for key in keys:
+        data, ttl = redis.values[key]
+        assert ttl == 120
+        assert is_serialized_bits(data)
+        assert set(deserialize(data)) == {"read_channel", "send_message"}
+    assert redis.indexes[user_index_key(1)] == {keys[0]}
@@ -0,0 +1,170 @@
+"""舱壁隔离测试：全局并发上限、空闲归还和租约回收"""
+
+import threading
+
+from app.core.permission.permission_resilience import Bulkhead, BulkheadConfig
+
+
+class FakeController:
+    """按 BULKHEAD_ATOMIC_SCRIPT 语义实现的控制器替身，多个 Bulkhead 共享即模拟多进程"""
+
+    def __init__(self):
+        self.active = 0
+        self.leases = {}  # holder -> [数量, 到期时间]
+        self.calls = 0
+        self.failures = 0
+        self.now = 0.0
+
+    def bulkhead_execute_atomic_operation(
+        self, name, operation, limit, current_time, count=1, holder="", lease_ttl=0
+    ):
+        now = self.now
+        if operation == "acquire":
+            for member, (held, expires_at) in list(self.leases.items()):
+                if expires_at <= now:
+                    self.active -= held
+                    del self.leases[member]
+            granted = min(count, limit - self.active)
+            if granted <= 0:
+                return (0, self.active, 0)
+            self.active += granted
+            lease = self.leases.setdefault(holder, [0, 0])
+            lease[0] += granted
+            lease[1] = now + lease_ttl
+            return (1, self.active, granted)
+        if operation == "release":
+            lease = self.leases.get(holder, [0, 0])
+            count = min(count, lease[0])
+            lease[0] -= count
+            if lease[0] <= 0:
+                self.leases.pop(holder, None)
+            self.active -= count
+            return (1, self.active)
+        if operation == "renew":
+            if holder not in self.leases:
+                return (0,)
+            self.leases[holder][1] = now + lease_ttl
+            return (1,)
+        if operation == "success":
+            self.calls += count
+        elif operation == "failure":
+            self.calls += count
+            self.failures += count
+        return (1, self.calls)
+
+    def get_bulkhead_active_calls(self, name):
+        return self.active
+
+    def get_bulkhead_total_calls(self, name):
+        return self.calls
+
+    def get_bulkhead_failed_calls(self, name):
+        return self.failures
+
+    def get_bulkhead_last_call_time(self, name):
+        return 0.0
+
+
+def make_bulkhead(controller, **overrides):
+    values = dict(
+        name="db",
+        max_concurrent_calls=100,
+        global_max_concurrent_calls=10,
+        reservation_chunk=4,
+        monitor_interval=3600,
+    )
+    values.update(overrides)
+    return Bulkhead("db", controller, BulkheadConfig(**values))
+
+
+def test_global_ceiling_holds_across_processes():
+    controller = FakeController()
+    first, second = make_bulkhead(controller), make_bulkhead(controller)
+    admitted = sum(first.acquire_resource(str(i)) for i in range(7))
+    admitted += sum(second.acquire_resource(str(i)) for i in range(7))
+    assert admitted == 9  # first 预留了两块(8)，second 只能拿到剩余的2
+    assert controller.active == 10
+    assert second.local_stats["global_rejections"] == 5
+
+
+def test_idle_process_returns_all_reservations():
+    controller = FakeController()
+    bulkhead = make_bulkhead(controller)
+    for i in range(5):
+        assert bulkhead.acquire_resource(str(i))
+    for i in range(4):
+        bulkhead.release_resource(str(i))
+    # 仍有进行中的调用：最多保留一个预留块
+    assert bulkhead._global_reserved == 1 + 4
+    bulkhead.release_resource("4")
+    assert bulkhead._global_reserved == 0
+    assert controller.active == 0
+    assert controller.leases == {}
+
+
+def test_crashed_process_lease_is_reclaimed():
+    controller = FakeController()
+    crashed = make_bulkhead(controller)
+    assert sum(crashed.acquire_resource(str(i)) for i in range(10)) == 10
+
+    survivor = make_bulkhead(controller)
+    assert not survivor.acquire_resource("x")
+
+    controller.now += crashed._lease_ttl(crashed.get_config()) + 1
+    assert sum(survivor.acquire_resource(str(i)) for i in range(10)) == 10
+
+    # 崩溃进程恢复后归还的额度已被回收，不会重复扣减
+    crashed.release_resource("0")
+    assert controller.active == 10
+
+
+def test_lost_lease_drops_local_reservation():
+    controller = FakeController()
+    bulkhead = make_bulkhead(controller)
+    assert bulkhead.acquire_resource("a")
+    controller.leases.clear()
+    bulkhead._renew_lease(bulkhead.get_config())
+    assert bulkhead._global_reserved == 0
+    assert bulkhead.local_stats["lease_lost"] == 1
+
+
+def test_default_ceiling_is_cluster_wide():
+    controller = FakeController()
+    config = dict(
+        max_concurrent_calls=3, global_max_concurrent_calls=None, reservation_chunk=0
+    )
+    first = make_bulkhead(controller, **config)
+    second = make_bulkhead(controller, **config)
+    results = [first.acquire_resource(), second.acquire_resource()]
+    results += [first.acquire_resource(), second.acquire_resource()]
+    assert results == [True, True, True, False]
+
+
+def test_unlimited_global_ceiling_skips_redis():
+    controller = FakeController()
+    bulkhead = make_bulkhead(
+        controller, max_concurrent_calls=2, global_max_concurrent_calls=0
+    )
+    assert bulkhead.acquire_resource("a") and bulkhead.acquire_resource("a")
+    assert not bulkhead.acquire_resource("a")
+    assert controller.active == 0
+    assert bulkhead.local_stats["local_rejections"] == 1
+
+
+def test_pending_calls_are_counted_under_contention():
+    controller = FakeController()
+    bulkhead = make_bulkhead(controller)
+
+    def worker():
+        for _ in range(2000):
+            bulkhead.record_success()
+            bulkhead.record_failure()
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = bulkhead.get_stats()
+    assert stats["total_calls"] == 8 * 2000 * 2
+    assert stats["failed_calls"] == 8 * 2000
@@ -0,0 +1,41 @@
+"""混合权限缓存测试：简单权限与混合策略都由RBAC快照解析"""
+
+import pytest
+
+from app.core.permission import hybrid_permission_cache
+from app.core.permission.hybrid_permission_cache import HybridPermissionCache
+
+
+class FakeResolver:
+    """只在服务器1上授予用户1 send_message 的快照替身"""
+
+    def resolve(self, user_id, scope=None, scope_id=None):
+        if (user_id, scope, scope_id) == (1, "server", 1):
+            return {"send_message"}
+        return set()
+
+    def user_role_ids(self, user_id):
+        return ()
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(
+        hybrid_permission_cache, "get_permission_resolver", FakeResolver
+    )
+    return HybridPermissionCache()
+
+
+def test_basic_strategy_consults_rbac(cache):
+    assert cache.get_permission(1, "send_message", "basic", "server", 1) is True
+    assert cache.get_permission(2, "send_message", "basic", "server", 1) is False
+    # 同一用户在其他作用域没有授权，缓存键区分作用域
+    assert cache.get_permission(1, "send_message", "basic", "server", 2) is False
+    assert cache.check_basic_permission(1, "read_channel") is False
+
+
+def test_hybrid_strategy_does_not_grant_basic_permissions(cache):
+    result = cache.get_permission(2, "send_message", "hybrid", "server", 1)
+    assert "send_message" not in result
+    result = cache.get_permission(1, "send_message", "hybrid", "server", 1)
+    assert "send_message" in result
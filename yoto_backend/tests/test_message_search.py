@@ -0,0 +1,181 @@
+"""消息检索测试：Redis 共享索引与未构建完成时的数据库退回"""
+
+import fnmatch
+
+import pytest
+
+from app.core.search import message_index
+from app.core.search.message_index import MessageSearchIndex
+from app.core.search.search_backends import (
+    IndexedDocument,
+    MemorySearchBackend,
+    RedisSearchBackend,
+    SearchQuery,
+    SearchResult,
+    SearchSort,
+)
+
+
+class FakeRedis:
+    """检索后端用到的哈希/字符串命令的Redis替身（decode_responses=True）"""
+
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        entry = self.data.setdefault(key, {})
+        for name, item in (mapping or {field: value}).items():
+            entry[str(name)] = str(item)
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(str(field))
+
+    def hmget(self, key, *fields):
+        if len(fields) == 1 and isinstance(fields[0], list):
+            fields = fields[0]
+        return [self.hget(key, field) for field in fields]
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hlen(self, key):
+        return len(self.data.get(key, {}))
+
+    def hdel(self, key, field):
+        self.data.get(key, {}).pop(str(field), None)
+
+    def hincrby(self, key, field, amount=1):
+        entry = self.data.setdefault(key, {})
+        entry[field] = str(int(entry.get(field, 0)) + amount)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = str(value)
+        return True
+
+    def exists(self, key):
+        return int(key in self.data)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match=None, count=None):
+        return [key for key in list(self.data) if fnmatch.fnmatch(key, match)]
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis, self.calls = redis, []
+
+    def __getattr__(self, command):
+        method = getattr(self.redis, command)
+        return lambda *args, **kwargs: self.calls.append((method, args, kwargs))
+
+    def execute(self):
+        return [method(*args, **kwargs) for method, args, kwargs in self.calls]
+
+
+def make_document(doc_id, tokens, channel_id=1, server_id=10, created_at=None):
+    return IndexedDocument(
+        doc_id=doc_id,
+        tokens=tokens,
+        channel_id=channel_id,
+        server_id=server_id,
+        user_id=7,
+        message_type="text",
+        created_at=created_at if created_at is not None else float(doc_id),
+    )
+
+
+def make_query(tokens, **kwargs):
+    return SearchQuery(tokens=tokens, **kwargs)
+
+
+def test_redis_backend_matches_memory_backend():
+    documents = [
+        make_document(1, ["hello", "world"]),
+        make_document(2, ["hello", "hello", "there"], channel_id=2, server_id=None),
+        make_document(3, ["world", "peace", "hello"], server_id=11),
+        make_document(4, ["goodbye"]),
+    ]
+    redis_backend = RedisSearchBackend(FakeRedis())
+    memory_backend = MemorySearchBackend()
+    for backend in (redis_backend, memory_backend):
+        backend.index_many(documents)
+
+    queries = [
+        make_query(["hello"]),
+        make_query(["hello", "world"]),
+        make_query(["hello"], server_ids=[10, 11], sort=SearchSort.DATE_ASC),
+        make_query(["hello"], channel_id=1, limit=1, offset=1),
+        make_query(["missing"]),
+    ]
+    for query in queries:
+        expected = memory_backend.search(query)
+        result = redis_backend.search(query)
+        assert result.doc_ids == expected.doc_ids
+        assert result.total == expected.total
+        for doc_id, score in expected.scores.items():
+            assert result.scores[doc_id] == pytest.approx(score)
+
+
+def test_redis_backend_reindex_and_remove_drop_stale_postings():
+    redis = FakeRedis()
+    backend = RedisSearchBackend(redis)
+    backend.index(make_document(1, ["hello", "world"]))
+    backend.index(make_document(1, ["goodbye"]))
+    assert backend.search(make_query(["hello"])).doc_ids == []
+    assert backend.search(make_query(["goodbye"])).doc_ids == [1]
+    assert backend.count() == 1
+
+    backend.remove(1)
+    assert backend.search(make_query(["goodbye"])).total == 0
+    assert backend.count() == 0
+
+    # 写入中途失败残留的 posting 以文档自身词项为准被过滤
+    backend.index(make_document(2, ["hello"]))
+    redis.hset("search:tok:world", 2, 1)
+    assert backend.search(make_query(["hello", "world"])).doc_ids == []
+
+
+def test_redis_backend_ready_flag_survives_clear_and_lease_is_exclusive():
+    backend = RedisSearchBackend(FakeRedis())
+    assert not backend.is_ready()
+    backend.index(make_document(1, ["hello"]))
+    backend.set_ready(True)
+    assert backend.claim_rebuild(60)
+    assert not backend.claim_rebuild(60)
+
+    backend.clear()
+    assert backend.count() == 0
+    assert backend.is_ready()
+    backend.release_rebuild()
+    assert backend.claim_rebuild(60)
+
+
+def test_search_falls_back_to_database_until_index_is_ready(monkeypatch):
+    calls = []
+
+    def fake_search_database(text, **kwargs):
+        calls.append((text, kwargs))
+        return SearchResult(doc_ids=[99], total=1)
+
+    index = MessageSearchIndex(MemorySearchBackend())
+    monkeypatch.setattr(index, "_search_database", fake_search_database)
+    index.backend.index(make_document(1, ["hello"]))
+
+    result = index.search("hello", channel_id=1, sort="date_asc")
+    assert result.doc_ids == [99]
+    assert calls[0][1]["channel_id"] == 1
+    assert calls[0][1]["sort"] == SearchSort.DATE_ASC
+
+    # 其他进程完成回填后，本地缓存到期即改用索引
+    index.backend.set_ready(True)
+    monkeypatch.setattr(message_index, "READY_CHECK_INTERVAL", 0.0)
+    assert index.search("hello").doc_ids == [1]
+    assert len(calls) == 1
@@ -0,0 +1,32 @@
+"""指标注册表测试：自动注册的指标数量有上限"""
+
+from app.core.permission.metrics_registry import (
+    OVERFLOW_SERIES,
+    UNREGISTERED_METRIC,
+    MetricsRegistry,
+)
+
+
+def test_auto_registration_is_capped():
+    registry = MetricsRegistry(default_max_series=3, max_metrics=2)
+    for i in range(100):
+        registry.series(f"dynamic_{i}", {"k": "v"})
+    assert len(registry._specs) == 2
+    assert registry.stats["auto_registered"] == 2
+    assert registry.stats["unregistered_overflow"] == 98
+    assert UNREGISTERED_METRIC in registry.get_stats()["metrics"]
+
+
+def test_unregistered_metrics_share_one_series_limit():
+    registry = MetricsRegistry(default_max_series=3, max_metrics=0)
+    series = [registry.series(f"m{i}", {"id": i}) for i in range(10)]
+    assert series[:3] == [(("id", 0),), (("id", 1),), (("id", 2),)]
+    assert set(series[3:]) == {OVERFLOW_SERIES}
+
+
+def test_explicit_registration_is_not_capped():
+    registry = MetricsRegistry(max_metrics=0)
+    registry.register("latency", allowed_tags=["operation"])
+    assert registry.series("latency", {"operation": "get", "cache_key": "x"}) == (
+        ("operation", "get"),
+    )
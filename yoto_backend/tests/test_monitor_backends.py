@@ -0,0 +1,167 @@
+"""监控后端测试：Prometheus 批量写入保留延迟分布"""
+
+import random
+
+import pytest
+
+from app.core.permission.metrics_registry import LatencySketch
+from app.core.permission.monitor_backends import (
+    MetricAggregate,
+    PrometheusBackend,
+    RedisBackend,
+)
+from app.core.permission.permission_monitor import Alert, AlertLevel, MetricType
+
+prometheus_client = pytest.importorskip("prometheus_client")
+
+NAME = "permission_system_response_time_seconds"
+LABELS = {"operation": "check"}
+
+
+def make_backend():
+    return PrometheusBackend(registry=prometheus_client.CollectorRegistry())
+
+
+def sample(backend, suffix, **labels):
+    return backend._registry.get_sample_value(f"{NAME}{suffix}", {**LABELS, **labels})
+
+
+def test_record_batch_observes_every_sketch_bucket():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(2000)]  # 毫秒
+
+    aggregate = MetricAggregate(
+        "response_time", "histogram", dict(LABELS), sketch=LatencySketch()
+    )
+    for value in values:
+        aggregate.add(value, 0.0)
+
+    batched, direct = make_backend(), make_backend()
+    assert batched.record_batch([aggregate], [])
+    for value in values:
+        direct.record_metric("response_time", value, dict(LABELS))
+
+    assert sample(batched, "_count") == len(values)
+    assert sample(batched, "_sum") == pytest.approx(sum(values) / 1000, rel=0.01)
+    for bound in ("0.01", "0.025", "0.05", "0.1", "0.25"):
+        expected = sample(direct, "_bucket", le=bound)
+        # 草图相对误差1%，只有紧邻分桶边界的值可能落入相邻的桶
+        assert sample(batched, "_bucket", le=bound) == pytest.approx(expected, abs=20)
+
+
+def test_record_batch_without_sketch_keeps_count_and_sum():
+    aggregate = MetricAggregate("response_time", "histogram", dict(LABELS))
+    for value in (10.0, 20.0, 30.0):
+        aggregate.add(value, 0.0)
+    backend = make_backend()
+    assert backend.record_batch([aggregate], [])
+    assert sample(backend, "_count") == 3
+    assert sample(backend, "_sum") == pytest.approx(0.06)
+
+
+def test_record_batch_passes_other_metrics_through():
+    backend = make_backend()
+    aggregate = MetricAggregate("cache_hit_rate", "gauge", {"cache_level": "l2"})
+    aggregate.add(0.75, 0.0)
+    assert backend.record_batch([aggregate], [])
+    value = backend._registry.get_sample_value(
+        "permission_system_cache_hit_rate", {"cache_level": "l2"}
+    )
+    assert value == 0.75
+
+
+class RecordingPipeline(list):
+    """记录命令的管道替身"""
+
+    def __getattr__(self, command):
+        return lambda *args: self.append((command, *args))
+
+    def execute(self, raise_on_error=True):
+        return [1] * len(self)
+
+
+class RecordingRedis:
+    def __init__(self):
+        self.pipelines = []
+
+    def script_load(self, script):
+        return "sha"
+
+    def pipeline(self, transaction=True):
+        self.pipelines.append(RecordingPipeline())
+        return self.pipelines[-1]
+
+
+def test_redis_sketch_keys_expire():
+    backend = RedisBackend(sketch_ttl=600)
+    backend._redis = RecordingRedis()
+    aggregate = MetricAggregate(
+        "response_time", "histogram", dict(LABELS), sketch=LatencySketch()
+    )
+    aggregate.add(12.0, 0.0)
+    assert backend.record_batch([aggregate], [])
+    commands = backend._redis.pipelines[0]
+    sketch_key = "monitor:sketch:response_time:operation=check"
+    assert ("hincrby", sketch_key, str(LatencySketch.bucket_index(12.0)), 1) in commands
+    assert ("expire", sketch_key, 600) in commands
+
+
+class AlertRedis:
+    """告警相关命令的Redis替身"""
+
+    def __init__(self):
+        self.values, self.ttls, self.sets, self.counters = {}, {}, {}, {}
+
+    def ping(self):
+        return True
+
+    def set(self, key, value, ex=None):
+        self.values[key], self.ttls[key] = value, ex
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def sadd(self, key, member):
+        members = self.sets.setdefault(key, set())
+        added = member.encode() not in members
+        members.add(member.encode())
+        return int(added)
+
+    def srem(self, key, *members):
+        self.sets.get(key, set()).difference_update(members)
+
+    def smembers(self, key):
+        return set(self.sets.get(key, set()))
+
+    def incr(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+
+
+def make_alert(alert_id, value):
+    return Alert(
+        id=alert_id,
+        level=AlertLevel.WARNING,
+        message="anomaly",
+        metric_type=MetricType.RESPONSE_TIME,
+        current_value=value,
+        threshold=1.0,
+        timestamp=value,
+        source="anomaly",
+    )
+
+
+def test_redis_alerts_expire_and_update_in_place():
+    backend = RedisBackend(alert_ttl=600)
+    backend._redis = fake = AlertRedis()
+    for second in range(10):
+        assert backend.create_alert(make_alert("anomaly_cache_get{level=l1}", second))
+
+    assert fake.ttls == {"monitor:alert:anomaly_cache_get{level=l1}": 600}
+    assert fake.counters == {"monitor:alert_counter:warning": 1}
+    (alert,) = backend.get_active_alerts()
+    assert alert.current_value == 9 and alert.source == "anomaly"
+
+    # 告警键过期后，活跃集合中的ID在读取时移除
+    fake.values.clear()
+    assert backend.get_active_alerts() == []
+    assert fake.sets["monitor:active_alerts"] == set()
@@ -0,0 +1,202 @@
+"""OPA策略管理器测试：使用本地HTTP替身模拟OPA服务"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.core.permission.abac_policy import ATTRIBUTE_LOCAL_POLICIES
+from app.core.permission.opa_policy_manager import OPAPolicyManager
+
+
+def rego_allow(input_doc):
+    """替身中的 permission.abac：属性规则之外还要求角色权限"""
+    user = input_doc.get("user") or {}
+    return (
+        user.get("session_valid") is True
+        and (input_doc.get("resource") or {}).get("exists") is True
+        and "editor" in (user.get("roles") or [])
+    )
+
+
+class FakeOPA:
+    """记录请求并按配置应答的OPA替身"""
+
+    def __init__(self):
+        self.requests = []
+        self.status = 200
+        self.fail = False
+        self.compile_result = None  # None 表示 /v1/compile 返回404
+
+    def handle(self, path, body):
+        self.requests.append(path)
+        if self.fail:
+            return 500, {"code": "internal_error"}
+        if path == "/v1/compile":
+            if self.compile_result is None:
+                return 404, {"code": "resource_not_found"}
+            return 200, {"result": self.compile_result}
+        if self.status != 200:
+            return self.status, {"code": "error"}
+        if path == "/v1/data/permission/abac":
+            return 200, {"result": {"allow": rego_allow(body["input"])}}
+        if path == "/v1/data/permission/abac/batch_allow":
+            batch = body["input"]["batch"]
+            decisions = {str(i): rego_allow(item) for i, item in enumerate(batch)}
+            return 200, {"result": decisions}
+        return 404, {"code": "resource_not_found"}
+
+    def count(self, path):
+        return sum(1 for request in self.requests if request == path)
+
+
+@pytest.fixture
+def opa():
+    fake = FakeOPA()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+            status, payload = fake.handle(self.path, body)
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    fake.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield fake
+    server.shutdown()
+    server.server_close()
+
+
+def make_manager(opa, **kwargs):
+    manager = OPAPolicyManager(opa_url=opa.url, **kwargs)
+    # 测试中不启动后台维护线程
+    manager._ensure_maintenance_thread = lambda: None
+    return manager
+
+
+USER = {"id": 1, "session_valid": True, "disabled": False, "risk_level": 1}
+RESOURCE = {"type": "channel", "exists": True, "owner_id": None}
+
+
+def test_rego_policy_is_not_shadowed_by_default(opa):
+    manager = make_manager(opa)
+    # 属性规则全部满足，但缺少角色权限，必须由OPA拒绝
+    assert manager.check_permission(USER, RESOURCE, "read") is False
+    assert manager.check_permission({**USER, "roles": ["editor"]}, RESOURCE, "read")
+    assert opa.count("/v1/data/permission/abac") == 2
+
+
+def test_attribute_policy_is_opt_in_under_its_own_name(opa):
+    manager = make_manager(opa, local_policies=ATTRIBUTE_LOCAL_POLICIES)
+    assert manager.check_permission(USER, RESOURCE, "read") is False
+    assert opa.count("/v1/data/permission/abac") == 1
+
+    input_doc = {
+        "user": {**USER, "behavior_score": 1, "security_level": 1},
+        "resource": {
+            **RESOURCE,
+            "max_risk_level": 3,
+            "min_behavior_score": 0,
+            "required_security_level": 0,
+        },
+    }
+    requests_before = len(opa.requests)
+    result = manager.evaluate_policy("permission.abac_attributes", input_doc)
+    assert result == {"result": {"allow": True}}
+    assert len(opa.requests) == requests_before  # 本地策略不访问OPA
+
+
+def test_batch_uses_batch_allow_rule(opa):
+    manager = make_manager(opa, partial_evaluation=False)
+    checks = [
+        (USER, RESOURCE, "read", None),
+        ({**USER, "roles": ["editor"]}, RESOURCE, "read", None),
+    ]
+    assert manager.check_permissions_batch(checks) == [False, True]
+    assert opa.requests == ["/v1/data/permission/abac/batch_allow"]
+
+    # 第二次由决策缓存应答
+    assert manager.check_permissions_batch(checks) == [False, True]
+    assert len(opa.requests) == 1
+
+
+EDITOR = {**USER, "roles": ["editor"]}
+
+
+def test_error_responses_are_not_cached(opa):
+    manager = make_manager(opa, partial_evaluation=False)
+    opa.status = 500
+    assert manager.check_permission(EDITOR, RESOURCE, "read") is False
+    assert len(manager._decision_cache) == 0
+
+    opa.status = 200
+    assert manager.check_permission(EDITOR, RESOURCE, "read") is True
+    assert opa.count("/v1/data/permission/abac") == 2
+
+
+def test_unreachable_opa_is_not_cached():
+    manager = OPAPolicyManager(opa_url="http://127.0.0.1:9", timeout=0.5)
+    manager._ensure_maintenance_thread = lambda: None
+    assert manager.check_permission(EDITOR, RESOURCE, "read") is False
+    assert manager.evaluate_policy("permission.abac", {"input": {}}) == {
+        "result": {"allow": False}
+    }
+    assert len(manager._decision_cache) == 0
+    assert len(manager._residual_cache) == 0
+
+
+def test_batch_errors_are_not_cached(opa):
+    manager = make_manager(opa, partial_evaluation=False)
+    checks = [(EDITOR, RESOURCE, "read", None)]
+    opa.status = 503
+    assert manager.check_permissions_batch(checks) == [False]
+    opa.status = 200
+    assert manager.check_permissions_batch(checks) == [True]
+    assert opa.count("/v1/data/permission/abac/batch_allow") == 2
+
+
+def test_residual_cached_only_for_real_answers(opa):
+    manager = make_manager(opa)
+    opa.fail = True
+    assert manager.check_permission(EDITOR, RESOURCE, "read") is False
+    assert len(manager._residual_cache) == 0
+
+    # 残余查询：input.resource.exists == true
+    opa.fail = False
+    opa.compile_result = {
+        "queries": [
+            [
+                {
+                    "terms": [
+                        {"type": "ref", "value": [{"type": "var", "value": "eq"}]},
+                        {
+                            "type": "ref",
+                            "value": [
+                                {"type": "var", "value": "input"},
+                                {"type": "string", "value": "resource"},
+                                {"type": "string", "value": "exists"},
+                            ],
+                        },
+                        {"type": "boolean", "value": True},
+                    ]
+                }
+            ]
+        ]
+    }
+    assert manager.check_permission(EDITOR, RESOURCE, "read") is True
+    missing = {**RESOURCE, "exists": False}
+    assert manager.check_permission(EDITOR, missing, "read") is False
+    assert opa.count("/v1/compile") == 2
+    assert opa.count("/v1/data/permission/abac") == 1
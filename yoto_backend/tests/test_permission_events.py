@@ -0,0 +1,47 @@
+"""失效总线测试：并发 flush 时消息按序号顺序发出"""
+
+import json
+import threading
+
+from app.core.permission.permission_events import InvalidationBus
+
+
+class PublishRedis:
+    """记录 publish 的Redis替身，第一条消息发送时阻塞，制造并发窗口"""
+
+    def __init__(self):
+        self.messages = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return None
+
+    def publish(self, channel, message):
+        if not self.entered.is_set():
+            self.entered.set()
+            self.release.wait(timeout=1.0)
+        self.messages.append(json.loads(message)["payload"])
+
+
+def test_concurrent_flushes_publish_in_seq_order():
+    redis_client = PublishRedis()
+    bus = InvalidationBus(redis_client, apply_callback=lambda users, roles: None)
+
+    bus.publish(user_ids=[1])
+    first = threading.Thread(target=bus.flush)
+    first.start()
+    assert redis_client.entered.wait(timeout=1.0)
+
+    bus.publish(user_ids=[2])
+    second = threading.Thread(target=bus.flush)
+    second.start()
+    second.join(timeout=0.05)
+    redis_client.release.set()
+    first.join()
+    second.join()
+
+    assert [(m["seq"], m["users"]) for m in redis_client.messages] == [
+        (1, [1]),
+        (2, [2]),
+    ]
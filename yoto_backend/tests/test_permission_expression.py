@@ -0,0 +1,125 @@
+"""权限表达式测试：位图上的DNF求值与直接求值一致"""
+
+import itertools
+
+import pytest
+
+from app.core.permission.permission_bitset import (
+    PermissionBits,
+    get_permission_bit_index,
+)
+from app.core.permission.permission_expression import (
+    MAX_DNF_TERMS,
+    PermissionExpressionError,
+    compile_expression,
+)
+
+NAMES = ["admin", "moderator", "read", "write", "banned"]
+
+EXPRESSIONS = [
+    "admin",
+    "not banned",
+    "admin or moderator",
+    "(admin or moderator) and (read or write)",
+    "(admin OR moderator) AND NOT banned",
+    "not (read and write) or admin",
+    "not (admin or (moderator and not read)) and write",
+    "read and not read",
+    "(admin or read) and (moderator or write) and (banned or not write)",
+]
+
+
+@pytest.fixture(autouse=True)
+def bit_index():
+    index = get_permission_bit_index()
+    index.clear()
+    # 阻止未知名称触发数据库加载
+    index._last_reload = float("inf")
+    index.register_many((name, i + 1) for i, name in enumerate(NAMES))
+    yield index
+    index.clear()
+
+
+def reference(expression, granted):
+    """用 Python 自身的布尔求值作为参照"""
+    names = {name: name in granted for name in NAMES}
+    return eval(expression.lower(), {"__builtins__": {}}, names)
+
+
+def all_subsets():
+    for size in range(len(NAMES) + 1):
+        for subset in itertools.combinations(NAMES, size):
+            yield frozenset(subset)
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_dnf_matches_direct_evaluation(expression):
+    compiled = compile_expression(expression)
+    assert compiled._terms is not None
+    for granted in all_subsets():
+        bits = PermissionBits.from_names(granted)
+        expected = reference(expression, granted)
+        assert compiled.evaluate(granted) is expected, granted
+        assert compiled.evaluate(bits) is expected, granted
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_evaluate_many_matches_evaluate(expression):
+    compiled = compile_expression(expression)
+    subsets = list(all_subsets())
+    bits = [PermissionBits.from_names(granted) for granted in subsets]
+    assert compiled.evaluate_many(bits) == [compiled.evaluate(s) for s in subsets]
+
+
+def test_unregistered_name_never_matches_bits():
+    compiled = compile_expression("ghost or (admin and not phantom)")
+    bits = PermissionBits.from_names({"admin"})
+    assert compiled.evaluate(bits) is True
+    assert compiled.evaluate(PermissionBits.from_names({"read"})) is False
+    assert compiled._masks is None  # 含未登记名称时不缓存掩码
+
+
+def test_large_dnf_falls_back_to_closure():
+    # 每个 (x or y) 翻倍合取项数
+    clauses = [f"(admin{i} or read{i})" for i in range(7)]
+    compiled = compile_expression(" and ".join(clauses))
+    assert 2 ** 7 > MAX_DNF_TERMS
+    assert compiled._terms is None
+    granted = {f"admin{i}" for i in range(7)}
+    assert compiled.evaluate(granted) is True
+    assert compiled.evaluate(granted - {"admin3"}) is False
+
+
+@pytest.mark.parametrize("expression", ["admin and", "(admin", "admin or or read"])
+def test_syntax_errors_raise(expression):
+    with pytest.raises(PermissionExpressionError):
+        compile_expression(expression)
+
+
+def test_decorator_rejects_invalid_expression_at_decoration_time():
+    from app.core.permission.permission_decorators import (
+        require_permission_with_expression,
+    )
+
+    with pytest.raises(PermissionExpressionError):
+        require_permission_with_expression("(admin or")
+
+
+def test_unknown_names_and_bits_reload_in_background(bit_index, monkeypatch):
+    def fail_reload(*args, **kwargs):
+        raise AssertionError("请求路径上不应同步加载位索引")
+
+    requested = []
+    monkeypatch.setattr(bit_index, "reload", fail_reload)
+    monkeypatch.setattr(bit_index, "request_reload", lambda: requested.append(1))
+
+    assert PermissionBits.from_names({"admin", "ghost"}) is None
+    assert bit_index.bit("ghost") is None
+    compiled = compile_expression("ghost or admin")
+    assert compiled.evaluate(PermissionBits.from_names({"admin"})) is True
+
+    # 稀疏的大位索引只遍历置位的位，未知位被跳过
+    bit_index.register("sparse", 100000)
+    bits = PermissionBits((1 << 100000) | (1 << 70000) | (1 << 1))
+    assert sorted(bits) == ["admin", "sparse"]
+    assert len(requested) == 4
@@ -0,0 +1,34 @@
+"""权限缓存代数测试：本地缓存有上限，按最近刷新顺序淘汰"""
+
+from app.core.permission.permission_generations import GenerationStore
+
+
+class MgetRedis:
+    def __init__(self, values=None):
+        self.values = values or {}
+        self.calls = 0
+
+    def mget(self, keys):
+        self.calls += 1
+        return [self.values.get(key) for key in keys]
+
+
+def test_cache_is_bounded_and_keeps_recently_refreshed_refs():
+    store = GenerationStore(MgetRedis({"perm_gen:user:0": "5"}), max_entries=3)
+    store.get("user", 0)
+    for user_id in range(1, 100):
+        store.get_many([("user", user_id)])
+        # 过期后刷新的常用引用移到队尾，不会被淘汰
+        store._cache[("user", 0)] = (5, 0.0)
+        store.get("user", 0)
+
+    assert len(store._cache) == 3
+    assert ("user", 0) in store._cache
+    assert store.get_stats()["evictions"] == 97
+
+
+def test_bumped_refs_count_towards_the_bound():
+    store = GenerationStore(max_entries=2)
+    store.bump("role", [1, 2, 3])
+    assert list(store._cache) == [("role", 2), ("role", 3)]
+    assert store.get("role", 3) == 1
@@ -0,0 +1,75 @@
+"""性能预测器测试：增量滑动回归与 np.polyfit 逐样本一致"""
+
+import numpy as np
+import pytest
+
+from app.core.permission.permission_ml import (
+    PREDICTED_METRICS,
+    MLPerformancePredictor,
+    PerformanceMetrics,
+    _SlidingRegression,
+)
+
+
+def make_metrics(timestamp, values):
+    fields = dict(zip(PREDICTED_METRICS, values))
+    return PerformanceMetrics(
+        timestamp=timestamp, connection_pool_usage=0.0, **fields
+    )
+
+
+def polyfit(x, values):
+    """逐指标拟合，返回 (斜率, 截距)"""
+    coefficients = np.array([np.polyfit(x, y, 1) for y in values])
+    return coefficients[:, 0], coefficients[:, 1]
+
+
+def assert_fit_matches(fit, x, values):
+    slope, intercept = fit.fit()
+    expected_slope, expected_intercept = polyfit(x, values)
+    np.testing.assert_allclose(slope, expected_slope, rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(intercept, expected_intercept, rtol=1e-6, atol=1e-9)
+
+
+def test_incremental_regression_matches_polyfit():
+    rng = np.random.default_rng(3)
+    predictor = MLPerformancePredictor(history_window=50, regression_window=20)
+    size = len(PREDICTED_METRICS)
+    timestamp = 1.7e9  # 真实时间戳量级，检验原点平移后的精度
+    timestamps, samples = [], []
+    # 超过缓冲区长度和统计量重算周期（1024），覆盖环形覆盖和重算两条路径
+    for step in range(1500):
+        timestamp += rng.uniform(0.5, 1.5)
+        values = 5.0 + 0.01 * step + rng.normal(0, 1, size)
+        predictor.add_performance_data(make_metrics(timestamp, values))
+        timestamps.append(timestamp)
+        samples.append(values)
+        if step < 2:
+            continue
+
+        n = min(len(samples), predictor.regression_window)
+        window = np.array(samples[-n:]).T
+        x_time = np.array(timestamps[-n:]) - timestamps[-1]
+        x_index = np.arange(1 - n, 1, dtype=float)
+        assert_fit_matches(predictor._time_fit, x_time, window)
+        assert_fit_matches(predictor._index_fit, x_index, window)
+
+
+def test_degenerate_fit_returns_mean():
+    fit = _SlidingRegression(2)
+    fit.add(0.0, np.array([1.0, 3.0]))
+    fit.add(0.0, np.array([3.0, 5.0]))
+    slope, intercept = fit.fit()
+    assert slope.tolist() == [0.0, 0.0]
+    assert intercept.tolist() == [2.0, 4.0]
+
+
+def test_linear_prediction_follows_fitted_trend(monkeypatch):
+    predictor = MLPerformancePredictor(regression_window=10)
+    for i in range(20):
+        values = [0.5] * len(PREDICTED_METRICS)
+        values[PREDICTED_METRICS.index("qps")] = 100.0 + 2.0 * i
+        predictor.add_performance_data(make_metrics(1000.0 + i, values))
+    monkeypatch.setattr("time.time", lambda: 1019.0)
+    result = predictor.predict_metric("qps", horizon=5)
+    assert result.predicted_value == pytest.approx(100.0 + 2.0 * 24)
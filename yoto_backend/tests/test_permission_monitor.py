@@ -0,0 +1,71 @@
+"""权限监控器测试：异常告警按指标和标签组合去重，不覆盖阈值告警"""
+
+import pytest
+
+from app.core.permission import permission_monitor
+from app.core.permission.anomaly_detection import Anomaly
+from app.core.permission.monitor_backends import MemoryBackend
+from app.core.permission.permission_monitor import (
+    AlertLevel,
+    MetricType,
+    PermissionMonitor,
+)
+
+
+@pytest.fixture
+def monitor(monkeypatch):
+    monkeypatch.setattr(permission_monitor, "get_monitor_backend", MemoryBackend)
+    return PermissionMonitor(flush_interval_ms=0, anomaly_detection=False)
+
+
+def make_anomaly(series, timestamp, severity="medium"):
+    return Anomaly(
+        metric="cache_get",
+        series=series,
+        value=50.0,
+        baseline=5.0,
+        scale=1.0,
+        score=45.0,
+        direction="up",
+        severity=severity,
+        timestamp=timestamp,
+    )
+
+
+def test_repeated_anomalies_update_one_alert_per_series(monitor):
+    for second in range(100):
+        severity = "high" if second % 2 else "medium"
+        for series in ("level=l1", "level=l2"):
+            anomaly = make_anomaly(series, 1000.0 + second, severity)
+            monitor._create_anomaly_alert(anomaly)
+
+    alerts = monitor.backend.get_active_alerts()
+    assert sorted(alert.id for alert in alerts) == [
+        "anomaly_cache_get{level=l1}",
+        "anomaly_cache_get{level=l2}",
+    ]
+    assert all(alert.timestamp == 1099.0 for alert in alerts)
+    assert all(alert.level == AlertLevel.ERROR for alert in alerts)
+    assert sum(monitor.backend.get_alert_counters().values()) == 2
+
+
+def test_anomaly_and_threshold_alerts_are_kept_apart(monitor):
+    monitor._create_alert(MetricType.RESPONSE_TIME, 300.0, 200.0, AlertLevel.ERROR)
+    monitor._create_anomaly_alert(make_anomaly("level=l1", 1000.0, "high"))
+    monitor._create_alert(MetricType.RESPONSE_TIME, 400.0, 200.0, AlertLevel.ERROR)
+
+    alerts = {alert.source: alert for alert in monitor.backend.get_active_alerts()}
+    assert len(monitor.backend.get_active_alerts()) == 2
+    assert alerts["threshold"].current_value == 400.0
+    assert alerts["anomaly"].current_value == 50.0
+
+
+def test_resolved_anomaly_alert_reopens(monitor):
+    monitor._create_anomaly_alert(make_anomaly("level=l1", 1000.0))
+    monitor.clear_alerts()
+    assert monitor.backend.get_active_alerts() == []
+
+    monitor._create_anomaly_alert(make_anomaly("level=l1", 1001.0))
+    assert len(monitor.backend.get_active_alerts()) == 1
+    monitor.clear_alerts()
+    assert monitor.backend.get_active_alerts() == []
@@ -0,0 +1,60 @@
+"""权限快照解析测试：服务器角色只在所属服务器及其频道上生效"""
+
+from app.core.permission.permission_resolver import (
+    GLOBAL_SCOPE,
+    PermissionSnapshot,
+)
+
+SEND = 1 << 1
+MANAGE = 1 << 2
+PIN = 1 << 3
+ADMIN = 1 << 4
+
+
+def make_snapshot(**overrides):
+    values = dict(
+        version=1,
+        built_at=0.0,
+        role_grants={
+            # 服务器1的角色：全局作用域权限 + 频道20上的显式权限
+            10: {GLOBAL_SCOPE: SEND, ("channel", 20): PIN},
+            # 服务器2的角色
+            11: {GLOBAL_SCOPE: MANAGE},
+            # 全局角色
+            12: {GLOBAL_SCOPE: ADMIN},
+        },
+        user_roles={1: ((10, None, None), (11, None, None)), 2: ((12, None, None),)},
+        role_servers={10: 1, 11: 2, 12: None},
+        channel_servers={20: 1, 30: 2},
+    )
+    values.update(overrides)
+    return PermissionSnapshot(**values)
+
+
+def test_server_role_does_not_leak_to_other_server():
+    snapshot = make_snapshot()
+    assert snapshot.resolve(1, "server", 1).bits == SEND
+    assert snapshot.resolve(1, "server", 2).bits == MANAGE
+    assert snapshot.resolve(1, "server", 3).bits == 0
+
+
+def test_channel_scope_uses_channel_server():
+    snapshot = make_snapshot()
+    assert snapshot.resolve(1, "channel", 20).bits == SEND | PIN
+    assert snapshot.resolve(1, "channel", 30).bits == MANAGE
+
+
+def test_unknown_server_only_applies_explicit_grants():
+    snapshot = make_snapshot(channel_servers={20: None})
+    assert snapshot.resolve(1, "channel", 20).bits == PIN
+    assert snapshot.resolve(1, "resource", 5).bits == 0
+
+
+def test_global_role_applies_everywhere():
+    snapshot = make_snapshot()
+    for scope, scope_id in ((None, None), ("server", 1), ("channel", 30)):
+        assert snapshot.resolve(2, scope, scope_id).bits == ADMIN
+
+
+def test_unscoped_check_merges_all_roles():
+    assert make_snapshot().resolve(1).bits == SEND | MANAGE
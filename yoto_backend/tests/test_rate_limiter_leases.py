@@ -0,0 +1,102 @@
+"""限流器令牌租约测试：本地消耗不超过Redis实际发放的令牌"""
+
+from app.core.permission.permission_resilience import (
+    MultiDimensionalKey,
+    RateLimitConfig,
+    RateLimiter,
+    RateLimitType,
+)
+
+
+class FakeController:
+    """按固定预算发放令牌的控制器替身，记录每次领取的数量"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.requests = []
+        self.grants = []
+
+    def _grant(self, requested):
+        self.requests.append(requested)
+        granted = min(requested, self.budget)
+        self.budget -= granted
+        self.grants.append(granted)
+        return granted
+
+    def rate_limiter_acquire(self, name, limit_type, key, limit, rate, now, requested):
+        return self._grant(requested)
+
+    def rate_limiter_multi_dimensional_acquire(
+        self, name, dimensions, window, now, requested
+    ):
+        granted = self._grant(requested)
+        return granted, (None if granted else dimensions[0][0])
+
+
+def make_limiter(controller, **overrides):
+    values = dict(
+        name="api",
+        limit_type=RateLimitType.SLIDING_WINDOW,
+        max_requests=1000,
+        lease_enabled=True,
+        lease_ttl=60.0,
+    )
+    values.update(overrides)
+    return RateLimiter("api", controller, RateLimitConfig(**values))
+
+
+def test_leased_grants_never_exceed_remote_budget():
+    controller = FakeController(budget=25)
+    limiter = make_limiter(controller)
+    allowed = sum(limiter.is_allowed("u1") for _ in range(100))
+    assert allowed == 25
+    # 第一次只领取1个，之后按观测速率领取，单次不超过限额的10%
+    assert controller.requests[0] == 1
+    assert max(controller.requests) <= 100
+    # 每次成功领取直接放行一个请求，其余由本地租约放行
+    remote_allowed = sum(1 for granted in controller.grants if granted)
+    assert limiter.lease_stats["local_grants"] == allowed - remote_allowed
+
+
+def test_denial_is_cached_locally():
+    controller = FakeController(budget=0)
+    limiter = make_limiter(controller)
+    assert not limiter.is_allowed("u1")
+    assert not limiter.is_allowed("u1")
+    assert len(controller.requests) == 1
+    assert limiter.lease_stats["local_denials"] == 1
+
+
+def test_lease_max_block_caps_fetch_size():
+    controller = FakeController(budget=10_000)
+    limiter = make_limiter(controller, lease_max_block=5)
+    for _ in range(200):
+        assert limiter.is_allowed("u1")
+    assert max(controller.requests) <= 5
+    assert sum(controller.requests) - 200 < 5  # 本地剩余不超过一个块
+
+
+def test_multi_dimensional_lease_uses_smallest_limit():
+    controller = FakeController(budget=10_000)
+    limiter = make_limiter(
+        controller,
+        multi_dimensional=True,
+        user_id_limit=30,
+        server_id_limit=200,
+        ip_limit=0,
+        combined_limit=0,
+        lease_enabled=True,
+    )
+    key = MultiDimensionalKey(user_id="1", server_id="2")
+    for _ in range(100):
+        limiter._check_multi_dimensional_limits(key, limiter.get_config())
+    assert max(controller.requests) <= 3  # 最小限额30的10%
+
+
+def test_block_grows_with_observed_rate():
+    controller = FakeController(budget=10_000)
+    limiter = make_limiter(controller)
+    for _ in range(50):
+        assert limiter.is_allowed("u1")
+    assert controller.requests[0] == 1
+    assert len(controller.requests) < 10
@@ -0,0 +1,62 @@
+"""共享内存指标表测试：代理接管与槽位回收"""
+
+import os
+import uuid
+from multiprocessing import shared_memory
+
+import pytest
+
+from app.core.permission import shared_metrics
+from app.core.permission.shared_metrics import SharedMetricsTable
+
+pytestmark = pytest.mark.skipif(
+    not shared_metrics.FCNTL_AVAILABLE, reason="需要fcntl文件锁"
+)
+
+
+@pytest.fixture
+def table_name():
+    name = f"yoto_test_{uuid.uuid4().hex[:12]}"
+    yield name
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+        shm.close()
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def test_new_agent_does_not_resend_cumulative_sums(table_name):
+    first = SharedMetricsTable(["latency"], table_name, slots=4)
+    assert first.try_become_agent()
+    for value in (10.0, 20.0, 30.0):
+        first.add("latency", value)
+    assert first.collect() == {"latency": (60.0, 3)}
+    first.acknowledge()
+    first.close()  # 代理退出，文件锁释放
+
+    second = SharedMetricsTable(["latency"], table_name, slots=4)
+    assert second.try_become_agent()
+    assert second.collect() == {}
+    second.add("latency", 5.0)
+    assert second.collect() == {"latency": (5.0, 1)}
+    second.close()
+
+
+def test_slot_with_reused_pid_is_reclaimed(table_name):
+    table = SharedMetricsTable(["latency"], table_name, slots=1)
+    parent = os.getppid()
+    parent_start = shared_metrics._process_start_time(parent)
+    if parent_start == 0:
+        pytest.skip("无法读取进程启动时间")
+
+    # 槽位属于仍在运行的进程：不能被占用
+    table._owners[0], table._owners[1] = parent, parent_start
+    assert not table.add("latency", 1.0)
+
+    # 进程ID相同但启动时间不同：原进程已退出，ID被复用
+    table._slot = table._slot_pid = None
+    table._owners[1] = parent_start - 1
+    assert table.add("latency", 1.0)
+    assert table._owners[0] == os.getpid()
+    table.close()